@@ -0,0 +1,241 @@
+"""
+This module compares chunking policies offline on a generated corpus and a fixed question set.
+
+The corpus mixes long handbooks, one-page memos and CSV tables, with facts ("The evidence deadline for
+Working Group 3 is ...") planted at known positions; every question asks for one fact. For each policy, every
+document is cut into the chunks its strategy gives (documents no rule matches get OpenAI's default of 800
+tokens overlapping by 400), and the chunks are indexed with BM25 as a stand-in for the vector store's search.
+The report gives, per policy:
+
+- indexing: wall time to chunk and index the corpus, the number of chunks and the tokens indexed (overlap included).
+- retrieval: p50/p95 latency of a search over the index.
+- quality: hit rate and MRR of the first chunk holding a whole fact among the top `k`, and the context tokens
+  those `k` chunks would add to the prompt.
+
+Words stand in for tokens. The absolute numbers are not OpenAI's, but the differences between policies on the
+same corpus show what a change of chunk size and overlap trades off.
+
+Functions:
+- generate_corpus(num_handbooks: int, num_memos: int, num_tables: int, seed: int) -> tuple[list[dict], list[dict]]: Builds the documents and questions.
+- run_benchmark(policies: dict, documents: list, questions: list, top_k: int) -> dict: Measures every policy.
+
+Usage:
+- `python chunking_benchmark.py --handbooks 4 --memos 60 --tables 10 --top-k 20 --out chunking-$(git rev-parse --short HEAD).json`
+- Pass `--policy name=path.json` to add a candidate policy file next to the built-in ones.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BENCHMARK_DIR, "../src"))
+
+from chunking import DEFAULT_RULES, ChunkingPolicy, load_policy
+
+# OpenAI's "auto" chunking
+DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS = 800, 400
+# A PDF is several times larger than its text
+PDF_BYTES_PER_TEXT_BYTE = 8
+
+FILLER = (
+    "the institution assesses student learning outcomes through program review and the committee documents "
+    "its findings in the annual report while faculty governance reviews curricular changes and the office of "
+    "institutional research publishes enrollment retention and graduation data for each academic unit"
+).split()
+ATTRIBUTES = ["evidence deadline", "report owner", "review cycle", "meeting room", "budget code", "lead contact"]
+ENTITIES = [f"Working Group {n}" for n in range(1, 8)] + [f"Standard {roman}" for roman in ("I", "II", "III", "IV", "V", "VI", "VII")]
+
+
+def _tokens(text: str) -> list[str]:
+    return text.lower().replace("?", " ").replace(".", " ").split()
+
+
+def _filler(rng: random.Random, words: int) -> list[str]:
+    return [rng.choice(FILLER) for _ in range(words)]
+
+
+def generate_corpus(num_handbooks: int = 4, num_memos: int = 60, num_tables: int = 10,
+                    seed: int = 0) -> tuple[list[dict], list[dict]]:
+    """
+    Builds the documents, with facts planted among filler text, and one question per fact.
+
+    Args:
+        num_handbooks (int): Long PDFs (about 60,000 words, over 2 MB as PDF)
+        num_memos (int): One-page PDFs (about 300 words)
+        num_tables (int): CSV tables (about 3,000 words)
+        seed (int): Seed of the generator
+
+    Returns:
+        tuple[list[dict], list[dict]]: Documents (`name`, `size`, `tokens`, `facts` as token spans) and
+        questions (`question`, `document`, `fact`)
+    """
+    rng = random.Random(seed)
+    documents, questions = [], []
+    kinds = [("Handbook", ".pdf", 60000, 12)] * num_handbooks + [("Memo", ".pdf", 300, 1)] * num_memos + \
+            [("Table", ".csv", 3000, 4)] * num_tables
+    for index, (kind, extension, words, num_facts) in enumerate(kinds):
+        tokens, facts = [], []
+        for fact_index in range(num_facts):
+            tokens += _filler(rng, words // num_facts)
+            attribute, entity = rng.choice(ATTRIBUTES), rng.choice(ENTITIES)
+            value = f"{kind.lower()}{index}v{fact_index}"
+            fact = _tokens(f"The {attribute} for {entity} is {value}.")
+            facts.append((len(tokens), len(tokens) + len(fact)))
+            tokens += fact
+            questions.append({"question": f"What is the {attribute} for {entity} in {kind.lower()} {index}?",
+                              "document": len(documents), "fact": len(facts) - 1, "value": value})
+        tokens += _filler(rng, words // (2 * num_facts))
+        # The document's name and number are in its text, as titles and headers are
+        tokens = [kind.lower(), str(index)] + tokens
+        facts = [(start + 2, end + 2) for start, end in facts]
+        text_bytes = sum(len(token) + 1 for token in tokens)
+        size = text_bytes * PDF_BYTES_PER_TEXT_BYTE if extension == ".pdf" else text_bytes
+        documents.append({"name": f"{kind} {index:03d}{extension}", "size": size, "tokens": tokens, "facts": facts})
+    return documents, questions
+
+
+def _chunk(tokens: list[str], size: int, overlap: int) -> list[tuple[int, int]]:
+    step = size - overlap
+    return [(start, min(start + size, len(tokens))) for start in range(0, max(len(tokens) - overlap, 1), step)]
+
+
+class _BM25:
+    """A minimal BM25 index over token lists."""
+    def __init__(self, chunks: list[list[str]], k1: float = 1.2, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.lengths = [len(chunk) for chunk in chunks]
+        self.average_length = sum(self.lengths) / max(len(chunks), 1)
+        self.postings = defaultdict(list)
+        for chunk_id, chunk in enumerate(chunks):
+            for term, count in Counter(chunk).items():
+                self.postings[term].append((chunk_id, count))
+        self.idf = {term: math.log(1 + (len(chunks) - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self.postings.items()}
+
+    def search(self, query: list[str], k: int) -> list[int]:
+        scores = defaultdict(float)
+        for term in set(query):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for chunk_id, count in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / self.average_length)
+                scores[chunk_id] += idf * count * (self.k1 + 1) / (count + norm)
+        return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def measure_policy(policy: ChunkingPolicy, documents: list[dict], questions: list[dict], top_k: int = 20) -> dict:
+    """
+    Chunks and indexes the corpus with one policy and asks every question.
+
+    Args:
+        policy (ChunkingPolicy): The policy
+        documents (list[dict]): The documents of `generate_corpus`
+        questions (list[dict]): The questions of `generate_corpus`
+        top_k (int): Chunks retrieved per question (file_search returns at most 20)
+
+    Returns:
+        dict: Indexing, retrieval and quality measurements
+    """
+    start = time.perf_counter()
+    spans, chunks, rules = [], [], Counter()
+    for document_id, document in enumerate(documents):
+        rule = policy.rule_for(document["name"], document["size"])
+        rules[rule.name if rule else "auto"] += 1
+        size, overlap = (rule.max_chunk_size_tokens, rule.chunk_overlap_tokens) if rule else \
+            (DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS)
+        for chunk_start, chunk_end in _chunk(document["tokens"], size, overlap):
+            spans.append((document_id, chunk_start, chunk_end))
+            chunks.append(document["tokens"][chunk_start:chunk_end])
+    index = _BM25(chunks)
+    indexing_s = time.perf_counter() - start
+
+    latencies, reciprocal_ranks, context_tokens = [], [], []
+    for question in questions:
+        fact_start, fact_end = documents[question["document"]]["facts"][question["fact"]]
+        query = _tokens(question["question"])
+        search_start = time.perf_counter()
+        results = index.search(query, top_k)
+        latencies.append(time.perf_counter() - search_start)
+        context_tokens.append(sum(len(chunks[chunk_id]) for chunk_id in results))
+        rank = next((position + 1 for position, chunk_id in enumerate(results)
+                     if spans[chunk_id][0] == question["document"]
+                     and spans[chunk_id][1] <= fact_start and fact_end <= spans[chunk_id][2]), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+    return {
+        "rules": dict(rules),
+        "indexing_s": round(indexing_s, 4),
+        "chunks": len(chunks),
+        "indexed_tokens": sum(len(chunk) for chunk in chunks),
+        "retrieval_p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "retrieval_p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+        "hit_rate": round(sum(1 for rr in reciprocal_ranks if rr) / len(questions), 4),
+        "mrr": round(sum(reciprocal_ranks) / len(questions), 4),
+        "context_tokens_p50": _percentile(context_tokens, 50),
+    }
+
+
+def run_benchmark(policies: dict[str, ChunkingPolicy], documents: list[dict], questions: list[dict],
+                  top_k: int = 20) -> dict:
+    """
+    Measures every policy on the same corpus and questions.
+
+    Args:
+        policies (dict[str, ChunkingPolicy]): The policies by name
+        documents (list[dict]): The documents of `generate_corpus`
+        questions (list[dict]): The questions of `generate_corpus`
+        top_k (int): Chunks retrieved per question
+
+    Returns:
+        dict: The measurements of each policy by name
+    """
+    return {name: measure_policy(policy, documents, questions, top_k) for name, policy in policies.items()}
+
+
+def builtin_policies() -> dict[str, ChunkingPolicy]:
+    """Returns the policies compared by default: OpenAI's default, the built-in rules and two uniform sizes."""
+    return {
+        "auto": ChunkingPolicy([]),
+        "default-rules": ChunkingPolicy(DEFAULT_RULES),
+        "uniform-400": ChunkingPolicy([{"name": "uniform-400", "max_chunk_size_tokens": 400, "chunk_overlap_tokens": 100}]),
+        "uniform-1600": ChunkingPolicy([{"name": "uniform-1600", "max_chunk_size_tokens": 1600, "chunk_overlap_tokens": 400}]),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare chunking policies offline on a generated corpus.")
+    parser.add_argument("--handbooks", type=int, default=4)
+    parser.add_argument("--memos", type=int, default=60)
+    parser.add_argument("--tables", type=int, default=10)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--policy", action="append", default=[], metavar="NAME=PATH",
+                        help="A policy file (a JSON list of rules) to compare as well")
+    parser.add_argument("--out", default="chunking_benchmark_results.json")
+    args = parser.parse_args()
+
+    policies = builtin_policies()
+    for option in args.policy:
+        name, _, path = option.partition("=")
+        policies[name] = load_policy(path)
+    documents, questions = generate_corpus(args.handbooks, args.memos, args.tables, args.seed)
+    results = run_benchmark(policies, documents, questions, args.top_k)
+
+    report = {"documents": len(documents), "questions": len(questions), "top_k": args.top_k, "policies": results}
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    for name, result in results.items():
+        print(f"{name:>16}: {result['chunks']:>6} chunks, {result['indexed_tokens']:>8} tokens indexed in "
+              f"{result['indexing_s']:.2f}s, p95 search {result['retrieval_p95_ms']:.2f} ms, "
+              f"hit rate {result['hit_rate']:.2f}, MRR {result['mrr']:.2f}, context {result['context_tokens_p50']} tokens")
@@ -0,0 +1,372 @@
+"""
+This module provides an in-memory fake of the parts of the Box SDK the backend uses, backed by a generated corpus.
+
+File contents are never stored: a file only keeps its size and a version number, and `content()` produces
+deterministic bytes of that size on demand. Corpora of tens of thousands of files therefore cost almost
+nothing to hold, while downloads still move (and are counted as) the full number of bytes.
+
+Classes:
+- FakeBoxFile: A file item as returned by `get_items()` or `client.file(id).get()`.
+- FakeBoxFolder: A folder item holding files and subfolders.
+- FakeBoxClient: A stand-in for `boxsdk.Client` that counts API calls and downloaded bytes.
+- FakeEvents: A stand-in for `client.events()` serving the events the fake account recorded, with long polling.
+
+Functions:
+- generate_corpus(num_files: int, ...) -> FakeBoxClient: Builds a fake Box account with a generated folder tree.
+
+Usage:
+- Pass `FakeBoxClient` wherever a `boxsdk.Client` is expected (e.g. `BoxClient(config_path=None, client=fake)`).
+- Use `touch_files` / `add_files` to simulate edits between two syncs, and `calls` / `bytes_downloaded` to measure cost.
+- Every change is also recorded as a Box event, so `client.events()` can drive an event-based sync.
+"""
+
+import hashlib
+import itertools
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+_BASE_TIME = datetime(2024, 11, 12, 7, 0, 0, tzinfo=timezone.utc)
+
+
+class FakeBoxFile:
+    """
+    A Box file with a size and a content version.
+
+    Attributes:
+        id (str): The Box file id
+        name (str): The file name
+        size (int): The content size in bytes
+        version (int): Incremented on every content change
+        created_at (str): ISO 8601 timestamp, bumped on every re-upload (content change or metadata-only re-save)
+        parent (FakeBoxFolder): The containing folder
+    """
+    type = "file"
+
+    def __init__(self, box, file_id: str, name: str, size: int, parent):
+        self._box = box
+        self.id = file_id
+        self.name = name
+        self.size = size
+        self.version = 0
+        self.created_at = _BASE_TIME.isoformat()
+        self.modified_at = self.created_at
+        self.parent = parent
+
+    @property
+    def sha1(self) -> str:
+        """The SHA-1 of the current content, derived from the id and version like Box's content hash."""
+        return hashlib.sha1(f"{self.id}:{self.version}:{self.size}".encode()).hexdigest()
+
+    @property
+    def etag(self) -> str:
+        return str(self.version)
+
+    @property
+    def path_collection(self) -> dict:
+        return {"entries": self.parent.ancestors() + [self.parent]}
+
+    def _bump_timestamps(self):
+        self._box.clock += timedelta(seconds=1)
+        self.created_at = self.modified_at = self._box.clock.isoformat()
+
+    def get(self, fields=None, etag=None):
+        self._box.calls["file.get"] += 1
+        return self
+
+    def content(self) -> bytes:
+        self._box.calls["file.content"] += 1
+        self._box.bytes_downloaded += self.size
+        seed = f"{self.id}:{self.version}".encode()
+        return (seed * (self.size // len(seed) + 1))[:self.size]
+
+    def delete(self):
+        self._box.calls["file.delete"] += 1
+        self.parent.children.pop(self.name, None)
+        self.parent.version += 1
+        self._box.files.pop(self.id, None)
+        self._box.emit("ITEM_TRASH", self)
+
+    def rename(self, name: str):
+        self._box.calls["file.rename"] += 1
+        self.parent.children.pop(self.name, None)
+        self.name = name
+        self.parent.children[name] = self
+        self.parent.version += 1
+        self._box.emit("ITEM_RENAME", self)
+
+    def move(self, parent):
+        self._box.calls["file.move"] += 1
+        self.parent.children.pop(self.name, None)
+        self.parent.version += 1
+        self.parent = parent
+        parent.children[self.name] = self
+        parent.version += 1
+        self._box.emit("ITEM_MOVE", self)
+
+    def __repr__(self):
+        return f"<FakeBoxFile {self.id} {self.name!r} {self.size}B v{self.version}>"
+
+
+class FakeBoxFolder:
+    """
+    A Box folder holding files and subfolders by name.
+
+    Attributes:
+        id (str): The Box folder id
+        name (str): The folder name
+        children (dict[str, FakeBoxFile | FakeBoxFolder]): The items of the folder by name
+        parent (FakeBoxFolder | None): The containing folder
+        version (int): Incremented whenever an item is added, removed, renamed or moved; serves as the etag
+    """
+    type = "folder"
+
+    def __init__(self, box, folder_id: str, name: str, parent=None):
+        self._box = box
+        self.id = folder_id
+        self.name = name
+        self.children = {}
+        self.parent = parent
+        self.version = 0
+
+    @property
+    def etag(self) -> str:
+        return str(self.version)
+
+    def ancestors(self) -> list:
+        chain, folder = [], self.parent
+        while folder is not None:
+            chain.insert(0, folder)
+            folder = folder.parent
+        return chain
+
+    def get(self, fields=None, etag=None):
+        self._box.calls["folder.get"] += 1
+        if etag is not None and etag == self.etag:
+            # Box answers a matching If-None-Match with 304, which the SDK raises
+            raise FakeBoxAPIException(304, "Not modified")
+        return self
+
+    def get_items(self, limit=None, offset=0, fields=None):
+        self._box.calls["folder.get_items"] += 1
+        # Box pages listings 1000 items at a time; count every extra page as its own call
+        pages = max(1, -(-len(self.children) // 1000))
+        self._box.calls["folder.get_items.page"] += pages
+        return iter(list(self.children.values()))
+
+    def upload_stream(self, file_stream, file_name: str):
+        self._box.calls["folder.upload_stream"] += 1
+        data = file_stream.read()
+        return self._box.add_file(self, file_name, len(data))
+
+    def __repr__(self):
+        return f"<FakeBoxFolder {self.id} {self.name!r} {len(self.children)} items>"
+
+
+class FakeBoxAPIException(Exception):
+    """Raised like `boxsdk.exception.BoxAPIException` for missing items and unmodified conditional requests."""
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class _MissingItem:
+    def __init__(self, box, item_id: str):
+        self._box = box
+        self.id = item_id
+
+    def get(self, fields=None, etag=None):
+        self._box.calls["file.get"] += 1
+        raise FakeBoxAPIException(404, f"Item {self.id} not found")
+
+    def delete(self, etag=None):
+        self._box.calls["file.delete"] += 1
+        raise FakeBoxAPIException(404, f"Item {self.id} not found")
+
+
+class _User:
+    name = "Fake Box User"
+
+    def get(self):
+        return self
+
+
+class _LongPollResponse:
+    def __init__(self, message: str):
+        self._body = {"version": 1, "message": message}
+
+    def json(self) -> dict:
+        return self._body
+
+
+class FakeEvents:
+    """
+    A stand-in for `boxsdk.object.events.Events` serving the events recorded by a `FakeBoxClient`.
+
+    Stream positions are indexes into the event log. `long_poll` blocks until an event past the position
+    is recorded or `long_poll_timeout` passes, and then answers "new_change" or "reconnect" like Box does.
+    """
+    def __init__(self, box):
+        self._box = box
+
+    def get_latest_stream_position(self, stream_type=None) -> int:
+        self._box.calls["events.get_latest_stream_position"] += 1
+        return len(self._box.event_log)
+
+    def get_events(self, limit: int = 100, stream_position=0, stream_type=None) -> dict:
+        self._box.calls["events.get_events"] += 1
+        log = self._box.event_log
+        start = len(log) if stream_position == "now" else int(stream_position)
+        entries = log[start:start + limit]
+        return {"chunk_size": len(entries), "next_stream_position": start + len(entries), "entries": entries}
+
+    def get_long_poll_options(self, stream_type=None) -> dict:
+        self._box.calls["events.get_long_poll_options"] += 1
+        return {"type": "realtime_server", "url": "fake://realtime", "ttl": "10", "max_retries": "10",
+                "retry_timeout": self._box.long_poll_timeout}
+
+    def long_poll(self, options: dict, stream_position) -> _LongPollResponse:
+        self._box.calls["events.long_poll"] += 1
+        with self._box.event_added:
+            has_new = self._box.event_added.wait_for(lambda: len(self._box.event_log) > int(stream_position),
+                                                     timeout=options["retry_timeout"])
+        return _LongPollResponse("new_change" if has_new else "reconnect")
+
+
+class FakeBoxClient:
+    """
+    A stand-in for `boxsdk.Client` backed by an in-memory folder tree.
+
+    Attributes:
+        root (FakeBoxFolder): The root folder (id "0")
+        files (dict[str, FakeBoxFile]): Every file by id
+        folders (dict[str, FakeBoxFolder]): Every folder by id
+        calls (collections.Counter): Number of API calls by kind (e.g. `file.get`)
+        bytes_downloaded (int): Total bytes returned by `content()`
+        event_log (list[dict]): Every change as a Box event (`event_id`, `event_type`, `source`, `created_at`)
+        long_poll_timeout (float): Seconds `events().long_poll` waits before answering "reconnect"
+    """
+    def __init__(self):
+        self._ids = itertools.count(100000)
+        self.clock = _BASE_TIME
+        self.calls = Counter()
+        self.bytes_downloaded = 0
+        self.event_log = []
+        self.event_added = threading.Condition()
+        self.long_poll_timeout = 0.1
+        self.files = {}
+        self.folders = {}
+        self.root = self.add_folder(None, "All Files", folder_id="0")
+
+    def _next_id(self) -> str:
+        return str(next(self._ids))
+
+    def add_folder(self, parent, name: str, folder_id: str | None = None) -> FakeBoxFolder:
+        folder = FakeBoxFolder(self, folder_id or self._next_id(), name, parent)
+        self.folders[folder.id] = folder
+        if parent is not None:
+            parent.children[name] = folder
+            parent.version += 1
+        return folder
+
+    def add_file(self, parent: FakeBoxFolder, name: str, size: int) -> FakeBoxFile:
+        existing = parent.children.get(name)
+        if isinstance(existing, FakeBoxFile):
+            existing.size = size
+            existing.version += 1
+            existing._bump_timestamps()
+            self.emit("ITEM_UPLOAD", existing)
+            return existing
+        item = FakeBoxFile(self, self._next_id(), name, size, parent)
+        self.files[item.id] = item
+        parent.children[name] = item
+        parent.version += 1
+        self.emit("ITEM_UPLOAD", item)
+        return item
+
+    def emit(self, event_type: str, source):
+        """Records a Box event about an item and wakes up long polls."""
+        with self.event_added:
+            self.event_log.append({"event_id": f"event-{len(self.event_log) + 1}", "event_type": event_type,
+                                   "source": source, "created_at": self.clock.isoformat()})
+            self.event_added.notify_all()
+
+    def events(self) -> FakeEvents:
+        return FakeEvents(self)
+
+    def folder(self, folder_id: str = "0") -> FakeBoxFolder:
+        return self.folders[folder_id]
+
+    def file(self, file_id: str) -> FakeBoxFile:
+        return self.files.get(file_id) or _MissingItem(self, file_id)
+
+    def user(self, user_id: str = "me"):
+        return _User()
+
+    def reset_counters(self):
+        """Clears the call and byte counters (e.g. between a full and an incremental sync)."""
+        self.calls.clear()
+        self.bytes_downloaded = 0
+
+    def touch_files(self, fraction: float, content_changed: bool = True, seed: int = 1) -> list[FakeBoxFile]:
+        """
+        Re-saves a random fraction of the files.
+
+        Args:
+            fraction (float): Fraction of the files to touch
+            content_changed (bool): Whether the bytes change, or only the timestamps (e.g. a re-save of identical bytes)
+            seed (int): Seed of the random selection
+
+        Returns:
+            list[FakeBoxFile]: The touched files
+        """
+        rng = random.Random(seed)
+        touched = rng.sample(sorted(self.files.values(), key=lambda f: f.id), int(len(self.files) * fraction))
+        for item in touched:
+            if content_changed:
+                item.version += 1
+            item._bump_timestamps()
+            self.emit("ITEM_UPLOAD", item)
+        return touched
+
+    def add_files(self, count: int, folder_id: str = "0", size: int = 64 * 1024) -> list[FakeBoxFile]:
+        """Adds `count` new files of `size` bytes to a folder."""
+        folder = self.folders[folder_id]
+        return [self.add_file(folder, f"New Document {len(self.files) + i:05d}.pdf", size) for i in range(count)]
+
+
+def generate_corpus(num_files: int, median_kb: float = 64.0, sigma: float = 1.0, max_mb: float = 20.0,
+                    subfolders: int = 0, folder_name: str = "Middle States", seed: int = 0) -> FakeBoxClient:
+    """
+    Builds a fake Box account whose watched folder holds `num_files` PDFs with log-normally distributed sizes.
+
+    Args:
+        num_files (int): Number of files in the corpus
+        median_kb (float): Median file size in KiB
+        sigma (float): Shape of the log-normal size distribution (0 gives equal sizes)
+        max_mb (float): Upper bound of a file size in MiB
+        subfolders (int): Number of subfolders to spread the files over (0 keeps every file at the top level)
+        folder_name (str): Name of the watched folder
+        seed (int): Seed of the size and placement generator
+
+    Returns:
+        FakeBoxClient: The fake account; the watched folder is `client.watched_folder`
+    """
+    rng = random.Random(seed)
+    box = FakeBoxClient()
+    watched = box.add_folder(box.root, folder_name)
+    folders = [watched] + [box.add_folder(watched, f"Working Group {i + 1}") for i in range(subfolders)]
+
+    max_bytes = int(max_mb * 1024 * 1024)
+    for i in range(num_files):
+        size = min(max_bytes, max(1, int(rng.lognormvariate(0, sigma) * median_kb * 1024)))
+        parent = folders[i % len(folders)]
+        box.add_file(parent, f"Document {i:05d}.pdf", size)
+
+    box.watched_folder = watched
+    box.reset_counters()
+    # The corpus already existed before the benchmark; only later changes are events
+    box.event_log.clear()
+    return box
+
@@ -0,0 +1,196 @@
+"""
+This module provides an in-process stub of the OpenAI file and vector store endpoints used during ingestion.
+
+It exposes the same call shapes as `openai.OpenAI` (`client.files`, `client.beta.vector_stores`,
+`client.beta.vector_stores.files`, `client.beta.vector_stores.file_batches` and `client.beta.assistants`)
+and records every call and every uploaded byte, so ingestion code can be benchmarked offline.
+
+Classes:
+- FakeOpenAIClient: A stand-in for `openai.OpenAI` covering the ingestion endpoints.
+
+Usage:
+- Pass `FakeOpenAIClient()` as the `client` of `OpenAIVectorStoreAPI`, or assign it to a setup script's `client`.
+- Read `calls` and `bytes_uploaded` after a sync to measure its API cost.
+"""
+
+import itertools
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+
+def _read(file) -> tuple[str, bytes]:
+    """Returns the (name, bytes) of any of the file argument shapes the SDK accepts."""
+    if isinstance(file, tuple):
+        name, payload = file[0], file[1]
+    else:
+        name, payload = getattr(file, "name", "upload"), file
+    if hasattr(payload, "read"):
+        payload = payload.read()
+    return name, payload
+
+
+class _Files:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def create(self, file, purpose="assistants", **kwargs):
+        self._fake.calls["files.create"] += 1
+        name, payload = _read(file)
+        self._fake.bytes_uploaded += len(payload)
+        file_id = f"file-{next(self._fake._ids):06d}"
+        record = SimpleNamespace(id=file_id, filename=name, bytes=len(payload), purpose=purpose,
+                                 created_at=int(time.time()), status="processed")
+        self._fake.uploaded[file_id] = record
+        return record
+
+    def retrieve(self, file_id, **kwargs):
+        self._fake.calls["files.retrieve"] += 1
+        return self._fake.uploaded[file_id]
+
+    def delete(self, file_id, **kwargs):
+        self._fake.calls["files.delete"] += 1
+        self._fake.uploaded.pop(file_id, None)
+        return SimpleNamespace(id=file_id, deleted=True)
+
+
+class _VectorStoreFiles:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def _attach(self, vector_store_id, file_id, chunking_strategy=None):
+        store = self._fake.vector_stores[vector_store_id]
+        entry = SimpleNamespace(id=file_id, vector_store_id=vector_store_id, status="completed",
+                                chunking_strategy=chunking_strategy, last_error=None)
+        store.files[file_id] = entry
+        return entry
+
+    def create(self, vector_store_id, file_id, chunking_strategy=None, **kwargs):
+        self._fake.calls["vector_stores.files.create"] += 1
+        return self._attach(vector_store_id, file_id, chunking_strategy)
+
+    def create_and_poll(self, file_id, vector_store_id, chunking_strategy=None, **kwargs):
+        return self.create(vector_store_id, file_id, chunking_strategy=chunking_strategy)
+
+    def upload(self, vector_store_id, file, chunking_strategy=None, **kwargs):
+        uploaded = self._fake.files.create(file=file, purpose="assistants")
+        return self.create(vector_store_id, uploaded.id, chunking_strategy=chunking_strategy)
+
+    def upload_and_poll(self, vector_store_id, file, chunking_strategy=None, **kwargs):
+        return self.upload(vector_store_id, file, chunking_strategy=chunking_strategy)
+
+    def retrieve(self, file_id, vector_store_id, **kwargs):
+        self._fake.calls["vector_stores.files.retrieve"] += 1
+        return self._fake.vector_stores[vector_store_id].files[file_id]
+
+    def list(self, vector_store_id, **kwargs):
+        self._fake.calls["vector_stores.files.list"] += 1
+        return list(self._fake.vector_stores[vector_store_id].files.values())
+
+    def delete(self, file_id, vector_store_id, **kwargs):
+        self._fake.calls["vector_stores.files.delete"] += 1
+        self._fake.vector_stores[vector_store_id].files.pop(file_id, None)
+        return SimpleNamespace(id=file_id, deleted=True)
+
+
+class _FileBatches:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def create_and_poll(self, vector_store_id, file_ids, chunking_strategy=None, **kwargs):
+        self._fake.calls["vector_stores.file_batches.create"] += 1
+        for file_id in file_ids:
+            self._fake.vector_stores_api.files._attach(vector_store_id, file_id, chunking_strategy)
+        return SimpleNamespace(id=f"vsfb-{next(self._fake._ids):06d}", status="completed",
+                               file_counts=SimpleNamespace(completed=len(file_ids), failed=0, in_progress=0,
+                                                           cancelled=0, total=len(file_ids)))
+
+    def upload_and_poll(self, vector_store_id, files, file_ids=(), chunking_strategy=None, **kwargs):
+        uploaded = [self._fake.files.create(file=file, purpose="assistants").id for file in files]
+        return self.create_and_poll(vector_store_id, list(file_ids) + uploaded, chunking_strategy=chunking_strategy)
+
+
+class _VectorStores:
+    def __init__(self, fake):
+        self._fake = fake
+        self.files = _VectorStoreFiles(fake)
+        self.file_batches = _FileBatches(fake)
+
+    def create(self, name=None, file_ids=None, chunking_strategy=None, **kwargs):
+        self._fake.calls["vector_stores.create"] += 1
+        store_id = f"vs_{next(self._fake._ids):06d}"
+        store = SimpleNamespace(id=store_id, name=name, files={}, status="completed", created_at=int(time.time()),
+                                file_counts=SimpleNamespace(completed=0, failed=0, in_progress=0, total=0))
+        self._fake.vector_stores[store_id] = store
+        for file_id in file_ids or []:
+            self.files._attach(store_id, file_id, chunking_strategy)
+        return store
+
+    def retrieve(self, vector_store_id, **kwargs):
+        self._fake.calls["vector_stores.retrieve"] += 1
+        store = self._fake.vector_stores[vector_store_id]
+        store.file_counts.completed = store.file_counts.total = len(store.files)
+        return store
+
+    def delete(self, vector_store_id, **kwargs):
+        self._fake.calls["vector_stores.delete"] += 1
+        self._fake.vector_stores.pop(vector_store_id, None)
+        return SimpleNamespace(id=vector_store_id, deleted=True)
+
+
+class _Assistants:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def create(self, model, name=None, instructions=None, tools=None, tool_resources=None, **kwargs):
+        self._fake.calls["assistants.create"] += 1
+        assistant = SimpleNamespace(id=f"asst_{next(self._fake._ids):06d}", model=model, name=name,
+                                    instructions=instructions, tools=tools or [],
+                                    tool_resources=_tool_resources(tool_resources))
+        self._fake.assistants[assistant.id] = assistant
+        return assistant
+
+    def retrieve(self, assistant_id, **kwargs):
+        self._fake.calls["assistants.retrieve"] += 1
+        return self._fake.assistants[assistant_id]
+
+    def update(self, assistant_id, tool_resources=None, **kwargs):
+        self._fake.calls["assistants.update"] += 1
+        assistant = self._fake.assistants[assistant_id]
+        if tool_resources is not None:
+            assistant.tool_resources = _tool_resources(tool_resources)
+        return assistant
+
+
+def _tool_resources(tool_resources: dict | None):
+    ids = ((tool_resources or {}).get("file_search") or {}).get("vector_store_ids", [])
+    return SimpleNamespace(file_search=SimpleNamespace(vector_store_ids=list(ids)))
+
+
+class FakeOpenAIClient:
+    """
+    A stand-in for `openai.OpenAI` covering the file, vector store and assistant endpoints used during ingestion.
+
+    Attributes:
+        calls (collections.Counter): Number of API calls by endpoint (e.g. `files.create`)
+        bytes_uploaded (int): Total bytes sent through `files.create`
+        uploaded (dict): Uploaded file records by id
+        vector_stores (dict): Vector stores by id, each with a `files` dict
+        assistants (dict): Assistants by id
+    """
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self.calls = Counter()
+        self.bytes_uploaded = 0
+        self.uploaded = {}
+        self.vector_stores = {}
+        self.assistants = {}
+        self.files = _Files(self)
+        self.vector_stores_api = _VectorStores(self)
+        self.beta = SimpleNamespace(vector_stores=self.vector_stores_api, assistants=_Assistants(self))
+
+    def reset_counters(self):
+        """Clears the call and byte counters."""
+        self.calls.clear()
+        self.bytes_uploaded = 0
+
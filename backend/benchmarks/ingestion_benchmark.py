@@ -0,0 +1,212 @@
+"""
+This module benchmarks the Box-to-vector-store ingestion path offline.
+
+Every scenario runs in a fresh process against a generated fake Box corpus (`fake_box.py`) and an in-process stub
+of the OpenAI file and vector store endpoints (`fake_vector_store.py`), and reports API call counts, wall time,
+peak RSS and bytes moved. The scenarios are:
+
+- full: `BoxClient.detect_changes` with no records, then `OpenAIVectorStoreAPI.update_vector_store` of every file.
+- incremental: the same pair after a full sync, once a small fraction of the files were edited, re-saved or added.
+- setup: `get_pdf_file_streams` and `upload_files_in_batches` from `setup/create_store_and_assistant.py`.
+
+Functions:
+- run_scenario(scenario: str, num_files: int, ...) -> dict: Runs one scenario in the current process.
+- run_isolated(scenario: str, num_files: int, ...) -> dict: Runs one scenario in a fresh process so peak RSS is its own.
+
+Usage:
+- `python ingestion_benchmark.py --files 100 1000 10000 --out ingestion-$(git rev-parse --short HEAD).json`
+- Compare the `calls`, `bytes_moved` and `wall_s` fields of two reports to catch regressions in sync cost.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BENCHMARK_DIR, "../src"))
+sys.path.append(os.path.join(BENCHMARK_DIR, "../setup"))
+
+SCENARIOS = ("full", "incremental", "setup")
+
+
+def _peak_rss_mb() -> float:
+    """Returns the peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _sync(box_client, vector_store, folder_id: str, records: dict):
+    changes = box_client.detect_changes(folder_id)
+    vector_store.update_vector_store(changes, folder_id, box_client, records)
+    return changes
+
+
+def _run_timed(scenario: str, box, openai_client, store_id: str, change_fraction: float, seed: int):
+    """Prepares and runs one scenario, returning the detected changes and the measured wall time."""
+    from box_client_api import BoxClient
+    from vector_store_api import OpenAIVectorStoreAPI
+
+    folder_id = box.watched_folder.id
+    num_files = len(box.files)
+    changes = []
+
+    if scenario in ("full", "incremental"):
+        box_client = BoxClient(config_path=None, client=box)
+        vector_store = OpenAIVectorStoreAPI("benchmark", store_id, client=openai_client)
+        records = {}
+        if scenario == "incremental":
+            _sync(box_client, vector_store, folder_id, records)
+            box.touch_files(change_fraction, content_changed=True, seed=seed + 1)
+            box.touch_files(change_fraction, content_changed=False, seed=seed + 2)
+            box.add_files(max(1, int(num_files * change_fraction)), folder_id=folder_id)
+            box.reset_counters()
+            openai_client.reset_counters()
+
+        start = time.perf_counter()
+        changes = _sync(box_client, vector_store, folder_id, records)
+        wall = time.perf_counter() - start
+    elif scenario == "setup":
+        import create_store_and_assistant as setup_script
+        setup_script.client = openai_client
+        setup_script.authorize_box = lambda: box
+
+        # The setup script prints a line per file; keep that console I/O out of the measurement
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            file_streams = setup_script.get_pdf_file_streams(folder_id=folder_id)
+            setup_script.upload_files_in_batches(file_streams)
+            wall = time.perf_counter() - start
+    else:
+        raise ValueError(f"Unknown scenario: {scenario}")
+    return changes, wall
+
+
+def run_scenario(scenario: str, num_files: int, median_kb: float = 64.0, sigma: float = 1.0,
+                 change_fraction: float = 0.01, subfolders: int = 0, seed: int = 0) -> dict:
+    """
+    Runs one scenario in the current process.
+
+    Args:
+        scenario (str): One of `full`, `incremental` or `setup`
+        num_files (int): Number of files in the generated corpus
+        median_kb (float): Median file size in KiB
+        sigma (float): Shape of the log-normal file size distribution
+        change_fraction (float): Fraction of files edited, re-saved without changes, and added before an incremental sync
+        subfolders (int): Number of subfolders the files are spread over
+        seed (int): Seed of the corpus generator
+
+    Returns:
+        dict: API call counts, wall time, peak RSS and bytes moved of the scenario
+    """
+    # Keep per-file INFO logging out of the measurement; the modules' own basicConfig calls become no-ops
+    logging.basicConfig(level=logging.WARNING)
+    os.environ.setdefault("API_KEY", "benchmark")
+
+    from fake_box import generate_corpus
+    from fake_vector_store import FakeOpenAIClient
+
+    box = generate_corpus(num_files, median_kb=median_kb, sigma=sigma, subfolders=subfolders, seed=seed)
+    openai_client = FakeOpenAIClient()
+    store_id = openai_client.beta.vector_stores.create(name="Benchmark Store").id
+    openai_client.reset_counters()
+
+    # The ingestion code writes its records files to the working directory
+    previous_cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp(prefix="ingestion-bench-"))
+    try:
+        changes, wall = _run_timed(scenario, box, openai_client, store_id, change_fraction, seed)
+    finally:
+        os.chdir(previous_cwd)
+
+    box_calls = {f"box.{name}": count for name, count in box.calls.items()}
+    openai_calls = {f"openai.{name}": count for name, count in openai_client.calls.items()}
+    return {
+        "scenario": scenario,
+        "files": num_files,
+        "changes": len(changes),
+        "wall_s": round(wall, 4),
+        "peak_rss_mb": _peak_rss_mb(),
+        "calls": {**box_calls, **openai_calls},
+        "total_calls": sum(box_calls.values()) + sum(openai_calls.values()),
+        "bytes_moved": {"box_download": box.bytes_downloaded, "openai_upload": openai_client.bytes_uploaded},
+    }
+
+
+def _child(queue, args, kwargs):
+    queue.put(run_scenario(*args, **kwargs))
+
+
+def run_isolated(scenario: str, num_files: int, **kwargs) -> dict:
+    """
+    Runs one scenario in a fresh process so that its peak RSS is not inflated by earlier scenarios.
+
+    Args:
+        scenario (str): One of `full`, `incremental` or `setup`
+        num_files (int): Number of files in the generated corpus
+        **kwargs: Forwarded to `run_scenario`
+
+    Returns:
+        dict: The scenario result
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_child, args=(queue, (scenario, num_files), kwargs))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=BENCHMARK_DIR).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Box-to-vector-store ingestion offline.")
+    parser.add_argument("--files", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--median-kb", type=float, default=64.0)
+    parser.add_argument("--sigma", type=float, default=1.0)
+    parser.add_argument("--change-fraction", type=float, default=0.01)
+    parser.add_argument("--subfolders", type=int, default=0)
+    parser.add_argument("--out", default="ingestion_benchmark_results.json")
+    args = parser.parse_args()
+
+    results = []
+    for num_files in args.files:
+        for scenario in args.scenarios:
+            result = run_isolated(scenario, num_files, median_kb=args.median_kb, sigma=args.sigma,
+                                  change_fraction=args.change_fraction, subfolders=args.subfolders)
+            moved_mb = sum(result["bytes_moved"].values()) / (1024 * 1024)
+            print(f"{scenario:<12} {num_files:>6} files  {result['wall_s']:>8.3f} s  {result['total_calls']:>7} calls  "
+                  f"{moved_mb:>9.1f} MiB moved  peak RSS {result['peak_rss_mb']:>7.1f} MiB")
+            results.append(result)
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "median_kb": args.median_kb,
+        "sigma": args.sigma,
+        "change_fraction": args.change_fraction,
+        "subfolders": args.subfolders,
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Report written to {args.out}")
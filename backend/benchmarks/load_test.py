@@ -0,0 +1,213 @@
+"""
+This module is an async load generator for the backend API.
+
+For each concurrency level it runs a fixed number of virtual users. Every user repeatedly
+creates a thread, asks a question, uploads a small file and attaches it, until the
+requests-per-level budget is spent. The latency of every request is recorded per endpoint.
+A JSON report with p50/p95/p99 latency, throughput and error counts is written at the end, so that runs
+on different commits can be compared with `compare_reports`.
+
+Functions:
+- percentile(values: list[float], pct: float) -> float: Returns a linearly interpolated percentile.
+- run_level(base_url: str, concurrency: int, requests: int, ...) -> dict: Runs one concurrency level.
+- compare_reports(baseline: dict, candidate: dict) -> list[str]: Summarizes p95 and throughput changes between two reports.
+
+Usage:
+- Start `stub_openai_server.py`, start the backend with `OPENAI_BASE_URL=http://localhost:8081/v1`, then run
+  `python load_test.py --base-url http://localhost:8080 --concurrency 1 8 32 --requests 200 --out results.json`.
+- Compare two runs with `python load_test.py --compare baseline.json results.json`.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import time
+import uuid
+
+import httpx
+
+ENDPOINTS = ("/create-thread", "/ask-question", "/upload", "/attach-file")
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """
+    Returns the `pct` percentile of `values` using linear interpolation between closest ranks.
+
+    Args:
+        values (list[float]): The samples
+        pct (float): The percentile in [0, 100]
+
+    Returns:
+        float: The percentile, or 0.0 when there are no samples
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    """Builds the statistics of one endpoint (latencies in milliseconds)."""
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "requests_per_s": round((len(latencies) + errors) / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+async def _timed(client: httpx.AsyncClient, results: dict, endpoint: str, **kwargs) -> httpx.Response | None:
+    """Sends one POST request and records its latency (or an error) under `endpoint`."""
+    start = time.perf_counter()
+    try:
+        response = await client.post(endpoint, **kwargs)
+        response.raise_for_status()
+    except httpx.HTTPError:
+        results[endpoint]["errors"] += 1
+        return None
+    results[endpoint]["latencies"].append(time.perf_counter() - start)
+    return response
+
+
+async def _virtual_user(client: httpx.AsyncClient, results: dict, budget: list[int], question: str, upload_bytes: bytes):
+    """Runs create-thread, ask-question, upload and attach-file in a loop while the shared budget lasts."""
+    user_id = f"loadtest-{uuid.uuid4().hex[:8]}@example.edu"
+    while budget[0] > 0:
+        budget[0] -= 1
+        response = await _timed(client, results, "/create-thread", json={"user_id": user_id})
+        if response is None:
+            continue
+        thread_id = response.json()["thread_id"]
+
+        await _timed(client, results, "/ask-question",
+                     json={"thread_id": thread_id, "question": question, "user_id": user_id})
+
+        response = await _timed(client, results, "/upload",
+                                files={"file": ("notes.txt", upload_bytes, "text/plain")},
+                                data={"user_id": user_id})
+        if response is None:
+            continue
+        await _timed(client, results, "/attach-file",
+                     json={"thread_id": thread_id, "file_id": response.json()["file_id"], "user_id": user_id})
+
+
+async def run_level(base_url: str, concurrency: int, requests: int, question: str, upload_size: int,
+                    timeout: float = 120.0, transport: httpx.AsyncBaseTransport | None = None) -> dict:
+    """
+    Runs one concurrency level.
+
+    Args:
+        base_url (str): The backend base URL
+        concurrency (int): Number of virtual users running in parallel
+        requests (int): Number of user iterations (each touches all four endpoints) for this level
+        question (str): The question every user asks
+        upload_size (int): Size in bytes of the uploaded file
+        timeout (float): Per-request timeout in seconds
+        transport (httpx.AsyncBaseTransport | None): Optional transport, e.g. an ASGI transport in tests
+
+    Returns:
+        dict: Per-endpoint statistics and the overall throughput of the level
+    """
+    results = {endpoint: {"latencies": [], "errors": 0} for endpoint in ENDPOINTS}
+    budget = [requests]
+    upload_bytes = b"x" * upload_size
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits, transport=transport) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(_virtual_user(client, results, budget, question, upload_bytes)
+                               for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    endpoints = {endpoint: summarize(r["latencies"], r["errors"], elapsed) for endpoint, r in results.items()}
+    total = sum(stats["requests"] for stats in endpoints.values())
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(total / elapsed, 2) if elapsed else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(baseline: dict, candidate: dict) -> list[str]:
+    """
+    Summarizes p95 latency and throughput changes between two reports.
+
+    Args:
+        baseline (dict): The report of the reference commit
+        candidate (dict): The report of the commit under test
+
+    Returns:
+        list[str]: One line per concurrency level and endpoint
+    """
+    lines = []
+    baseline_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in candidate["levels"]:
+        reference = baseline_levels.get(level["concurrency"])
+        if reference is None:
+            continue
+        for endpoint, stats in level["endpoints"].items():
+            before = reference["endpoints"].get(endpoint)
+            if not before or not before["p95_ms"]:
+                continue
+            change = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+            lines.append(f"c={level['concurrency']:<4} {endpoint:<15} p95 {before['p95_ms']:>9.1f} -> "
+                         f"{stats['p95_ms']:>9.1f} ms ({change:+.1f}%)  "
+                         f"rps {before['requests_per_s']:.1f} -> {stats['requests_per_s']:.1f}")
+    return lines
+
+
+async def main(args):
+    levels = []
+    for concurrency in args.concurrency:
+        print(f"Running concurrency level {concurrency}...")
+        level = await run_level(args.base_url, concurrency, args.requests, args.question, args.upload_size)
+        for endpoint, stats in level["endpoints"].items():
+            print(f"  {endpoint:<15} p50 {stats['p50_ms']:>8.1f} ms  p95 {stats['p95_ms']:>8.1f} ms  "
+                  f"p99 {stats['p99_ms']:>8.1f} ms  errors {stats['errors']}")
+        print(f"  overall {level['requests_per_s']} requests/s")
+        levels.append(level)
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "base_url": args.base_url,
+        "requests_per_level": args.requests,
+        "levels": levels,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Report written to {args.out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the chatbot backend.")
+    parser.add_argument("--base-url", default="http://localhost:8080")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=100, help="User iterations per concurrency level")
+    parser.add_argument("--question", default="What are the evidence expectations for Working Group 3?")
+    parser.add_argument("--upload-size", type=int, default=16 * 1024)
+    parser.add_argument("--out", default="load_test_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"))
+    cli_args = parser.parse_args()
+
+    if cli_args.compare:
+        with open(cli_args.compare[0]) as baseline_file, open(cli_args.compare[1]) as candidate_file:
+            print("\n".join(compare_reports(json.load(baseline_file), json.load(candidate_file))))
+    else:
+        asyncio.run(main(cli_args))
@@ -0,0 +1,160 @@
+"""
+This module measures the cold start of the backend against the local OpenAI stub.
+
+Each repetition starts a fresh `uvicorn main:app` process and records how long it takes until the server
+answers at all, until `/ready` reports ready, and until the first `/ask-question` succeeds, along with the
+latency of that first question. Running it with and without `STARTUP_WARMUP` shows what the warm-up moves
+out of the first user request.
+
+Functions:
+- measure_startup(stub_url: str, warmup: bool, ...) -> dict: Starts the backend once and times it until its first successful question.
+
+Usage:
+- `python startup_benchmark.py --repetitions 5 --out startup-$(git rev-parse --short HEAD).json`
+- The stub is started on `--stub-port` unless `--stub-url` points at a running one.
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.abspath(os.path.join(BENCHMARK_DIR, "../src"))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url: str, deadline: float, expect_ok: bool = False) -> float:
+    """Polls `url` until it answers (with a 2xx if `expect_ok`) and returns the time it did."""
+    while time.perf_counter() < deadline:
+        try:
+            response = httpx.get(url, timeout=1.0)
+            if not expect_ok or response.is_success:
+                return time.perf_counter()
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} did not answer in time")
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=BENCHMARK_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure_startup(stub_url: str, warmup: bool = True, question: str = "What is WG3?",
+                    thread_pool_size: int = 5, timeout: float = 60.0) -> dict:
+    """
+    Starts the backend in a fresh process and times it until its first successful question.
+
+    Args:
+        stub_url (str): The base URL of the OpenAI stub, e.g. `http://127.0.0.1:8081/v1`
+        warmup (bool): Whether the backend runs its startup warm-up
+        question (str): The first question to ask
+        thread_pool_size (int): The warm thread pool size of the backend
+        timeout (float): Seconds to wait for each milestone
+
+    Returns:
+        dict: Seconds from process start to listening, ready and first success, the first question's latency
+        and the startup timings the backend reports itself
+    """
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(
+        os.environ, OPENAI_BASE_URL=stub_url, API_KEY="stub", ASSISTANT_ID_4O="asst_4o",
+        ASSISTANT_ID_4O_MINI="asst_4o_mini", STARTUP_WARMUP="true" if warmup else "false",
+        THREAD_POOL_SIZE=str(thread_pool_size),
+    )
+    with tempfile.TemporaryDirectory() as workdir:
+        # Run from a scratch directory so the server's log files do not land in the repository
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", SRC_DIR, "--port", str(port),
+             "--log-level", "warning"],
+            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            deadline = started + timeout
+            listening = _wait_for(f"{base_url}/ready", deadline)
+            ready = _wait_for(f"{base_url}/ready", deadline, expect_ok=True)
+            startup = httpx.get(f"{base_url}/ready").json()
+
+            asked = time.perf_counter()
+            response = httpx.post(f"{base_url}/ask-question", json={"question": question, "user_id": "bench"},
+                                  timeout=timeout)
+            answered = time.perf_counter()
+            response.raise_for_status()
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    return {
+        "warmup": warmup,
+        "listening_s": round(listening - started, 4),
+        "ready_s": round(ready - started, 4),
+        "first_success_s": round(answered - started, 4),
+        "first_question_ms": round((answered - asked) * 1000, 1),
+        "reported": startup,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the backend's cold start against the OpenAI stub.")
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--stub-url", help="Base URL of a running stub (started on --stub-port otherwise)")
+    parser.add_argument("--stub-port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--run-ms", type=float, default=500.0)
+    parser.add_argument("--out", default="startup_benchmark_results.json")
+    args = parser.parse_args()
+
+    stub = None
+    stub_url = args.stub_url
+    if stub_url is None:
+        stub = subprocess.Popen(
+            [sys.executable, os.path.join(BENCHMARK_DIR, "stub_openai_server.py"), "--port", str(args.stub_port),
+             "--latency-ms", str(args.latency_ms), "--run-ms", str(args.run_ms)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        stub_url = f"http://127.0.0.1:{args.stub_port}/v1"
+        _wait_for(f"http://127.0.0.1:{args.stub_port}/v1/files/none", time.perf_counter() + 30)
+
+    results = []
+    try:
+        for warmup in (False, True):
+            for _ in range(args.repetitions):
+                result = measure_startup(stub_url, warmup=warmup)
+                print(f"warmup={str(warmup):<5}  listening {result['listening_s']:>6.3f} s  ready {result['ready_s']:>6.3f} s  "
+                      f"first success {result['first_success_s']:>6.3f} s  first question {result['first_question_ms']:>7.1f} ms")
+                results.append(result)
+    finally:
+        if stub is not None:
+            stub.terminate()
+            stub.wait(timeout=10)
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "stub_latency_ms": args.latency_ms,
+        "stub_run_ms": args.run_ms,
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Report written to {args.out}")
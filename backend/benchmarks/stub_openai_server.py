@@ -0,0 +1,431 @@
+"""
+This module provides a local stub of the OpenAI Assistants API for benchmarks and offline tests.
+
+It implements the subset of endpoints the backend uses (assistants, threads, messages, runs, run streaming, files, thread vector store files and embeddings)
+with in-memory state. Latency, run duration, streaming speed and the rate of 429 responses are configurable,
+so the backend can be load tested without spending tokens or hitting OpenAI's rate limits.
+
+Classes:
+- StubConfig: Latency and failure settings of the stub.
+
+Functions:
+- create_app(config: StubConfig) -> FastAPI: Builds the stub application.
+- serve_in_background(app: FastAPI) -> Iterator[str]: Serves an application on a free local port and yields its base URL.
+
+Usage:
+- Run `python stub_openai_server.py --port 8081 --latency-ms 40 --run-ms 1500 --rate-429 0.02`
+  and start the backend with `OPENAI_BASE_URL=http://localhost:8081/v1`.
+- In tests, pass `TestClient(create_app(config))` as the `http_client` of an `OpenAI` client. `TestClient` returns
+  a streamed run only once it has ended; to see a run while it is in flight (e.g. to cancel it), point the client
+  at `serve_in_background(create_app(config))` instead.
+"""
+
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CITATION_MARKER = "【4:0†source】"
+EMBEDDING_DIMENSIONS = 64
+
+
+def embed_text(text: str) -> list[float]:
+    """Returns a deterministic bag-of-words embedding, so texts sharing words are similar."""
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    for word in re.findall(r"\w+", text.lower()):
+        vector[zlib.crc32(word.encode()) % EMBEDDING_DIMENSIONS] += 1.0
+    return vector
+
+
+@dataclass
+class StubConfig:
+    """
+    Latency and failure settings of the stub.
+
+    Attributes:
+        latency_ms (float): Base latency added to every request
+        jitter_ms (float): Maximum uniform random latency added on top of `latency_ms`
+        run_ms (float): How long a run stays in progress before completing
+        assistant_run_ms (dict[str, float]): `run_ms` of the runs of particular assistants, e.g. to stall one
+        stream_chunks (int): Number of `thread.message.delta` events per streamed answer
+        rate_429 (float): Probability (0-1) that a request is rejected with HTTP 429
+        rate_limited_runs (int): How many streamed runs fail with `rate_limit_exceeded` once created, messages added
+        index_ms (float): How long a file attached to a thread stays `in_progress` in the thread's vector store
+        answer (str): The answer text the assistant produces
+        cited_filename (str): Filename of the file cited by every answer
+    """
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    run_ms: float = 0.0
+    assistant_run_ms: dict = field(default_factory=dict)
+    stream_chunks: int = 8
+    rate_429: float = 0.0
+    rate_limited_runs: int = 0
+    index_ms: float = 0.0
+    answer: str = "The Working Group 3 evidence expectations are listed in the self-study design."
+    cited_filename: str = "01 - Working Group 3 Evidence Expectations.pdf"
+
+
+def create_app(config: StubConfig | None = None) -> FastAPI:
+    """
+    Builds the stub application with its own in-memory state.
+
+    Args:
+        config (StubConfig | None): Latency and failure settings (defaults to no added latency)
+
+    Returns:
+        FastAPI: The stub application, serving the API under `/v1`
+    """
+    config = config or StubConfig()
+    app = FastAPI()
+    ids = itertools.count(1)
+    state = {"threads": {}, "messages": {}, "runs": {}, "files": {}, "vector_store_files": {}, "rate_limited_runs": 0}
+    app.state.stub = state
+    app.state.config = config
+    app.state.request_counts = {}
+
+    def new_id(prefix: str) -> str:
+        return f"{prefix}_{next(ids):08d}"
+
+    def text_content(value: str, annotations: list | None = None) -> list:
+        return [{"type": "text", "text": {"value": value, "annotations": annotations or []}}]
+
+    def make_message(thread_id: str, role: str, content, run_id=None, attachments=None) -> dict:
+        if isinstance(content, str):
+            content = text_content(content)
+        message = {
+            "id": new_id("msg"), "object": "thread.message", "created_at": int(time.time()),
+            "thread_id": thread_id, "role": role, "content": content, "run_id": run_id,
+            "assistant_id": None, "attachments": attachments or [], "metadata": {},
+            "status": "completed",
+        }
+        state["messages"][thread_id].append(message)
+        for attachment in attachments or []:
+            if any(tool.get("type") == "file_search" for tool in attachment.get("tools", [])):
+                index_file(thread_id, attachment["file_id"])
+        return message
+
+    def index_file(thread_id: str, file_id: str):
+        # Attaching a file for file search creates the thread's vector store on first use
+        file_search = state["threads"][thread_id]["tool_resources"].setdefault("file_search", {"vector_store_ids": []})
+        if not file_search["vector_store_ids"]:
+            file_search["vector_store_ids"].append(new_id("vs"))
+        vector_store_id = file_search["vector_store_ids"][0]
+        state["vector_store_files"][(vector_store_id, file_id)] = {
+            "id": file_id, "object": "vector_store.file", "created_at": int(time.time()),
+            "vector_store_id": vector_store_id, "status": "in_progress", "usage_bytes": 0, "last_error": None,
+            "_completes_at": time.time() + config.index_ms / 1000,
+        }
+
+    def refresh_vector_store_file(record: dict) -> dict:
+        if record["status"] == "in_progress" and time.time() >= record["_completes_at"]:
+            record["status"] = "completed"
+        return {key: value for key, value in record.items() if not key.startswith("_")}
+
+    def answer_message(run: dict) -> dict:
+        cited_file = state["files"].setdefault("file-stub-citation", {
+            "id": "file-stub-citation", "object": "file", "bytes": 1024, "created_at": int(time.time()),
+            "filename": config.cited_filename, "purpose": "assistants", "status": "processed",
+        })
+        value = config.answer + CITATION_MARKER
+        annotation = {
+            "type": "file_citation", "text": CITATION_MARKER, "start_index": len(config.answer),
+            "end_index": len(value), "file_citation": {"file_id": cited_file["id"]},
+        }
+        message = make_message(run["thread_id"], "assistant", text_content(value, [annotation]), run_id=run["id"])
+        message["assistant_id"] = run["assistant_id"]
+        return message
+
+    def usage_for(thread_id: str) -> dict:
+        prompt_tokens = 50 + 20 * len(state["messages"][thread_id])
+        completion_tokens = max(1, len(config.answer) // 4)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def refresh_run(run: dict) -> dict:
+        if run["status"] in ("queued", "in_progress") and time.time() >= run["_completes_at"]:
+            answer_message(run)
+            run["status"] = "completed"
+            run["completed_at"] = int(time.time())
+            run["usage"] = usage_for(run["thread_id"])
+        return {key: value for key, value in run.items() if not key.startswith("_")}
+
+    def get_thread(thread_id: str) -> dict:
+        if thread_id not in state["threads"]:
+            raise HTTPException(status_code=404, detail=f"No thread found with id '{thread_id}'.")
+        return state["threads"][thread_id]
+
+    def create_thread_record(messages: list | None = None, tool_resources: dict | None = None) -> dict:
+        thread = {"id": new_id("thread"), "object": "thread", "created_at": int(time.time()),
+                  "metadata": {}, "tool_resources": tool_resources or {}}
+        state["threads"][thread["id"]] = thread
+        state["messages"][thread["id"]] = []
+        for message in messages or []:
+            make_message(thread["id"], message.get("role", "user"), message["content"],
+                         attachments=message.get("attachments"))
+        return thread
+
+    def create_run_record(thread_id: str, body: dict) -> dict:
+        for message in body.get("additional_messages") or []:
+            make_message(thread_id, message.get("role", "user"), message["content"],
+                         attachments=message.get("attachments"))
+        run = {
+            "id": new_id("run"), "object": "thread.run", "created_at": int(time.time()),
+            "thread_id": thread_id, "assistant_id": body["assistant_id"], "status": "queued",
+            "model": body.get("model") or "gpt-4o", "instructions": "", "tools": [],
+            "usage": None, "truncation_strategy": body.get("truncation_strategy") or {"type": "auto"},
+            "metadata": {}, "parallel_tool_calls": True,
+            "_run_ms": config.assistant_run_ms.get(body["assistant_id"], config.run_ms),
+        }
+        run["_completes_at"] = time.time() + run["_run_ms"] / 1000
+        state["runs"][run["id"]] = run
+        return run
+
+    async def stream_run(run: dict, thread: dict | None = None):
+        def event(name: str, data: dict) -> str:
+            return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+        if thread is not None:
+            yield event("thread.created", thread)
+        # A streamed run completes when its last delta has been sent, not on the polling clock
+        run["_completes_at"] = float("inf")
+        public = refresh_run(run)
+        yield event("thread.run.created", public)
+        run["status"] = "in_progress"
+        yield event("thread.run.in_progress", refresh_run(run))
+        if state["rate_limited_runs"] < config.rate_limited_runs:
+            # OpenAI fails a run that runs into the token rate limit after it was created
+            state["rate_limited_runs"] += 1
+            run.update(status="failed", failed_at=int(time.time()), last_error={
+                "code": "rate_limit_exceeded", "message": "Rate limit reached for gpt-4o (stub)."})
+            yield event("thread.run.failed", refresh_run(run))
+            yield "event: done\ndata: [DONE]\n\n"
+            return
+
+        chunk_delay = run["_run_ms"] / 1000 / max(config.stream_chunks, 1)
+        step = max(1, len(config.answer) // max(config.stream_chunks, 1))
+        message_id = new_id("msg")
+        for start in range(0, len(config.answer), step):
+            await asyncio.sleep(chunk_delay)
+            if run["status"] == "cancelled":
+                yield event("thread.run.cancelled", refresh_run(run))
+                yield "event: done\ndata: [DONE]\n\n"
+                return
+            delta = {"id": message_id, "object": "thread.message.delta",
+                     "delta": {"content": [{"index": 0, "type": "text",
+                                            "text": {"value": config.answer[start:start + step]}}]}}
+            yield event("thread.message.delta", delta)
+
+        run["_completes_at"] = 0
+        completed = refresh_run(run)
+        message = state["messages"][run["thread_id"]][-1]
+        yield event("thread.message.completed", message)
+        yield event("thread.run.completed", completed)
+        yield "event: done\ndata: [DONE]\n\n"
+
+    @app.middleware("http")
+    async def simulate_network(request: Request, call_next):
+        key = f"{request.method} {request.url.path}"
+        app.state.request_counts[key] = app.state.request_counts.get(key, 0) + 1
+        delay = config.latency_ms + random.uniform(0, config.jitter_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if config.rate_429 and random.random() < config.rate_429:
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after-ms": "50"},
+                content={"error": {"message": "Rate limit reached (stub).", "type": "requests",
+                                   "code": "rate_limit_exceeded", "param": None}},
+            )
+        return await call_next(request)
+
+    @app.post("/v1/threads")
+    async def create_thread(request: Request):
+        body = await request.json() if await request.body() else {}
+        return create_thread_record(body.get("messages"), body.get("tool_resources"))
+
+    @app.get("/v1/threads/{thread_id}")
+    async def retrieve_thread(thread_id: str):
+        return get_thread(thread_id)
+
+    @app.get("/v1/vector_stores/{vector_store_id}/files/{file_id}")
+    async def retrieve_vector_store_file(vector_store_id: str, file_id: str):
+        record = state["vector_store_files"].get((vector_store_id, file_id))
+        if record is None:
+            raise HTTPException(status_code=404, detail=f"No file found with id '{file_id}' in vector store.")
+        return refresh_vector_store_file(record)
+
+    @app.delete("/v1/threads/{thread_id}")
+    async def delete_thread(thread_id: str):
+        get_thread(thread_id)
+        state["threads"].pop(thread_id)
+        state["messages"].pop(thread_id, None)
+        return {"id": thread_id, "object": "thread.deleted", "deleted": True}
+
+    def reject_if_active(thread_id: str):
+        active = [r for r in state["runs"].values()
+                  if r["thread_id"] == thread_id and refresh_run(r)["status"] in ("queued", "in_progress")]
+        if active:
+            raise HTTPException(status_code=400,
+                                detail=f"Thread {thread_id} already has an active run {active[0]['id']}.")
+
+    @app.post("/v1/threads/{thread_id}/messages")
+    async def create_message(thread_id: str, request: Request):
+        get_thread(thread_id)
+        reject_if_active(thread_id)
+        body = await request.json()
+        return make_message(thread_id, body.get("role", "user"), body["content"], attachments=body.get("attachments"))
+
+    @app.get("/v1/threads/{thread_id}/messages")
+    async def list_messages(thread_id: str, run_id: str | None = None, order: str = "desc",
+                            limit: int = 20, after: str | None = None):
+        get_thread(thread_id)
+        messages = [m for m in state["messages"][thread_id] if run_id is None or m["run_id"] == run_id]
+        if order == "desc":
+            messages = list(reversed(messages))
+        if after:
+            position = next((i for i, m in enumerate(messages) if m["id"] == after), -1)
+            messages = messages[position + 1:]
+        page = messages[:limit]
+        return {"object": "list", "data": page, "first_id": page[0]["id"] if page else None,
+                "last_id": page[-1]["id"] if page else None, "has_more": len(messages) > limit}
+
+    @app.delete("/v1/threads/{thread_id}/messages/{message_id}")
+    async def delete_message(thread_id: str, message_id: str):
+        get_thread(thread_id)
+        reject_if_active(thread_id)
+        messages = state["messages"][thread_id]
+        if not any(m["id"] == message_id for m in messages):
+            raise HTTPException(status_code=404, detail=f"No message found with id '{message_id}'.")
+        state["messages"][thread_id] = [m for m in messages if m["id"] != message_id]
+        return {"id": message_id, "object": "thread.message.deleted", "deleted": True}
+
+    @app.post("/v1/threads/{thread_id}/runs")
+    async def create_run(thread_id: str, request: Request):
+        get_thread(thread_id)
+        reject_if_active(thread_id)
+        body = await request.json()
+        run = create_run_record(thread_id, body)
+        if body.get("stream"):
+            return StreamingResponse(stream_run(run), media_type="text/event-stream")
+        return refresh_run(run)
+
+    @app.post("/v1/threads/runs")
+    async def create_thread_and_run(request: Request):
+        body = await request.json()
+        thread = create_thread_record((body.get("thread") or {}).get("messages"))
+        run = create_run_record(thread["id"], body)
+        if body.get("stream"):
+            return StreamingResponse(stream_run(run, thread), media_type="text/event-stream")
+        return refresh_run(run)
+
+    @app.get("/v1/threads/{thread_id}/runs/{run_id}")
+    async def retrieve_run(thread_id: str, run_id: str):
+        if run_id not in state["runs"]:
+            raise HTTPException(status_code=404, detail=f"No run found with id '{run_id}'.")
+        run = state["runs"][run_id]
+        if run["status"] == "queued":
+            run["status"] = "in_progress"
+        return JSONResponse(refresh_run(run), headers={"openai-poll-after-ms": "25"})
+
+    @app.post("/v1/threads/{thread_id}/runs/{run_id}/cancel")
+    async def cancel_run(thread_id: str, run_id: str):
+        if run_id not in state["runs"]:
+            raise HTTPException(status_code=404, detail=f"No run found with id '{run_id}'.")
+        run = state["runs"][run_id]
+        if run["status"] in ("queued", "in_progress"):
+            run["status"] = "cancelled"
+        return refresh_run(run)
+
+    @app.post("/v1/files")
+    async def create_file(request: Request):
+        form = await request.form()
+        upload = form["file"]
+        content = await upload.read()
+        record = {"id": new_id("file"), "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                  "filename": upload.filename, "purpose": form.get("purpose", "assistants"), "status": "processed"}
+        state["files"][record["id"]] = record
+        return record
+
+    @app.get("/v1/assistants/{assistant_id}")
+    async def retrieve_assistant(assistant_id: str):
+        return {"id": assistant_id, "object": "assistant", "created_at": int(time.time()), "name": "Stub assistant",
+                "model": "gpt-4o", "instructions": "", "tools": [{"type": "file_search"}], "metadata": {},
+                "tool_resources": {"file_search": {"vector_store_ids": ["vs_stub"]}}}
+
+    @app.post("/v1/embeddings")
+    async def create_embeddings(request: Request):
+        body = await request.json()
+        texts = [body["input"]] if isinstance(body["input"], str) else body["input"]
+        embeddings = [embed_text(text) for text in texts]
+        if body.get("encoding_format") == "base64":
+            # What the SDK asks for by default: little-endian float32
+            embeddings = [base64.b64encode(struct.pack(f"<{len(e)}f", *e)).decode() for e in embeddings]
+        return {"object": "list", "model": body["model"],
+                "data": [{"object": "embedding", "index": i, "embedding": e} for i, e in enumerate(embeddings)],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+
+    @app.get("/v1/files/{file_id}")
+    async def retrieve_file(file_id: str):
+        if file_id not in state["files"]:
+            raise HTTPException(status_code=404, detail=f"No such File object: {file_id}")
+        return state["files"][file_id]
+
+    return app
+
+
+@contextmanager
+def serve_in_background(app: FastAPI) -> Iterator[str]:
+    """
+    Serves an application with uvicorn on a free local port in a background thread.
+
+    Args:
+        app (FastAPI): The application, usually `create_app(config)`
+
+    Returns:
+        Iterator[str]: The base URL of the OpenAI API, e.g. `http://127.0.0.1:54321/v1`; the server stops on exit
+    """
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/v1"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stub of the OpenAI Assistants API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--run-ms", type=float, default=1500.0)
+    parser.add_argument("--stream-chunks", type=int, default=8)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--index-ms", type=float, default=2000.0)
+    args = parser.parse_args()
+
+    stub_config = StubConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, run_ms=args.run_ms,
+        stream_chunks=args.stream_chunks, rate_429=args.rate_429, index_ms=args.index_ms,
+    )
+    uvicorn.run(create_app(stub_config), host=args.host, port=args.port, log_level="warning")
@@ -2,8 +2,12 @@ from openai import OpenAI
 from proof_authorize_Box import authorize_box
 import io
 import os
+import sys
 from dotenv import load_dotenv
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from chunking import load_policy
+
 # Load environment variables
 load_dotenv()
 api_key = os.getenv("API_KEY")
@@ -66,14 +70,18 @@ def create_assistants(models, instructions_path):
     return assistants
 
 
-def upload_files_in_batches(file_streams, batch_size=10):
+def upload_files_in_batches(file_streams, batch_size=10, policy=None):
     """
     Uploads the given file streams to a newly created OpenAI vector store in batches.
     Automatically polls each batch until it completes.
 
+    Files are grouped by the chunking strategy the policy gives them, since a batch applies one strategy
+    to all its files, and each group is uploaded in batches of its own.
+
     Parameters:
         file_streams (list of tuples): List of (filename, BytesIO) tuples to be uploaded.
         batch_size (int): Number of files to upload per batch. Default is 10.
+        policy (ChunkingPolicy): The chunking policy. Defaults to the file named by `CHUNKING_POLICY`, or the built-in rules.
 
     Returns:
         object: The created vector store object containing all uploaded files.
@@ -81,21 +89,23 @@ def upload_files_in_batches(file_streams, batch_size=10):
     Note:
         This function logs the number of completed and failed uploads but does not retry failed files.
     """
+    policy = policy if policy is not None else load_policy(os.getenv("CHUNKING_POLICY"))
     vector_store = client.beta.vector_stores.create(name="Middle States Files")
 
     num_completed = 0
     num_failed = 0
-    cur_index = 0
 
-    while cur_index < len(file_streams):
-        batch = file_streams[cur_index: cur_index + batch_size]
-        file_batch = client.beta.vector_stores.file_batches.upload_and_poll(
-            vector_store_id=vector_store.id,
-            files=batch
-        )
-        num_completed += file_batch.file_counts.completed
-        num_failed += file_batch.file_counts.failed
-        cur_index += batch_size
+    groups = policy.group((name, stream.getbuffer().nbytes, (name, stream)) for name, stream in file_streams)
+    for strategy, group in groups:
+        for cur_index in range(0, len(group), batch_size):
+            batch = group[cur_index: cur_index + batch_size]
+            file_batch = client.beta.vector_stores.file_batches.upload_and_poll(
+                vector_store_id=vector_store.id,
+                files=batch,
+                **({"chunking_strategy": strategy} if strategy else {}),
+            )
+            num_completed += file_batch.file_counts.completed
+            num_failed += file_batch.file_counts.failed
 
     print(f"Upload complete: {num_completed} completed, {num_failed} failed")
     return vector_store
@@ -3,8 +3,12 @@ from proof_authorize_Box import authorize_box
 import io
 from dotenv import load_dotenv
 import os
+import sys
 import json
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from chunking import load_policy
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -85,19 +89,20 @@ file_path = "file_setup_info.json"
 with open(file_path, "w") as file:
     json.dump(file_dict, file, indent=4)
 
-file_ids = [tup[0] for tup in file_dict.values()]
-
-# Use the upload and poll SDK helper to upload the files, add them to the vector store,
-# and poll the status of the file batch for completion.
-file_batch = client.beta.vector_stores.file_batches.upload_and_poll(
-  vector_store_id=vector_store.id,
-  file_ids=file_ids,
-  files=file_streams
-)
- 
-# You can print the status and the file counts of the batch to see the result of this operation.
-print(file_batch.status)
-print(file_batch.file_counts)
+# Add the files to the vector store in one batch per chunking strategy (a batch applies one strategy to all
+# its files) and poll each batch for completion. The files were already created above, so only their ids are passed.
+policy = load_policy(os.getenv("CHUNKING_POLICY"))
+sizes = {name: stream.getbuffer().nbytes for name, stream in file_streams}
+for strategy, file_ids in policy.group((name, sizes[name], ids[0]) for name, ids in file_dict.items()):
+  file_batch = client.beta.vector_stores.file_batches.create_and_poll(
+    vector_store_id=vector_store.id,
+    file_ids=file_ids,
+    **({"chunking_strategy": strategy} if strategy else {}),
+  )
+
+  # You can print the status and the file counts of the batch to see the result of this operation.
+  print(strategy or "auto", file_batch.status)
+  print(file_batch.file_counts)
 
 print(f'\nFiles in vector store: {vector_store.file_counts}')
 
@@ -2,12 +2,26 @@
 This module contains functions for interacting with the OpenAI API,
 including methods for generating responses and managing threads.
 
+Classes:
+- RunFailedError: A run that failed or ended without an answer, with OpenAI's error code (e.g. `rate_limit_exceeded`).
+
 Functions:
 - create_thread() -> str: Creates a new thread
--delete_thread() -> dict: Deletes the current thread
-- ask_question(question: str) -> tuple[str, list[str]]: Sends a question to the assistant and retrieves the response and cited files.
+- delete_thread(thread_id: str) -> dict: Deletes a thread
+- ask_question(thread_id: str | None, question: str) -> tuple[str, list[str], str]: Sends a question to the assistant in a single streamed run and retrieves the response, cited files and thread id, optionally passing on the answer as it streams.
 - upload_file(self, file: UploadFile) -> str: Creates an OpenAI file object and returns the ID.
 - attach_file_to_thread(self, thread_id: str, file_id: str) -> dict: Attaches a file object to a thread.
+- run_and_poll(self, thread_id: str, **run_options) -> Run: Runs the assistant on a thread and waits for the run to finish.
+- answer_again(self, thread_id: str) -> tuple[str, list[str], str]: Answers a thread's latest user message again with this assistant.
+- compact_thread(self, thread_id: str) -> str: Summarizes a long thread into a fresh thread and returns its ID.
+- list_messages(self, thread_id: str) -> list[dict]: Reads a whole thread as compact messages with resolved citations.
+- indexing_status(self, thread_id: str, file_id: str, vector_store_id: str | None) -> tuple[str, str | None, str | None]: Checks whether an attached file is indexed.
+- warm_up(self) -> None: Creates the OpenAI client and opens a pooled connection before the first request.
+- cache_version(self) -> str: Identifies the assistant and vector stores answers come from, for the semantic answer cache.
+- record_answer(self, thread_id: str | None, question: str, response: str, answer_only: bool) -> str: Writes a cached answer to a thread as if it had been asked.
+- answer_on_scratch_thread(self, messages: list[dict]) -> tuple[str, list[str], str]: Answers the last of some messages on a new thread holding them.
+- cancel_run(self, thread_id: str, run_id: str) -> Run: Cancels a run.
+- load_citation_names(path: str) -> dict[str, str]: Reads the file ID -> file name map written by the setup scripts.
 
 Usage:
 - Use `create_thread` to create a new thread.
@@ -17,13 +31,66 @@ Usage:
 - Use `attach_file_to_thread` to attach a file object to a thread
 """
 
+import json
 import logging
-from openai import OpenAI
+import threading
+from openai import OpenAI, NotFoundError
 from dotenv import load_dotenv
 import os
 from fastapi import HTTPException
 import tempfile
+import time
 from fastapi import UploadFile
+from metrics import track_stage, RUNS_IN_FLIGHT, RUN_POLLS, STAGE_LATENCY
+from tracing import traced
+from typing import Callable
+from thread_context import ThreadContextManager
+
+# Instructions of the run that condenses a long thread before it is replaced by a fresh one
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation so far for your own future reference. Keep every fact, number, file name "
+    "and open question the user may refer back to, and drop greetings and repetition. Do not search files."
+)
+
+def load_citation_names(path: str) -> dict[str, str]:
+    """
+    Reads the file ID -> file name map of the vector store files from the setup scripts' `file_setup_info.json`.
+
+    Args:
+        path (str): The path of `file_setup_info.json` (file name -> [file ID, modified at])
+
+    Returns:
+        dict[str, str]: The file name of each file ID
+    """
+    with open(path, "r") as f:
+        records = json.load(f)
+    names = {}
+    for file_name, record in records.items():
+        file_id = record.get("file_id") if isinstance(record, dict) else record[0]
+        if file_id:
+            names[file_id] = file_name
+    return names
+
+# Content of the user message that carries an attached file
+ATTACHMENT_MESSAGE = "Uploading a file for context."
+
+# Run states after which a run no longer changes
+TERMINAL_RUN_STATES = {"requires_action", "cancelled", "completed", "failed", "expired", "incomplete"}
+
+class RunFailedError(RuntimeError):
+    """
+    A run that failed or ended without an answer.
+
+    `code` is OpenAI's error code, if it gave one. `thread_id` is the thread the run was on, including a thread
+    created with the run, and `message_added` tells whether the run's messages were already added to it, so a
+    retry answers them again (`answer_again`) instead of asking them a second time.
+    """
+    def __init__(self, message: str, code: str | None = None, thread_id: str | None = None,
+                 message_added: bool = False):
+        super().__init__(message)
+        self.code = code
+        self.thread_id = thread_id
+        self.message_added = message_added
 
 class AssistantAPI:
     """
@@ -34,18 +101,35 @@ class AssistantAPI:
     Attributes:
         api_key (str): The OpenAI API key used for authentication
         assistant_id (str): The ID of the OpenAI assistant
-        client (openai.OpenAI): The OpenAI client
+        client (openai.OpenAI): The OpenAI client, created on first use
+        context (ThreadContextManager): Truncation, usage tracking and compaction settings shared between assistants
+        file_names (dict[str, str]): Cache of cited file ID -> file name, shared between assistants
     """
-    def __init__(self, api_key, assistant_id):
+    def __init__(self, api_key, assistant_id, context: ThreadContextManager = None,
+                 file_names: dict[str, str] | None = None, client: OpenAI | None = None):
         """
         Initializes access to the existing OpenAI assistant and configures the logging of the file.
 
+        The OpenAI client is not created until it is first used (or `warm_up` is called), so importing the
+        app does not pay for it.
+
         Args:
             api_key (str): The API key for OpenAI
             assistant_id (str): The ID of the assistant
+            context (ThreadContextManager): Context settings to apply to runs (defaults to OpenAI's automatic truncation)
+            file_names (dict[str, str] | None): Known file ID -> file name pairs used to name citations without a lookup
+            client (OpenAI | None): An OpenAI client to use instead of creating one
         """
+        self.api_key = api_key
         self.assistant_id = assistant_id
-        self.client = OpenAI(api_key=api_key)
+        self.context = context if context is not None else ThreadContextManager()
+        self.file_names = file_names if file_names is not None else {}
+        self._client = client
+        self._client_lock = threading.Lock()
+        self.vector_store_ids = None  # The assistant's file_search vector stores, read by `warm_up`
+        self.vector_stores_read_at = 0.0
+        # Seconds before `cache_version` reads the vector stores again, to notice a blue/green switch-over
+        self.vector_store_refresh = 300.0
 
         # Configure logging
         logging.basicConfig(
@@ -57,6 +141,90 @@ class AssistantAPI:
             ]
         )
 
+    @property
+    def client(self) -> OpenAI:
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = OpenAI(api_key=self.api_key)
+        return self._client
+
+    @client.setter
+    def client(self, client: OpenAI):
+        self._client = client
+
+    @traced("assistant.warm_up")
+    def warm_up(self):
+        """
+        Creates the OpenAI client and retrieves the assistant, which opens a pooled connection (DNS, TLS)
+        and checks the assistant ID before the first user request needs it.
+
+        Raises:
+            Exception: The assistant could not be retrieved
+        """
+        try:
+            with track_stage("assistant_retrieve"):
+                assistant = self.client.beta.assistants.retrieve(self.assistant_id)
+            file_search = assistant.tool_resources.file_search if assistant.tool_resources else None
+            self.vector_store_ids = sorted(file_search.vector_store_ids or []) if file_search else []
+            self.vector_stores_read_at = time.monotonic()
+            logging.info(f"Assistant {self.assistant_id} warmed up.")
+        except Exception as e:
+            logging.error(f"Failed to warm up assistant {self.assistant_id}: {e}")
+            raise
+
+    def cache_version(self) -> str:
+        """
+        Identifies what this assistant's answers are based on: its ID and the vector stores it searches.
+
+        Cached answers are only served for the same version, so rebuilding the vector store or pointing the
+        assistant at another one retires them. Retrieves the assistant if `warm_up` has not run yet, and again
+        every `vector_store_refresh` seconds so a switch-over made by another process is noticed.
+
+        Returns:
+            str: The version, e.g. `asst_123:vs_456`
+        """
+        if self.vector_store_ids is None or time.monotonic() - self.vector_stores_read_at >= self.vector_store_refresh:
+            self.warm_up()
+        return f"{self.assistant_id}:{','.join(self.vector_store_ids)}"
+
+    @traced("assistant.record_answer")
+    def record_answer(self, thread_id: str | None, question: str, response: str, answer_only: bool = False) -> str:
+        """
+        Adds a question and an answer served from the semantic cache (or by another assistant) to a thread,
+        without running the assistant, so later questions in the conversation see them.
+
+        Args:
+            thread_id (str | None): The thread, or None to create one holding the two messages
+            question (str): The user question
+            response (str): The cached answer
+            answer_only (bool): The question is already on the thread (added by a cancelled run); add only the answer
+
+        Returns:
+            str: The id of the thread
+
+        Raises:
+            Exception: The messages could not be added
+        """
+        messages = [{"role": "user", "content": question}, {"role": "assistant", "content": response}]
+        if answer_only and thread_id is not None:
+            messages = messages[1:]
+        try:
+            if thread_id is None:
+                with track_stage("threads_create"):
+                    thread_id = self.client.beta.threads.create(messages=messages).id
+            else:
+                thread_id = self.context.resolve(thread_id)
+                for message in messages:
+                    with track_stage("message_create"):
+                        self.client.beta.threads.messages.create(thread_id=thread_id, **message)
+            logging.info(f"Cached answer recorded on thread {thread_id}")
+            return thread_id
+        except Exception as e:
+            logging.error(f"Failed to record a cached answer: {e}")
+            raise
+
+    @traced("assistant.create_thread")
     def create_thread(self) -> str:
         """
         Creates the thread of the current conversation and returns its ID
@@ -69,7 +237,8 @@ class AssistantAPI:
 
         """
         try:
-            thread = self.client.beta.threads.create(messages=[])
+            with track_stage("threads_create"):
+                thread = self.client.beta.threads.create(messages=[])
             logging.info(f"Thread successfully created with ID: {thread.id}")
             return thread.id
         except Exception as e:
@@ -77,12 +246,13 @@ class AssistantAPI:
             raise
 
 
-    def delete_thread(thread_id:str) -> dict:
+    @traced("assistant.delete_thread")
+    def delete_thread(self, thread_id: str) -> dict:
         """
-        Deletes the current conversation thread.
+        Deletes a conversation thread.
         
         Args:
-        	thread_id (str): The id of the current thread
+        	thread_id (str): The id of the thread to delete
 
         Returns:
             dict: The response of the API call
@@ -92,8 +262,9 @@ class AssistantAPI:
         """
         try:
             if thread_id:
-                response = self.client.beta.threads.delete(thread_id)
-                logging.info("Thread successfully deleted.")
+                with track_stage("threads_delete"):
+                    response = self.client.beta.threads.delete(thread_id)
+                logging.info(f"Thread {thread_id} successfully deleted.")
                 return response
             else:
                 logging.warning("No active thread to delete.")
@@ -101,61 +272,400 @@ class AssistantAPI:
             logging.error(f"Failed to delete thread: {e}")
             raise
 
-    def ask_question(self, thread_id, question) -> tuple[str, list[str]]:
+    @traced("assistant.ask_question")
+    def ask_question(self, thread_id, question, on_run: Callable[[str, str], None] | None = None,
+                     on_delta: Callable[[str], None] | None = None) -> tuple[str, list[str], str]:
         """
         Prompts the assistant with the user question and returns the generated response and cited files
 
+        The question is sent as part of the run creation (or of `create_and_run` when there is no thread yet)
+        and the run is streamed, so the answer and usage are read from the run's events. This replaces the
+        separate `messages.create`, status polling and `messages.list` round trips with a single request.
+
         Args:
-        	thread_id (str): The id of the current thread
+        	thread_id (str | None): The id of the current thread, or None to start a new conversation
             question (str): The user prompt
+            on_run (Callable | None): Called with the thread and run IDs as soon as the run is created, e.g. to cancel it
+            on_delta (Callable | None): Called with each piece of the answer text as it streams, citation markers included
 
         Returns:
-            tuple[str, list[str]]: The generated response and cited files
+            tuple[str, list[str], str]: The generated response, cited files and the id of the thread it was asked on
 
         Raises:
-            ValueError: The thread doesn't exist
+            ValueError: The question is empty
             Exception: Failed to process the question
         """
         try:
-            if not thread_id:
-                raise ValueError("No thread exists. Create a thread first.")
+            if not question or not question.strip():
+                raise ValueError("The question cannot be empty.")
+            return self._answer(thread_id, [{"role": "user", "content": question}], on_run, on_delta)
+
+        except ValueError as e:
+            logging.error(f"Question error: {e}")
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logging.error(f"Failed to process question: {e}")
+            raise
+
+    @traced("assistant.answer_again")
+    def answer_again(self, thread_id: str) -> tuple[str, list[str], str]:
+        """
+        Runs this assistant again on a thread to answer its latest user message, without adding a new message.
+
+        Used to escalate a question another assistant answered poorly; once the new answer is in, the answers
+        given to the message before are deleted, so the thread keeps only the new one. If the run fails, the
+        thread keeps the earlier answers.
+
+        Args:
+            thread_id (str): The id of the thread
+
+        Returns:
+            tuple[str, list[str], str]: The generated response, cited files and the id of the thread
+
+        Raises:
+            Exception: Failed to answer the question
+        """
+        try:
+            with track_stage("messages_list"):
+                messages = self.client.beta.threads.messages.list(thread_id=thread_id, order="desc", limit=10).data
+            earlier_answers = []
+            for message in messages:
+                if message.role == "user":
+                    break
+                earlier_answers.append(message.id)
+            answer = self._answer(thread_id, [])
+            for message_id in earlier_answers:
+                with track_stage("messages_delete"):
+                    self.client.beta.threads.messages.delete(message_id=message_id, thread_id=thread_id)
+            return answer
+        except Exception as e:
+            logging.error(f"Failed to answer again on thread {thread_id}: {e}")
+            raise
+
+    @traced("assistant.answer_on_scratch_thread")
+    def answer_on_scratch_thread(self, messages: list[dict],
+                                 on_run: Callable[[str, str], None] | None = None) -> tuple[str, list[str], str]:
+        """
+        Answers the last of some messages on a new thread holding them, e.g. to ask a question with a copy of
+        its conversation without touching the user's thread.
+
+        Args:
+            messages (list[dict]): `{"role", "content"}` messages, oldest first, ending with the question
+            on_run (Callable | None): Called with the thread and run IDs as soon as the run is created
+
+        Returns:
+            tuple[str, list[str], str]: The generated response, cited files and the id of the new thread
+
+        Raises:
+            Exception: Failed to answer the question
+        """
+        try:
+            return self._answer(None, messages, on_run)
+        except Exception as e:
+            logging.error(f"Failed to answer on a scratch thread: {e}")
+            raise
+
+    @traced("assistant.cancel_run")
+    def cancel_run(self, thread_id: str, run_id: str):
+        """
+        Cancels a run; it stops producing tokens and its stream ends with `thread.run.cancelled`.
+
+        Args:
+            thread_id (str): The thread of the run
+            run_id (str): The run
+
+        Returns:
+            Run: The run, usually in the `cancelling` state
 
-            # Add message to thread
-            self.client.beta.threads.messages.create(
-                thread_id=thread_id,
-                role="user",
-                content=question,
+        Raises:
+            Exception: The run could not be cancelled (e.g. it already finished)
+        """
+        try:
+            with track_stage("run_cancel"):
+                run = self.client.beta.threads.runs.cancel(run_id=run_id, thread_id=thread_id)
+            logging.info(f"Run {run_id} on thread {thread_id} cancelled")
+            return run
+        except Exception as e:
+            logging.error(f"Failed to cancel run {run_id}: {e}")
+            raise
+
+    def _answer(self, thread_id: str | None, additional_messages: list[dict],
+                on_run: Callable[[str, str], None] | None = None,
+                on_delta: Callable[[str], None] | None = None) -> tuple[str, list[str], str]:
+        """
+        Streams one run, creating the thread with it when there is none yet, and extracts the answer.
+
+        Args:
+            thread_id (str | None): The thread to run on, or None to create one
+            additional_messages (list[dict]): Messages to add to the thread as part of the run
+            on_run (Callable | None): Called with the thread and run IDs as soon as the run is created
+            on_delta (Callable | None): Called with each piece of the answer text as it streams
+
+        Returns:
+            tuple[str, list[str], str]: The generated response, cited files and the id of the thread
+        """
+        start = time.perf_counter()
+        with RUNS_IN_FLIGHT.track_inprogress(), track_stage("run"):
+            if thread_id:
+                thread_id = self.context.resolve(thread_id)
+                with track_stage("run_create"):
+                    stream = self.client.beta.threads.runs.create(
+                        thread_id=thread_id,
+                        assistant_id=self.assistant_id,
+                        additional_messages=additional_messages,
+                        stream=True,
+                        **self.context.run_options(),
+                    )
+            else:
+                with track_stage("thread_create_and_run"):
+                    stream = self.client.beta.threads.create_and_run(
+                        assistant_id=self.assistant_id,
+                        thread={"messages": additional_messages},
+                        stream=True,
+                        **self.context.run_options(),
+                    )
+            try:
+                run, message, thread_id = self._consume_run_stream(stream, thread_id, start, on_run, on_delta)
+            except RunFailedError as e:
+                # The stream opens once the run is created, so the messages are on its thread
+                e.message_added = bool(additional_messages) and e.thread_id is not None
+                raise
+
+        self.context.record_run(thread_id, run, time.perf_counter() - start)
+        if run.status != "completed" or message is None:
+            error = getattr(run, "last_error", None)
+            raise RunFailedError(
+                f"Run {run.id} ended with status '{run.status}'" + (f": {error.message}" if error else ""),
+                code=error.code if error else None, thread_id=thread_id, message_added=bool(additional_messages),
             )
-            logging.info("Question added to thread.")
+        logging.info(f"Question answered on thread {thread_id} by run {run.id}")
+
+        response, citations = self._extract_answer(message)
+        return response, citations, thread_id
+
+    def _consume_run_stream(self, stream, thread_id: str | None, start: float,
+                            on_run: Callable[[str, str], None] | None = None,
+                            on_delta: Callable[[str], None] | None = None):
+        """
+        Reads a streamed run to completion.
+
+        Args:
+            stream (Stream[AssistantStreamEvent]): The event stream returned by run creation
+            thread_id (str | None): The thread the run is on, if already known
+            start (float): `time.perf_counter()` at run creation, used to time the first streamed token
+            on_run (Callable | None): Called with the thread and run IDs on the first run event
+            on_delta (Callable | None): Called with the text of each message delta
+
+        Returns:
+            tuple[Run, Message | None, str]: The final run, the completed assistant message and the thread id
+        """
+        run, message = None, None
+        first_delta_seen = False
+        with stream:
+            for event in stream:
+                if event.event == "thread.created":
+                    thread_id = event.data.id
+                elif event.event == "thread.message.delta":
+                    if not first_delta_seen:
+                        first_delta_seen = True
+                        STAGE_LATENCY.observe(time.perf_counter() - start, stage="run_first_delta")
+                    if on_delta is not None:
+                        for part in event.data.delta.content or []:
+                            if part.type == "text" and part.text and part.text.value:
+                                on_delta(part.text.value)
+                elif event.event == "thread.message.completed" and event.data.role == "assistant":
+                    message = event.data
+                elif event.event.startswith("thread.run.") and not event.event.startswith("thread.run.step"):
+                    if run is None and on_run is not None:
+                        on_run(thread_id or event.data.thread_id, event.data.id)
+                    run = event.data
+                    thread_id = thread_id or run.thread_id
+                elif event.event == "error":
+                    raise RunFailedError(f"Run stream failed: {event.data.message}", code=getattr(event.data, "code", None),
+                                         thread_id=thread_id or (run.thread_id if run is not None else None))
+
+        if run is None:
+            raise RuntimeError("Run stream ended without a run.")
+        return run, message, thread_id
+
+    def _extract_answer(self, message) -> tuple[str, list[str]]:
+        """
+        Strips the citation markers from an assistant message and resolves the cited file names.
+
+        Args:
+            message (Message): The completed assistant message
+
+        Returns:
+            tuple[str, list[str]]: The response text and the cited file names
+        """
+        response_content = message.content[0].text
+
+        # Extract citations if available
+        citations = []
+        annotations = response_content.annotations
+        for annotation in annotations:
+            response_content.value = response_content.value.replace(annotation.text, '')
+            if file_citation := getattr(annotation, "file_citation", None):
+                file_name = self.file_names.get(file_citation.file_id)
+                if file_name is None:
+                    with track_stage("citation_lookup"):
+                        file_name = self.client.files.retrieve(file_citation.file_id).filename
+                    self.file_names[file_citation.file_id] = file_name
+                file_name = file_name.replace('.pdf', '')
+                if file_name not in citations:
+                    citations.append(file_name)
+
+        return response_content.value, citations
+
+    def run_and_poll(self, thread_id: str, **run_options):
+        """
+        Starts a run of the assistant on a thread and polls it until it reaches a terminal state.
+
+        The run is polled here rather than through the SDK's `create_and_poll` so that the time spent
+        creating the run, each status poll, and the number of polls per run can be measured.
+
+        Args:
+            thread_id (str): The id of the thread to run the assistant on
+            **run_options: Extra `runs.create` arguments; they override the context manager's truncation settings
+
+        Returns:
+            Run: The run in its terminal state
+        """
+        options = {**self.context.run_options(), **run_options}
+        start = time.perf_counter()
+        with RUNS_IN_FLIGHT.track_inprogress(), track_stage("run"):
+            with track_stage("run_create"):
+                run = self.client.beta.threads.runs.create(
+                    thread_id=thread_id, assistant_id=self.assistant_id, **options
+                )
+
+            polls = 0
+            while run.status not in TERMINAL_RUN_STATES:
+                with track_stage("run_poll"):
+                    response = self.client.beta.threads.runs.with_raw_response.retrieve(
+                        thread_id=thread_id, run_id=run.id
+                    )
+                    run = response.parse()
+                polls += 1
+                if run.status not in TERMINAL_RUN_STATES:
+                    # Honor the server's polling hint, as the SDK helper does
+                    poll_after_ms = response.headers.get("openai-poll-after-ms")
+                    time.sleep(int(poll_after_ms) / 1000 if poll_after_ms else 1.0)
+
+        RUN_POLLS.observe(polls)
+        self.context.record_run(thread_id, run, time.perf_counter() - start)
+        logging.info(f"Run {run.id} finished with status '{run.status}' after {polls} polls")
+        return run
+
+    @traced("assistant.compact_thread")
+    def compact_thread(self, thread_id: str) -> str | None:
+        """
+        Replaces a long thread with a fresh thread that starts from a summary of the conversation.
+
+        The fresh thread searches the same vector stores, so files attached to the old thread stay searchable.
+        The old thread is redirected to the new one through the context manager, so later questions sent
+        with the old thread ID continue in the compact thread, and is then deleted.
+
+        Args:
+            thread_id (str): The thread to compact
 
-            # Process the response
-            run = self.client.beta.threads.runs.create_and_poll(
-                thread_id=thread_id, assistant_id=self.assistant_id
+        Returns:
+            str | None: The ID of the new thread, or None if the thread is already being compacted
+
+        Raises:
+            Exception: The summary run or the new thread failed
+        """
+        if not self.context.begin_compaction(thread_id):
+            return None
+
+        new_thread_id = None
+        try:
+            # Summarize with the whole history and without file_search, whatever the usual run settings are
+            run = self.run_and_poll(
+                thread_id, instructions=SUMMARY_INSTRUCTIONS, tools=[], truncation_strategy={"type": "auto"}
             )
-            message_list = list(self.client.beta.threads.messages.list(thread_id=thread_id, run_id=run.id))
-            message = message_list[-1]
-            response_content = message.content[0].text
-
-            # Extract citations if available
-            citations = []
-            annotations = response_content.annotations
-            for annotation in annotations:
-                response_content.value = response_content.value.replace(annotation.text, '')
-                if file_citation := getattr(annotation, "file_citation", None):
-                    cited_file = self.client.files.retrieve(file_citation.file_id)
-                    file_name = cited_file.filename.replace('.pdf', '')
-                    if file_name not in citations:
-                        citations.append(file_name)
-
-            return response_content.value, citations
+            if run.status != "completed":
+                raise RuntimeError(f"Summary run ended with status '{run.status}'")
+            with track_stage("messages_list"):
+                summary_message = list(self.client.beta.threads.messages.list(thread_id=thread_id, run_id=run.id))[-1]
+            summary = summary_message.content[0].text.value
+
+            # Files attached with `attach_file_to_thread` live in the thread's file_search vector store
+            with track_stage("threads_retrieve"):
+                tool_resources = self.client.beta.threads.retrieve(thread_id).tool_resources
+            file_search = tool_resources.file_search if tool_resources else None
+            vector_store_ids = list(file_search.vector_store_ids or []) if file_search else []
+
+            with track_stage("threads_create"):
+                thread = self.client.beta.threads.create(
+                    messages=[{
+                        "role": "assistant",
+                        "content": f"Summary of our conversation so far:\n\n{summary}",
+                    }],
+                    **({"tool_resources": {"file_search": {"vector_store_ids": vector_store_ids}}} if vector_store_ids else {}),
+                )
+            new_thread_id = thread.id
+            logging.info(f"Compacted thread {thread_id} into {new_thread_id}")
+        except Exception as e:
+            logging.error(f"Failed to compact thread {thread_id}: {e}")
+            raise
+        finally:
+            self.context.finish_compaction(thread_id, new_thread_id)
 
-        except ValueError as e:
-            logging.error(f"Thread error: {e}")
-            raise HTTPException(status_code=400, detail=str(e))
+        # The conversation continues in the summary thread; the full-size thread would only be left behind
+        try:
+            self.delete_thread(thread_id)
         except Exception as e:
-            logging.error(f"Failed to process question: {e}")
+            logging.warning(f"Compacted thread {thread_id} was not deleted: {e}")
+        return new_thread_id
+
+    @traced("assistant.list_messages")
+    def list_messages(self, thread_id: str) -> list[dict]:
+        """
+        Reads every message of a thread, oldest first, as compact dictionaries.
+
+        Assistant messages have their citation markers stripped and their cited file names resolved, the same
+        way `ask_question` returns them.
+
+        Args:
+            thread_id (str): The thread to read
+
+        Returns:
+            list[dict]: `role`, `content` and `created_at` of each message, with `citations` and `attachments` when present
+
+        Raises:
+            Exception: The messages could not be listed
+        """
+        try:
+            messages = []
+            after = None
+            while True:
+                # Page by hand: the SDK's auto-pagination asks for one more (empty) page after the last one
+                with track_stage("messages_list"):
+                    page = self.client.beta.threads.messages.list(
+                        thread_id=thread_id, order="asc", limit=100, **({"after": after} if after else {})
+                    )
+                for message in page.data:
+                    if not message.content or getattr(message.content[0], "type", "text") != "text":
+                        continue
+                    if message.role == "assistant":
+                        content, citations = self._extract_answer(message)
+                    else:
+                        content, citations = message.content[0].text.value, []
+                    compact = {"role": message.role, "content": content, "created_at": message.created_at}
+                    if citations:
+                        compact["citations"] = citations
+                    if attachments := [attachment.file_id for attachment in message.attachments or []]:
+                        compact["attachments"] = attachments
+                    messages.append(compact)
+                if not page.data or not getattr(page, "has_more", False):
+                    return messages
+                after = page.data[-1].id
+        except Exception as e:
+            logging.error(f"Failed to list messages of thread {thread_id}: {e}")
             raise
 
+    @traced("assistant.upload_file")
     def upload_file(self, file: UploadFile) -> str:
         """
         Uploads a file to OpenAI and returns the file ID.
@@ -173,7 +683,8 @@ class AssistantAPI:
 
             with open(temp_file_path, "rb") as f:
                 file_tuple = (file.filename, f)
-                uploaded_file = self.client.files.create(file=file_tuple, purpose="assistants")
+                with track_stage("file_create"):
+                    uploaded_file = self.client.files.create(file=file_tuple, purpose="assistants")
 
             logging.info(f"File uploaded successfully with ID: {uploaded_file.id}")
             return uploaded_file.id
@@ -183,6 +694,7 @@ class AssistantAPI:
         finally:
             os.remove(temp_file_path)
 
+    @traced("assistant.attach_file_to_thread")
     def attach_file_to_thread(self, thread_id: str, file_id: str) -> dict:
         """
         Attaches a file to a thread using the new 'attachments' field.
@@ -198,23 +710,64 @@ class AssistantAPI:
             if not thread_id:
                 raise ValueError("No thread ID provided.")
 
-            self.client.beta.threads.messages.create(
-                thread_id=thread_id,
-                role="user",
-                content="Uploading a file for context.",
-                attachments=[
-                    {
-                        "file_id": file_id,
-                        "tools": [{"type": "file_search"}]
-                    }
-                ]
-            )
+            with track_stage("attach_message_create"):
+                self.client.beta.threads.messages.create(
+                    thread_id=thread_id,
+                    role="user",
+                    content=ATTACHMENT_MESSAGE,
+                    attachments=[
+                        {
+                            "file_id": file_id,
+                            "tools": [{"type": "file_search"}]
+                        }
+                    ]
+                )
             logging.info(f"File {file_id} attached to thread {thread_id}")
             return {"status": "file attached to thread"}
         except Exception as e:
             logging.error(f"Failed to attach file to thread: {e}")
             raise HTTPException(status_code=500, detail="Failed to attach file to thread.")
 
+    @traced("assistant.indexing_status")
+    def indexing_status(self, thread_id: str, file_id: str, vector_store_id: str | None = None) -> tuple[str, str | None, str | None]:
+        """
+        Checks the indexing status of a file attached to a thread in the thread's vector store.
+
+        Args:
+            thread_id (str): The thread the file was attached to
+            file_id (str): The OpenAI file ID
+            vector_store_id (str | None): The thread's vector store, if already known from an earlier check
+
+        Returns:
+            tuple[str, str | None, str | None]: The status ("in_progress", "completed", "failed" or "cancelled"),
+            the indexing error if any, and the thread's vector store ID (None until OpenAI created it)
+
+        Raises:
+            Exception: Failed to retrieve the thread or the vector store file
+        """
+        try:
+            if vector_store_id is None:
+                with track_stage("thread_retrieve"):
+                    thread = self.client.beta.threads.retrieve(thread_id)
+                file_search = thread.tool_resources.file_search if thread.tool_resources else None
+                if not file_search or not file_search.vector_store_ids:
+                    return "in_progress", None, None
+                vector_store_id = file_search.vector_store_ids[0]
+
+            try:
+                with track_stage("vector_store_file_retrieve"):
+                    vector_store_file = self.client.beta.vector_stores.files.retrieve(
+                        file_id=file_id, vector_store_id=vector_store_id
+                    )
+            except NotFoundError:
+                # The file has not been added to the thread's vector store yet
+                return "in_progress", None, vector_store_id
+            error = vector_store_file.last_error.message if vector_store_file.last_error else None
+            return vector_store_file.status, error, vector_store_id
+        except Exception as e:
+            logging.error(f"Failed to check indexing of file {file_id} on thread {thread_id}: {e}")
+            raise
+
 
 if __name__ == "__main__":
     """For testing assistant functionality through the terminal"""
@@ -227,22 +780,21 @@ if __name__ == "__main__":
 
     try:
         print("Using Assistant...")
-        print("Creating new thread...")
-        api.create_thread()
-        print("Thread created.")
+        # The first question creates the thread
+        thread_id = None
 
         while True:
             init = input("Do you want to ask a question? (y|n): ").lower()
             if init == 'n':
                 print("Deleting thread...")
-                api.delete_thread()
+                api.delete_thread(thread_id)
                 print("Thread deleted. Have a good day!")
                 break
             else:
                 question = input("Enter your question for the assistant: ")
                 print("Processing your question...")
 
-                response, citations = api.ask_question(question)
+                response, citations, thread_id = api.ask_question(thread_id, question)
 
                 print("Response:")
                 print(response)
@@ -0,0 +1,247 @@
+"""
+This module verifies the Okta tokens sent with every request to the backend.
+
+Verifying a JWT means finding its signing key in the issuer's JWKS and checking an RSA signature. The JWKS is
+cached and refreshed in the background (and refetched at once when a token names an unknown key, which is how
+Okta key rotation shows up). Tokens that were already verified are kept in a short-lived LRU cache, so a
+client's repeated requests with the same token cost a hash and a dictionary lookup.
+
+Classes:
+- OktaVerifier: Verifies Okta ID and access tokens against a cached JWKS and caches the verified claims.
+
+Functions:
+- user_id_from_claims(claims: dict) -> str: Returns the user ID (email) a verified token belongs to.
+
+Usage:
+- Create the verifier with the Okta issuer and the accepted audiences (the SPA client ID for ID tokens,
+  e.g. `api://default` for access tokens).
+- Call `start()` on application startup and `stop()` on shutdown to refresh the JWKS in the background.
+- Call `cached()` first and fall back to `verify()` off the event loop; both raise `jwt.InvalidTokenError`
+  for tokens that must be rejected.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Sequence
+
+import httpx
+import jwt
+
+from metrics import REGISTRY
+
+AUTH_VERIFICATIONS = REGISTRY.counter(
+    "auth_token_verifications_total", "Bearer tokens checked, by how the result was obtained.", ("result",)
+)
+AUTH_VERIFY_LATENCY = REGISTRY.histogram(
+    "auth_token_verify_seconds", "Time to verify a token that was not cached.",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.25, 1.0),
+)
+AUTH_JWKS_REFRESHES = REGISTRY.counter("auth_jwks_refreshes_total", "Fetches of the issuer's JWKS, by result.", ("result",))
+
+# Okta signs its tokens with RS256; accepting only that rules out "none" and HMAC key confusion
+ALGORITHMS = ["RS256"]
+
+
+def user_id_from_claims(claims: dict) -> str:
+    """
+    Returns the user ID of a verified token: the email of an ID token, or the subject (the Okta login,
+    which is the email for this app's users) of an access token.
+
+    Args:
+        claims (dict): The verified claims
+
+    Returns:
+        str: The user ID
+    """
+    return claims.get("email") or claims["sub"]
+
+
+def _fetch_json(url: str) -> dict:
+    response = httpx.get(url, timeout=5.0)
+    response.raise_for_status()
+    return response.json()
+
+
+class OktaVerifier:
+    """
+    Verifies Okta tokens with a cached JWKS and keeps recently verified tokens in an LRU cache.
+
+    Attributes:
+        issuer (str): The Okta issuer the tokens must come from
+        audiences (list[str]): The accepted `aud` values
+        refresh_interval (float): Seconds between background JWKS refreshes
+        token_ttl (float): Seconds a verified token is served from the cache (never past its expiry)
+        max_tokens (int): The most verified tokens held at once
+        leeway (float): Seconds of clock skew tolerated when checking `exp`, `iat` and `nbf`
+    """
+    def __init__(self, issuer: str, audiences: Sequence[str], jwks_uri: str | None = None,
+                 refresh_interval: float = 3600.0, min_refresh_interval: float = 30.0, token_ttl: float = 60.0,
+                 max_tokens: int = 10000, leeway: float = 30.0, fetch_json: Callable[[str], dict] = _fetch_json):
+        """
+        Initializes the verifier; the JWKS is fetched on first use, or by `refresh` during startup.
+
+        Args:
+            issuer (str): The Okta issuer, e.g. `https://example.okta.com/oauth2/default`
+            audiences (Sequence[str]): The accepted `aud` values
+            jwks_uri (str | None): The JWKS URL, or None to read it from the issuer's OpenID configuration
+            refresh_interval (float): Seconds between background JWKS refreshes
+            min_refresh_interval (float): Least seconds between two refreshes caused by unknown key IDs
+            token_ttl (float): Seconds a verified token is served from the cache
+            max_tokens (int): The most verified tokens held at once
+            leeway (float): Seconds of clock skew tolerated
+            fetch_json (Callable[[str], dict]): Blocking function fetching a JSON document (replaced in tests)
+        """
+        self.issuer = issuer.rstrip("/")
+        self.audiences = list(audiences)
+        self.jwks_uri = jwks_uri
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.token_ttl = token_ttl
+        self.max_tokens = max_tokens
+        self.leeway = leeway
+        self.fetch_json = fetch_json
+        self._keys = {}  # kid -> public key
+        self._refreshed_at = None
+        self._refresh_lock = threading.Lock()
+        self._tokens = OrderedDict()  # sha256 of token -> (claims, cached until)
+        self._tokens_lock = threading.Lock()
+        self._task = None
+
+    def refresh(self, force: bool = True) -> bool:
+        """
+        Fetches the JWKS and replaces the cached keys.
+
+        Args:
+            force (bool): Refresh even if the last refresh was less than `min_refresh_interval` ago
+
+        Returns:
+            bool: Whether the keys were fetched
+
+        Raises:
+            Exception: The OpenID configuration or the JWKS could not be fetched
+        """
+        with self._refresh_lock:
+            if not force and self._refreshed_at is not None and \
+                    time.monotonic() - self._refreshed_at < self.min_refresh_interval:
+                return False
+            try:
+                if self.jwks_uri is None:
+                    self.jwks_uri = self.fetch_json(f"{self.issuer}/.well-known/openid-configuration")["jwks_uri"]
+                jwks = self.fetch_json(self.jwks_uri)
+                keys = {}
+                for jwk in jwks.get("keys", []):
+                    if jwk.get("kty") == "RSA" and jwk.get("use", "sig") == "sig":
+                        keys[jwk["kid"]] = jwt.PyJWK(jwk, algorithm="RS256").key
+            except Exception as e:
+                AUTH_JWKS_REFRESHES.inc(result="error")
+                logging.error(f"Failed to fetch the Okta JWKS: {e}")
+                raise
+            self._keys = keys
+            self._refreshed_at = time.monotonic()
+            AUTH_JWKS_REFRESHES.inc(result="ok")
+            logging.info(f"Loaded {len(keys)} Okta signing key(s)")
+            return True
+
+    def _signing_key(self, token: str):
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self._keys.get(kid)
+        if key is None:
+            # A new key ID usually means Okta rotated its keys; refetch, but not for every forged token
+            self.refresh(force=self._refreshed_at is None)
+            key = self._keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unknown signing key: {kid}")
+        return key
+
+    @staticmethod
+    def _token_key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def cached(self, token: str) -> dict | None:
+        """
+        Returns the claims of a token verified within the last `token_ttl` seconds, or None.
+
+        Args:
+            token (str): The bearer token
+
+        Returns:
+            dict | None: The verified claims, or None if the token has to be verified
+        """
+        key = self._token_key(token)
+        with self._tokens_lock:
+            entry = self._tokens.get(key)
+            if entry is None:
+                return None
+            claims, cached_until = entry
+            if time.time() >= cached_until:
+                del self._tokens[key]
+                return None
+            self._tokens.move_to_end(key)
+        AUTH_VERIFICATIONS.inc(result="cached")
+        return claims
+
+    def verify(self, token: str) -> dict:
+        """
+        Verifies a token's signature, issuer, audience and lifetime, and caches the claims.
+
+        Blocks while the JWKS is fetched on first use or after a key rotation, so call it off the event loop.
+
+        Args:
+            token (str): The bearer token
+
+        Returns:
+            dict: The verified claims
+
+        Raises:
+            jwt.InvalidTokenError: The token is malformed, expired, or not issued by the issuer for an accepted audience
+            Exception: The JWKS could not be fetched
+        """
+        if (claims := self.cached(token)) is not None:
+            return claims
+        start = time.perf_counter()
+        try:
+            claims = jwt.decode(
+                token, self._signing_key(token), algorithms=ALGORITHMS, audience=self.audiences, issuer=self.issuer,
+                leeway=self.leeway, options={"require": ["exp", "iat", "iss", "sub"]},
+            )
+        except jwt.InvalidTokenError as e:
+            AUTH_VERIFICATIONS.inc(result="rejected")
+            logging.warning(f"Rejected token: {e}")
+            raise
+        AUTH_VERIFY_LATENCY.observe(time.perf_counter() - start)
+        AUTH_VERIFICATIONS.inc(result="verified")
+
+        cached_until = min(time.time() + self.token_ttl, claims["exp"])
+        with self._tokens_lock:
+            self._tokens[self._token_key(token)] = (claims, cached_until)
+            while len(self._tokens) > self.max_tokens:
+                self._tokens.popitem(last=False)
+        return claims
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception:
+                # Keep serving with the current keys; the next interval or an unknown key retries
+                pass
+
+    def start(self):
+        """Starts refreshing the JWKS in the background on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stops the background refresh."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,164 @@
+"""
+This module answers a batch of questions with bounded concurrency and yields each result as soon as it completes.
+
+Questions asked in their own threads run concurrently up to a cap. Questions that share one thread run one
+after another, because a thread only accepts one active run at a time. When OpenAI answers with a rate limit
+(HTTP 429, or a run that failed with `rate_limit_exceeded`), every worker of the batch pauses until the
+retry-after delay has passed, and the question is retried with exponential backoff. A run that failed after
+it had already added the question to its thread is retried by answering that thread again, so the question is
+not asked twice and a thread created with the failed run is not left behind.
+
+Classes:
+- RateLimitGate: A pause shared by the workers of one batch after a rate limit response.
+
+Functions:
+- run_batch(ask, questions, ...) -> AsyncIterator[dict]: Answers the questions and yields one result per question in completion order.
+
+Usage:
+- Pass an async `ask(thread_id, question)` that returns `(response, citations, thread_id)`, and an async
+  `answer_again(thread_id)` that answers a thread's latest question again.
+- Serialize each yielded dict as one NDJSON line.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import AsyncIterator, Awaitable, Callable, Sequence
+
+from metrics import REGISTRY
+
+BATCH_QUESTIONS = REGISTRY.counter("batch_questions_total", "Questions answered through the batch endpoint, by result.", ("result",))
+BATCH_RATE_LIMITS = REGISTRY.counter("batch_rate_limits_total", "Rate limit responses received while answering batches.")
+BATCH_QUESTION_LATENCY = REGISTRY.histogram("batch_question_seconds", "Latency of one batch question, including retries.")
+
+
+def _retry_after(error: Exception) -> float | None:
+    """Returns the retry-after delay of a rate limit error in seconds, if the response carried one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is not None:
+            try:
+                return float(value) * scale
+            except ValueError:
+                pass
+    return None
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    # A streamed run that hits the limit does not answer 429; it fails with the `rate_limit_exceeded` code
+    return getattr(error, "status_code", None) == 429 or getattr(error, "code", None) == "rate_limit_exceeded"
+
+
+class RateLimitGate:
+    """
+    A pause shared by the workers of one batch so a rate limit slows the whole batch, not only one worker.
+    """
+    def __init__(self):
+        self._resume_at = 0.0
+
+    def pause(self, seconds: float):
+        """Holds every worker back for at least `seconds` from now."""
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    async def wait(self):
+        """Sleeps until the current pause is over."""
+        while (delay := self._resume_at - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+
+async def _ask_one(ask: Callable[[str | None, str], Awaitable[tuple]], index: int, question: str,
+                   thread_id: str | None, gate: RateLimitGate, max_retries: int, backoff: float,
+                   answer_again: Callable[[str], Awaitable[tuple]] | None = None) -> dict:
+    start = time.perf_counter()
+    attempt = 0
+    asked_on = None  # The thread already holding the question after a failed run
+    while True:
+        attempt += 1
+        await gate.wait()
+        try:
+            if asked_on is not None:
+                response, citations, thread_id = await answer_again(asked_on)
+            else:
+                response, citations, thread_id = await ask(thread_id, question)
+            elapsed = time.perf_counter() - start
+            BATCH_QUESTIONS.inc(result="ok")
+            BATCH_QUESTION_LATENCY.observe(elapsed)
+            return {
+                "index": index, "question": question, "response": response, "citations": citations,
+                "thread_id": thread_id, "latency_ms": round(elapsed * 1000, 1), "attempts": attempt,
+            }
+        except Exception as e:
+            if getattr(e, "message_added", False) and getattr(e, "thread_id", None):
+                # Report (and discard) the thread the question is on, even one created by the failed run
+                asked_on = thread_id = e.thread_id
+            if _is_rate_limited(e) and attempt <= max_retries and (asked_on is None or answer_again is not None):
+                BATCH_RATE_LIMITS.inc()
+                delay = _retry_after(e) or backoff * 2 ** (attempt - 1) * (1 + random.random())
+                logging.warning(f"Batch question {index} rate limited, pausing the batch for {delay:.2f}s")
+                gate.pause(delay)
+                continue
+            elapsed = time.perf_counter() - start
+            BATCH_QUESTIONS.inc(result="error")
+            BATCH_QUESTION_LATENCY.observe(elapsed)
+            logging.error(f"Batch question {index} failed: {e}")
+            return {
+                "index": index, "question": question, "error": str(getattr(e, "detail", None) or e),
+                "thread_id": thread_id, "latency_ms": round(elapsed * 1000, 1), "attempts": attempt,
+            }
+
+
+async def run_batch(ask: Callable[[str | None, str], Awaitable[tuple]], questions: Sequence[str],
+                    concurrency: int = 4, thread_id: str | None = None, shared_thread: bool = False,
+                    max_retries: int = 3, backoff: float = 1.0,
+                    discard_thread: Callable[[str], Awaitable[object]] | None = None,
+                    answer_again: Callable[[str], Awaitable[tuple]] | None = None) -> AsyncIterator[dict]:
+    """
+    Answers a batch of questions and yields one result per question as soon as it completes.
+
+    Args:
+        ask (Callable): Async function answering `(thread_id, question)` with `(response, citations, thread_id)`
+        questions (Sequence[str]): The questions, identified in the results by their index
+        concurrency (int): The most questions in flight at once (ignored for a shared thread)
+        thread_id (str | None): The thread shared by all questions, or None to start one with the first question
+        shared_thread (bool): Whether all questions are asked in one thread, one after another
+        max_retries (int): Retries of a question after rate limit responses
+        backoff (float): Base seconds of the exponential backoff when a rate limit response has no retry-after
+        discard_thread (Callable | None): Async function called with each per-question thread after its answer
+        answer_again (Callable | None): Async function answering a thread's latest question again, with the same
+            result as `ask`; without it, a rate-limited run that already added its question is not retried
+
+    Returns:
+        AsyncIterator[dict]: Results with the response, citations, thread ID, latency and attempts, or an error
+    """
+    gate = RateLimitGate()
+
+    if shared_thread:
+        for index, question in enumerate(questions):
+            result = await _ask_one(ask, index, question, thread_id, gate, max_retries, backoff, answer_again)
+            thread_id = result.get("thread_id") or thread_id
+            yield result
+        return
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def worker(index: int, question: str) -> dict:
+        async with semaphore:
+            result = await _ask_one(ask, index, question, None, gate, max_retries, backoff, answer_again)
+        if discard_thread is not None and result.get("thread_id"):
+            try:
+                await discard_thread(result["thread_id"])
+            except Exception as e:
+                logging.warning(f"Failed to delete batch thread {result['thread_id']}: {e}")
+        return result
+
+    tasks = [asyncio.create_task(worker(index, question)) for index, question in enumerate(questions)]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        # The client went away or the batch finished; drop whatever has not started
+        for task in tasks:
+            task.cancel()
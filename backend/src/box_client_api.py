@@ -1,8 +1,14 @@
 import os
 import json
 import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from boxsdk import JWTAuth, Client
+from metrics import REGISTRY
+from tracing import traced
 
 # Setup logging
 logging.basicConfig(
@@ -12,20 +18,166 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+CACHE_REQUESTS = REGISTRY.counter(
+    "box_metadata_cache_requests_total", "Folder lookups served by the Box metadata cache, by how they were served.", ("result",)
+)
+CACHE_FOLDERS = REGISTRY.gauge("box_metadata_cache_folders", "Folders held by the Box metadata cache.")
+
+
+class _FolderEntry:
+    def __init__(self, folder, items: dict):
+        self.folder = folder
+        self.etag = getattr(folder, "etag", None)
+        self.items = items  # name -> item
+        self.validated_at = time.monotonic()
+
+
+class BoxMetadataCache:
+    """
+    Caches folder metadata and listings so name lookups are local dictionary reads.
+
+    An entry younger than `max_age` is served as is. An older one is revalidated with a conditional request
+    (`If-None-Match` with the folder's etag): a 304 keeps the listing, anything else refetches it. Changes made
+    through `BoxClient` are written through, and the least recently used folders are evicted beyond `max_folders`.
+
+    Attributes:
+        max_folders (int): The most folders held at once
+        max_age (float): Seconds an entry is served without revalidation
+        hits (int): Lookups served from the cache without a request
+        revalidations (int): Lookups served from the cache after a 304
+        misses (int): Lookups that fetched the folder and its listing
+    """
+    def __init__(self, client: Client, max_folders: int = 256, max_age: float = 30.0):
+        self.client = client
+        self.max_folders = max_folders
+        self.max_age = max_age
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # folder_id -> _FolderEntry, least recently used first
+        self._lock = threading.Lock()
+
+    def _fetch(self, folder_id, etag=None):
+        """Fetches a folder and its listing, or returns None if `etag` is still current."""
+        folder_ref = self.client.folder(folder_id=folder_id)
+        try:
+            folder = folder_ref.get(etag=etag) if etag else folder_ref.get()
+        except Exception as e:
+            if etag and getattr(e, "status", None) == 304:
+                return None
+            raise
+        items = {item.name: item for item in folder.get_items(fields=BoxClient.ITEM_FIELDS)}
+        return _FolderEntry(folder, items)
+
+    def _entry(self, folder_id) -> _FolderEntry:
+        folder_id = str(folder_id)
+        with self._lock:
+            entry = self._entries.get(folder_id)
+            if entry is not None:
+                self._entries.move_to_end(folder_id)
+                if time.monotonic() - entry.validated_at < self.max_age:
+                    self.hits += 1
+                    CACHE_REQUESTS.inc(result="hit")
+                    return entry
+
+        fetched = self._fetch(folder_id, etag=entry.etag if entry is not None else None)
+        with self._lock:
+            if fetched is None:
+                entry.validated_at = time.monotonic()
+                self.revalidations += 1
+                CACHE_REQUESTS.inc(result="revalidated")
+            else:
+                entry = fetched
+                self.misses += 1
+                CACHE_REQUESTS.inc(result="miss")
+            self._entries[folder_id] = entry
+            self._entries.move_to_end(folder_id)
+            while len(self._entries) > self.max_folders:
+                self._entries.popitem(last=False)
+            CACHE_FOLDERS.set(len(self._entries))
+        return entry
+
+    def folder(self, folder_id):
+        """Returns the folder item."""
+        return self._entry(folder_id).folder
+
+    def items(self, folder_id) -> dict:
+        """Returns the items of a folder by name."""
+        return dict(self._entry(folder_id).items)
+
+    def find(self, folder_id, name: str, item_type: str = None):
+        """
+        Looks up an item of a folder by name.
+
+        Args:
+            folder_id (str): Box folder ID.
+            name (str): The item name.
+            item_type (str): `file` or `folder` to only match that type.
+
+        Returns:
+            The item, or None if the folder has no such item.
+        """
+        item = self._entry(folder_id).items.get(name)
+        if item is None or (item_type is not None and item.type != item_type):
+            return None
+        return item
+
+    def put_item(self, folder_id, item):
+        """Records an item added to (or replaced in) a cached folder."""
+        with self._lock:
+            entry = self._entries.get(str(folder_id))
+            if entry is not None:
+                entry.items[item.name] = item
+
+    def drop_item(self, folder_id, name: str):
+        """Forgets an item removed from a cached folder."""
+        with self._lock:
+            entry = self._entries.get(str(folder_id))
+            if entry is not None:
+                entry.items.pop(name, None)
+
+    def invalidate(self, folder_id=None):
+        """Drops one folder, or every folder if no ID is given, so the next lookup refetches it."""
+        with self._lock:
+            if folder_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(folder_id), None)
+            CACHE_FOLDERS.set(len(self._entries))
+
+    def stats(self) -> dict:
+        """Returns the lookup counts and the hit rate (revalidated lookups count as hits)."""
+        total = self.hits + self.revalidations + self.misses
+        return {
+            "hits": self.hits, "revalidations": self.revalidations, "misses": self.misses,
+            "hit_rate": (self.hits + self.revalidations) / total if total else 0.0, "folders": len(self._entries),
+        }
+
 
 class BoxClient:
-    RECORDS_FILE = 'file_records.json'
+    # Change-detection records; `file_records.json` holds the vector store's records, which a sync rewrites
+    RECORDS_FILE = 'box_records.json'
+    # Older versions kept change-detection records in the vector store's file; read once to carry them over
+    LEGACY_RECORDS_FILE = 'file_records.json'
+    # Fields requested when listing folders, so change detection needs no extra call per file
+    ITEM_FIELDS = ['type', 'id', 'name', 'sha1', 'size', 'created_at', 'modified_at']
 
-    def __init__(self, config_path: str):
+    def __init__(self, config_path: str, client: Client = None, max_workers: int = 8, cache: BoxMetadataCache = None):
         """
         Initializes the BoxAPI with the configuration file path.
         
         Args:
             config_path (str): Path to the Box configuration file.
+            client (Client): An already authenticated Box client to use instead of authenticating with `config_path`.
+            max_workers (int): The most folders listed at once while walking a folder tree.
+            cache (BoxMetadataCache): The folder metadata cache to use (one is created if not given).
         """
         self.config_path = config_path
-        self.client = self.authenticate()
+        self.client = client if client is not None else self.authenticate()
+        self.max_workers = max_workers
+        self.cache = cache if cache is not None else BoxMetadataCache(self.client)
         self.records = self.load_records()
+        self.changed_items = {}  # file path -> Box file item of the last `detect_changes`
 
     def authenticate(self) -> Client:
         """Authenticates with the Box API."""
@@ -42,14 +194,15 @@ class BoxClient:
 
     def load_records(self) -> dict:
         """
-        Loads the file records from the JSON file.
+        Loads the file records from the JSON file, or from the legacy records file if there is none yet.
 
         Returns:
             dict: The file records. Returns an empty dictionary if the file is empty or missing.
         """
         try:
-            if os.path.exists(self.RECORDS_FILE):
-                with open(self.RECORDS_FILE, 'r') as f:
+            path = self.RECORDS_FILE if os.path.exists(self.RECORDS_FILE) else self.LEGACY_RECORDS_FILE
+            if os.path.exists(path):
+                with open(path, 'r') as f:
                     content = f.read().strip()
                     if not content:  # Handle empty file
                         logging.warning("File records JSON is empty. Initializing new records.")
@@ -67,6 +220,7 @@ class BoxClient:
             json.dump(self.records, f, indent=4)
         logging.info("File records saved.")
 
+    @traced("box.get_folder")
     def get_folder(self, folder_id):
         """
         Gets the specified Box folder.
@@ -78,24 +232,27 @@ class BoxClient:
             The specified Box folder object.
         """
         try:
-            folder = self.client.folder(folder_id=folder_id).get()
+            folder = self.cache.folder(folder_id)
             logging.info(f"Accessed folder with ID: {folder_id}")
             return folder
         except Exception as e:
             logging.error(f"Failed to access folder with ID {folder_id}: {e}")
             raise
 
+    @traced("box.upload_file")
     def upload_file(self, local_file_path: str, folder_id='0'):
         """Uploads a file to the specified Box folder."""
         try:
             with open(local_file_path, 'rb') as file_stream:
                 uploaded_file = self.client.folder(folder_id).upload_stream(file_stream, os.path.basename(local_file_path))
+            self.cache.put_item(folder_id, uploaded_file)
             logging.info(f"File uploaded: {uploaded_file.name}")
             return uploaded_file
         except Exception as e:
             logging.error(f"Failed to upload file: {e}")
             raise
 
+    @traced("box.delete_file")
     def delete_file(self, file_name: str, folder_id='0'):
         """
         Deletes a file with the given name from the specified Box folder.
@@ -105,44 +262,121 @@ class BoxClient:
             folder_id (str): Box folder ID to search for the file (default: root folder).
         """
         try:
-            folder = self.client.folder(folder_id).get_items()
-            for item in folder:
-                if item.name == file_name and item.type == 'file':
-                    self.client.file(item.id).delete()
-                    logging.info(f"File deleted from Box: {file_name}")
-                    return
-            logging.warning(f"File not found in Box: {file_name}")
+            item = self.cache.find(folder_id, file_name, 'file')
+            if item is None:
+                logging.warning(f"File not found in Box: {file_name}")
+                return
+            try:
+                self.client.file(item.id).delete()
+            except Exception as e:
+                if getattr(e, "status", None) != 404:
+                    raise
+                # The cached listing was stale; the file is already gone
+            self.cache.drop_item(folder_id, file_name)
+            logging.info(f"File deleted from Box: {file_name}")
         except Exception as e:
             logging.error(f"Failed to delete file: {e}")
             raise
 
+    def walk_files(self, folder_id):
+        """
+        Lists every file in a folder and its subfolders, listing up to `max_workers` folders at once.
+
+        Args:
+            folder_id (str): Box folder ID of the tree root.
+
+        Returns:
+            list: The file items, with the fields in `ITEM_FIELDS`.
+        """
+        return [item for _, item in self.walk_tree(folder_id)]
+
+    @traced("box.walk_files")
+    def walk_tree(self, folder_id):
+        """
+        Lists every file in a folder and its subfolders with its path, listing up to `max_workers` folders at once.
+
+        Args:
+            folder_id (str): Box folder ID of the tree root.
+
+        Returns:
+            list: (path relative to the folder, file item) pairs; a file directly in the folder has its name as path.
+        """
+        def list_folder(current_id, prefix):
+            return prefix, list(self.client.folder(current_id).get_items(fields=self.ITEM_FIELDS))
+
+        files = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running = {executor.submit(list_folder, folder_id, '')}
+            while running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    prefix, items = future.result()
+                    for item in items:
+                        if item.type == 'file':
+                            files.append((prefix + item.name, item))
+                        elif item.type == 'folder':
+                            running.add(executor.submit(list_folder, item.id, f"{prefix}{item.name}/"))
+        return files
+
+    @staticmethod
+    def _record_sha1(record):
+        """Returns the content hash of a record, or None for records written before hashes were stored."""
+        return record.get('sha1') if isinstance(record, dict) else None
+
+    @staticmethod
+    def _record_created_at(record):
+        """Returns the timestamp of a record in any of the forms written so far."""
+        if isinstance(record, dict):
+            return record.get('created_at')
+        if isinstance(record, (list, tuple)):
+            # A vector store record, [vector store file ID, created_at], read from the legacy records file
+            return record[1]
+        return record
+
+    @traced("box.detect_changes")
     def detect_changes(self, folder_id):
         """
-        Detects new or modified files in the specified Box folder.
+        Detects new or modified files in the specified Box folder and its subfolders.
+
+        Records are keyed by Box file ID and changes name files by their path in the folder, so files with the
+        same name in different subfolders are told apart.
+
+        A file counts as modified only when its content hash (Box's SHA-1) changed, so re-saves, moves and
+        metadata edits do not trigger a re-upload. Records written before hashes were stored only hold the
+        `created_at` timestamp (alone, or in a vector store record read from the legacy records file); such a
+        file counts as modified if the timestamp changed, and its record is upgraded with the hash either way.
 
         Args:
             folder_id (str): Box folder ID to detect changes in.
 
         Returns:
-            list: A list of changes detected (new or modified files).
+            list: A list of changes detected (new or modified files), e.g. "Modified file: Reports/Budget.pdf".
         """
         changes = []
-        folder = self.get_folder(folder_id)
+        self.changed_items = {}
 
         try:
-            for item in folder.get_items():
-                if item.type == 'file':
-                    file_info = self.client.file(item.id).get()
-                    created_at = file_info.created_at  # ISO 8601 string
-
-                    if item.name not in self.records:
-                        # New file detected
-                        changes.append(f"New file: {item.name}")
-                        self.records[item.name] = created_at
-                    elif self.records[item.name] != created_at:
-                        # Modified file detected
-                        changes.append(f"Modified file: {item.name}")
-                        self.records[item.name] = created_at
+            for path, item in self.walk_tree(folder_id):
+                record = self.records.get(item.id)
+                if record is None:
+                    # Records written before they were keyed by Box file ID are keyed by file name
+                    record = self.records.pop(path, None)
+                stored_sha1 = self._record_sha1(record)
+
+                if record is None:
+                    # New file detected
+                    change = "New file"
+                elif stored_sha1 is not None:
+                    # Modified file detected only if the bytes changed
+                    change = "Modified file" if stored_sha1 != item.sha1 else None
+                else:
+                    # Record without a hash: fall back to the timestamp once
+                    change = "Modified file" if self._record_created_at(record) != item.created_at else None
+
+                self.records[item.id] = {'path': path, 'sha1': item.sha1, 'created_at': item.created_at}
+                if change:
+                    changes.append(f"{change}: {path}")
+                    self.changed_items[path] = item
 
             self.save_records()
         except Exception as e:
@@ -150,4 +384,3 @@ class BoxClient:
             raise
 
         return changes
-
@@ -0,0 +1,423 @@
+"""
+This module keeps the vector store in sync with a Box folder tree by consuming the Box events stream.
+
+Instead of re-listing the whole folder on every sync, the daemon long-polls the events API from a stream
+position persisted on disk, keeps only file events inside the watched folder tree, coalesces them per file and
+applies them to the vector store in batches. The cost of a sync therefore grows with the rate of change, not
+with the size of the folder.
+
+Batches are applied before the next page of events is read and the stream position is only saved once a batch
+is applied, so a slow or failing vector store holds the reader back instead of queueing events in memory, and a
+restart replays whatever was not applied yet.
+
+Classes:
+- BoxSyncDaemon: Reads Box events, filters them to the watched tree and applies them to the vector store.
+
+Usage:
+- `python box_sync.py` with `BOX_CONFIG_PATH`, `BOX_FOLDER_ID`, `API_KEY` and `VECTOR_STORE_ID` set.
+- The first run uploads the whole tree once and then follows the events stream from where the upload began.
+- `python box_sync.py rebuild` builds a new vector store next to the live one and switches the assistants
+  (`ASSISTANT_ID_4O`, `ASSISTANT_ID_4O_MINI`) to it once indexed; `rollback` switches back to the previous store
+  and `gc` deletes the stores retired more than `STORE_ROLLBACK_HOURS` ago (see `store_rebuild.py`).
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import REGISTRY
+from tracing import traced
+
+SYNC_EVENTS = REGISTRY.counter("box_sync_events_total", "Box events read by the sync daemon, by what was done with them.", ("result",))
+SYNC_BATCH_SIZE = REGISTRY.histogram(
+    "box_sync_batch_files", "Files changed per applied batch.", buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500)
+)
+SYNC_BATCH_LATENCY = REGISTRY.histogram("box_sync_batch_seconds", "Time to apply one batch to the vector store.")
+SYNC_FAILURES = REGISTRY.counter("box_sync_batch_failures_total", "Batches that failed and will be retried.")
+
+# Events after which the file's current content should be in the vector store
+UPSERT_EVENTS = {"ITEM_CREATE", "ITEM_UPLOAD", "ITEM_COPY", "ITEM_MOVE", "ITEM_RENAME", "ITEM_UNDELETE_VIA_TRASH", "ITEM_MODIFY"}
+# Events after which the file should no longer be in the vector store
+REMOVE_EVENTS = {"ITEM_TRASH"}
+
+
+def _entry_id(entry) -> str | None:
+    return entry.get("id") if isinstance(entry, dict) else getattr(entry, "id", None)
+
+
+def _records_by_id(records: dict, files: dict) -> dict:
+    """Re-keys records written before they were keyed by Box file ID, which were keyed by file name."""
+    ids = {name: box_id for box_id, name in files.items()}
+    return {key if key in files else ids.get(key, key): record for key, record in records.items()}
+
+
+class BoxSyncDaemon:
+    """
+    Follows the Box events stream and applies the changes of a folder tree to the vector store.
+
+    Attributes:
+        folder_id (str): The watched Box folder; files in any of its subfolders are synced too
+        state_path (str): JSON file holding the stream position, the synced files and the vector store records
+        batch_size (int): Changed files that trigger a batch
+        batch_window (float): Seconds a change may wait for its batch to fill before it is applied anyway
+        page_size (int): Events read per request
+        retry_delay (float): Initial seconds to wait after a failed batch (doubles up to 5 minutes)
+    """
+    def __init__(self, box_client, vector_store, folder_id: str, state_path: str = "box_sync_state.json",
+                 batch_size: int = 50, batch_window: float = 5.0, page_size: int = 100, retry_delay: float = 5.0,
+                 max_seen_events: int = 10000, rebuilder=None):
+        """
+        Loads the persisted state; nothing is read from Box until `run_once` or `run_forever` is called.
+
+        Args:
+            box_client (BoxClient): The Box client wrapper of the watched account
+            vector_store (OpenAIVectorStoreAPI): The vector store to keep in sync
+            folder_id (str): The watched Box folder
+            state_path (str): Where the stream position and records are persisted
+            batch_size (int): Changed files that trigger a batch
+            batch_window (float): Seconds a change may wait for its batch to fill
+            page_size (int): Events read per request (Box allows up to 500)
+            retry_delay (float): Initial seconds to wait after a failed batch
+            max_seen_events (int): Number of recent event IDs remembered to drop duplicate deliveries
+            rebuilder (StoreRebuilder | None): Builds new vector stores for `rebuild` and `rollback`
+        """
+        self.box_client = box_client
+        self.vector_store = vector_store
+        self.folder_id = str(folder_id)
+        self.state_path = state_path
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.page_size = page_size
+        self.retry_delay = retry_delay
+        self.max_seen_events = max_seen_events
+        self.rebuilder = rebuilder
+
+        state = self._load_state()
+        self.stream_position = state.get("stream_position")
+        self.files = state.get("files", {})  # Box file ID -> synced file name
+        self.records = _records_by_id(state.get("records", {}), self.files)  # Box file ID -> [vector store file ID, created_at]
+        self.hashes = state.get("hashes", {})  # Box file ID -> SHA-1 of the synced content
+
+        self._pending = OrderedDict()  # Box file ID -> "upsert" | "remove", in order of first change
+        self._pending_since = None
+        self._pending_position = None
+        self._resync = False
+        self._seen_events = OrderedDict()
+        self._failures = 0
+
+    def _load_state(self) -> dict:
+        try:
+            if os.path.exists(self.state_path):
+                with open(self.state_path, "r") as f:
+                    return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logging.error(f"Error loading sync state, starting over: {e}")
+        return {}
+
+    def save_state(self):
+        """Writes the stream position, synced files and records atomically."""
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"stream_position": self.stream_position, "files": self.files, "records": self.records,
+                       "hashes": self.hashes}, f, indent=4)
+        os.replace(temp_path, self.state_path)
+
+    @property
+    def events(self):
+        return self.box_client.client.events()
+
+    def _in_tree(self, item) -> bool:
+        if getattr(item, "id", None) == self.folder_id:
+            return True
+        path = getattr(item, "path_collection", None) or {}
+        entries = path.get("entries", []) if isinstance(path, dict) else []
+        return any(_entry_id(entry) == self.folder_id for entry in entries)
+
+    @traced("box_sync.reconcile")
+    def reconcile(self):
+        """
+        Lists the whole watched tree once and applies every difference to the vector store.
+
+        Used for the first sync and after folder-level events (a folder moved, renamed or trashed), whose
+        effect on the individual files is not in the events stream.
+        """
+        present = {}
+        for item in self.box_client.walk_files(self.folder_id):
+            present[item.id] = item
+            self._apply_upsert(item.id, item)
+        for box_id in [box_id for box_id in self.files if box_id not in present]:
+            self._apply_remove(box_id)
+        self._resync = False
+
+    def _snapshot(self) -> dict:
+        return {"files": dict(self.files), "records": dict(self.records), "hashes": dict(self.hashes)}
+
+    def _is_unchanged(self, item) -> bool:
+        return bool(item.sha1) and self.files.get(item.id) == item.name and self.hashes.get(item.id) == item.sha1
+
+    @traced("box_sync.rebuild")
+    def rebuild(self):
+        """
+        Rebuilds the vector store from the whole watched tree next to the live store and switches to it.
+
+        Unlike `reconcile`, nothing changes on the store the assistants search until the new one is indexed.
+        Events read afterwards are applied to the new store; those that happened during the rebuild are
+        replayed and find their files unchanged.
+
+        Raises:
+            RebuildError: The new store could not be built or switched to; the sync state is unchanged
+        """
+        items = list(self.box_client.walk_files(self.folder_id))
+        self.records = self.rebuilder.rebuild(items, self.records, self._is_unchanged, snapshot=self._snapshot())
+        self.files = {item.id: item.name for item in items}
+        self.hashes = {item.id: item.sha1 for item in items}
+        self._resync = False
+        self.save_state()
+
+    @traced("box_sync.rollback")
+    def rollback(self):
+        """
+        Switches back to the previous vector store and restores the sync state that describes it.
+
+        The restored state predates the changes applied since the rebuild, so the next flush reconciles the tree
+        and re-uploads only the files changed since.
+        """
+        snapshot = self.rebuilder.rollback(self._snapshot())
+        if snapshot:
+            self.files, self.hashes = snapshot["files"], snapshot["hashes"]
+            self.records = _records_by_id(snapshot["records"], self.files)
+        self._resync = True
+        self.save_state()
+
+    def _apply_upsert(self, box_id: str, item):
+        old_name = self.files.get(box_id)
+        if old_name == item.name and item.sha1 and self.hashes.get(box_id) == item.sha1:
+            # Re-saves, moves within the tree and metadata edits leave the bytes, and so the index, as they are
+            SYNC_EVENTS.inc(result="unchanged")
+            return
+        # A renamed file is uploaded again under its new name, which is the name citations show
+        self.vector_store.sync_file(item, self.records)
+        self.files[box_id] = item.name
+        self.hashes[box_id] = item.sha1
+
+    def _apply_remove(self, box_id: str):
+        self.files.pop(box_id, None)
+        self.hashes.pop(box_id, None)
+        self.vector_store.remove_file(box_id, self.records)
+
+    def _queue(self, event):
+        """Filters one event and merges it into the pending batch."""
+        event_id = event["event_id"]
+        if event_id in self._seen_events:
+            SYNC_EVENTS.inc(result="duplicate")
+            return
+        self._seen_events[event_id] = True
+        while len(self._seen_events) > self.max_seen_events:
+            self._seen_events.popitem(last=False)
+
+        event_type, source = event["event_type"], event["source"]
+        if source is None or (event_type not in UPSERT_EVENTS and event_type not in REMOVE_EVENTS):
+            SYNC_EVENTS.inc(result="ignored")
+            return
+
+        known = source.id in self.files
+        in_tree = self._in_tree(source)
+        if source.type == "folder":
+            if in_tree or source.id == self.folder_id:
+                self._resync = True
+                SYNC_EVENTS.inc(result="resync")
+            else:
+                SYNC_EVENTS.inc(result="ignored")
+            return
+        if source.type != "file" or not (in_tree or known):
+            SYNC_EVENTS.inc(result="ignored")
+            return
+
+        # A file moved out of the tree is removed like a trashed one
+        action = "upsert" if event_type in UPSERT_EVENTS and in_tree else "remove"
+        self._pending.pop(source.id, None)
+        self._pending[source.id] = action
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+        SYNC_EVENTS.inc(result="queued")
+
+    @traced("box_sync.flush")
+    def flush(self):
+        """
+        Applies the pending batch to the vector store and saves the stream position it was read up to.
+
+        Raises:
+            Exception: Applying the batch failed; the batch stays pending and the position is not saved
+        """
+        start = time.perf_counter()
+        size = len(self._pending)
+        if self._resync:
+            self.reconcile()
+            self._pending.clear()
+        while self._pending:
+            box_id, action = next(iter(self._pending.items()))
+            if action == "upsert":
+                try:
+                    item = self.box_client.client.file(box_id).get()
+                except Exception as e:
+                    if getattr(e, "status", None) != 404:
+                        raise
+                    # Deleted again after the event was emitted
+                    self._apply_remove(box_id)
+                else:
+                    self._apply_upsert(box_id, item)
+            else:
+                self._apply_remove(box_id)
+            del self._pending[box_id]
+
+        if self._pending_position is not None:
+            self.stream_position = self._pending_position
+        self.save_state()
+        self._pending_since = None
+        if size:
+            SYNC_BATCH_SIZE.observe(size)
+            SYNC_BATCH_LATENCY.observe(time.perf_counter() - start)
+            logging.info(f"Applied {size} Box change(s) in {time.perf_counter() - start:.2f}s; stream position {self.stream_position}")
+
+    def _batch_due(self) -> bool:
+        if self._resync or self._failures or len(self._pending) >= self.batch_size:
+            return True
+        return self._pending_since is not None and time.monotonic() - self._pending_since >= self.batch_window
+
+    def _flush_with_backoff(self, stop: threading.Event | None = None) -> bool:
+        try:
+            self.flush()
+            self._failures = 0
+            return True
+        except Exception as e:
+            self._failures += 1
+            SYNC_FAILURES.inc()
+            delay = min(self.retry_delay * 2 ** (self._failures - 1), 300)
+            logging.error(f"Failed to apply Box changes, retrying in {delay:.0f}s: {e}")
+            if stop is not None:
+                stop.wait(delay)
+            else:
+                time.sleep(delay)
+            return False
+
+    def start(self):
+        """Sets the stream position on the first run: remember where the stream is, then upload the whole tree once."""
+        if self.stream_position is None:
+            self.stream_position = self.events.get_latest_stream_position()
+            logging.info(f"No saved stream position; syncing the whole tree from position {self.stream_position}")
+            self.reconcile()
+            self.save_state()
+
+    def run_once(self, wait: float = 0.0, stop: threading.Event | None = None) -> int:
+        """
+        Reads every event available now, applying batches as they fill, and applies what is left at the end.
+
+        Args:
+            wait (float): Seconds to long-poll for new events when there were none (0 returns immediately)
+            stop (threading.Event | None): Interrupts backoff waits when set
+
+        Returns:
+            int: The number of events read
+        """
+        self.start()
+        read = 0
+        position = self._pending_position if self._pending_position is not None else self.stream_position
+        while True:
+            # Backpressure: the next page is only read once the pending batch is applied
+            if self._batch_due() and not self._flush_with_backoff(stop):
+                return read
+            page = self.events.get_events(limit=self.page_size, stream_position=position)
+            entries = page["entries"]
+            for event in entries:
+                self._queue(event)
+            read += len(entries)
+            position = self._pending_position = page["next_stream_position"]
+            if len(entries) < self.page_size:
+                break
+
+        # The stream is drained; apply what is pending instead of waiting for the batch to fill
+        if read or self._pending or self._resync:
+            self._flush_with_backoff(stop)
+        elif wait > 0:
+            self._long_poll(position, wait)
+        return read
+
+    def _long_poll(self, position, wait: float):
+        options = dict(self.events.get_long_poll_options())
+        options["retry_timeout"] = min(float(options.get("retry_timeout", wait)), wait)
+        try:
+            self.events.long_poll(options, position)
+        except Exception as e:
+            # Box closes idle long polls; the next iteration simply reconnects
+            logging.debug(f"Long poll ended: {e}")
+
+    def run_forever(self, stop: threading.Event, wait: float = 60.0):
+        """
+        Follows the events stream until `stop` is set.
+
+        Args:
+            stop (threading.Event): Set to end the loop after the current step
+            wait (float): Seconds each long poll waits for new events
+        """
+        while not stop.is_set():
+            try:
+                if self.rebuilder is not None:
+                    self.rebuilder.collect_garbage()
+                self.run_once(wait=wait, stop=stop)
+            except Exception as e:
+                logging.error(f"Box sync step failed: {e}")
+                stop.wait(self.retry_delay)
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    from box_client_api import BoxClient
+    from store_rebuild import StoreRebuilder
+    from vector_store_api import OpenAIVectorStoreAPI
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Keep the vector store in sync with a Box folder tree.")
+    parser.add_argument("command", nargs="?", default="run", choices=("run", "rebuild", "rollback", "gc"))
+    command = parser.parse_args().command
+
+    vector_store = OpenAIVectorStoreAPI(os.getenv("API_KEY"), os.getenv("VECTOR_STORE_ID"))
+    rebuilder = StoreRebuilder(
+        vector_store,
+        [os.getenv("ASSISTANT_ID_4O"), os.getenv("ASSISTANT_ID_4O_MINI")],
+        state_path=os.getenv("STORE_REBUILD_STATE", "store_rebuild_state.json"),
+        rollback_window=float(os.getenv("STORE_ROLLBACK_HOURS", "168")) * 3600,
+    )
+    daemon = BoxSyncDaemon(
+        BoxClient(os.getenv("BOX_CONFIG_PATH")),
+        vector_store,
+        os.getenv("BOX_FOLDER_ID"),
+        state_path=os.getenv("BOX_SYNC_STATE", "box_sync_state.json"),
+        batch_size=int(os.getenv("BOX_SYNC_BATCH_SIZE", "50")),
+        batch_window=float(os.getenv("BOX_SYNC_BATCH_WINDOW", "5")),
+        rebuilder=rebuilder,
+    )
+    # Run `rebuild` and `rollback` while the daemon is stopped; the restarted daemon replays the events since
+    if command == "rebuild":
+        if daemon.stream_position is None:
+            # The rebuild replaces the first full upload
+            daemon.stream_position = daemon.events.get_latest_stream_position()
+        daemon.rebuild()
+        sys.exit(0)
+    if command == "rollback":
+        daemon.rollback()
+        sys.exit(0)
+    if command == "gc":
+        rebuilder.collect_garbage()
+        sys.exit(0)
+
+    stop_event = threading.Event()
+    try:
+        daemon.run_forever(stop_event)
+    except KeyboardInterrupt:
+        stop_event.set()
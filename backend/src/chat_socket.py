@@ -0,0 +1,332 @@
+"""
+This module runs the WebSocket chat channel: one long-lived connection per chat session that carries many requests.
+
+Over HTTPS every chat action is a separate request with its own headers, token and `user_id`, and the server has
+no way to push anything back. On the channel the client authenticates once, then sends JSON messages that each
+carry a correlation `id` and a `type`; the server answers with messages carrying the same `id`: partial answers
+while a run streams, status events, the final `result` (the body the HTTP endpoint would return) or an `error`,
+and for attachments the indexing progress. Requests on one connection run concurrently, and one can be cancelled
+by `id`, which cancels its OpenAI run.
+
+Each connection holds one reader and one writer coroutine and a bounded outbox, so an idle connection costs no
+thread and almost no memory. When a client reads slower than the server writes, request handlers wait for room in
+the outbox, partial answers are coalesced into fewer, larger messages instead of piling up, and a client that
+stops reading for `send_timeout` seconds is disconnected.
+
+Classes:
+- RequestCancelled: The request was cancelled by the client before its work started.
+- ChatRequest: One request on a connection, with the callbacks that stream its run and cancel it.
+- ChatConnection: Reads, dispatches and answers the requests of one WebSocket connection.
+
+Usage:
+- Accept and authenticate the WebSocket, then `await ChatConnection(websocket, handlers, cancel_run).serve()`.
+- A handler is an async generator taking a `ChatRequest` and yielding `(type, fields)` messages; its first
+  `"result"` message completes the request, and any later messages (e.g. indexing progress) follow it.
+- Pass `request.on_run` and `request.on_delta` to `AssistantAPI.ask_question`, and call
+  `request.raise_if_cancelled()` before starting work, so cancelling a request stops its run.
+"""
+
+import asyncio
+import collections
+import json
+import logging
+import threading
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Callable
+
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+
+from metrics import REGISTRY
+
+SOCKET_CONNECTIONS = REGISTRY.gauge("chat_socket_connections", "Open WebSocket chat connections.")
+SOCKET_MESSAGES = REGISTRY.counter("chat_socket_messages_total", "Messages received on WebSocket chat connections, by type.", ("type",))
+SOCKET_SLOW_CLIENTS = REGISTRY.counter(
+    "chat_socket_slow_clients_total", "WebSocket chat connections closed because the client stopped reading."
+)
+
+# Close codes in the private range, so clients can tell them from protocol errors
+CLOSE_TOKEN_EXPIRED = 4401
+CLOSE_SLOW_CLIENT = 4408
+
+
+class RequestCancelled(Exception):
+    """The request was cancelled by the client before its work started."""
+
+
+class ChatRequest:
+    """
+    One request received on a chat connection.
+
+    `on_run` and `on_delta` are called from the worker thread answering the question.
+
+    Attributes:
+        id (str): The client's correlation ID
+        message (dict): The request message
+        cancelled (bool): Whether the client cancelled the request
+        answered (bool): Whether the request's result has been queued
+        run (tuple[str, str] | None): The thread and run IDs of the request's run, once created
+    """
+    def __init__(self, connection: "ChatConnection", request_id: str, message: dict):
+        self.connection = connection
+        self.id = request_id
+        self.message = message
+        self.cancelled = False
+        self.answered = False
+        self.run = None
+        self.task = None
+        self._lock = threading.Lock()
+
+    def on_run(self, thread_id: str, run_id: str):
+        """Records the request's run, cancelling it at once if the request was cancelled before it was created."""
+        with self._lock:
+            self.run = (thread_id, run_id)
+            cancelled = self.cancelled
+        if cancelled:
+            self.connection.cancel_run_quietly(thread_id, run_id)
+        else:
+            self.connection.post_threadsafe({"id": self.id, "type": "status", "status": "running",
+                                             "thread_id": thread_id, "run_id": run_id})
+
+    def on_delta(self, text: str):
+        """Sends a piece of the answer being generated."""
+        self.connection.post_delta_threadsafe(self.id, text)
+
+    def raise_if_cancelled(self):
+        """
+        Raises:
+            RequestCancelled: The client cancelled the request
+        """
+        if self.cancelled:
+            raise RequestCancelled(f"Request {self.id} was cancelled.")
+
+    def cancel(self) -> tuple[str, str] | None:
+        """Marks the request cancelled and returns its run, if one was created."""
+        with self._lock:
+            self.cancelled = True
+            return self.run
+
+
+Handler = Callable[[ChatRequest], AsyncIterator[tuple[str, dict]]]
+
+
+class ChatConnection:
+    """
+    Serves the requests of one authenticated WebSocket chat connection.
+
+    Attributes:
+        websocket (WebSocket): The accepted connection
+        handlers (dict[str, Handler]): Message type -> handler
+        cancel_run (Callable): Blocking `cancel_run(thread_id, run_id)` of the assistant API
+        expires_at (float | None): When the connection's token expires; later messages close the connection
+        max_in_flight (int): Requests that may await their result at once
+        max_queued (int): Messages the outbox holds before handlers wait for the client to read
+        send_timeout (float): Seconds a single send may take before the client is considered gone
+    """
+    def __init__(self, websocket: WebSocket, handlers: dict[str, Handler], cancel_run: Callable[[str, str], object],
+                 expires_at: float | None = None, max_in_flight: int = 8, max_queued: int = 64,
+                 send_timeout: float = 30.0):
+        self.websocket = websocket
+        self.handlers = handlers
+        self.cancel_run = cancel_run
+        self.expires_at = expires_at
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.send_timeout = send_timeout
+
+        self._requests = {}  # request ID -> ChatRequest, until its handler returns
+        self._in_flight = 0
+        self._outbox = collections.deque()  # message dicts, or a request ID whose partial answer is waiting
+        self._unsent = {}  # request ID -> pieces of its answer not sent yet
+        self._ready = asyncio.Event()
+        self._room = asyncio.Event()
+        self._background = set()
+        self._loop = None
+        self._closed = False
+
+    async def serve(self):
+        """Reads and answers requests until the client disconnects, stops reading, or its token expires."""
+        self._loop = asyncio.get_running_loop()
+        SOCKET_CONNECTIONS.inc()
+        reader = asyncio.create_task(self._read())
+        writer = asyncio.create_task(self._write())
+        try:
+            await asyncio.wait({reader, writer}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            SOCKET_CONNECTIONS.dec()
+            self._closed = True
+            self._room.set()
+            reader.cancel()
+            writer.cancel()
+            # Questions already asked still finish and are recorded on their threads, as with a closed HTTP request;
+            # only requests that are just following events stop
+            for request in list(self._requests.values()):
+                if request.answered:
+                    request.task.cancel()
+
+    async def send(self, request_id: str | None, kind: str, **fields):
+        """Queues a message, waiting while the outbox is full; messages for a closed connection are dropped."""
+        while len(self._outbox) >= self.max_queued and not self._closed:
+            self._room.clear()
+            await self._room.wait()
+        if self._closed:
+            return
+        self._post({"id": request_id, "type": kind, **fields})
+
+    def _post(self, item: dict | str):
+        self._outbox.append(item)
+        self._ready.set()
+
+    def _call_threadsafe(self, callback: Callable, *args):
+        # A question outlives its connection, and may outlive the event loop at shutdown
+        if self._closed:
+            return
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            pass
+
+    def post_threadsafe(self, message: dict):
+        """Queues a status message from a worker thread; there is at most one per request, so it is not bounded."""
+        self._call_threadsafe(self._post, message)
+
+    def post_delta_threadsafe(self, request_id: str, text: str):
+        """Queues a piece of an answer from a worker thread."""
+        self._call_threadsafe(self._post_delta, request_id, text)
+
+    def _post_delta(self, request_id: str, text: str):
+        request = self._requests.get(request_id)
+        if request is None or request.cancelled or request.answered:
+            return
+        if request_id in self._unsent:
+            # The previous pieces are still waiting for the client; this one goes out with them
+            self._unsent[request_id].append(text)
+        else:
+            self._unsent[request_id] = [text]
+            self._post(request_id)
+
+    def cancel_run_quietly(self, thread_id: str, run_id: str):
+        """Cancels a run, which may have finished in the meantime."""
+        try:
+            self.cancel_run(thread_id, run_id)
+        except Exception as e:
+            logging.warning(f"Could not cancel run {run_id} of a cancelled chat request: {e}")
+
+    async def _write(self):
+        while True:
+            while not self._outbox:
+                self._ready.clear()
+                await self._ready.wait()
+            item = self._outbox.popleft()
+            if len(self._outbox) < self.max_queued:
+                self._room.set()
+            if isinstance(item, str):
+                text = "".join(self._unsent.pop(item, ()))
+                if not text:
+                    continue
+                item = {"id": item, "type": "delta", "text": text}
+            try:
+                await asyncio.wait_for(self.websocket.send_text(json.dumps(item)), self.send_timeout)
+            except asyncio.TimeoutError:
+                SOCKET_SLOW_CLIENTS.inc()
+                logging.warning(f"Closing a chat connection that read nothing for {self.send_timeout}s")
+                await self._close(CLOSE_SLOW_CLIENT, "Client too slow.")
+                return
+            except Exception:
+                # The client is gone; the reader sees the disconnect
+                return
+
+    async def _close(self, code: int, reason: str):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code, reason=reason), 1.0)
+        except Exception:
+            pass
+
+    async def _read(self):
+        try:
+            while True:
+                text = await self.websocket.receive_text()
+                if self.expires_at is not None and time.time() >= self.expires_at:
+                    await self._close(CLOSE_TOKEN_EXPIRED, "Token expired.")
+                    return
+                await self._dispatch(text)
+        except WebSocketDisconnect:
+            return
+
+    async def _dispatch(self, text: str):
+        try:
+            message = json.loads(text)
+        except json.JSONDecodeError:
+            message = None
+        if not isinstance(message, dict):
+            SOCKET_MESSAGES.inc(type="invalid")
+            await self.send(None, "error", status=400, detail="Messages must be JSON objects.")
+            return
+        request_id, kind = message.get("id"), message.get("type")
+        SOCKET_MESSAGES.inc(type=kind if kind in self.handlers or kind == "cancel" else "unknown")
+        if not isinstance(request_id, str) or not request_id:
+            await self.send(None, "error", status=400, detail="Every message needs a string id.")
+        elif kind == "cancel":
+            await self._cancel(request_id, message.get("target"))
+        elif kind not in self.handlers:
+            await self.send(request_id, "error", status=400, detail=f"Unknown message type: {kind}.")
+        elif request_id in self._requests:
+            await self.send(request_id, "error", status=400, detail="A request with this id is still running.")
+        elif self._in_flight >= self.max_in_flight:
+            await self.send(request_id, "error", status=429, detail="Too many requests in flight on this connection.")
+        else:
+            request = ChatRequest(self, request_id, message)
+            self._requests[request_id] = request
+            self._in_flight += 1
+            request.task = asyncio.create_task(self._run(request, self.handlers[kind]))
+
+    def _complete(self, request: ChatRequest):
+        if not request.answered:
+            request.answered = True
+            self._in_flight -= 1
+
+    async def _run(self, request: ChatRequest, handler: Handler):
+        try:
+            async with aclosing(handler(request)) as messages:
+                async for kind, fields in messages:
+                    if request.cancelled:
+                        break
+                    await self.send(request.id, kind, **fields)
+                    if kind == "result":
+                        self._complete(request)
+        except (RequestCancelled, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            if not request.cancelled:
+                await self.send(request.id, "error", **self._error_fields(e))
+        finally:
+            self._complete(request)
+            self._requests.pop(request.id, None)
+
+    @staticmethod
+    def _error_fields(error: Exception) -> dict:
+        if isinstance(error, HTTPException):
+            return {"status": error.status_code, "detail": error.detail}
+        if isinstance(error, ValidationError):
+            return {"status": 422, "detail": error.errors(include_url=False, include_context=False)}
+        logging.error(f"Chat request failed: {error}")
+        return {"status": 500, "detail": "Request failed."}
+
+    async def _cancel(self, request_id: str, target: str | None):
+        """Cancels a request: its run is cancelled, or it does not start; events it is following stop."""
+        request = self._requests.get(target) if isinstance(target, str) else None
+        if request is None or request.cancelled:
+            await self.send(request_id, "result", data={"cancelled": False})
+            return
+        run = request.cancel()
+        self._unsent.pop(target, None)
+        if request.answered:
+            request.task.cancel()
+        else:
+            if run is not None:
+                task = asyncio.create_task(asyncio.to_thread(self.cancel_run_quietly, *run))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+            await self.send(target, "cancelled")
+        await self.send(request_id, "result", data={"cancelled": True})
@@ -0,0 +1,164 @@
+"""
+This module chooses how each document is chunked when it is added to a vector store.
+
+The vector store's default ("auto") strategy cuts every document into 800-token chunks overlapping by 400 tokens,
+whether it is a 300-page handbook or a one-page memo. A policy is an ordered list of rules keyed on the file
+type, size and name; the first rule that matches a document gives its static chunk size and overlap, and a
+document no rule matches keeps the default. Every file and batch creation passes the chosen strategy, and files
+are grouped into batches by strategy, since a batch takes one strategy for all its files.
+
+Classes:
+- ChunkingRule: One rule: which documents it matches and the static strategy it gives them.
+- ChunkingPolicy: An ordered list of rules that picks the strategy of each document.
+
+Functions:
+- load_policy(path: str | None) -> ChunkingPolicy: Reads a policy from a JSON file, or returns the default policy.
+
+Usage:
+- Pass a policy to `OpenAIVectorStoreAPI` or the setup scripts; `strategy_for(file_name, size)` gives the
+  `chunking_strategy` argument (None for the default) and `group(files)` splits files into per-strategy batches.
+- Set `CHUNKING_POLICY` to a JSON file of rules (see `DEFAULT_RULES` for the shape) to replace the default policy,
+  and compare policies with `benchmarks/chunking_benchmark.py` before changing it.
+"""
+
+import fnmatch
+import json
+import os
+from dataclasses import dataclass, asdict, field
+from typing import Iterable
+
+# OpenAI's bounds for static chunking
+MIN_CHUNK_TOKENS = 100
+MAX_CHUNK_TOKENS = 4096
+
+# Rules applied when no policy file is configured, first match wins
+DEFAULT_RULES = [
+    # Spreadsheets and tables: small chunks keep one table's rows together without mixing in the next table
+    {"name": "tables", "extensions": [".csv", ".xlsx", ".xls"], "max_chunk_size_tokens": 400, "chunk_overlap_tokens": 50},
+    # One-page memos and letters: a few chunks, each with the whole context of its paragraph
+    {"name": "short", "max_bytes": 64 * 1024, "max_chunk_size_tokens": 400, "chunk_overlap_tokens": 100},
+    # Handbooks and self-studies: larger chunks keep a standard's criteria together, with less overlap to index
+    {"name": "handbooks", "extensions": [".pdf", ".docx"], "min_bytes": 2 * 1024 * 1024,
+     "max_chunk_size_tokens": 1200, "chunk_overlap_tokens": 300},
+]
+
+
+@dataclass
+class ChunkingRule:
+    """
+    A static chunking strategy for the documents that match every condition given.
+
+    Attributes:
+        name (str): Identifies the rule in logs and benchmark reports
+        max_chunk_size_tokens (int): The chunk size (100 to 4096 tokens)
+        chunk_overlap_tokens (int): Tokens shared by consecutive chunks (at most half the chunk size)
+        extensions (list[str]): File extensions matched, case-insensitively (empty matches any)
+        name_pattern (str | None): A glob matched against the file name, case-insensitively
+        min_bytes (int | None): Smallest file size matched
+        max_bytes (int | None): Largest file size matched
+    """
+    name: str
+    max_chunk_size_tokens: int
+    chunk_overlap_tokens: int
+    extensions: list[str] = field(default_factory=list)
+    name_pattern: str | None = None
+    min_bytes: int | None = None
+    max_bytes: int | None = None
+
+    def __post_init__(self):
+        if not MIN_CHUNK_TOKENS <= self.max_chunk_size_tokens <= MAX_CHUNK_TOKENS:
+            raise ValueError(f"Rule '{self.name}': max_chunk_size_tokens must be between {MIN_CHUNK_TOKENS} and {MAX_CHUNK_TOKENS}.")
+        if not 0 <= self.chunk_overlap_tokens <= self.max_chunk_size_tokens // 2:
+            raise ValueError(f"Rule '{self.name}': chunk_overlap_tokens must be between 0 and half of max_chunk_size_tokens.")
+        self.extensions = [extension.lower() for extension in self.extensions]
+
+    def matches(self, file_name: str, size: int | None) -> bool:
+        """
+        Returns whether the rule applies to a document. Size conditions never match a document of unknown size.
+
+        Args:
+            file_name (str): The file name
+            size (int | None): The file size in bytes, if known
+        """
+        if self.extensions and os.path.splitext(file_name)[1].lower() not in self.extensions:
+            return False
+        if self.name_pattern and not fnmatch.fnmatch(file_name.lower(), self.name_pattern.lower()):
+            return False
+        if self.min_bytes is not None and (size is None or size < self.min_bytes):
+            return False
+        if self.max_bytes is not None and (size is None or size > self.max_bytes):
+            return False
+        return True
+
+    def strategy(self) -> dict:
+        """Returns the `chunking_strategy` argument of the OpenAI vector store endpoints."""
+        return {"type": "static", "static": {"max_chunk_size_tokens": self.max_chunk_size_tokens,
+                                             "chunk_overlap_tokens": self.chunk_overlap_tokens}}
+
+
+class ChunkingPolicy:
+    """
+    Picks the chunking strategy of each document from an ordered list of rules.
+
+    Attributes:
+        rules (list[ChunkingRule]): The rules, first match wins
+    """
+    def __init__(self, rules: Iterable[ChunkingRule | dict] = ()):
+        self.rules = [rule if isinstance(rule, ChunkingRule) else ChunkingRule(**rule) for rule in rules]
+
+    def rule_for(self, file_name: str, size: int | None = None) -> ChunkingRule | None:
+        """Returns the first rule matching a document, or None if it keeps the vector store's default."""
+        return next((rule for rule in self.rules if rule.matches(file_name, size)), None)
+
+    def strategy_for(self, file_name: str, size: int | None = None) -> dict | None:
+        """
+        Returns the `chunking_strategy` of a document.
+
+        Args:
+            file_name (str): The file name
+            size (int | None): The file size in bytes, if known
+
+        Returns:
+            dict | None: The static strategy, or None to leave the argument out and use the default ("auto")
+        """
+        rule = self.rule_for(file_name, size)
+        return rule.strategy() if rule else None
+
+    def group(self, files: Iterable[tuple[str, int | None, object]]) -> list[tuple[dict | None, list]]:
+        """
+        Groups files by the strategy they get, so each group can be one batch.
+
+        Args:
+            files (Iterable[tuple[str, int | None, object]]): `(file_name, size, value)` triples
+
+        Returns:
+            list[tuple[dict | None, list]]: The strategy of each group and the values of its files, in first-seen order
+        """
+        groups = {}
+        for file_name, size, value in files:
+            rule = self.rule_for(file_name, size)
+            groups.setdefault(rule.name if rule else None, (rule.strategy() if rule else None, []))[1].append(value)
+        return list(groups.values())
+
+    def to_dict(self) -> list[dict]:
+        """Returns the rules in the JSON shape `load_policy` reads."""
+        return [{key: value for key, value in asdict(rule).items() if value not in (None, [])} for rule in self.rules]
+
+
+def load_policy(path: str | None = None) -> ChunkingPolicy:
+    """
+    Reads a policy from a JSON file holding a list of rules, or returns the default policy.
+
+    Args:
+        path (str | None): The policy file, or None to use `DEFAULT_RULES`
+
+    Returns:
+        ChunkingPolicy: The policy
+
+    Raises:
+        ValueError: A rule is invalid
+    """
+    if not path:
+        return ChunkingPolicy(DEFAULT_RULES)
+    with open(path) as f:
+        return ChunkingPolicy(json.load(f))
@@ -0,0 +1,334 @@
+"""
+This module hedges slow questions: when the chosen assistant has not answered by the time most of its answers
+are done, the question is also put to the other assistant, and whichever answers first wins.
+
+Runs occasionally stall far beyond their usual duration. Waiting for such a run costs the user tens of seconds,
+while asking again elsewhere usually takes an ordinary answer time. The primary run streams on the user's thread;
+if it is still running at the deadline (a percentile of the primary assistant's recent answer times), the
+question is asked on a scratch thread holding a copy of the recent conversation, so the user's thread never
+has two runs at once. The first answer wins and the other run is cancelled. When the hedge wins, its answer is
+added to the user's thread once the primary run is cancelled, so the conversation continues as if the primary
+assistant had answered. If the cancelled run is still active after a while, the answer is returned anyway and
+added when the run ends; the caller is told, so it can keep the thread for itself until then. The scratch thread
+is always deleted.
+
+Hedges cost a second run, so a budget caps them to a share of the questions, e.g. 5%.
+
+Classes:
+- LatencyWindow: Recent answer times of one assistant, with percentiles.
+- HedgeBudget: Earns hedge credit with every question and spends it on hedges.
+- Hedger: Asks a question on the primary assistant and hedges it on the other one past the deadline.
+
+Usage:
+- Create one hedger and call `ask_question(primary, secondary, thread_id, question, context)` instead of
+  `primary.ask_question(thread_id, question)`; pass `context=None` when the conversation is not known, which
+  disables the hedge for that question.
+- Pass `on_deferred` to learn about answers that are added to the thread after `ask_question` returns, and hold
+  the thread until the future it gets is done.
+"""
+
+import contextvars
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable
+
+from metrics import REGISTRY
+
+HEDGE_REQUESTS = REGISTRY.counter(
+    "hedge_requests_total", "Questions asked with hedging, by whether a hedge was sent.", ("result",)
+)
+HEDGE_WINS = REGISTRY.counter("hedge_wins_total", "Hedged questions, by the run that answered first.", ("winner",))
+HEDGE_SAVED = REGISTRY.histogram(
+    "hedge_saved_seconds", "Estimated seconds saved by hedge wins: the primary's expected answer time past the win.",
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0),
+)
+HEDGE_DEADLINE = REGISTRY.gauge("hedge_deadline_seconds", "The current hedging deadline of each assistant.", ("assistant",))
+
+
+class LatencyWindow:
+    """
+    The most recent answer times of one assistant.
+
+    Attributes:
+        size (int): The number of answer times kept
+    """
+    def __init__(self, size: int = 200):
+        self.size = size
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        """Returns the nearest-rank `q`th percentile of the kept answer times, or None if there are none."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[max(0, min(len(samples), math.ceil(q / 100 * len(samples))) - 1)]
+
+    def mean_beyond(self, seconds: float) -> float | None:
+        """Returns the mean of the answer times longer than `seconds`, or None if there are none."""
+        with self._lock:
+            beyond = [sample for sample in self._samples if sample > seconds]
+        return sum(beyond) / len(beyond) if beyond else None
+
+
+class HedgeBudget:
+    """
+    A token bucket of hedges: every question earns `ratio` of a hedge, up to `burst`, and a hedge costs one.
+
+    Attributes:
+        ratio (float): The long-run share of questions that may be hedged
+        burst (float): The most hedges that may be sent in a row after a calm period
+    """
+    def __init__(self, ratio: float = 0.05, burst: float = 5.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.credit = burst
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self.credit = min(self.burst, self.credit + self.ratio)
+
+    def spend(self) -> bool:
+        """Takes one hedge from the budget; returns False if it is exhausted."""
+        with self._lock:
+            if self.credit < 1:
+                return False
+            self.credit -= 1
+            return True
+
+
+class _Race:
+    """The runs of one hedged question, so the losing run can be cancelled as soon as it is known."""
+    def __init__(self):
+        self.runs = {}  # side -> (thread_id, run_id)
+        self.losers = {}  # side -> assistant of the run to cancel
+        self._lock = threading.Lock()
+
+    def on_run(self, side: str):
+        def record(thread_id: str, run_id: str):
+            with self._lock:
+                self.runs[side] = (thread_id, run_id)
+                assistant = self.losers.get(side)
+            if assistant is not None:
+                _cancel(assistant, thread_id, run_id)
+        return record
+
+    def cancel(self, side: str, assistant):
+        """Cancels a side's run now if it was created, or as soon as it is."""
+        with self._lock:
+            self.losers[side] = assistant
+            run = self.runs.get(side)
+        if run is not None:
+            _cancel(assistant, *run)
+
+
+def _cancel(assistant, thread_id: str, run_id: str):
+    try:
+        assistant.cancel_run(thread_id, run_id)
+    except Exception as e:
+        # The run most likely finished in the meantime
+        logging.info(f"Could not cancel the losing run {run_id}: {e}")
+
+
+class Hedger:
+    """
+    Asks questions on a primary assistant and, past an adaptive deadline and within a budget, on a second one.
+
+    Attributes:
+        percentile (float): The percentile of the primary assistant's answer times used as the deadline
+        min_delay (float): The shortest deadline, so fast assistants are not hedged on noise
+        max_delay (float): The longest deadline
+        initial_delay (float): The deadline until `min_samples` answer times are known
+        min_samples (int): Answer times needed before the percentile is used
+        cancel_wait (float): Seconds to wait for a cancelled primary run to end before adding the hedge's answer
+        budget (HedgeBudget): Caps the share of hedged questions
+    """
+    def __init__(self, percentile: float = 95.0, budget: float = 0.05, burst: float = 5.0, min_delay: float = 2.0,
+                 max_delay: float = 60.0, initial_delay: float = 10.0, min_samples: int = 20, window: int = 200,
+                 cancel_wait: float = 10.0, max_workers: int = 64):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.cancel_wait = cancel_wait
+        self.budget = HedgeBudget(budget, burst)
+        self._latencies = {}  # assistant ID -> LatencyWindow
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+
+    def latencies(self, assistant) -> LatencyWindow:
+        with self._lock:
+            return self._latencies.setdefault(assistant.assistant_id, LatencyWindow(self.window))
+
+    def deadline(self, assistant) -> float:
+        """Returns how long a question on this assistant runs before it is hedged."""
+        latencies = self.latencies(assistant)
+        value = latencies.percentile(self.percentile) if len(latencies) >= self.min_samples else None
+        deadline = self.initial_delay if value is None else min(max(value, self.min_delay), self.max_delay)
+        HEDGE_DEADLINE.set(deadline, assistant=str(assistant.assistant_id))
+        return deadline
+
+    def ask_question(self, primary, secondary, thread_id: str | None, question: str, context: list[dict] | None,
+                     on_deferred: Callable[[str, Future], None] | None = None) -> tuple[str, list[str], str, str]:
+        """
+        Asks a question on the primary assistant, hedging it on the secondary one if it is slow.
+
+        Args:
+            primary (AssistantAPI): The assistant the user chose; its run is on the user's thread
+            secondary (AssistantAPI): The assistant hedges are sent to
+            thread_id (str | None): The user's thread, or None to start a new conversation
+            question (str): The user question
+            context (list[dict] | None): The recent conversation as `{"role", "content"}` messages, oldest first,
+                or None if it is not known (the question is then never hedged)
+            on_deferred (Callable | None): Called with the thread ID and a future when the hedge's answer is only
+                added to the thread once the cancelled primary run ends; the future is done once it is added
+
+        Returns:
+            tuple[str, list[str], str, str]: The response, cited files, the user's thread ID and the winner
+            ("primary" or "hedge")
+
+        Raises:
+            Exception: Both runs failed (the primary's error is raised)
+        """
+        latencies = self.latencies(primary)
+        deadline = self.deadline(primary)
+        self.budget.earn()
+        start = time.perf_counter()
+        race = _Race()
+        primary_future = self._submit(primary.ask_question, thread_id, question, on_run=race.on_run("primary"))
+
+        done, _ = wait([primary_future], timeout=deadline)
+        if not done:
+            if context is None:
+                HEDGE_REQUESTS.inc(result="no_context")
+            elif not self.budget.spend():
+                HEDGE_REQUESTS.inc(result="budget_exhausted")
+            else:
+                HEDGE_REQUESTS.inc(result="hedged")
+                return self._race(primary, secondary, thread_id, question, context, race, primary_future, start,
+                                  on_deferred)
+        else:
+            HEDGE_REQUESTS.inc(result="not_needed")
+
+        response, citations, thread_id = primary_future.result()
+        latencies.record(time.perf_counter() - start)
+        return response, citations, thread_id, "primary"
+
+    def _submit(self, func: Callable, *args, **kwargs) -> Future:
+        """Runs `func` on a worker thread with the caller's context variables (e.g. the user of the usage ledger)."""
+        return self._executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+    def _race(self, primary, secondary, thread_id, question, context, race: _Race, primary_future: Future,
+              start: float, on_deferred) -> tuple[str, list[str], str, str]:
+        messages = [{"role": message["role"], "content": message["content"]} for message in context]
+        messages.append({"role": "user", "content": question})
+        hedge_future = self._submit(secondary.answer_on_scratch_thread, messages, on_run=race.on_run("hedge"))
+        hedge_future.add_done_callback(lambda _: self._delete_scratch_thread(secondary, race))
+        logging.info(f"Hedged a question on thread {thread_id} after {time.perf_counter() - start:.1f}s")
+
+        pending = {primary_future: "primary", hedge_future: "hedge"}
+        winner = None
+        while pending and winner is None:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            # The primary wins ties: its answer is already on the user's thread
+            for future in sorted(done, key=lambda future: pending[future] != "primary"):
+                side = pending.pop(future)
+                if future.exception() is None:
+                    winner = side
+                    break
+        if winner is None:
+            HEDGE_WINS.inc(winner="none")
+            raise primary_future.exception()
+
+        elapsed = time.perf_counter() - start
+        latencies = self.latencies(primary)
+        if winner == "primary":
+            race.cancel("hedge", secondary)
+            latencies.record(elapsed)
+            HEDGE_WINS.inc(winner="primary")
+            response, citations, thread_id = primary_future.result()
+            return response, citations, thread_id, "primary"
+
+        race.cancel("primary", primary)
+        response, citations, _ = hedge_future.result()
+        expected = latencies.mean_beyond(elapsed)
+        # The primary's answer time is only known to exceed this; keeping it as a lower bound keeps the tail in the window
+        latencies.record(elapsed)
+
+        wait([primary_future], timeout=self.cancel_wait)
+        if primary_future.done() and primary_future.exception() is None:
+            # The primary finished before the cancellation reached it; its answer is the one on the thread
+            HEDGE_WINS.inc(winner="primary")
+            response, citations, thread_id = primary_future.result()
+            return response, citations, thread_id, "primary"
+        HEDGE_WINS.inc(winner="hedge")
+        HEDGE_SAVED.observe(expected - elapsed if expected is not None else 0.0)
+        thread_id = self._write_back(primary, thread_id, question, response, race, primary_future, on_deferred)
+        return response, citations, thread_id, "hedge"
+
+    def _write_back(self, primary, thread_id: str | None, question: str, response: str, race: _Race,
+                    primary_future: Future, on_deferred) -> str:
+        """Adds the hedge's answer to the user's thread once the cancelled primary run has ended."""
+        run = race.runs.get("primary")
+        if primary_future.done():
+            if run is not None:
+                return primary.record_answer(run[0], question, response, answer_only=True)
+            # The primary failed before its run (and, for a new conversation, its thread) was created
+            return primary.record_answer(thread_id, question, response)
+
+        if thread_id is None and run is None:
+            # The primary is still creating its thread; the conversation continues on a new one instead
+            return primary.record_answer(None, question, response)
+
+        written = Future()
+        written.set_running_or_notify_cancel()
+        context = contextvars.copy_context()
+
+        def write_back_later(future: Future):
+            late_run = race.runs.get("primary")
+            try:
+                if future.exception() is None:
+                    logging.warning(f"The cancelled run on thread {thread_id} still answered; both answers are on the thread")
+                else:
+                    context.run(primary.record_answer, late_run[0] if late_run else thread_id, question, response,
+                                answer_only=late_run is not None)
+            except Exception as e:
+                logging.error(f"Failed to add the hedged answer to thread {thread_id}: {e}")
+            finally:
+                written.set_result(None)
+
+        logging.warning(f"The cancelled run on thread {thread_id} is still running; adding the hedged answer when it ends")
+        thread_id = run[0] if run is not None else thread_id
+        if on_deferred is not None:
+            # Registered before the callback, so the caller learns of the write-back before it can be done
+            on_deferred(thread_id, written)
+        primary_future.add_done_callback(write_back_later)
+        return thread_id
+
+    @staticmethod
+    def _delete_scratch_thread(secondary, race: _Race):
+        run = race.runs.get("hedge")
+        if run is not None:
+            try:
+                secondary.delete_thread(run[0])
+            except Exception as e:
+                logging.warning(f"Failed to delete the scratch thread {run[0]}: {e}")
+
+    def shutdown(self):
+        """Stops the worker threads once the running questions are answered."""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,270 @@
+"""
+This module tracks the indexing of files attached to threads.
+
+A file attached to a thread for file search is indexed into the thread's vector store after the attach request
+has returned. Until it is, a question on the thread runs against a partly indexed file. The tracker hands out a
+tracking ID per attachment, polls the indexing status in the background with a growing interval, and lets
+callers look up the status, stream status changes, or wait until a thread's attachments are indexed.
+
+Classes:
+- IndexingTracker: Tracks attachments and polls their indexing status in a background task.
+
+Usage:
+- Create the tracker with a blocking `check_status(thread_id, file_id, vector_store_id)` function.
+- Call `start()` on application startup and `stop()` on shutdown.
+- Call `track()` after attaching a file, and `wait_for_thread()` before asking a question on the thread.
+- Call `move_thread()` when a thread is compacted into a new one, so its attachments follow the conversation.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import AsyncIterator, Callable
+
+from metrics import REGISTRY
+
+INDEXING_LATENCY = REGISTRY.histogram(
+    "attachment_indexing_seconds", "Time from attaching a file to its indexing finishing, by final status.", ("status",)
+)
+INDEXING_PENDING = REGISTRY.gauge("attachment_indexing_pending", "Attached files whose indexing has not finished.")
+INDEXING_WAIT = REGISTRY.histogram("attachment_indexing_wait_seconds", "Time questions waited for their thread's attachments.")
+INDEXING_WAIT_TIMEOUTS = REGISTRY.counter(
+    "attachment_indexing_wait_timeouts_total", "Questions asked before their thread's attachments finished indexing."
+)
+
+# Vector store file states after which the status no longer changes
+TERMINAL_STATES = {"completed", "failed", "cancelled"}
+
+
+class IndexingTracker:
+    """
+    Tracks the indexing status of files attached to threads.
+
+    Attributes:
+        poll_interval (float): Seconds before the first status check of an attachment
+        max_poll_interval (float): Upper bound of the interval, which grows by half after every check
+        max_indexing_seconds (float): Seconds after which an attachment that is still indexing is marked failed
+        retention (float): Seconds a finished attachment stays queryable
+    """
+    def __init__(self, check_status: Callable[[str, str, str | None], tuple[str, str | None, str | None]],
+                 poll_interval: float = 0.5, max_poll_interval: float = 5.0, max_indexing_seconds: float = 600.0,
+                 retention: float = 3600.0):
+        """
+        Initializes an empty tracker; nothing is polled until `start` is called.
+
+        Args:
+            check_status (Callable): Blocking function returning `(status, error, vector_store_id)` of an attachment
+            poll_interval (float): Seconds before the first status check of an attachment
+            max_poll_interval (float): Upper bound of the polling interval
+            max_indexing_seconds (float): Seconds after which an attachment that is still indexing is marked failed
+            retention (float): Seconds a finished attachment stays queryable
+        """
+        self.check_status = check_status
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.max_indexing_seconds = max_indexing_seconds
+        self.retention = retention
+        self._records = {}  # tracking_id -> record
+        self._waiters = set()  # (loop, event) pairs of callers waiting for a status change
+        self._wakeup = None
+        self._loop = None
+        self._task = None
+
+    @staticmethod
+    def _public(record: dict) -> dict:
+        return {key: value for key, value in record.items() if not key.startswith("_")}
+
+    def _notify(self):
+        # Waiters may sit on another event loop than the poller, so wake each one through its own loop
+        for loop, event in list(self._waiters):
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                self._waiters.discard((loop, event))
+        INDEXING_PENDING.set(sum(1 for record in self._records.values() if record["status"] not in TERMINAL_STATES))
+
+    def track(self, thread_id: str, file_id: str, file_name: str | None = None) -> str:
+        """
+        Starts tracking the indexing of a file attached to a thread.
+
+        Args:
+            thread_id (str): The thread the file was attached to
+            file_id (str): The OpenAI file ID
+            file_name (str | None): The original file name, for display
+
+        Returns:
+            str: The tracking ID
+        """
+        now = time.time()
+        tracking_id = uuid.uuid4().hex
+        self._records[tracking_id] = {
+            "tracking_id": tracking_id, "thread_id": thread_id, "file_id": file_id, "file_name": file_name,
+            "status": "in_progress", "error": None, "vector_store_id": None, "created_at": now, "updated_at": now,
+            "_next_check": time.monotonic() + self.poll_interval, "_interval": self.poll_interval,
+            "_started": time.monotonic(),
+        }
+        self._notify()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return tracking_id
+
+    def move_thread(self, thread_id: str, new_thread_id: str):
+        """Tracks the attachments of a thread under the thread that replaced it."""
+        for record in self._records.values():
+            if record["thread_id"] == thread_id:
+                record["thread_id"] = new_thread_id
+        self._notify()
+
+    def get(self, tracking_id: str) -> dict | None:
+        """Returns the status record of a tracking ID, or None if it is unknown or expired."""
+        record = self._records.get(tracking_id)
+        return self._public(record) if record else None
+
+    def for_thread(self, thread_id: str) -> list[dict]:
+        """Returns the status records of every attachment tracked on a thread."""
+        return [self._public(record) for record in self._records.values() if record["thread_id"] == thread_id]
+
+    def pending(self, thread_id: str) -> list[dict]:
+        """Returns the status records of a thread's attachments that are still indexing."""
+        return [record for record in self.for_thread(thread_id) if record["status"] not in TERMINAL_STATES]
+
+    async def wait_for_thread(self, thread_id: str, timeout: float) -> list[dict]:
+        """
+        Waits until every attachment of a thread has finished indexing, or the timeout passes.
+
+        Args:
+            thread_id (str): The thread about to be asked a question
+            timeout (float): The most seconds to wait
+
+        Returns:
+            list[dict]: The attachments still indexing when the wait ended (empty if all finished)
+        """
+        if not self.pending(thread_id):
+            return []
+        start = time.monotonic()
+        deadline = start + timeout
+        waiter = self._add_waiter()
+        pending = self.pending(thread_id)
+        try:
+            while pending and (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+                waiter[1].clear()
+                pending = self.pending(thread_id)
+        finally:
+            self._waiters.discard(waiter)
+        INDEXING_WAIT.observe(time.monotonic() - start)
+        if pending:
+            INDEXING_WAIT_TIMEOUTS.inc()
+            logging.warning(f"Thread {thread_id} still has {len(pending)} attachment(s) indexing after {timeout}s")
+        return pending
+
+    async def events(self, thread_id: str | None = None, tracking_id: str | None = None) -> AsyncIterator[dict]:
+        """
+        Yields the status record of matching attachments whenever it changes, until all of them have finished.
+
+        Args:
+            thread_id (str | None): Follow every attachment of this thread
+            tracking_id (str | None): Follow this attachment only
+
+        Returns:
+            AsyncIterator[dict]: Status records, each yielded once per change
+        """
+        def matching() -> list[dict]:
+            if tracking_id is not None:
+                record = self.get(tracking_id)
+                return [record] if record else []
+            return self.for_thread(thread_id)
+
+        sent = {}
+        waiter = self._add_waiter()
+        try:
+            while True:
+                waiter[1].clear()
+                records = matching()
+                for record in records:
+                    if sent.get(record["tracking_id"]) != record["updated_at"]:
+                        sent[record["tracking_id"]] = record["updated_at"]
+                        yield record
+                if all(record["status"] in TERMINAL_STATES for record in records):
+                    return
+                await waiter[1].wait()
+        finally:
+            self._waiters.discard(waiter)
+
+    def _add_waiter(self) -> tuple:
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        self._waiters.add(waiter)
+        return waiter
+
+    def _finish(self, record: dict, status: str, error: str | None):
+        record["status"] = status
+        record["error"] = error
+        record["updated_at"] = time.time()
+        INDEXING_LATENCY.observe(time.monotonic() - record["_started"], status=status)
+        logging.info(f"Attachment {record['file_id']} on thread {record['thread_id']} finished indexing: {status}")
+
+    async def _check(self, record: dict):
+        try:
+            status, error, vector_store_id = await asyncio.to_thread(
+                self.check_status, record["thread_id"], record["file_id"], record["vector_store_id"]
+            )
+        except Exception as e:
+            logging.warning(f"Failed to check indexing of {record['file_id']}: {e}")
+            status, error, vector_store_id = "in_progress", None, record["vector_store_id"]
+        record["vector_store_id"] = vector_store_id
+
+        if status in TERMINAL_STATES:
+            self._finish(record, status, error)
+        elif time.monotonic() - record["_started"] > self.max_indexing_seconds:
+            self._finish(record, "failed", f"Indexing did not finish within {self.max_indexing_seconds:.0f}s")
+        else:
+            record["_interval"] = min(record["_interval"] * 1.5, self.max_poll_interval)
+            record["_next_check"] = time.monotonic() + record["_interval"]
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for tracking_id in [tracking_id for tracking_id, record in self._records.items()
+                            if record["status"] in TERMINAL_STATES and record["updated_at"] < cutoff]:
+            del self._records[tracking_id]
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            due = [record for record in self._records.values()
+                   if record["status"] not in TERMINAL_STATES and record["_next_check"] <= now]
+            if due:
+                await asyncio.gather(*(self._check(record) for record in due))
+                self._notify()
+                self._prune()
+
+            # Sleep until the next check is due, or until a new attachment is tracked
+            next_checks = [record["_next_check"] for record in self._records.values()
+                           if record["status"] not in TERMINAL_STATES]
+            timeout = max(min(next_checks) - time.monotonic(), 0) if next_checks else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Starts the background polling task on the running event loop."""
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        """Stops the background polling task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._loop = None
@@ -3,34 +3,83 @@ This module provides an API for interacting with a per-user assistant, allowing
 
 Functions:
 - attach_file(payload: AttachFileRequest) -> dict[str, str]: Attaches an OpenAI file object to a thread for a specific user.
-- upload(file: UploadFile = File(...), user_id: str = Form(...)) -> dict[str, str]: Uploads a file to OpenAI for a specific user's assistant and returns the file ID.
+- upload(file: UploadFile = File(...), user_id: str | None = Form(None)) -> dict[str, str]: Uploads a file to OpenAI for a specific user's assistant and returns the file ID.
 - set_model(payload: ModelSelectRequest) -> dict[str, str]: Sets the active assistant model for a specific user.
 - create_thread(payload: CreateThreadRequest) -> dict[str, str]: Creates a new conversation thread for a specific user.
-- ask_question(payload: QuestionRequest) -> dict[str, str | list[str]]: Sends a question to the assistant for a specific user and retrieves the response and cited files.
-- delete_thread(payload: DeleteThreadRequest) -> dict[str, str]: Deletes a specific user's active conversation thread.
-- get_active_model(user_id: str) -> dict[str, str]: Retrieves the currently active model type for a specific user.
+- ask_question(payload: QuestionRequest, background_tasks: BackgroundTasks) -> dict[str, str | list[str] | bool]: Sends a question to the assistant for a specific user and retrieves the response and cited files, compacting long threads afterwards.
+- compact_thread(assistant: AssistantAPI | ModelRouter, thread_id: str) -> None: Summarizes a long thread into a fresh one while holding the thread in the thread queue.
+- answer_question(user_id: str, requested_thread_id: str | None, question: str, request: ChatRequest | None, endpoint: str) -> tuple[dict, AssistantAPI | ModelRouter]: Answers a question for `ask_question` and the chat channel.
+- ask_batch(payload: BatchQuestionRequest) -> StreamingResponse: Answers a batch of questions with bounded concurrency and streams the results as NDJSON.
+- chat_socket(websocket: WebSocket) -> None: Serves the WebSocket chat channel, which multiplexes thread creation, questions, attachments and cancellation.
+- delete_thread(payload: DeleteThreadRequest) -> dict[str, str]: Deletes a specific user's conversation thread.
+- thread_history(request: Request, response: Response, thread_id: str, before: str, limit: int) -> dict: Returns a page of a thread's messages from the history cache, or 304 if the client's copy is current.
+- get_active_model(user_id: str | None) -> dict[str, str | None]: Retrieves the currently active model type for a specific user, and the last route in "auto" mode.
 - get_okta_config(request: Request) -> dict[str, str]: Returns Okta configuration details required by the frontend for authentication setup.
+- indexing_status(tracking_id: str, thread_id: str) -> dict: Returns the indexing status of an attachment or of a thread's attachments.
+- indexing_events(tracking_id: str, thread_id: str) -> StreamingResponse: Streams indexing status changes as Server-Sent Events.
+- ready() -> dict: Reports whether startup warm-up has finished, with the startup timings.
+- authenticated_user(request: Request) -> str | None: Dependency verifying the request's Okta bearer token and returning the user ID from its claims.
+- require_thread_owner(verified_user_id: str | None, thread_id: str | None) -> None: Rejects requests on threads created for another user with 404.
+- usage_report(request: Request, by: str, since_hours: float | None, top_threads: int) -> dict: Aggregates the usage ledger into per-user, per-model or per-thread percentiles.
+- metrics() -> Response: Exposes request and assistant pipeline metrics in the Prometheus text format.
+- profile_worker(request: Request, seconds: float, interval_ms: float) -> Response: Samples this worker's stacks for N seconds and returns folded stacks.
 
 Usage:
+- When `REACT_APP_OKTA_ISSUER` is set, send the Okta ID or access token as `Authorization: Bearer <token>`; the user is
+  then taken from the token and any `user_id` in the request is ignored.
 - Use `upload` to upload a file to OpenAI for a user.
 - Use `attach_file` to attach an uploaded file to a user's thread.
-- Use `set_model` to set or switch the assistant model for a user.
+- Use `set_model` to set or switch the assistant model for a user ("auto" routes each question by its complexity).
 - Use `create_thread` to start a new conversation thread for a user.
-- Use `ask_question` to send a question and get a response from a user's assistant.
+- Use `ask_question` to send a question and get a response from a user's assistant. With `SEMANTIC_CACHE` on, the
+  opening question of a conversation is answered from earlier answers to the same question, however it is phrased.
+- Use `ask_batch` to run an evaluation set of questions in one request.
+- Use `chat_socket` (`/ws/chat`) to keep one authenticated connection per chat session, with answers streamed as
+  they are generated, indexing progress pushed, and running questions cancellable.
 - Use `delete_thread` to remove a user's active conversation thread.
+- Use `thread_history` to restore a conversation after a reload, newest page first, revalidating with `If-None-Match`.
 - Use `get_active_model` to synchronize frontend display with the backend's stored model for a user.
 - Use `get_okta_config` to retrieve Okta authentication configuration for initializing the frontend login flow.
+- Use `indexing_status` or `indexing_events` to follow the indexing of attached files.
+- Use `ready` as the readiness probe; it answers 503 until the OpenAI connections and citation names are warm.
+- Use `metrics` as the Prometheus scrape target.
+- Use `usage_report` (with the `X-Usage-Token` header) to see which users, models and threads drive token use and latency.
+- Use `profile_worker` (with the `X-Profiler-Token` header) to capture a flamegraph-ready profile under live traffic.
 """
 
-from fastapi import FastAPI, HTTPException, Request, File, UploadFile, Form
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response, File, UploadFile, Form, BackgroundTasks, Depends, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 import logging
-from assistant_api import AssistantAPI
+import time
+import asyncio
+import secrets
+import json
+import jwt
+from assistant_api import AssistantAPI, ATTACHMENT_MESSAGE, load_citation_names
+from thread_pool import ThreadPool
+from thread_context import ThreadContextManager
+from model_router import ModelRouter
+from batch import run_batch
+from indexing import IndexingTracker
+from thread_history import ThreadHistoryCache, exchange_messages
+from auth import OktaVerifier, user_id_from_claims
+from semantic_cache import SemanticAnswerCache, OpenAIEmbedder
+from usage_ledger import UsageLedger, current_user, read_usage, summarize
+from thread_queue import ThreadQueue, ThreadBusyError, RedisLockBackend
+from hedging import Hedger
+from chat_socket import ChatConnection, ChatRequest, RequestCancelled
+import metrics as app_metrics
+import profiler
+import tracing
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
 
+IMPORT_STARTED_AT = time.perf_counter()
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -41,8 +90,41 @@ logging.basicConfig(
     handlers=[logging.FileHandler("server.log"), logging.StreamHandler()],
 )
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Runs the startup and shutdown of the app.
+
+    The app accepts requests at once, but `/ready` reports 503 until the warm-up has opened the OpenAI
+    connections and preloaded the citation names (or immediately, if `STARTUP_WARMUP` is off).
+    """
+    app.state.ready = False
+    app.state.startup = {"import_seconds": round(IMPORT_FINISHED_AT - IMPORT_STARTED_AT, 4)}
+    if STARTUP_WARMUP:
+        warmup_task = asyncio.create_task(warm_up())
+    else:
+        warmup_task = None
+        app.state.thread_pool.start()
+        mark_ready()
+    app.state.indexing.start()
+    if app.state.auth is not None:
+        app.state.auth.start()
+    yield
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    await app.state.indexing.stop()
+    if app.state.auth is not None:
+        await app.state.auth.stop()
+    await app.state.thread_pool.stop()
+    if app.state.faq_cache is not None:
+        await asyncio.to_thread(app.state.faq_cache.save)
+    if thread_context.ledger is not None:
+        thread_context.ledger.close()
+    if app.state.hedger is not None:
+        app.state.hedger.shutdown()
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Load environment variables
 API_KEY = os.getenv("API_KEY")
@@ -50,7 +132,54 @@ ASSISTANT_ID_4O = os.getenv("ASSISTANT_ID_4O")
 ASSISTANT_ID_4O_MINI = os.getenv("ASSISTANT_ID_4O_MINI")
 OKTA_CLIENT_ID = os.getenv("REACT_APP_OKTA_CLIENT")
 OKTA_ISSUER = os.getenv("REACT_APP_OKTA_ISSUER")
+OKTA_AUDIENCE = os.getenv("OKTA_AUDIENCE", "api://default")
+# Verify Okta tokens whenever an issuer is configured, unless explicitly turned off (e.g. for local load tests)
+AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "true" if OKTA_ISSUER else "false").lower() not in ("0", "false", "no")
+AUTH_TOKEN_TTL = float(os.getenv("AUTH_TOKEN_TTL", "60"))
 ORIGIN = os.getenv("ORIGIN")
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN")
+THREAD_QUEUE_REDIS_URL = os.getenv("THREAD_QUEUE_REDIS_URL")
+THREAD_QUEUE_MAX_WAIT = float(os.getenv("THREAD_QUEUE_MAX_WAIT", "120"))
+THREAD_QUEUE_MERGE = os.getenv("THREAD_QUEUE_MERGE", "false").lower() in ("1", "true", "yes")
+THREAD_BUSY_RETRY_AFTER = 5
+USAGE_LEDGER_PATH = os.getenv("USAGE_LEDGER_PATH")
+USAGE_REPORT_TOKEN = os.getenv("USAGE_REPORT_TOKEN")
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", "5"))
+THREAD_POOL_MAX_AGE = float(os.getenv("THREAD_POOL_MAX_AGE", "3600"))
+THREAD_TRUNCATION_LAST_MESSAGES = os.getenv("THREAD_TRUNCATION_LAST_MESSAGES")
+THREAD_MAX_PROMPT_TOKENS = os.getenv("THREAD_MAX_PROMPT_TOKENS")
+THREAD_COMPACTION_TOKENS = os.getenv("THREAD_COMPACTION_TOKENS")
+INDEXING_WAIT_SECONDS = float(os.getenv("INDEXING_WAIT_SECONDS", "30"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "1000"))
+HISTORY_CACHE_THREADS = int(os.getenv("HISTORY_CACHE_THREADS", "1000"))
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+HISTORY_MAX_PAGE_SIZE = 200
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "false").lower() not in ("0", "false", "no")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "5000"))
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# Also ask slow questions of the other assistant past a percentile of the chosen one's answer times, within a budget
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "false").lower() not in ("0", "false", "no")
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.05"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "2"))
+HEDGE_CONTEXT_MESSAGES = int(os.getenv("HEDGE_CONTEXT_MESSAGES", "10"))
+CHAT_SOCKET_AUTH_TIMEOUT = float(os.getenv("CHAT_SOCKET_AUTH_TIMEOUT", "10"))
+CHAT_SOCKET_MAX_IN_FLIGHT = int(os.getenv("CHAT_SOCKET_MAX_IN_FLIGHT", "8"))
+CHAT_SOCKET_MAX_QUEUED = int(os.getenv("CHAT_SOCKET_MAX_QUEUED", "64"))
+CHAT_SOCKET_SEND_TIMEOUT = float(os.getenv("CHAT_SOCKET_SEND_TIMEOUT", "30"))
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() not in ("0", "false", "no")
+FILE_SETUP_INFO = os.getenv(
+    "FILE_SETUP_INFO", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "setup", "file_setup_info.json")
+)
+MAX_PROFILE_SECONDS = 60
+
+STARTUP_SECONDS = app_metrics.REGISTRY.gauge("app_startup_seconds", "Seconds spent in each startup phase.", ("phase",))
+
+# Record request traces when TRACE_EXPORT is set
+tracing.configure_tracing()
 
 # CORS Middleware
 app.add_middleware(
@@ -61,36 +190,231 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize the Assistant API
-assistant_api_4o = AssistantAPI(API_KEY, ASSISTANT_ID_4O)
-assistant_api_4o_mini = AssistantAPI(API_KEY, ASSISTANT_ID_4O_MINI)
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Records the latency, in-flight count and errors of every HTTP request, and opens the root trace span
+    that the assistant, OpenAI and Box spans of the request are nested under.
 
-# Maps user_id -> AssistantAPI instance
+    The endpoint label uses the matched route template so unknown paths cannot blow up the label set.
+    """
+    start = time.perf_counter()
+    app_metrics.REQUESTS_IN_FLIGHT.inc()
+    status = 500
+    parent = tracing.parse_traceparent(request.headers.get("traceparent"))
+    with tracing.span(f"{request.method} {request.url.path}", parent=parent) as root_span:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            if root_span is not None:
+                root_span.set_attribute("http.status_code", status)
+                response.headers["X-Trace-Id"] = root_span.trace_id
+            return response
+        except Exception as e:
+            app_metrics.REQUEST_ERRORS.inc(endpoint=_endpoint_label(request), error_type=type(e).__name__)
+            raise
+        finally:
+            app_metrics.REQUESTS_IN_FLIGHT.dec()
+            app_metrics.REQUEST_LATENCY.observe(
+                time.perf_counter() - start, method=request.method, endpoint=_endpoint_label(request), status=str(status)
+            )
+
+def _endpoint_label(request: Request) -> str:
+    """Returns the route template the request matched, normalized without a trailing slash."""
+    route = request.scope.get("route")
+    if route is None:
+        return "unmatched"
+    return route.path.rstrip("/") or "/"
+
+# Truncation and compaction settings shared by both assistants, so compacted threads redirect for either model
+thread_context = ThreadContextManager(
+    last_messages=int(THREAD_TRUNCATION_LAST_MESSAGES) if THREAD_TRUNCATION_LAST_MESSAGES else None,
+    max_prompt_tokens=int(THREAD_MAX_PROMPT_TOKENS) if THREAD_MAX_PROMPT_TOKENS else None,
+    compaction_threshold=int(THREAD_COMPACTION_TOKENS) if THREAD_COMPACTION_TOKENS else None,
+    # Every run's usage, appended to a local JSON lines file when USAGE_LEDGER_PATH is set
+    ledger=UsageLedger(USAGE_LEDGER_PATH) if USAGE_LEDGER_PATH else None,
+)
+
+# Cited file ID -> file name, shared by both assistants and preloaded during warm-up
+citation_names = {}
+
+# Initialize the Assistant API (the OpenAI clients are created on first use or during warm-up)
+assistant_api_4o = AssistantAPI(API_KEY, ASSISTANT_ID_4O, context=thread_context, file_names=citation_names)
+assistant_api_4o_mini = AssistantAPI(API_KEY, ASSISTANT_ID_4O_MINI, context=thread_context, file_names=citation_names)
+
+# Routes the questions of users in "auto" mode between the two assistants
+model_router = ModelRouter(assistant_api_4o_mini, assistant_api_4o)
+
+# Maps user_id -> AssistantAPI instance, or the model router for users in "auto" mode
 app.state.user_assistants = {}
 
+# Maps user_id -> the route that answered the last question of a user in "auto" mode
+app.state.auto_routes = {}
+
+# Maps thread_id -> the user_id the thread was created for; compacted threads inherit the owner
+app.state.thread_owners = {}
+
+# Pre-created threads handed out by /create-thread; threads are not tied to an assistant, so one pool serves both
+app.state.thread_pool = ThreadPool(
+    assistant_api_4o.create_thread,
+    assistant_api_4o.delete_thread,
+    low_water_mark=THREAD_POOL_SIZE,
+    max_age=THREAD_POOL_MAX_AGE,
+)
+
+# Indexing status of files attached to threads; questions wait for their own thread's attachments
+app.state.indexing = IndexingTracker(assistant_api_4o.indexing_status)
+
+# Serializes the questions and attachments of each thread; a Redis lock extends this across workers
+app.state.thread_queue = ThreadQueue(
+    RedisLockBackend.from_url(THREAD_QUEUE_REDIS_URL) if THREAD_QUEUE_REDIS_URL else None,
+    merge=THREAD_QUEUE_MERGE, max_wait=THREAD_QUEUE_MAX_WAIT,
+)
+
+# Verifies the Okta token of every user request; None when auth is off and requests name their user themselves
+app.state.auth = OktaVerifier(
+    OKTA_ISSUER, [audience for audience in (OKTA_CLIENT_ID, OKTA_AUDIENCE) if audience], token_ttl=AUTH_TOKEN_TTL
+) if AUTH_REQUIRED else None
+
+# Compact message history of recent threads, read from OpenAI once and kept current after each question
+app.state.history = ThreadHistoryCache(assistant_api_4o.list_messages, max_threads=HISTORY_CACHE_THREADS)
+
+# Answers to opening questions, matched by meaning; None when the semantic cache is off
+app.state.faq_cache = SemanticAnswerCache(
+    OpenAIEmbedder(lambda: assistant_api_4o.client, EMBEDDING_MODEL), threshold=SEMANTIC_CACHE_THRESHOLD,
+    max_entries=SEMANTIC_CACHE_SIZE, path=SEMANTIC_CACHE_PATH,
+) if SEMANTIC_CACHE else None
+
+# Hedges questions on 4o or 4o-mini that run past their deadline on the other assistant; None when hedging is off
+app.state.hedger = Hedger(
+    percentile=HEDGE_PERCENTILE, budget=HEDGE_BUDGET, min_delay=HEDGE_MIN_DELAY
+) if HEDGE_REQUESTS else None
+
+def mark_ready():
+    """Records how long the app took to become ready and starts reporting ready."""
+    app.state.startup["ready_seconds"] = round(time.perf_counter() - IMPORT_STARTED_AT, 4)
+    for phase, seconds in app.state.startup.items():
+        if phase.endswith("_seconds"):
+            STARTUP_SECONDS.set(seconds, phase=phase[:-len("_seconds")])
+    app.state.ready = True
+    logging.info(f"Ready: {app.state.startup}")
+
+async def warm_up():
+    """
+    Creates both OpenAI clients in parallel and opens a pooled connection for each, preloads the citation
+    names from `file_setup_info.json` and the Okta signing keys, then starts the thread pool and reports ready.
+
+    A failing step is logged and reported by `/ready`, but does not keep the app from serving: every
+    step is repeated lazily by the first request that needs it.
+    """
+    start = time.perf_counter()
+    errors = {}
+    steps = {
+        "citation_names": asyncio.to_thread(load_citation_names, FILE_SETUP_INFO),
+        "assistant_4o": asyncio.to_thread(assistant_api_4o.warm_up),
+        "assistant_4o_mini": asyncio.to_thread(assistant_api_4o_mini.warm_up),
+    }
+    if app.state.auth is not None:
+        steps["okta_jwks"] = asyncio.to_thread(app.state.auth.refresh)
+    results = await asyncio.gather(*steps.values(), return_exceptions=True)
+    for step, result in zip(steps, results):
+        if isinstance(result, Exception):
+            logging.warning(f"Warm-up step {step} failed: {result}")
+            errors[step] = str(result)
+    if not isinstance(results[0], Exception):
+        citation_names.update(results[0])
+
+    app.state.thread_pool.start()
+    app.state.startup.update({
+        "warmup_seconds": round(time.perf_counter() - start, 4),
+        "citation_names": len(citation_names),
+        "warmup_errors": errors,
+    })
+    mark_ready()
+
+async def authenticated_user(request: Request) -> str | None:
+    """
+    Verifies the request's `Authorization: Bearer` Okta token and returns the user ID from its claims.
+
+    Tokens seen within the last `AUTH_TOKEN_TTL` seconds are served from the verifier's cache; others are
+    verified off the event loop, since a key rotation makes the verifier fetch the JWKS.
+
+    Returns:
+        str | None: The verified user ID, or None when auth is off
+
+    Raises:
+        HTTPException: The token is missing or invalid (401), or the signing keys cannot be fetched (503).
+    """
+    verifier = app.state.auth
+    if verifier is None:
+        return None
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Missing bearer token.", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        claims = verifier.cached(token) or await asyncio.to_thread(verifier.verify, token)
+        return user_id_from_claims(claims)
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token.", headers={"WWW-Authenticate": "Bearer"})
+    except Exception as e:
+        logging.error(f"Token verification unavailable: {e}")
+        raise HTTPException(status_code=503, detail="Cannot verify tokens right now.")
+
+def resolve_user_id(verified_user_id: str | None, claimed_user_id: str | None) -> str:
+    """
+    Returns the verified user ID when auth is on, and the user ID named by the request otherwise.
+
+    The user is also remembered for the rest of the request, so the runs it causes are attributed in the usage ledger.
+
+    Raises:
+        HTTPException: Auth is off and the request names no user (400).
+    """
+    if verified_user_id is None and not claimed_user_id:
+        raise HTTPException(status_code=400, detail="Missing user_id.")
+    user_id = verified_user_id if verified_user_id is not None else claimed_user_id
+    current_user.set(user_id)
+    return user_id
+
+def require_thread_owner(verified_user_id: str | None, thread_id: str | None):
+    """
+    Hides threads of other users: with auth on, a thread created for another user is reported as not found.
+
+    Both the thread ID the request names and the thread it continues in after a compaction are checked. Threads
+    whose owner is unknown (created before this process started) stay usable by any verified user.
+
+    Raises:
+        HTTPException: The thread belongs to another user (404).
+    """
+    if verified_user_id is None or not thread_id:
+        return
+    for thread_id in (thread_id, thread_context.resolve(thread_id)):
+        owner = app.state.thread_owners.get(thread_id)
+        if owner is not None and owner != verified_user_id:
+            raise HTTPException(status_code=404, detail="Thread not found.")
+
 class QuestionRequest(BaseModel):
     """
     Request model for asking a question to the assistant.
     
     Attributes:
-        thread_id (str): The ID of the thread where the question is asked.
+        thread_id (str | None): The ID of the thread where the question is asked, or None to start a new conversation.
         question (str): The question to be sent to the assistant.
-        user_id (str): The ID of the user (their email)
+        user_id (str | None): The ID of the user (their email); taken from the verified token when auth is on
     """
-    thread_id: str
+    thread_id: str | None = None
     question: str
-    user_id: str
+    user_id: str | None = None
 
 class ModelSelectRequest(BaseModel):
     """
     Request model for changing the active assistant
 
     Attributes:
-        model_type (str): The string identifier for the model type.
-        user_id (str): The ID of the user (their email)
+        model_type (str): The string identifier for the model type ("4o", "4o-mini" or "auto").
+        user_id (str | None): The ID of the user (their email); taken from the verified token when auth is on
     """
     model_type: str
-    user_id: str
+    user_id: str | None = None
 
 class AttachFileRequest(BaseModel):
     """
@@ -99,25 +423,55 @@ class AttachFileRequest(BaseModel):
     Attributes:
         thread_id (str): The ID of the thread to attach the file to.
         file_id (str): The ID of the file object to attach
-        user_id (str): The ID of the user (their email)
+        user_id (str | None): The ID of the user (their email); taken from the verified token when auth is on
     """
     thread_id: str
     file_id: str
-    user_id: str
+    user_id: str | None = None
+
+class DeleteThreadRequest(BaseModel):
+    """
+    Request model for deleting a thread
+
+    Attributes:
+        thread_id (str): The ID of the thread to delete.
+        user_id (str | None): The ID of the user (their email); taken from the verified token when auth is on
+    """
+    thread_id: str
+    user_id: str | None = None
+
+class BatchQuestionRequest(BaseModel):
+    """
+    Request model for asking a batch of questions
+
+    Attributes:
+        questions (list[str]): The questions to ask, identified in the results by their index.
+        user_id (str | None): The ID of the user (their email); taken from the verified token when auth is on
+        shared_thread (bool): Whether all questions are asked in one thread, one after another.
+        thread_id (str | None): The shared thread to ask in, or None to start one with the first question.
+        concurrency (int | None): The most questions in flight at once (capped by `BATCH_MAX_CONCURRENCY`).
+        keep_threads (bool): Whether to keep the thread of each question when they are not shared.
+    """
+    questions: list[str]
+    user_id: str | None = None
+    shared_thread: bool = False
+    thread_id: str | None = None
+    concurrency: int | None = None
+    keep_threads: bool = False
 
 class CreateThreadRequest(BaseModel):
     """
     Request model for creating a thread
 
     Attributes:
-        user_id (str): The ID of the user (their email)
+        user_id (str | None): The ID of the user (their email); taken from the verified token when auth is on
     """
-    user_id: str
+    user_id: str | None = None
 
 
 @app.post("/attach-file")
 @app.post("/attach-file/")
-async def attach_file(payload: AttachFileRequest) -> dict[str, str]:
+async def attach_file(payload: AttachFileRequest, user: str | None = Depends(authenticated_user)) -> dict[str, str]:
     """
     Attaches an uploaded file to an existing thread as a user message.
 
@@ -125,28 +479,50 @@ async def attach_file(payload: AttachFileRequest) -> dict[str, str]:
     and creates a new message within that thread that includes the file. 
     This makes the file accessible to the assistant in future runs.
 
+    The response returns as soon as the file is attached; OpenAI indexes it afterwards. The returned
+    tracking ID can be followed with `/indexing-status` or `/indexing-events`, and the next question
+    on the thread waits for the indexing to finish.
+
     Args:
         payload (AttachFileRequest): An object containing `thread_id`, `file_id`, and `user_id`.
+        user (str | None): The user ID of the verified token.
 
     Returns:
-        dict[str, str]: A dictionary indicating success.
+        dict[str, str]: A dictionary indicating success and the indexing tracking ID.
 
     Raises:
         HTTPException: If the attachment fails due to invalid thread or file.
+        HTTPException: The thread belongs to another user (404).
+        HTTPException: The thread stayed busy with another request for `THREAD_QUEUE_MAX_WAIT` seconds (409).
     """
+    user_id = resolve_user_id(user, payload.user_id)
+    require_thread_owner(user, payload.thread_id)
     try:
-        assistant = app.state.user_assistants.get(payload.user_id, assistant_api_4o)
-        return assistant.attach_file_to_thread(
-            thread_id=payload.thread_id,
-            file_id=payload.file_id
+        assistant = app.state.user_assistants.get(user_id, assistant_api_4o)
+        thread_id = thread_context.resolve(payload.thread_id)
+        # Adding the attachment message fails while a run is active, so it queues like a question
+        result = await app.state.thread_queue.run(
+            thread_id, lambda: assistant.attach_file_to_thread(thread_id=thread_id, file_id=payload.file_id),
+            merge_key=f"attach:{payload.file_id}",
         )
+        tracking_id = app.state.indexing.track(thread_id, payload.file_id)
+        app.state.history.append(thread_id, [{
+            "role": "user", "content": ATTACHMENT_MESSAGE, "created_at": int(time.time()),
+            "attachments": [payload.file_id],
+        }], previous=(payload.thread_id,))
+        return {**result, "tracking_id": tracking_id}
+    except ThreadBusyError as e:
+        app_metrics.REQUEST_ERRORS.inc(endpoint="/attach-file", error_type=type(e).__name__)
+        raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": str(THREAD_BUSY_RETRY_AFTER)})
     except Exception as e:
         logging.error(f"Attach failed: {e}")
+        app_metrics.REQUEST_ERRORS.inc(endpoint="/attach-file", error_type=type(e).__name__)
         raise HTTPException(status_code=500, detail="Failed to attach file.")
     
 @app.post("/upload")
 @app.post("/upload/")
-async def upload(file: UploadFile = File(...), user_id: str = Form(...)) -> dict[str, str]:
+async def upload(file: UploadFile = File(...), user_id: str | None = Form(None),
+                 user: str | None = Depends(authenticated_user)) -> dict[str, str]:
     """
     Uploads a file to OpenAI and returns its unique file ID.
 
@@ -156,7 +532,8 @@ async def upload(file: UploadFile = File(...), user_id: str = Form(...)) -> dict
 
     Args:
         file (UploadFile): The file uploaded by the client.
-        user_id (str): The ID of the user
+        user_id (str | None): The ID of the user (ignored when auth is on)
+        user (str | None): The user ID of the verified token
 
     Returns:
         dict[str, str]: A dictionary containing the generated file ID.
@@ -164,22 +541,28 @@ async def upload(file: UploadFile = File(...), user_id: str = Form(...)) -> dict
     Raises:
         HTTPException: If the file upload fails.
     """
+    user_id = resolve_user_id(user, user_id)
     try:
         assistant = app.state.user_assistants.get(user_id, assistant_api_4o)
-        file_id = assistant.upload_file(file)
+        # Copying the upload and sending it to OpenAI block, so they run off the event loop
+        file_id = await asyncio.to_thread(assistant.upload_file, file)
         return {"file_id": file_id}
     except Exception as e:
         logging.error(f"Upload failed: {e}")
+        app_metrics.REQUEST_ERRORS.inc(endpoint="/upload", error_type=type(e).__name__)
         raise HTTPException(status_code=500, detail="File upload failed.")
 
 @app.post("/set-model")
 @app.post("/set-model/")
-async def set_model(payload: ModelSelectRequest) -> dict[str, str]:
+async def set_model(payload: ModelSelectRequest, user: str | None = Depends(authenticated_user)) -> dict[str, str]:
     """
     Changes the active assistant based on the model type
 
+    With "auto", each question is routed to 4o-mini or 4o depending on how complex it is.
+
     Args:
         payload (ModelSelectRequest): The request payload containing the model identifier and user ID.
+        user (str | None): The user ID of the verified token.
 
     Returns:
         dict[str, str]: A dictionary containing a success message and the active model type
@@ -187,27 +570,34 @@ async def set_model(payload: ModelSelectRequest) -> dict[str, str]:
     Raises:
         HTTPException
     """
+    user_id = resolve_user_id(user, payload.user_id)
     if payload.model_type == "4o":
         assistant = assistant_api_4o
     elif payload.model_type == "4o-mini":
         assistant = assistant_api_4o_mini
+    elif payload.model_type == "auto":
+        assistant = model_router
     else:
         logging.error(f"Unknown model type: {payload.model_type}")
         raise HTTPException(status_code=400, detail="Invalid model type")
 
-    app.state.user_assistants[payload.user_id] = assistant
+    app.state.user_assistants[user_id] = assistant
 
-    logging.info(f"Set model '{payload.model_type}' for user '{payload.user_id}'")
+    logging.info(f"Set model '{payload.model_type}' for user '{user_id}'")
     return {"status": "successfully changed the model", "active_model": payload.model_type}
 
 @app.post("/create-thread")
 @app.post("/create-thread/")
-async def create_thread(payload: CreateThreadRequest) -> dict[str, str]:
+async def create_thread(payload: CreateThreadRequest, user: str | None = Depends(authenticated_user)) -> dict[str, str]:
     """
     Creates a new thread for conversation.
 
+    A pre-created thread is handed out from the warm pool when one is available; otherwise the thread
+    is created on demand.
+
     Args:
         payload (CreateThreadRequest): The request payload containing the user ID.
+        user (str | None): The user ID of the verified token.
 
     Returns:
         dict[str, str]: A dictionary containing the message (str) and the created thread ID (str).
@@ -215,62 +605,445 @@ async def create_thread(payload: CreateThreadRequest) -> dict[str, str]:
     Raises:
         HTTPException: Failed to create the thread.
     """
+    user_id = resolve_user_id(user, payload.user_id)
     try:
-        assistant = app.state.user_assistants.get(payload.user_id, assistant_api_4o)
-        thread_id = assistant.create_thread()
+        thread_id = app.state.thread_pool.acquire()
+        if thread_id is None:
+            assistant = app.state.user_assistants.get(user_id, assistant_api_4o)
+            thread_id = await asyncio.to_thread(assistant.create_thread)
+        app.state.thread_owners[thread_id] = user_id
+        app.state.history.start(thread_id)
         return {"message": "Thread created successfully.", "thread_id": thread_id}
     except Exception as e:
         logging.error(f"Error creating thread: {e}")
+        app_metrics.REQUEST_ERRORS.inc(endpoint="/create-thread", error_type=type(e).__name__)
         raise HTTPException(status_code=500, detail="Failed to create thread.")
 
 @app.post("/ask-question")
 @app.post("/ask-question/")
-async def ask_question(payload: QuestionRequest) -> dict[str, str | list[str]]:
+async def ask_question(payload: QuestionRequest, background_tasks: BackgroundTasks,
+                       user: str | None = Depends(authenticated_user)) -> dict[str, str | list[str] | bool]:
     """
     Prompts the assistant with the user question and returns the generated response and cited files.
+
+    Without a thread ID, the thread is created together with the first run. If the thread has grown past
+    the compaction threshold, it is summarized into a fresh thread after the response is sent. The thread
+    ID in the response is the one the client should use from then on.
+
+    Questions on a thread that already has a run in progress wait for it instead of failing. With
+    `THREAD_QUEUE_MERGE` on, a question repeated while the same question is still queued or running (a
+    double-submit or a retry) gets that answer.
+
+    Files attached to the thread that are still being indexed are waited for, up to `INDEXING_WAIT_SECONDS`;
+    the tracking IDs of any that were still indexing when the question was asked are returned.
+
+    When the semantic cache is on and the question opens a conversation (no thread yet, or a thread with no
+    messages), a close enough earlier question answered by the same assistant and vector store is answered
+    from the cache: the question and the stored answer are written to the thread without running the assistant.
+
+    When hedging is on, a question to 4o or 4o-mini still running past that assistant's usual answer time is
+    also asked of the other one on a scratch thread; the first answer is returned and written to the thread.
     
     Args:
         payload (QuestionRequest): The request payload containing thread ID, question, and user ID.
+        background_tasks (BackgroundTasks): Used to compact the thread after responding.
+        user (str | None): The user ID of the verified token.
     
     Returns:
-        dict[str, str]: A dictionary containing the assistant's response (str) and citations (list[str]).
+        dict[str, str]: A dictionary containing the assistant's response (str), citations (list[str]), the live thread ID (str),
+            the attachments still indexing (list[str]) and whether the answer came from the semantic cache (bool).
     
     Raises:
         HTTPException: The thread ID is invalid.
+        HTTPException: The thread belongs to another user (404).
+        HTTPException: The thread stayed busy with another request for `THREAD_QUEUE_MAX_WAIT` seconds (409).
         HTTPException: Failed to process the question.
     """
+    user_id = resolve_user_id(user, payload.user_id)
+    require_thread_owner(user, payload.thread_id)
+    result, assistant = await answer_question(user_id, payload.thread_id, payload.question)
+    if thread_context.needs_compaction(result["thread_id"]):
+        background_tasks.add_task(compact_thread, assistant, result["thread_id"])
+    return result
+
+async def compact_thread(assistant: AssistantAPI | ModelRouter, thread_id: str):
+    """
+    Compacts a thread through the thread queue, so no question runs on the thread while it is summarized.
+
+    Questions queued behind the compaction are asked on the compact thread.
+
+    Args:
+        assistant (AssistantAPI | ModelRouter): The assistant that answered on the thread
+        thread_id (str): The thread to compact
+    """
+    try:
+        compact_thread_id = await app.state.thread_queue.run(thread_id, lambda: assistant.compact_thread(thread_id))
+        if compact_thread_id is not None:
+            if thread_id in app.state.thread_owners:
+                app.state.thread_owners[compact_thread_id] = app.state.thread_owners[thread_id]
+            # The compact thread searches the same vector store, so its attachments carry over
+            app.state.indexing.move_thread(thread_id, compact_thread_id)
+    except Exception as e:
+        # The thread stays as it is and is compacted after a later question
+        logging.warning(f"Compaction of thread {thread_id} did not run: {e}")
+
+async def answer_question(user_id: str, requested_thread_id: str | None, question: str,
+                          request: ChatRequest | None = None,
+                          endpoint: str = "/ask-question") -> tuple[dict, AssistantAPI | ModelRouter]:
+    """
+    Answers a question for `/ask-question` and for `ask` messages on the chat channel.
+
+    Args:
+        user_id (str): The user asking
+        requested_thread_id (str | None): The thread the client named, or None to start a new conversation
+        question (str): The question
+        request (ChatRequest | None): The chat channel request; its run is streamed to it and can be cancelled
+        endpoint (str): The endpoint label of error metrics
+
+    Returns:
+        tuple[dict, AssistantAPI | ModelRouter]: The response body, and the assistant that should compact the thread
+
+    Raises:
+        HTTPException: As documented for `/ask-question`.
+        RequestCancelled: The chat request was cancelled.
+    """
+    # Only a plain question streams its run; the semantic cache, auto mode and hedging answer in other ways
+    callbacks = {"on_run": request.on_run, "on_delta": request.on_delta} if request is not None else {}
     try:
-        user_id = payload.user_id 
         assistant = app.state.user_assistants.get(user_id, assistant_api_4o)
+        thread_id = thread_context.resolve(requested_thread_id) if requested_thread_id else None
+
+        # Answer against fully indexed attachments, but never stall the question indefinitely
+        indexing = await app.state.indexing.wait_for_thread(thread_id, INDEXING_WAIT_SECONDS) if thread_id else []
+
+        resolved_thread_id = asked_thread_id = thread_id
+
+        def answer() -> tuple[str, list[str], str, bool] | None:
+            if request is not None:
+                request.raise_if_cancelled()
+            if asked_thread_id is not None and thread_context.resolve(asked_thread_id) != asked_thread_id:
+                # Compacted while the question waited; it is asked again on the thread that continues the conversation
+                return None
+            # Follow-up questions depend on the conversation, so only opening questions use the semantic cache
+            faq_cache = app.state.faq_cache
+            cached, version, vector = None, None, None
+            if faq_cache is not None and (asked_thread_id is None or app.state.history.is_empty(asked_thread_id)):
+                try:
+                    version = assistant.cache_version()
+                    vector = faq_cache.embed_question(question)
+                    cached = faq_cache.lookup(question, version, vector)
+                except Exception as e:
+                    logging.warning(f"Semantic cache lookup failed, asking the assistant: {e}")
+                    version = None
 
-        response, citations = assistant.ask_question(payload.thread_id, payload.question)
+            if cached is not None:
+                response, citations = cached.response, cached.citations
+                thread_id = assistant.record_answer(asked_thread_id, question, response)
+            elif assistant is model_router:
+                response, citations, thread_id, route = model_router.ask_question(asked_thread_id, question)
+                app.state.auto_routes[user_id] = route
+            elif app.state.hedger is not None and (assistant is assistant_api_4o or assistant is assistant_api_4o_mini):
+                other = assistant_api_4o_mini if assistant is assistant_api_4o else assistant_api_4o
+                # The hedge sees the recent conversation if it is cached; otherwise the question is not hedged
+                context = app.state.history.recent(asked_thread_id, HEDGE_CONTEXT_MESSAGES) if asked_thread_id else []
+                # An answer added to the thread once the cancelled run ends keeps the thread held until then
+                response, citations, thread_id, _ = app.state.hedger.ask_question(
+                    assistant, other, asked_thread_id, question, context, on_deferred=app.state.thread_queue.keep_held
+                )
+            else:
+                response, citations, thread_id = assistant.ask_question(asked_thread_id, question, **callbacks)
+            if cached is None and version is not None and ModelRouter.is_good_answer(response, citations):
+                try:
+                    faq_cache.store(question, version, response, citations, vector)
+                except Exception as e:
+                    logging.warning(f"Failed to cache the answer: {e}")
+            app.state.history.append(
+                thread_id, exchange_messages(question, response, citations),
+                previous=(asked_thread_id, resolved_thread_id, requested_thread_id), new=asked_thread_id is None,
+            )
+            return response, citations, thread_id, cached is not None
+
+        if thread_id is None:
+            response, citations, thread_id, cached = await asyncio.to_thread(answer)
+            app.state.thread_owners[thread_id] = user_id
+            # Nobody else knows the new thread yet, so holding it now still comes before any other request on it
+            await app.state.thread_queue.hold_kept(thread_id)
+        else:
+            # Queue behind a run or compaction active on the thread; a double-submitted question shares its answer
+            while (answered := await app.state.thread_queue.run(thread_id, answer, merge_key=question)) is None:
+                thread_id = asked_thread_id = thread_context.resolve(thread_id)
+            response, citations, thread_id, cached = answered
         return {
             "response": response,
             "citations": citations,
-        }
+            "thread_id": thread_id,
+            "indexing_pending": [record["tracking_id"] for record in indexing],
+            "cached": cached,
+        }, assistant
+    except ThreadBusyError as e:
+        app_metrics.REQUEST_ERRORS.inc(endpoint=endpoint, error_type=type(e).__name__)
+        raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": str(THREAD_BUSY_RETRY_AFTER)})
+    except HTTPException as e:
+        app_metrics.REQUEST_ERRORS.inc(endpoint=endpoint, error_type=type(e).__name__)
+        raise
     except Exception as e:
+        # A cancelled run ends in an error; the client has already been told the request was cancelled
+        if request is not None and request.cancelled:
+            raise RequestCancelled(f"Request {request.id} was cancelled.") from e
         logging.error(f"Error processing question: {e}")
+        app_metrics.REQUEST_ERRORS.inc(endpoint=endpoint, error_type=type(e).__name__)
         raise HTTPException(status_code=500, detail="Failed to process question.")
 
-# NOT CURRENTLY USED
+@app.post("/ask-batch")
+@app.post("/ask-batch/")
+async def ask_batch(payload: BatchQuestionRequest, user: str | None = Depends(authenticated_user)) -> StreamingResponse:
+    """
+    Answers a batch of questions and streams one NDJSON line per question as soon as it is answered.
+
+    Each line holds the question's index, response, citations, thread ID, latency and attempts, or an
+    error. A final line `{"done": true, ...}` summarizes the batch. Questions in their own threads run
+    concurrently and their threads are deleted afterwards unless `keep_threads` is set; questions in a
+    shared thread run one after another.
+
+    Args:
+        payload (BatchQuestionRequest): The questions, the user ID and how to run them.
+        user (str | None): The user ID of the verified token.
+
+    Returns:
+        StreamingResponse: The `application/x-ndjson` results in completion order.
+
+    Raises:
+        HTTPException: The batch is empty or too large (400), or its thread belongs to another user (404).
+    """
+    if not payload.questions:
+        raise HTTPException(status_code=400, detail="The batch has no questions.")
+    if len(payload.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"A batch can have at most {BATCH_MAX_QUESTIONS} questions.")
+
+    user_id = resolve_user_id(user, payload.user_id)
+    require_thread_owner(user, payload.thread_id)
+    assistant = app.state.user_assistants.get(user_id, assistant_api_4o)
+    concurrency = min(max(payload.concurrency or BATCH_MAX_CONCURRENCY, 1), BATCH_MAX_CONCURRENCY)
+    thread_id = thread_context.resolve(payload.thread_id) if payload.thread_id else None
+
+    async def ask(thread_id: str | None, question: str) -> tuple[str, list[str], str]:
+        def answer() -> tuple[str, list[str], str]:
+            if assistant is model_router:
+                response, citations, answered_thread_id, _ = model_router.ask_question(thread_id, question)
+                return response, citations, answered_thread_id
+            return assistant.ask_question(thread_id, question)
+
+        if thread_id is None:
+            return await asyncio.to_thread(answer)
+        # A shared thread may also be in use by the user's own questions
+        return await app.state.thread_queue.run(thread_id, answer)
+
+    async def answer_again(thread_id: str) -> tuple[str, list[str], str]:
+        # A rate-limited run already added the question; in "auto" mode the retry goes to the strong route
+        again = model_router.primary if assistant is model_router else assistant
+        return await app.state.thread_queue.run(thread_id, lambda: again.answer_again(thread_id))
+
+    async def discard_thread(thread_id: str):
+        await asyncio.to_thread(assistant.delete_thread, thread_id)
+
+    async def results():
+        start = time.perf_counter()
+        answered = failed = 0
+        async for result in run_batch(
+            ask, payload.questions, concurrency=concurrency, thread_id=thread_id,
+            shared_thread=payload.shared_thread,
+            discard_thread=None if payload.shared_thread or payload.keep_threads else discard_thread,
+            answer_again=answer_again,
+        ):
+            if "error" in result:
+                failed += 1
+            else:
+                answered += 1
+            yield json.dumps(result) + "\n"
+        logging.info(f"Batch of {len(payload.questions)} questions for {user_id}: {answered} answered, {failed} failed")
+        yield json.dumps({
+            "done": True, "answered": answered, "failed": failed,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        }) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket):
+    """
+    Serves the WebSocket chat channel, authenticated once for the whole connection.
+
+    The first message authenticates: `{"token": "<Okta token>"}` when auth is on, `{"user_id": "..."}` otherwise.
+    The server answers `{"type": "ready", "user_id": ...}`, or closes the connection with code 4401 (invalid
+    token), 4400 (no user) or 1013 (tokens cannot be verified right now). After that every message has an `id`
+    chosen by the client and a `type`, with the fields of the matching HTTP request (without `user_id`):
+
+    - `create_thread`: answered like `/create-thread`.
+    - `ask` (`thread_id`, `question`): answered like `/ask-question`. While the run streams, a `status` message
+      with the run ID and `delta` messages with the answer text are sent first; the deltas are a draft that
+      still holds citation markers, and the `result` replaces it.
+    - `attach` (`thread_id`, `file_id`): answered like `/attach-file`, followed by an `indexing` message for each
+      status change of the attachment and a final `indexing_done`.
+    - `cancel` (`target`): cancels the request with that ID. It gets a `cancelled` message and its run is
+      cancelled; a question whose work had not started yet is not asked at all.
+
+    Answers are `{"id", "type": "result", "data"}`, or `{"id", "type": "error", "status", "detail"}` with the
+    status code the HTTP endpoint would have used. The connection closes with code 4401 on the first message
+    after the token expires, so the client reconnects with a fresh token.
+
+    Args:
+        websocket (WebSocket): The connection
+    """
+    await websocket.accept()
+    try:
+        hello = json.loads(await asyncio.wait_for(websocket.receive_text(), CHAT_SOCKET_AUTH_TIMEOUT))
+        if not isinstance(hello, dict):
+            raise ValueError("The first message must be a JSON object.")
+    except WebSocketDisconnect:
+        return
+    except (asyncio.TimeoutError, ValueError):
+        await websocket.close(code=4400, reason="Authenticate with the first message.")
+        return
+
+    verifier = app.state.auth
+    expires_at = None
+    if verifier is None:
+        user_id = hello.get("user_id")
+        if not user_id:
+            await websocket.close(code=4400, reason="Missing user_id.")
+            return
+    else:
+        token = hello.get("token")
+        try:
+            if not token:
+                raise jwt.InvalidTokenError("Missing token.")
+            claims = verifier.cached(token) or await asyncio.to_thread(verifier.verify, token)
+        except jwt.InvalidTokenError:
+            await websocket.close(code=4401, reason="Invalid token.")
+            return
+        except Exception as e:
+            logging.error(f"Token verification unavailable: {e}")
+            await websocket.close(code=1013, reason="Cannot verify tokens right now.")
+            return
+        user_id = user_id_from_claims(claims)
+        expires_at = claims.get("exp")
+
+    async def create(request: ChatRequest):
+        payload = CreateThreadRequest.model_validate(request.message)
+        yield "result", {"data": await create_thread(payload, user=user_id)}
+
+    async def ask(request: ChatRequest):
+        payload = QuestionRequest.model_validate(request.message)
+        require_thread_owner(user_id, payload.thread_id)
+        current_user.set(user_id)
+        result, assistant = await answer_question(user_id, payload.thread_id, payload.question, request, "/ws/chat")
+        yield "result", {"data": result}
+        if thread_context.needs_compaction(result["thread_id"]):
+            await compact_thread(assistant, result["thread_id"])
+
+    async def attach(request: ChatRequest):
+        payload = AttachFileRequest.model_validate(request.message)
+        request.raise_if_cancelled()
+        result = await attach_file(payload, user=user_id)
+        yield "result", {"data": result}
+        async for record in app.state.indexing.events(tracking_id=result["tracking_id"]):
+            yield "indexing", {"data": record}
+        yield "indexing_done", {}
+
+    logging.info(f"Chat channel opened for user {user_id}")
+    await websocket.send_json({"type": "ready", "user_id": user_id})
+    connection = ChatConnection(
+        websocket, {"create_thread": create, "ask": ask, "attach": attach},
+        # Runs are cancelled by thread and run ID, which either assistant's client can do
+        cancel_run=assistant_api_4o.cancel_run, expires_at=expires_at, max_in_flight=CHAT_SOCKET_MAX_IN_FLIGHT,
+        max_queued=CHAT_SOCKET_MAX_QUEUED, send_timeout=CHAT_SOCKET_SEND_TIMEOUT,
+    )
+    await connection.serve()
+    logging.info(f"Chat channel closed for user {user_id}")
+
 @app.delete("/delete-thread")
-async def delete_thread() -> dict[str, str]:
+async def delete_thread(payload: DeleteThreadRequest, user: str | None = Depends(authenticated_user)) -> dict[str, str]:
     """
-    Deletes the existing conversation thread.
+    Deletes a user's conversation thread (following any compaction redirect).
+
+    Args:
+        payload (DeleteThreadRequest): The request payload containing the thread ID and user ID.
+        user (str | None): The user ID of the verified token.
     
     Returns:
-        dict[str, str]: A dictionary containing a success message and the response from the assistant API.
+        dict[str, str]: A dictionary containing a success message and the ID of the deleted thread.
     
     Raises:
+        HTTPException: The thread belongs to another user (404).
         HTTPException: Failed to delete the thread.
     """
+    user_id = resolve_user_id(user, payload.user_id)
+    require_thread_owner(user, payload.thread_id)
     try:
-        response = app.state.active_assistant.delete_thread()
-        return {"message": "Thread deleted successfully.", "response": response}
+        assistant = app.state.user_assistants.get(user_id, assistant_api_4o)
+        thread_id = thread_context.resolve(payload.thread_id)
+        await asyncio.to_thread(assistant.delete_thread, thread_id)
+        app.state.history.forget(thread_id)
+        app.state.history.forget(payload.thread_id)
+        app.state.thread_owners.pop(thread_id, None)
+        app.state.thread_owners.pop(payload.thread_id, None)
+        return {"message": "Thread deleted successfully.", "thread_id": thread_id}
     except Exception as e:
         logging.error(f"Error deleting thread: {e}")
         raise HTTPException(status_code=500, detail="Failed to delete thread.")
     
+@app.get("/thread-history")
+async def thread_history(request: Request, response: Response, thread_id: str, before: str | None = None,
+                         limit: int = HISTORY_PAGE_SIZE, user: str | None = Depends(authenticated_user)) -> dict:
+    """
+    Returns a page of a thread's messages, newest page first, with citations already resolved.
+
+    The history is served from the backend's cache, which reads a thread from OpenAI only the first time
+    it is requested and is updated after every question and attachment. Each page carries an ETag; a request
+    whose `If-None-Match` matches it gets an empty 304.
+
+    Args:
+        request (Request): The incoming request, used to read `If-None-Match`
+        response (Response): Used to set the ETag
+        thread_id (str): The thread to read (following any compaction redirect)
+        before (str | None): The `next_cursor` of the previous page, to read older messages
+        limit (int): The most messages per page (at most `HISTORY_MAX_PAGE_SIZE`)
+        user (str | None): The user ID of the verified token.
+
+    Returns:
+        dict: `messages` (oldest first, each with `role`, `content`, `created_at` and any `citations` or
+            `attachments`), `next_cursor` (None on the oldest page) and `total`
+
+    Raises:
+        HTTPException: The cursor or limit is invalid (400), the thread belongs to another user (404), or the
+            thread could not be read (500).
+    """
+    try:
+        cursor = int(before) if before is not None else None
+    except ValueError:
+        cursor = -1
+    if cursor is not None and cursor < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"The limit must be between 1 and {HISTORY_MAX_PAGE_SIZE}.")
+
+    require_thread_owner(user, thread_id)
+    live_thread_id = thread_context.resolve(thread_id)
+    try:
+        page, etag = await asyncio.to_thread(
+            app.state.history.page, live_thread_id, cursor, limit, (thread_id,), request.headers.get("if-none-match")
+        )
+    except Exception as e:
+        logging.error(f"Error reading history of thread {thread_id}: {e}")
+        app_metrics.REQUEST_ERRORS.inc(endpoint="/thread-history", error_type=type(e).__name__)
+        raise HTTPException(status_code=500, detail="Failed to read thread history.")
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if page is None:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return page
+
 @app.get("/auth-config")
 async def get_okta_config(request:Request) -> dict[str, str | list[str]]:
     """
@@ -289,26 +1062,190 @@ async def get_okta_config(request:Request) -> dict[str, str | list[str]]:
     }
 
 @app.get("/get-active-model")
-async def get_active_model(user_id: str) -> dict[str, str]:
+async def get_active_model(user_id: str | None = None, user: str | None = Depends(authenticated_user)) -> dict[str, str | None]:
     """
     Retrieves the active model for a given user.
 
+    Users in "auto" mode also get the route that answered their last question (None before the first one).
+
     Args:
-        user_id (str): The ID of the user.
+        user_id (str | None): The ID of the user (ignored when auth is on).
+        user (str | None): The user ID of the verified token.
 
     Returns:
-        dict[str, str]: Contains the active model of a user.
+        dict[str, str | None]: Contains the active model of a user, and the last route in "auto" mode.
     """
-    logging.info(f"")
+    user_id = resolve_user_id(user, user_id)
     assistant = app.state.user_assistants.get(user_id, assistant_api_4o)  # fallback to 4o
     active_model = None
-    if assistant == assistant_api_4o:
+    if assistant is model_router:
+        route = app.state.auto_routes.get(user_id)
+        logging.info(f"Active model of user {user_id} is: auto (last route: {route})")
+        return {"active_model": "auto", "route": route}
+    elif assistant == assistant_api_4o:
         active_model = "4o"
     else: 
         active_model = "4o-mini"
     logging.info(f"Active model of user {user_id} is: {active_model}")
     return {"active_model": active_model}
 
+@app.get("/indexing-status")
+async def indexing_status(tracking_id: str | None = None, thread_id: str | None = None,
+                          user: str | None = Depends(authenticated_user)) -> dict:
+    """
+    Returns the indexing status of one attachment, or of every attachment of a thread.
+
+    Args:
+        tracking_id (str | None): The tracking ID returned by `/attach-file`
+        thread_id (str | None): A thread whose attachments to list
+        user (str | None): The user ID of the verified token.
+
+    Returns:
+        dict: The attachment's status record, or `{"attachments": [...]}` for a thread
+
+    Raises:
+        HTTPException: Neither parameter was given (400), the tracking ID is unknown (404) or the attachment or
+            thread belongs to another user (404).
+    """
+    if tracking_id:
+        record = app.state.indexing.get(tracking_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail="Unknown tracking ID.")
+        require_thread_owner(user, record["thread_id"])
+        return record
+    if thread_id:
+        require_thread_owner(user, thread_id)
+        return {"attachments": app.state.indexing.for_thread(thread_context.resolve(thread_id))}
+    raise HTTPException(status_code=400, detail="Pass a tracking_id or a thread_id.")
+
+@app.get("/indexing-events")
+async def indexing_events(tracking_id: str | None = None, thread_id: str | None = None,
+                          user: str | None = Depends(authenticated_user)) -> StreamingResponse:
+    """
+    Streams Server-Sent Events with an attachment's status record each time it changes, until indexing finishes.
+
+    Args:
+        tracking_id (str | None): Follow this attachment
+        thread_id (str | None): Follow every attachment of this thread
+        user (str | None): The user ID of the verified token.
+
+    Returns:
+        StreamingResponse: `indexing` events carrying the status records, then a final `done` event
+
+    Raises:
+        HTTPException: Neither parameter was given (400), or the attachment or thread belongs to another user (404).
+    """
+    if not tracking_id and not thread_id:
+        raise HTTPException(status_code=400, detail="Pass a tracking_id or a thread_id.")
+    if tracking_id and (record := app.state.indexing.get(tracking_id)) is not None:
+        require_thread_owner(user, record["thread_id"])
+    if thread_id:
+        require_thread_owner(user, thread_id)
+        thread_id = thread_context.resolve(thread_id)
+
+    async def events():
+        async for record in app.state.indexing.events(thread_id=thread_id, tracking_id=tracking_id):
+            yield f"event: indexing\ndata: {json.dumps(record)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/ready")
+async def ready() -> dict:
+    """
+    Reports whether the warm-up has finished, for load balancer and orchestrator readiness checks.
+
+    Returns:
+        dict: The startup timings (import, warm-up and time to ready) and any warm-up errors
+
+    Raises:
+        HTTPException: The app is still warming up (503).
+    """
+    if not getattr(app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="Warming up.")
+    return {"status": "ready", **app.state.startup}
+
+@app.get("/metrics")
+async def metrics() -> Response:
+    """
+    Exposes the request and assistant pipeline metrics in the Prometheus text format.
+
+    Returns:
+        Response: The plain-text scrape body
+    """
+    return Response(content=app_metrics.REGISTRY.render(), media_type=app_metrics.CONTENT_TYPE)
+
+@app.get("/usage-report")
+async def usage_report(request: Request, by: str = "user", since_hours: float | None = None,
+                       top_threads: int = 10) -> dict:
+    """
+    Aggregates the usage ledger: runs, failures, token totals and percentiles of latency and tokens per group,
+    and the threads that used the most tokens.
+
+    The endpoint is disabled unless both `USAGE_LEDGER_PATH` and `USAGE_REPORT_TOKEN` are set, and the caller must
+    send the token in the `X-Usage-Token` header, since the report names users and threads.
+
+    Args:
+        request (Request): The incoming request, used to read the token header
+        by (str): The grouping: "user", "model", "assistant" or "thread"
+        since_hours (float | None): Only runs from the last N hours
+        top_threads (int): How many of the heaviest threads to list
+
+    Returns:
+        dict: The report
+
+    Raises:
+        HTTPException: The report is disabled, the token is wrong, or the arguments are invalid.
+    """
+    token = request.headers.get("X-Usage-Token", "")
+    if not USAGE_REPORT_TOKEN or thread_context.ledger is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(token, USAGE_REPORT_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid usage report token.")
+    since = time.time() - since_hours * 3600 if since_hours else None
+    try:
+        return await asyncio.to_thread(
+            lambda: summarize(read_usage(thread_context.ledger.path, since), by, max(0, top_threads))
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/debug/profile")
+async def profile_worker(request: Request, seconds: float = 10, interval_ms: float = 5) -> Response:
+    """
+    Samples every thread of this worker for `seconds` seconds and returns the folded stacks.
+
+    The endpoint is disabled unless `PROFILER_TOKEN` is set, and the caller must send the same
+    value in the `X-Profiler-Token` header. The output can be fed directly to `flamegraph.pl` or speedscope.
+
+    Args:
+        request (Request): The incoming request, used to read the token header
+        seconds (float): How long to sample for (at most 60 seconds)
+        interval_ms (float): Milliseconds between two samples
+
+    Returns:
+        Response: The folded stacks as plain text
+
+    Raises:
+        HTTPException: The profiler is disabled, the token is wrong, the arguments are invalid, or a session is already running.
+    """
+    token = request.headers.get("X-Profiler-Token", "")
+    if not PROFILER_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(token, PROFILER_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid profiler token.")
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {MAX_PROFILE_SECONDS}] and interval_ms in [1, 1000].")
+
+    try:
+        folded = await asyncio.to_thread(profiler.profile, seconds, interval_ms / 1000)
+    except profiler.ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    logging.info(f"Profiled worker for {seconds}s")
+    return Response(content=folded, media_type="text/plain")
+
+
+IMPORT_FINISHED_AT = time.perf_counter()
 
 if __name__ == "__main__":
     """Starts the FastAPI server on port 8080."""
@@ -0,0 +1,277 @@
+"""
+This module provides a small in-process metrics registry that renders in the Prometheus text exposition format.
+
+Recording a sample is a dictionary lookup plus an addition under a per-metric lock, so the metrics can stay
+enabled in production without measurably slowing down the request path.
+
+Classes:
+- Counter: A monotonically increasing value, optionally split by labels.
+- Gauge: A value that can go up and down, optionally split by labels.
+- Histogram: Bucketed observations (e.g. latencies), optionally split by labels.
+- MetricsRegistry: Holds the metrics and renders them for the `/metrics` endpoint.
+
+Functions:
+- track_stage(stage: str): Context manager that times one stage of the assistant pipeline, counts its errors and records a trace span.
+
+Usage:
+- Use the module-level metrics (e.g. `STAGE_LATENCY`) to record samples from anywhere in the backend.
+- Use `REGISTRY.render()` to produce the body of the `/metrics` response.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from tracing import span
+
+# Default latency buckets (seconds), tuned for OpenAI calls that range from ~50ms to over a minute
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    """Escapes a label value per the exposition format."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    """Formats a label set as `{a="x",b="y"}`."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    """Formats a sample value, using the exposition format's spelling of infinity."""
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """
+    Shared label handling for all metric types.
+
+    Attributes:
+        name (str): The metric name as exposed to Prometheus
+        documentation (str): The HELP text of the metric
+        labelnames (tuple[str, ...]): The names of the labels the metric is split by
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        """Turns keyword labels into the tuple key used for storage."""
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def _render_samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Renders the HELP, TYPE and sample lines of the metric."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._render_samples())
+        return "\n".join(lines)
+
+    def clear(self):
+        """Drops every recorded sample (used by tests)."""
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """A monotonically increasing count, e.g. the number of errors of a given type."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        """Increments the counter for the given labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        """Returns the current count for the given labels."""
+        return self._values.get(self._key(labels), 0.0)
+
+    def _render_samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Gauge(Counter):
+    """A value that can go up and down, e.g. the number of requests currently in flight."""
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels):
+        """Decrements the gauge for the given labels."""
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        """Sets the gauge for the given labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        """Increments the gauge for the duration of the `with` block."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """
+    Bucketed observations with a running sum and count.
+
+    Attributes:
+        buckets (tuple[float, ...]): The sorted upper bounds of the buckets, excluding +Inf
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        """Records one observation for the given labels."""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts followed by [sum, count]
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the wall time spent in the `with` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self, **labels) -> dict:
+        """Returns the count and sum recorded for the given labels."""
+        state = self._values.get(self._key(labels))
+        if state is None:
+            return {"count": 0, "sum": 0.0}
+        return {"count": state[-1], "sum": state[-2]}
+
+    def _render_samples(self) -> list[str]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+
+        lines = []
+        bounds = self.buckets + (float("inf"),)
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(bounds, state):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    A collection of metrics that is rendered as one Prometheus scrape.
+
+    Attributes:
+        metrics (dict[str, _Metric]): The registered metrics keyed by name
+    """
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        """Creates and registers a counter."""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        """Creates and registers a gauge."""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        """Creates and registers a histogram."""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Renders every registered metric in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self.metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# HTTP layer
+REQUEST_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "Latency of HTTP requests by endpoint.", ("method", "endpoint", "status")
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "HTTP requests currently being processed.")
+REQUEST_ERRORS = REGISTRY.counter(
+    "http_request_errors_total", "HTTP requests that raised an error, by endpoint and error type.", ("endpoint", "error_type")
+)
+
+# Assistant pipeline
+STAGE_LATENCY = REGISTRY.histogram(
+    "assistant_stage_duration_seconds", "Latency of each OpenAI call made by the assistant pipeline.", ("stage",)
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "assistant_stage_errors_total", "Errors raised by OpenAI calls, by stage and error type.", ("stage", "error_type")
+)
+RUNS_IN_FLIGHT = REGISTRY.gauge("assistant_runs_in_flight", "Assistant runs currently being executed.")
+RUN_POLLS = REGISTRY.histogram(
+    "assistant_run_polls", "Number of status polls needed per assistant run.", (), buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+)
+
+
+@contextmanager
+def track_stage(stage: str):
+    """
+    Times one stage of the assistant pipeline, counts the errors it raises and records it as an
+    `openai.<stage>` span of the current trace.
+
+    Args:
+        stage (str): The name of the stage (e.g. `messages_create`)
+    """
+    start = time.perf_counter()
+    try:
+        with span(f"openai.{stage}"):
+            yield
+    except Exception as e:
+        STAGE_ERRORS.inc(stage=stage, error_type=type(e).__name__)
+        raise
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
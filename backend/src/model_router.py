@@ -0,0 +1,316 @@
+"""
+This module routes questions between the 4o and 4o-mini assistants for users who choose the "auto" model.
+
+Most questions are simple lookups that 4o-mini answers as well as 4o, in less time. A cheap local
+classifier scores each question on its length, wording and the size of the conversation so far, sends
+simple questions to the fast route and synthesis questions to the strong route. The observed latency,
+error rate and answer quality of each route are tracked as moving averages, so the router falls back to
+the other route when one is failing or slower, and escalates a poor fast-route answer to the strong route.
+An avoided route only gets new averages from the questions it answers, so a small share of the rerouted
+questions still goes to it as probes; once it recovers, its averages show it and traffic returns.
+
+Classes:
+- RouteDecision: The route chosen for one question and why.
+- RouteStats: Moving averages of latency, errors and answer quality of one route.
+- ModelRouter: Classifies questions, picks a route and answers through the matching assistant.
+
+Functions:
+- complexity_score(question: str, turns: int, prompt_tokens: int) -> int: Scores how much reasoning a question needs.
+
+Usage:
+- Create one router with the fast and strong `AssistantAPI` instances and store it as a user's assistant.
+- Use `ask_question` like `AssistantAPI.ask_question`; it also returns the route that answered.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from metrics import REGISTRY
+
+ROUTE_REQUESTS = REGISTRY.counter(
+    "model_route_requests_total", "Questions answered in auto mode, by route and routing reason.", ("route", "reason")
+)
+ROUTE_LATENCY = REGISTRY.histogram("model_route_seconds", "Latency of questions answered in auto mode, by route.", ("route",))
+ROUTE_ESCALATIONS = REGISTRY.counter("model_route_escalations_total", "Fast-route answers re-asked on the strong route.")
+
+# Wording that asks for comparison, judgement or writing rather than a lookup
+COMPLEX_TERMS = re.compile(
+    r"\b(compare|comparison|contrast|differences?|synthes[iz]e|analy[sz]e|analysis|evaluate|assess|implications?|"
+    r"recommend|recommendations?|strategy|strategies|plan|draft|write|rewrite|summari[sz]e|pros and cons|"
+    r"trade-?offs?|relationship|across|why|how should|how would|step[- ]by[- ]step)\b",
+    re.IGNORECASE,
+)
+# Openings of short factual questions
+SIMPLE_OPENINGS = re.compile(
+    r"^\s*(what is|what's|what are|who|when|where|which|is there|are there|does|do|define|list|how many|how much)\b",
+    re.IGNORECASE,
+)
+# Answers in which the assistant admits it could not answer
+UNSURE_ANSWER = re.compile(
+    r"\b(I (could not|couldn't|cannot|can't|was unable to) find|I'm not sure|I am not sure|"
+    r"no (relevant )?information|not (mentioned|covered) in)\b",
+    re.IGNORECASE,
+)
+
+
+def complexity_score(question: str, turns: int = 0, prompt_tokens: int = 0) -> int:
+    """
+    Scores how much reasoning a question needs; higher scores favour the strong model.
+
+    Args:
+        question (str): The user question
+        turns (int): Questions already answered on the thread
+        prompt_tokens (int): Prompt tokens of the thread's last run
+
+    Returns:
+        int: The complexity score
+    """
+    words = len(question.split())
+    score = 0
+    if words <= 12:
+        score -= 1
+    elif words > 120:
+        score += 2
+    elif words > 40:
+        score += 1
+    score += min(len(COMPLEX_TERMS.findall(question)), 3)
+    if SIMPLE_OPENINGS.match(question):
+        score -= 1
+    if question.count("?") > 1:
+        score += 1
+    # Long conversations need the stronger model to keep track of earlier turns
+    if turns > 10 or prompt_tokens > 8000:
+        score += 1
+    return score
+
+
+@dataclass
+class RouteDecision:
+    """
+    The route chosen for one question.
+
+    Attributes:
+        route (str): The model type that answers ("4o" or "4o-mini")
+        reason (str): Why the route was chosen ("simple", "complex", "escalated", "latency", "fallback" or "probe")
+        score (int): The complexity score of the question
+    """
+    route: str
+    reason: str
+    score: int
+
+
+class RouteStats:
+    """
+    Exponentially weighted moving averages of one route's latency, error rate and answer quality.
+
+    Attributes:
+        latency (float | None): Average seconds per answered question (None until the first answer)
+        error_rate (float): Average share of failed questions
+        quality (float): Average share of answers that cited a file and did not admit defeat
+        requests (int): Number of questions sent to the route
+    """
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.latency = None
+        self.error_rate = 0.0
+        self.quality = 1.0
+        self.requests = 0
+
+    def record(self, seconds: float | None, ok: bool, good: bool | None = None):
+        """Folds one outcome into the averages; `seconds` and `good` are ignored for failed questions."""
+        self.requests += 1
+        self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok and seconds is not None:
+            self.latency = seconds if self.latency is None else self.latency + self.alpha * (seconds - self.latency)
+        if ok and good is not None:
+            self.quality += self.alpha * ((1.0 if good else 0.0) - self.quality)
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "latency_seconds": round(self.latency, 4) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 4),
+            "quality": round(self.quality, 4),
+        }
+
+
+class ModelRouter:
+    """
+    Picks the 4o or 4o-mini assistant for each question and tracks how each route performs.
+
+    Threads and files are not tied to an assistant, so thread and file operations go to the strong assistant.
+
+    Attributes:
+        assistants (dict[str, AssistantAPI]): The assistant of each route
+        fast_route (str): The route for simple questions
+        strong_route (str): The route for complex questions and escalations
+        complexity_threshold (int): Scores at or above this go to the strong route
+        latency_slack (float): The fast route is skipped while its average latency exceeds the strong route's by this factor
+        max_error_rate (float): A route whose average error rate exceeds this is avoided while the other is healthier
+        escalate (bool): Whether poor fast-route answers are re-asked on the strong route
+        probe_every (int): Every this many questions rerouted for latency or errors, one goes to the avoided
+            route anyway so its averages keep up with it (0 never probes)
+        stats (dict[str, RouteStats]): Moving averages per route
+    """
+    def __init__(self, fast_assistant, strong_assistant, fast_route: str = "4o-mini", strong_route: str = "4o",
+                 complexity_threshold: int = 2, latency_slack: float = 1.2, max_error_rate: float = 0.5,
+                 escalate: bool = True, max_tracked_threads: int = 10000, probe_every: int = 20):
+        self.assistants = {fast_route: fast_assistant, strong_route: strong_assistant}
+        self.fast_route = fast_route
+        self.strong_route = strong_route
+        self.complexity_threshold = complexity_threshold
+        self.latency_slack = latency_slack
+        self.max_error_rate = max_error_rate
+        self.escalate = escalate
+        self.max_tracked_threads = max_tracked_threads
+        self.probe_every = probe_every
+        self.stats = {fast_route: RouteStats(), strong_route: RouteStats()}
+        self._rerouted = 0
+        self._escalated_threads = OrderedDict()  # threads kept on the strong route after an escalation
+        self._lock = threading.Lock()
+
+    @property
+    def primary(self):
+        """The assistant used for operations that do not depend on the model."""
+        return self.assistants[self.strong_route]
+
+    def _other(self, route: str) -> str:
+        return self.strong_route if route == self.fast_route else self.fast_route
+
+    def route(self, thread_id: str | None, question: str) -> RouteDecision:
+        """
+        Chooses the route for a question.
+
+        Args:
+            thread_id (str | None): The thread the question is asked on
+            question (str): The user question
+
+        Returns:
+            RouteDecision: The chosen route and the reason
+        """
+        usage = self.primary.context.usage(thread_id) if thread_id else None
+        turns = usage["turns"] if usage else 0
+        prompt_tokens = usage["prompt_tokens"][-1] if usage and usage["prompt_tokens"] else 0
+        score = complexity_score(question, turns, prompt_tokens)
+
+        if thread_id and thread_id in self._escalated_threads:
+            decision = RouteDecision(self.strong_route, "escalated", score)
+        elif score >= self.complexity_threshold:
+            decision = RouteDecision(self.strong_route, "complex", score)
+        else:
+            decision = RouteDecision(self.fast_route, "simple", score)
+        preferred = decision.route
+        if decision.reason == "simple":
+            fast, strong = self.stats[self.fast_route].latency, self.stats[self.strong_route].latency
+            if fast is not None and strong is not None and fast > strong * self.latency_slack:
+                decision = RouteDecision(self.strong_route, "latency", score)
+
+        # Avoid a failing route while the other one is doing better
+        chosen, other = self.stats[decision.route], self.stats[self._other(decision.route)]
+        if chosen.error_rate > self.max_error_rate and other.error_rate < chosen.error_rate:
+            decision = RouteDecision(self._other(decision.route), "fallback", score)
+
+        if decision.route != preferred and self.probe_every:
+            with self._lock:
+                self._rerouted += 1
+                probe = self._rerouted % self.probe_every == 0
+            if probe:
+                decision = RouteDecision(preferred, "probe", score)
+        return decision
+
+    @staticmethod
+    def is_good_answer(response: str, citations: list[str]) -> bool:
+        """Returns whether an answer looks useful: it cites a file or at least does not admit it found nothing."""
+        return bool(citations) or not UNSURE_ANSWER.search(response)
+
+    def _mark_escalated(self, thread_id: str):
+        with self._lock:
+            self._escalated_threads.pop(thread_id, None)
+            self._escalated_threads[thread_id] = True
+            while len(self._escalated_threads) > self.max_tracked_threads:
+                self._escalated_threads.popitem(last=False)
+
+    def ask_question(self, thread_id: str | None, question: str) -> tuple[str, list[str], str, str]:
+        """
+        Answers a question through the route the classifier picks, escalating a poor fast-route answer.
+
+        Args:
+            thread_id (str | None): The id of the current thread, or None to start a new conversation
+            question (str): The user prompt
+
+        Returns:
+            tuple[str, list[str], str, str]: The response, cited files, thread id and the route that answered
+
+        Raises:
+            Exception: The chosen route failed to answer
+        """
+        decision = self.route(thread_id, question)
+        assistant = self.assistants[decision.route]
+        start = time.perf_counter()
+        try:
+            response, citations, thread_id = assistant.ask_question(thread_id, question)
+        except Exception:
+            with self._lock:
+                self.stats[decision.route].record(None, ok=False)
+            raise
+        elapsed = time.perf_counter() - start
+        good = self.is_good_answer(response, citations)
+        with self._lock:
+            self.stats[decision.route].record(elapsed, ok=True, good=good)
+        ROUTE_REQUESTS.inc(route=decision.route, reason=decision.reason)
+        ROUTE_LATENCY.observe(elapsed, route=decision.route)
+        logging.info(f"Auto route {decision.route} ({decision.reason}, score {decision.score}) answered in {elapsed:.2f}s")
+
+        if good or not self.escalate or decision.route != self.fast_route:
+            return response, citations, thread_id, decision.route
+
+        # The fast answer found nothing: answer the same message again on the strong route and keep the thread there
+        logging.info(f"Escalating thread {thread_id} to {self.strong_route}")
+        ROUTE_ESCALATIONS.inc()
+        self._mark_escalated(thread_id)
+        start = time.perf_counter()
+        try:
+            response, citations, thread_id = self.assistants[self.strong_route].answer_again(thread_id)
+        except Exception as e:
+            with self._lock:
+                self.stats[self.strong_route].record(None, ok=False)
+            logging.warning(f"Escalation failed, keeping the {self.fast_route} answer: {e}")
+            return response, citations, thread_id, decision.route
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.stats[self.strong_route].record(elapsed, ok=True, good=self.is_good_answer(response, citations))
+        ROUTE_REQUESTS.inc(route=self.strong_route, reason="escalated")
+        ROUTE_LATENCY.observe(elapsed, route=self.strong_route)
+        return response, citations, thread_id, self.strong_route
+
+    def snapshot(self) -> dict:
+        """Returns the moving averages of every route."""
+        with self._lock:
+            return {route: stats.as_dict() for route, stats in self.stats.items()}
+
+    def cache_version(self) -> str:
+        """Identifies the answers of this router for the semantic cache; either route may have answered."""
+        return "|".join(self.assistants[route].cache_version() for route in (self.fast_route, self.strong_route))
+
+    # Thread and file operations do not depend on the model
+    def record_answer(self, thread_id: str | None, question: str, response: str) -> str:
+        return self.primary.record_answer(thread_id, question, response)
+
+    def create_thread(self) -> str:
+        return self.primary.create_thread()
+
+    def delete_thread(self, thread_id: str) -> dict:
+        return self.primary.delete_thread(thread_id)
+
+    def upload_file(self, file) -> str:
+        return self.primary.upload_file(file)
+
+    def attach_file_to_thread(self, thread_id: str, file_id: str) -> dict:
+        return self.primary.attach_file_to_thread(thread_id, file_id)
+
+    def compact_thread(self, thread_id: str) -> str | None:
+        return self.primary.compact_thread(thread_id)
@@ -0,0 +1,103 @@
+"""
+This module provides an on-demand sampling profiler for a live worker.
+
+While active, a background thread snapshots the stack of every other thread at a fixed interval and
+counts identical stacks. The result is emitted in the "folded" (collapsed stack) format, one
+`frame;frame;frame count` line per unique stack, which `flamegraph.pl`, speedscope and inferno read directly.
+
+Classes:
+- SamplingProfiler: Samples all thread stacks for a fixed duration.
+
+Functions:
+- profile(seconds: float, interval: float) -> str: Runs one profiling session and returns folded stacks.
+
+Usage:
+- Call `profile` from a worker thread (it blocks for `seconds`); only one session can run at a time.
+"""
+
+import sys
+import threading
+import time
+from collections import Counter
+
+# Only one session may run at a time so overlapping requests cannot multiply the overhead
+_session_lock = threading.Lock()
+
+
+class ProfilerBusyError(RuntimeError):
+    """Raised when a profiling session is requested while another one is running."""
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread in the process at a fixed interval.
+
+    Attributes:
+        interval (float): Seconds between two samples
+        max_depth (int): Maximum number of frames kept per stack
+        samples (collections.Counter): Counts of folded stacks
+    """
+    def __init__(self, interval: float = 0.005, max_depth: int = 128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self.sample_count = 0
+
+    def _fold(self, frame, thread_name: str) -> str:
+        frames = []
+        while frame is not None and len(frames) < self.max_depth:
+            code = frame.f_code
+            module = frame.f_globals.get("__name__", "?")
+            frames.append(f"{module}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        frames.append(thread_name)
+        return ";".join(reversed(frames))
+
+    def sample(self, exclude_ident: int):
+        """Records one snapshot of every thread's stack except the sampling thread's own."""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == exclude_ident:
+                continue
+            self.samples[self._fold(frame, names.get(ident, f"thread-{ident}"))] += 1
+        self.sample_count += 1
+
+    def run(self, seconds: float):
+        """Samples every `interval` seconds for `seconds` seconds (blocking)."""
+        own_ident = threading.get_ident()
+        deadline = time.perf_counter() + seconds
+        next_sample = time.perf_counter()
+        while next_sample < deadline:
+            self.sample(own_ident)
+            next_sample += self.interval
+            delay = next_sample - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def folded(self) -> str:
+        """Returns the collected samples in the folded stack format."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def profile(seconds: float, interval: float = 0.005) -> str:
+    """
+    Profiles the whole process for `seconds` seconds.
+
+    Args:
+        seconds (float): How long to sample for
+        interval (float): Seconds between two samples
+
+    Returns:
+        str: The folded stacks of the session
+
+    Raises:
+        ProfilerBusyError: Another profiling session is already running
+    """
+    if not _session_lock.acquire(blocking=False):
+        raise ProfilerBusyError("A profiling session is already running.")
+    try:
+        profiler = SamplingProfiler(interval=interval)
+        profiler.run(seconds)
+        return profiler.folded()
+    finally:
+        _session_lock.release()
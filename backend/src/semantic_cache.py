@@ -0,0 +1,251 @@
+"""
+This module caches answers to opening questions by meaning, so paraphrases of a question already answered skip the run.
+
+Every cached question is stored as a normalized embedding in one preallocated NumPy matrix; a lookup embeds the
+new question and takes the best cosine similarity with a single matrix-vector product. A match above the
+threshold returns the stored answer and citations. Each entry carries a version (the assistant and the vector
+store it was answered from), so answers from an older assistant or index are never served. The least recently
+used entries are evicted when the matrix is full, and the cache is saved to disk so it survives restarts.
+
+Only the first question of a conversation is a good cache key: a follow-up such as "and for WG4?" means
+something different in every thread. Callers are expected to consult and fill the cache for those only.
+
+Classes:
+- CachedAnswer: An answer served from the cache, with the similarity of the matched question.
+- OpenAIEmbedder: Embeds questions with the OpenAI embeddings endpoint.
+- SemanticAnswerCache: The similarity index of past questions and their answers.
+
+Usage:
+- Create the cache with any `embed(texts) -> array` function (an `OpenAIEmbedder`, or a fake one in tests).
+- Call `lookup(question, version)` before asking, and `store(question, version, response, citations)` after;
+  embed the question once with `embed_question` and pass the vector to both to avoid embedding it twice.
+- Call `save()` on shutdown; a cache created with the same `path` loads it again.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Sequence
+
+import numpy as np
+
+from metrics import REGISTRY
+
+SEMANTIC_LOOKUPS = REGISTRY.counter("semantic_cache_lookups_total", "Semantic answer cache lookups, by result.", ("result",))
+SEMANTIC_LOOKUP_LATENCY = REGISTRY.histogram(
+    "semantic_cache_lookup_seconds", "Time to embed a question and search the cache.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+SEMANTIC_ENTRIES = REGISTRY.gauge("semantic_cache_entries", "Questions held by the semantic answer cache.")
+
+
+@dataclass
+class CachedAnswer:
+    """
+    An answer served from the semantic cache.
+
+    Attributes:
+        question (str): The cached question that matched
+        response (str): The stored answer
+        citations (list[str]): The stored cited file names
+        similarity (float): The cosine similarity between the asked and the cached question
+    """
+    question: str
+    response: str
+    citations: list[str]
+    similarity: float
+
+
+class OpenAIEmbedder:
+    """
+    Embeds texts with the OpenAI embeddings endpoint.
+
+    Attributes:
+        model (str): The embedding model
+    """
+    def __init__(self, client: Callable, model: str = "text-embedding-3-small"):
+        """
+        Args:
+            client (Callable): Returns the `openai.OpenAI` client to use (so a lazily created client is reused)
+            model (str): The embedding model
+        """
+        self._client = client
+        self.model = model
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        response = self._client().embeddings.create(model=self.model, input=list(texts))
+        return np.array([item.embedding for item in response.data], dtype=np.float32)
+
+
+class SemanticAnswerCache:
+    """
+    A fixed-size similarity index of past questions with their answers.
+
+    Attributes:
+        threshold (float): The least cosine similarity at which a cached answer is served
+        max_entries (int): The most questions held; the least recently used is evicted beyond it
+        path (str | None): Where the cache is saved, or None to keep it in memory only
+        save_every (int): Stored answers after which the cache is saved (0 saves only on `save()`)
+    """
+    def __init__(self, embed: Callable[[Sequence[str]], np.ndarray], threshold: float = 0.92,
+                 max_entries: int = 5000, path: str | None = None, save_every: int = 50):
+        """
+        Initializes the cache, loading the entries saved at `path` if there are any.
+
+        Args:
+            embed (Callable): Blocking function returning one embedding row per text
+            threshold (float): The least cosine similarity at which a cached answer is served
+            max_entries (int): The most questions held
+            path (str | None): Where the cache is saved
+            save_every (int): Stored answers after which the cache is saved
+        """
+        self.embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.path = path
+        self.save_every = save_every
+        self._vectors = None  # (max_entries, dim) float32, unit rows; allocated on the first embedding
+        self._versions = np.full(max_entries, -1, dtype=np.int32)  # version number per slot, -1 when free
+        self._version_ids = {}  # version string -> version number
+        self._entries = [None] * max_entries  # slot -> {"question", "response", "citations", "version", "stored_at"}
+        self._lru = OrderedDict()  # used slots, least recently used first
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                self._load()
+            except Exception as e:
+                logging.error(f"Error loading the semantic cache from {path}, starting empty: {e}")
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    def embed_question(self, text: str) -> np.ndarray:
+        """Returns the unit-length embedding of a question."""
+        vector = np.asarray(self.embed([text])[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _version_id(self, version: str) -> int:
+        if version not in self._version_ids:
+            self._version_ids[version] = len(self._version_ids)
+        return self._version_ids[version]
+
+    def lookup(self, question: str, version: str, vector: np.ndarray | None = None) -> CachedAnswer | None:
+        """
+        Returns the answer of the most similar cached question of the same version, if it is similar enough.
+
+        Args:
+            question (str): The question about to be asked
+            version (str): The assistant and vector store the answer must come from
+            vector (np.ndarray | None): The question's `embed_question` result, if already computed
+
+        Returns:
+            CachedAnswer | None: The cached answer, or None on a miss
+        """
+        start = time.perf_counter()
+        with self._lock:
+            version_id = self._version_ids.get(version)
+            empty = version_id is None or not self._lru
+        if empty:
+            SEMANTIC_LOOKUPS.inc(result="miss")
+            return None
+
+        if vector is None:
+            vector = self.embed_question(question)
+        with self._lock:
+            scores = self._vectors @ vector
+            scores[self._versions != version_id] = -np.inf
+            slot = int(np.argmax(scores))
+            similarity = float(scores[slot])
+            if similarity < self.threshold:
+                hit = None
+            else:
+                self._lru.move_to_end(slot)
+                entry = self._entries[slot]
+                hit = CachedAnswer(entry["question"], entry["response"], list(entry["citations"]), similarity)
+        SEMANTIC_LOOKUP_LATENCY.observe(time.perf_counter() - start)
+        SEMANTIC_LOOKUPS.inc(result="hit" if hit else "miss")
+        if hit:
+            logging.info(f"Semantic cache hit ({similarity:.3f}): {question!r} ~ {hit.question!r}")
+        return hit
+
+    def store(self, question: str, version: str, response: str, citations: list[str], vector: np.ndarray | None = None):
+        """
+        Adds an answered question, evicting the least recently used entry if the cache is full.
+
+        Args:
+            question (str): The question
+            version (str): The assistant and vector store that answered it
+            response (str): The answer
+            citations (list[str]): The cited file names
+            vector (np.ndarray | None): The question's `embed_question` result, if already computed
+        """
+        if vector is None:
+            vector = self.embed_question(question)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            slot = self._free.pop() if self._free else self._lru.popitem(last=False)[0]
+            self._vectors[slot] = vector
+            self._versions[slot] = self._version_id(version)
+            self._entries[slot] = {"question": question, "response": response, "citations": list(citations),
+                                   "version": version, "stored_at": time.time()}
+            self._lru[slot] = None
+            self._unsaved += 1
+            save = self.save_every and self._unsaved >= self.save_every
+            SEMANTIC_ENTRIES.set(len(self._lru))
+        if save:
+            self.save()
+
+    def invalidate(self, keep_version: str | None = None):
+        """
+        Drops every entry, or every entry of another version than `keep_version`.
+
+        Args:
+            keep_version (str | None): The version to keep, e.g. after the vector store was rebuilt
+        """
+        with self._lock:
+            for slot in list(self._lru):
+                if keep_version is None or self._entries[slot]["version"] != keep_version:
+                    del self._lru[slot]
+                    self._entries[slot] = None
+                    self._versions[slot] = -1
+                    self._free.append(slot)
+            SEMANTIC_ENTRIES.set(len(self._lru))
+
+    def save(self):
+        """Writes the cache to `path` atomically, least recently used entry first."""
+        if not self.path:
+            return
+        with self._lock:
+            slots = list(self._lru)
+            vectors = self._vectors[slots] if slots else np.zeros((0, 0), dtype=np.float32)
+            entries = [self._entries[slot] for slot in slots]
+            self._unsaved = 0
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "wb") as f:
+            np.savez(f, vectors=vectors, entries=np.array(json.dumps(entries)))
+        os.replace(temp_path, self.path)
+        logging.info(f"Saved {len(entries)} semantic cache entries to {self.path}")
+
+    def _load(self):
+        with np.load(self.path) as data:
+            vectors = data["vectors"]
+            entries = json.loads(str(data["entries"]))
+        # Keep the most recently used entries if the cache shrank
+        for vector, entry in list(zip(vectors, entries))[-self.max_entries:]:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._versions[slot] = self._version_id(entry["version"])
+            self._entries[slot] = entry
+            self._lru[slot] = None
+        SEMANTIC_ENTRIES.set(len(self._lru))
+        logging.info(f"Loaded {len(self._lru)} semantic cache entries from {self.path}")
@@ -0,0 +1,298 @@
+"""
+This module rebuilds the vector store blue/green: a new store is built and indexed next to the live one, and the
+assistants are switched to it only once it is complete.
+
+Syncing in place deletes and re-uploads files on the store the assistants search, so while a large sync runs,
+answers come from a half-indexed store. A rebuild instead creates a new store, attaches every file to it (files
+whose content did not change keep their OpenAI file id, so only changed files are uploaded), waits for the
+indexing to finish and then points the assistants' `file_search` at the new store. The previous store is kept,
+with the sync state that describes it, for a rollback window and deleted afterwards together with the files
+that no remaining store uses.
+
+Classes:
+- RebuildError: The new store could not be built or switched to; the live store is unchanged.
+- StoreRebuilder: Builds, switches to, rolls back and garbage-collects vector stores.
+
+Usage:
+- Give a `StoreRebuilder` to `BoxSyncDaemon` and run `python box_sync.py rebuild` (or `rollback`, `gc`).
+- The rebuilder's state file names the live store, and overrides `VECTOR_STORE_ID` once a rebuild switched it.
+"""
+
+import io
+import json
+import logging
+import os
+import time
+from typing import Callable, Iterable
+
+from metrics import REGISTRY
+from tracing import traced
+
+REBUILD_FILES = REGISTRY.counter("store_rebuild_files_total", "Files attached to rebuilt vector stores, by whether they were reused or uploaded.", ("result",))
+REBUILD_LATENCY = REGISTRY.histogram(
+    "store_rebuild_seconds", "Time to build, index and switch to a new vector store.",
+    buckets=(10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200),
+)
+REBUILDS = REGISTRY.counter("store_rebuilds_total", "Vector store rebuilds, by outcome.", ("result",))
+
+# Most file ids one file batch accepts
+MAX_BATCH_FILES = 500
+
+
+class RebuildError(Exception):
+    """The new store could not be built or switched to; the live store is unchanged."""
+
+
+class StoreRebuilder:
+    """
+    Builds a new vector store next to the live one and switches the assistants to it once it is indexed.
+
+    Attributes:
+        vector_store (OpenAIVectorStoreAPI): The vector store API; its `vector_store_id` follows the live store
+        assistant_ids (list[str]): The assistants whose `file_search` is switched together
+        state_path (str): JSON file holding the live store and the retired stores kept for rollback
+        rollback_window (float): Seconds a retired store is kept before it is garbage-collected
+        max_failed_files (int): Files that may fail to index before a rebuild is abandoned
+        store_name (str): Name prefix of the created stores
+    """
+    def __init__(self, vector_store, assistant_ids: Iterable[str], state_path: str = "store_rebuild_state.json",
+                 rollback_window: float = 7 * 24 * 3600, max_failed_files: int = 0, store_name: str = "Middle States Files"):
+        self.vector_store = vector_store
+        self.assistant_ids = [assistant_id for assistant_id in assistant_ids if assistant_id]
+        self.state_path = state_path
+        self.rollback_window = rollback_window
+        self.max_failed_files = max_failed_files
+        self.store_name = store_name
+
+        state = self._load_state()
+        self.live_store_id = state.get("live_store_id")
+        self.retired = state.get("retired", [])  # [{"vector_store_id", "retired_at", "snapshot"}], oldest first
+        if self.live_store_id and self.live_store_id != vector_store.vector_store_id:
+            logging.info(f"Using the rebuilt vector store {self.live_store_id} instead of {vector_store.vector_store_id}")
+            vector_store.vector_store_id = self.live_store_id
+
+    @property
+    def client(self):
+        return self.vector_store.client
+
+    def _load_state(self) -> dict:
+        try:
+            if os.path.exists(self.state_path):
+                with open(self.state_path, "r") as f:
+                    return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logging.error(f"Error loading rebuild state, starting without rollback history: {e}")
+        return {}
+
+    def save_state(self):
+        """Writes the live store and the retired stores atomically."""
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"live_store_id": self.live_store_id, "retired": self.retired}, f, indent=4)
+        os.replace(temp_path, self.state_path)
+
+    def assistant_stores(self) -> dict[str, list[str]]:
+        """Returns the vector stores each assistant searches."""
+        stores = {}
+        for assistant_id in self.assistant_ids:
+            assistant = self.client.beta.assistants.retrieve(assistant_id)
+            file_search = assistant.tool_resources.file_search if assistant.tool_resources else None
+            stores[assistant_id] = list(file_search.vector_store_ids or []) if file_search else []
+        return stores
+
+    def switch(self, vector_store_id: str, previous: dict[str, list[str]] | None = None):
+        """
+        Points every assistant's `file_search` at a vector store.
+
+        Assistants are updated one call each; if one update fails, those already switched are switched back, so
+        the assistants never stay split between two stores.
+
+        Args:
+            vector_store_id (str): The store to switch to
+            previous (dict[str, list[str]] | None): The stores each assistant searched, to restore on failure
+
+        Raises:
+            RebuildError: An assistant could not be switched
+        """
+        previous = previous if previous is not None else self.assistant_stores()
+        switched = []
+        try:
+            for assistant_id in self.assistant_ids:
+                self.client.beta.assistants.update(
+                    assistant_id, tool_resources={"file_search": {"vector_store_ids": [vector_store_id]}}
+                )
+                switched.append(assistant_id)
+        except Exception as e:
+            logging.error(f"Failed to switch assistant to vector store {vector_store_id}, switching back: {e}")
+            for assistant_id in switched:
+                try:
+                    self.client.beta.assistants.update(
+                        assistant_id, tool_resources={"file_search": {"vector_store_ids": previous[assistant_id]}}
+                    )
+                except Exception as restore_error:
+                    logging.error(f"Failed to switch assistant {assistant_id} back: {restore_error}")
+            raise RebuildError(f"Could not switch the assistants to vector store {vector_store_id}.") from e
+        logging.info(f"Assistants {', '.join(self.assistant_ids)} now search vector store {vector_store_id}")
+
+    def _index(self, vector_store_id: str, files: list[tuple[str, int | None, str]]) -> int:
+        """Attaches files to a store in batches grouped by chunking strategy and returns how many failed to index."""
+        failed = 0
+        for strategy, file_ids in self.vector_store.chunking_policy.group(files):
+            for start in range(0, len(file_ids), MAX_BATCH_FILES):
+                batch = self.client.beta.vector_stores.file_batches.create_and_poll(
+                    vector_store_id=vector_store_id,
+                    file_ids=file_ids[start: start + MAX_BATCH_FILES],
+                    **({"chunking_strategy": strategy} if strategy else {}),
+                )
+                failed += batch.file_counts.failed
+        return failed
+
+    @traced("store_rebuild.rebuild")
+    def rebuild(self, items: Iterable, records: dict, is_unchanged: Callable[[object], bool],
+                snapshot: dict | None = None) -> dict:
+        """
+        Builds a new store holding every item, waits for it to be indexed and switches the assistants to it.
+
+        The live store is not touched; it is retired with `snapshot` and kept for the rollback window.
+
+        Args:
+            items (Iterable): The Box file items the new store should hold (`id`, `name`, `created_at`, `content()`, `size`)
+            records (dict): Box file ID -> [vector store file ID, created_at] of the live store
+            is_unchanged (Callable): Whether an item's content is the one its record was uploaded from
+            snapshot (dict | None): The caller's sync state describing the live store, returned by `rollback`
+
+        Returns:
+            dict: The records of the new store
+
+        Raises:
+            RebuildError: The new store could not be built, indexed or switched to; it was deleted
+        """
+        start = time.perf_counter()
+        previous = self.assistant_stores()
+        live = {store_id for stores in previous.values() for store_id in stores}
+        if len(live) > 1:
+            raise RebuildError(f"The assistants search different vector stores ({', '.join(sorted(live))}).")
+        live_store_id = next(iter(live), None)
+
+        store = self.client.beta.vector_stores.create(name=f"{self.store_name} {time.strftime('%Y-%m-%d %H:%M')}")
+        logging.info(f"Rebuilding into vector store {store.id} while {live_store_id} stays live")
+        uploaded = []
+        try:
+            new_records, files = {}, []
+            for item in items:
+                record = records.get(item.id)
+                size = getattr(item, "size", None)
+                if record and is_unchanged(item):
+                    file_id = record[0]
+                    REBUILD_FILES.inc(result="reused")
+                else:
+                    content = item.content()
+                    size = len(content)
+                    file_id = self.client.files.create(file=(item.name, io.BytesIO(content)), purpose="assistants").id
+                    uploaded.append(file_id)
+                    REBUILD_FILES.inc(result="uploaded")
+                new_records[item.id] = [file_id, item.created_at]
+                files.append((item.name, size, file_id))
+
+            failed = self._index(store.id, files)
+            if failed > self.max_failed_files:
+                raise RebuildError(f"{failed} file(s) failed to index in vector store {store.id}.")
+            self.switch(store.id, previous)
+        except Exception as e:
+            REBUILDS.inc(result="failed")
+            logging.error(f"Rebuild failed, {live_store_id} stays live: {e}")
+            self._delete_store(store.id, uploaded)
+            if isinstance(e, RebuildError):
+                raise
+            raise RebuildError(f"Could not build vector store {store.id}.") from e
+
+        if live_store_id:
+            self.retired.append({"vector_store_id": live_store_id, "retired_at": time.time(), "snapshot": snapshot})
+        self.live_store_id = store.id
+        self.vector_store.vector_store_id = store.id
+        self.save_state()
+        REBUILDS.inc(result="switched")
+        REBUILD_LATENCY.observe(time.perf_counter() - start)
+        logging.info(f"Rebuilt vector store {store.id} in {time.perf_counter() - start:.0f}s: "
+                     f"{len(files) - len(uploaded)} file(s) reused, {len(uploaded)} uploaded")
+        return new_records
+
+    @traced("store_rebuild.rollback")
+    def rollback(self, snapshot: dict | None = None) -> dict | None:
+        """
+        Switches the assistants back to the most recently retired store.
+
+        The store rolled back from is retired in turn, so it can be switched to again within the window.
+
+        Args:
+            snapshot (dict | None): The caller's sync state describing the current live store
+
+        Returns:
+            dict | None: The snapshot saved when the store switched back to was retired
+
+        Raises:
+            RebuildError: No retired store is left, or the assistants could not be switched
+        """
+        if not self.retired:
+            raise RebuildError("No retired vector store to roll back to.")
+        target = self.retired[-1]
+        self.switch(target["vector_store_id"])
+        self.retired.pop()
+        if self.live_store_id:
+            self.retired.append({"vector_store_id": self.live_store_id, "retired_at": time.time(), "snapshot": snapshot})
+        self.live_store_id = target["vector_store_id"]
+        self.vector_store.vector_store_id = self.live_store_id
+        self.save_state()
+        REBUILDS.inc(result="rolled_back")
+        logging.info(f"Rolled back to vector store {self.live_store_id}")
+        return target["snapshot"]
+
+    def _store_file_ids(self, vector_store_id: str) -> set[str]:
+        return {entry.id for entry in self.client.beta.vector_stores.files.list(vector_store_id=vector_store_id)}
+
+    def _delete_store(self, vector_store_id: str, file_ids: Iterable[str]) -> bool:
+        try:
+            self.client.beta.vector_stores.delete(vector_store_id)
+            for file_id in file_ids:
+                self.client.files.delete(file_id)
+            return True
+        except Exception as e:
+            logging.error(f"Failed to delete vector store {vector_store_id}: {e}")
+            return False
+
+    @traced("store_rebuild.collect_garbage")
+    def collect_garbage(self, now: float | None = None) -> list[str]:
+        """
+        Deletes the retired stores older than the rollback window, and their files no remaining store uses.
+
+        Args:
+            now (float | None): The current time (defaults to `time.time()`)
+
+        Returns:
+            list[str]: The deleted stores
+        """
+        now = now if now is not None else time.time()
+        expired = [entry for entry in self.retired if now - entry["retired_at"] >= self.rollback_window]
+        if not expired:
+            return []
+        kept = [entry["vector_store_id"] for entry in self.retired if entry not in expired]
+        in_use = set()
+        for store_id in [self.live_store_id, *kept]:
+            if store_id:
+                in_use |= self._store_file_ids(store_id)
+
+        deleted = []
+        for entry in expired:
+            store_id = entry["vector_store_id"]
+            try:
+                orphans = self._store_file_ids(store_id) - in_use
+            except Exception as e:
+                logging.error(f"Failed to list vector store {store_id}, keeping it: {e}")
+                continue
+            if not self._delete_store(store_id, orphans):
+                continue
+            self.retired.remove(entry)
+            deleted.append(store_id)
+            logging.info(f"Deleted retired vector store {store_id} and {len(orphans)} file(s) only it used")
+        self.save_state()
+        return deleted
@@ -0,0 +1,168 @@
+"""
+This module manages how much conversation history each assistant run reads.
+
+Without limits, every run re-reads the whole thread, so prompt tokens and latency grow with every turn.
+The manager applies a configurable truncation strategy and prompt token cap to each run, records the
+prompt tokens and run duration per turn so the growth can be observed, and decides when a thread has grown
+large enough to be compacted into a fresh thread that starts from a summary.
+
+Classes:
+- ThreadContextManager: Holds the context settings, per-thread usage and the redirects of compacted threads.
+
+Usage:
+- Pass one shared instance to every `AssistantAPI` so compaction redirects apply regardless of the model.
+- Use `run_options()` when creating a run, `record_run()` after it finishes, and `resolve()` on incoming thread IDs.
+- Pass a `UsageLedger` to also append every recorded run to the usage ledger.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+
+from metrics import REGISTRY
+
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+
+PROMPT_TOKENS = REGISTRY.histogram(
+    "assistant_run_prompt_tokens", "Prompt tokens per run, by the turn of the thread the run answered.",
+    ("turn",), buckets=TOKEN_BUCKETS,
+)
+RUN_SECONDS_BY_TURN = REGISTRY.histogram(
+    "assistant_run_seconds_by_turn", "Run duration by the turn of the thread the run answered.", ("turn",)
+)
+COMPACTIONS = REGISTRY.counter("assistant_thread_compactions_total", "Threads compacted into a summary thread.")
+
+
+def turn_bucket(turn: int) -> str:
+    """Groups a turn number into a low-cardinality metric label."""
+    for upper, label in ((1, "1"), (5, "2-5"), (10, "6-10"), (20, "11-20"), (50, "21-50")):
+        if turn <= upper:
+            return label
+    return "51+"
+
+
+class ThreadContextManager:
+    """
+    Context settings and per-thread usage shared by the assistants.
+
+    Attributes:
+        last_messages (int | None): Number of most recent messages a run reads (None lets OpenAI truncate automatically)
+        max_prompt_tokens (int | None): Upper bound of prompt tokens per run
+        compaction_threshold (int | None): Prompt tokens above which a thread is compacted (None disables compaction)
+        max_tracked_threads (int): Number of threads whose usage, and of compacted threads whose redirect, is
+            remembered (least recently used are dropped)
+        ledger (UsageLedger | None): Where every recorded run is appended, if anywhere
+    """
+    def __init__(self, last_messages: int | None = None, max_prompt_tokens: int | None = None,
+                 compaction_threshold: int | None = None, max_tracked_threads: int = 10000, ledger=None):
+        self.last_messages = last_messages
+        self.max_prompt_tokens = max_prompt_tokens
+        self.compaction_threshold = compaction_threshold
+        self.max_tracked_threads = max_tracked_threads
+        self.ledger = ledger
+        self._usage = OrderedDict()  # thread_id -> {"turns": int, "prompt_tokens": [int, ...]}
+        self._redirects = OrderedDict()  # compacted thread_id -> summary thread_id
+        self._compacting = set()
+        self._lock = threading.Lock()
+
+    def run_options(self) -> dict:
+        """
+        Returns the keyword arguments that apply the context settings to `runs.create`.
+
+        Returns:
+            dict: `truncation_strategy` and, if configured, `max_prompt_tokens`
+        """
+        options = {}
+        if self.last_messages:
+            options["truncation_strategy"] = {"type": "last_messages", "last_messages": self.last_messages}
+        else:
+            options["truncation_strategy"] = {"type": "auto"}
+        if self.max_prompt_tokens:
+            options["max_prompt_tokens"] = self.max_prompt_tokens
+        return options
+
+    def resolve(self, thread_id: str) -> str:
+        """
+        Follows compaction redirects to the thread that currently continues the conversation.
+
+        Args:
+            thread_id (str): A thread ID sent by the client
+
+        Returns:
+            str: The ID of the live thread
+        """
+        seen = set()
+        with self._lock:
+            while thread_id in self._redirects and thread_id not in seen:
+                seen.add(thread_id)
+                self._redirects.move_to_end(thread_id)
+                thread_id = self._redirects[thread_id]
+        return thread_id
+
+    def record_run(self, thread_id: str, run, duration: float):
+        """
+        Records the prompt tokens and duration of a finished run against its thread's turn number.
+
+        Args:
+            thread_id (str): The thread the run answered on
+            run (Run): The finished run (its `usage` may be None for failed runs)
+            duration (float): Seconds from run creation to completion
+        """
+        prompt_tokens = run.usage.prompt_tokens if getattr(run, "usage", None) else None
+        with self._lock:
+            usage = self._usage.pop(thread_id, None) or {"turns": 0, "prompt_tokens": []}
+            usage["turns"] += 1
+            if prompt_tokens is not None:
+                usage["prompt_tokens"].append(prompt_tokens)
+            self._usage[thread_id] = usage
+            while len(self._usage) > self.max_tracked_threads:
+                self._usage.popitem(last=False)
+            turn = usage["turns"]
+
+        if self.ledger is not None:
+            self.ledger.record(thread_id, run, duration, turn)
+        label = turn_bucket(turn)
+        RUN_SECONDS_BY_TURN.observe(duration, turn=label)
+        if prompt_tokens is not None:
+            PROMPT_TOKENS.observe(prompt_tokens, turn=label)
+            logging.info(f"Thread {thread_id} turn {turn}: {prompt_tokens} prompt tokens in {duration:.2f}s")
+
+    def usage(self, thread_id: str) -> dict | None:
+        """Returns the number of turns and prompt tokens per turn recorded for a thread."""
+        usage = self._usage.get(thread_id)
+        return {"turns": usage["turns"], "prompt_tokens": list(usage["prompt_tokens"])} if usage else None
+
+    def needs_compaction(self, thread_id: str) -> bool:
+        """Returns whether the thread's last run exceeded the compaction threshold and no compaction is underway."""
+        if not self.compaction_threshold:
+            return False
+        usage = self._usage.get(thread_id)
+        if not usage or not usage["prompt_tokens"]:
+            return False
+        return usage["prompt_tokens"][-1] > self.compaction_threshold and thread_id not in self._compacting
+
+    def begin_compaction(self, thread_id: str) -> bool:
+        """Marks a thread as being compacted; returns False if it already is."""
+        with self._lock:
+            if thread_id in self._compacting:
+                return False
+            self._compacting.add(thread_id)
+            return True
+
+    def finish_compaction(self, thread_id: str, new_thread_id: str | None):
+        """
+        Ends a compaction and, if it succeeded, redirects the old thread to the summary thread.
+
+        Args:
+            thread_id (str): The compacted thread
+            new_thread_id (str | None): The summary thread, or None if compaction failed
+        """
+        with self._lock:
+            self._compacting.discard(thread_id)
+            if new_thread_id:
+                self._redirects[thread_id] = new_thread_id
+                while len(self._redirects) > self.max_tracked_threads:
+                    self._redirects.popitem(last=False)
+                self._usage.pop(thread_id, None)
+        if new_thread_id:
+            COMPACTIONS.inc()
@@ -0,0 +1,199 @@
+"""
+This module caches the message history of threads so a reloaded frontend can restore a conversation cheaply.
+
+A thread is read from OpenAI once, the first time its history is requested, and kept as compact messages with
+citations already resolved. Questions, answers and attachments handled by this backend are appended as they
+happen, so the cache stays current without reading the thread again. Pages are cut from the newest message
+backwards with a positional cursor, and carry an ETag so an unchanged page costs a 304.
+
+Classes:
+- ThreadHistoryCache: Caches compact thread histories and serves them in pages.
+
+Functions:
+- exchange_messages(question: str, response: str, citations: list[str]) -> list[dict]: Builds the compact messages of one answered question.
+
+Usage:
+- Create the cache with a blocking `load(thread_id)` returning the thread's compact messages, oldest first.
+- Call `start()` for new threads, `append()` after each answer or attachment and `forget()` when a thread is deleted.
+- Call `page()` with the request's `If-None-Match` to serve a history request; answer 304 when it returns no page.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable
+
+from metrics import REGISTRY
+
+HISTORY_REQUESTS = REGISTRY.counter(
+    "thread_history_requests_total", "Thread history pages served, by whether the thread was cached.", ("result",)
+)
+HISTORY_NOT_MODIFIED = REGISTRY.counter(
+    "thread_history_not_modified_total", "Thread history requests answered with 304 because the client's copy was current."
+)
+HISTORY_THREADS = REGISTRY.gauge("thread_history_cached_threads", "Threads whose history is cached.")
+
+
+def exchange_messages(question: str, response: str, citations: list[str]) -> list[dict]:
+    """
+    Builds the compact user and assistant messages of one answered question, as `AssistantAPI.list_messages` reads them.
+
+    Args:
+        question (str): The user's question
+        response (str): The answer, with citation markers already stripped
+        citations (list[str]): The cited file names
+
+    Returns:
+        list[dict]: The user message and the assistant message
+    """
+    now = int(time.time())
+    answer = {"role": "assistant", "content": response, "created_at": now}
+    if citations:
+        answer["citations"] = list(citations)
+    return [{"role": "user", "content": question, "created_at": now}, answer]
+
+
+class ThreadHistoryCache:
+    """
+    Caches the compact message history of threads, evicting the least recently used beyond `max_threads`.
+
+    A thread that was compacted keeps its full history here: appending to the new thread ID with the old one
+    among the `previous` IDs moves the cached history over.
+
+    Attributes:
+        max_threads (int): The most threads held at once
+    """
+    def __init__(self, load: Callable[[str], list[dict]], max_threads: int = 1000):
+        """
+        Initializes an empty cache.
+
+        Args:
+            load (Callable): Blocking function returning a thread's compact messages, oldest first
+            max_threads (int): The most threads held at once
+        """
+        self.load = load
+        self.max_threads = max_threads
+        self._threads = OrderedDict()  # thread_id -> list of compact messages, oldest first
+        self._lock = threading.Lock()
+
+    def _store(self, thread_id: str, messages: list[dict]):
+        self._threads[thread_id] = messages
+        self._threads.move_to_end(thread_id)
+        while len(self._threads) > self.max_threads:
+            self._threads.popitem(last=False)
+        HISTORY_THREADS.set(len(self._threads))
+
+    def start(self, thread_id: str):
+        """Caches a new thread as empty, so its history never needs to be read from OpenAI."""
+        with self._lock:
+            if thread_id not in self._threads:
+                self._store(thread_id, [])
+
+    def append(self, thread_id: str, messages: Iterable[dict], previous: Iterable[str | None] = (),
+               new: bool = False) -> bool:
+        """
+        Appends messages to a cached thread.
+
+        Args:
+            thread_id (str): The live thread ID
+            messages (Iterable[dict]): The compact messages to append, oldest first
+            previous (Iterable[str | None]): Earlier IDs of the thread (before a compaction) whose history carries over
+            new (bool): Whether the thread was just created, so its history is exactly `messages`
+
+        Returns:
+            bool: Whether the messages were appended (False if the thread is not cached and not new)
+        """
+        with self._lock:
+            history = self._threads.get(thread_id)
+            if history is None:
+                for old_thread_id in previous:
+                    if old_thread_id and old_thread_id != thread_id and old_thread_id in self._threads:
+                        history = self._threads.pop(old_thread_id)
+                        break
+            if history is None:
+                if not new:
+                    # Unknown history; the next request reads the whole thread instead
+                    return False
+                history = []
+            history.extend(messages)
+            self._store(thread_id, history)
+            return True
+
+    def is_empty(self, thread_id: str) -> bool:
+        """Returns whether a thread is cached and has no messages yet, e.g. a thread just handed out by `/create-thread`."""
+        with self._lock:
+            return self._threads.get(thread_id) == []
+
+    def recent(self, thread_id: str, limit: int) -> list[dict] | None:
+        """
+        Returns the last messages of a cached thread without reading it from OpenAI.
+
+        Args:
+            thread_id (str): The thread ID
+            limit (int): The most messages returned
+
+        Returns:
+            list[dict] | None: The messages, oldest first, or None if the thread is not cached
+        """
+        with self._lock:
+            history = self._threads.get(thread_id)
+            if history is None:
+                return None
+            return list(history[-limit:]) if limit > 0 else []
+
+    def forget(self, thread_id: str):
+        """Drops a thread, e.g. after it was deleted."""
+        with self._lock:
+            self._threads.pop(thread_id, None)
+            HISTORY_THREADS.set(len(self._threads))
+
+    def _history(self, thread_id: str, aliases: Iterable[str | None]) -> list[dict]:
+        with self._lock:
+            for candidate in (thread_id, *aliases):
+                if candidate in self._threads:
+                    self._threads.move_to_end(candidate)
+                    HISTORY_REQUESTS.inc(result="hit")
+                    return self._threads[candidate]
+
+        HISTORY_REQUESTS.inc(result="miss")
+        messages = self.load(thread_id)
+        with self._lock:
+            # Keep what was appended while the thread was being read
+            if thread_id not in self._threads:
+                self._store(thread_id, messages)
+            return self._threads[thread_id]
+
+    def page(self, thread_id: str, before: int | None = None, limit: int = 50,
+             aliases: Iterable[str | None] = (), if_none_match: str | None = None) -> tuple[dict | None, str]:
+        """
+        Returns a page of a thread's history, reading the thread from OpenAI if it is not cached.
+
+        Args:
+            thread_id (str): The live thread ID
+            before (int | None): The cursor of the previous page, or None for the newest messages
+            limit (int): The most messages in the page
+            aliases (Iterable[str | None]): Other IDs the history may be cached under (e.g. before a compaction)
+            if_none_match (str | None): The ETag of the client's copy of the page
+
+        Returns:
+            tuple[dict | None, str]: The page (`messages` oldest first, `next_cursor` for older messages or None,
+            `total`), or None if it matches `if_none_match`, and its ETag
+        """
+        history = self._history(thread_id, aliases)
+        with self._lock:
+            total = len(history)
+            end = total if before is None else max(0, min(before, total))
+            start = max(0, end - limit)
+            messages = history[start:end]
+
+        page = {"thread_id": thread_id, "messages": messages, "next_cursor": str(start) if start else None, "total": total}
+        digest = hashlib.sha1(json.dumps(page, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+        etag = f'W/"{digest[:32]}"'
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            HISTORY_NOT_MODIFIED.inc()
+            return None, etag
+        logging.debug(f"History page of thread {thread_id}: messages {start}-{end} of {total}")
+        return page, etag
@@ -0,0 +1,174 @@
+"""
+This module provides a warm pool of pre-created OpenAI threads so that `/create-thread` can answer immediately.
+
+Threads are not tied to an assistant, so one pool serves every model. A background task keeps the pool
+topped up to its low-water mark and deletes pooled threads that have gone unused for longer than `max_age`.
+
+Classes:
+- ThreadPool: A pool of pre-created thread IDs with a background refill task.
+
+Usage:
+- Create the pool with the `create_thread` / `delete_thread` methods of an `AssistantAPI`.
+- Call `start()` on application startup and `stop()` on shutdown.
+- Use `acquire()` to take a thread ID; it returns None on a miss so the caller can create one directly.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable
+
+from metrics import REGISTRY
+
+POOL_REQUESTS = REGISTRY.counter("thread_pool_requests_total", "Thread requests served by the pool, by result.", ("result",))
+POOL_SIZE = REGISTRY.gauge("thread_pool_size", "Pre-created threads currently waiting in the pool.")
+POOL_REFILL_LATENCY = REGISTRY.histogram("thread_pool_refill_seconds", "Latency of creating one pooled thread.")
+POOL_EXPIRED = REGISTRY.counter("thread_pool_expired_total", "Pooled threads deleted because they went unused.")
+
+
+class ThreadPool:
+    """
+    A pool of pre-created thread IDs that is refilled in the background.
+
+    Attributes:
+        low_water_mark (int): The number of threads the pool is kept topped up to
+        max_age (float): Seconds after which an unused pooled thread is deleted
+        hits (int): Number of `acquire` calls served from the pool
+        misses (int): Number of `acquire` calls that found the pool empty
+    """
+    def __init__(self, create_thread: Callable[[], str], delete_thread: Callable[[str], object],
+                 low_water_mark: int = 5, max_age: float = 3600.0, retry_delay: float = 5.0):
+        """
+        Initializes an empty pool; nothing is created until `start` is called.
+
+        Args:
+            create_thread (Callable[[], str]): Blocking function that creates a thread and returns its ID
+            delete_thread (Callable[[str], object]): Blocking function that deletes a thread by ID
+            low_water_mark (int): The number of threads to keep ready
+            max_age (float): Seconds after which an unused pooled thread is deleted
+            retry_delay (float): Seconds to wait before retrying after a failed refill
+        """
+        self.create_thread = create_thread
+        self.delete_thread = delete_thread
+        self.low_water_mark = low_water_mark
+        self.max_age = max_age
+        self.retry_delay = retry_delay
+        self.hits = 0
+        self.misses = 0
+        self._threads = deque()  # (thread_id, created_at) pairs, oldest first
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self) -> int:
+        return len(self._threads)
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of `acquire` calls served from the pool."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        """Returns the pool size, hit/miss counts and hit rate."""
+        return {"size": len(self._threads), "hits": self.hits, "misses": self.misses, "hit_rate": round(self.hit_rate, 4)}
+
+    def acquire(self) -> str | None:
+        """
+        Takes the newest unexpired thread from the pool and schedules a refill.
+
+        Returns:
+            str | None: A thread ID, or None if the pool is empty
+        """
+        now = time.monotonic()
+        thread_id = None
+        while self._threads:
+            candidate, created_at = self._threads.pop()
+            if now - created_at < self.max_age:
+                thread_id = candidate
+                break
+            # Anything older than this one is older still; leave them all to the expiry sweep
+            self._threads.append((candidate, created_at))
+            break
+
+        if thread_id is None:
+            self.misses += 1
+            POOL_REQUESTS.inc(result="miss")
+        else:
+            self.hits += 1
+            POOL_REQUESTS.inc(result="hit")
+        POOL_SIZE.set(len(self._threads))
+        self._wakeup.set()
+        return thread_id
+
+    async def _expire(self):
+        now = time.monotonic()
+        while self._threads and now - self._threads[0][1] >= self.max_age:
+            thread_id, _ = self._threads.popleft()
+            POOL_EXPIRED.inc()
+            try:
+                await asyncio.to_thread(self.delete_thread, thread_id)
+            except Exception as e:
+                logging.warning(f"Failed to delete expired pooled thread {thread_id}: {e}")
+        POOL_SIZE.set(len(self._threads))
+
+    async def _refill(self):
+        while len(self._threads) < self.low_water_mark:
+            start = time.perf_counter()
+            thread_id = await asyncio.to_thread(self.create_thread)
+            POOL_REFILL_LATENCY.observe(time.perf_counter() - start)
+            self._threads.append((thread_id, time.monotonic()))
+            POOL_SIZE.set(len(self._threads))
+
+    async def _run(self):
+        while True:
+            try:
+                await self._expire()
+                await self._refill()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Thread pool refill failed: {e}")
+                await asyncio.sleep(self.retry_delay)
+                continue
+
+            # Sleep until a thread is taken, or until the oldest pooled thread is due to expire
+            self._wakeup.clear()
+            timeout = self.max_age - (time.monotonic() - self._threads[0][1]) if self._threads else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0) if timeout is not None else None)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Starts the background refill task on the running event loop."""
+        if self._task is None and self.low_water_mark > 0:
+            # Bind the wakeup event to the loop the refill task runs on
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logging.info(f"Thread pool started with low-water mark {self.low_water_mark}")
+
+    async def stop(self, delete_pooled: bool = True):
+        """
+        Stops the refill task and optionally deletes the threads still waiting in the pool.
+
+        Args:
+            delete_pooled (bool): Whether to delete the unused pooled threads
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if delete_pooled:
+            while self._threads:
+                thread_id, _ = self._threads.popleft()
+                try:
+                    await asyncio.to_thread(self.delete_thread, thread_id)
+                except Exception as e:
+                    logging.warning(f"Failed to delete pooled thread {thread_id}: {e}")
+        POOL_SIZE.set(len(self._threads))
+        logging.info(f"Thread pool stopped: {self.stats()}")
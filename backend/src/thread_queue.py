@@ -0,0 +1,310 @@
+"""
+This module serializes the work done on each thread, so two requests never start runs on the same thread at once.
+
+OpenAI rejects a message or run on a thread that already has an active run. A double-submitted question, or a
+retry sent while the first answer is still being generated, used to fail with a 500 that the user retried,
+adding to the pile. Requests for the same thread now queue behind the active one, in arrival order, while
+different threads run fully in parallel. With merging on, a request that repeats a question already queued or
+running on the thread is merged into it and gets the same answer without a second run.
+
+Within one worker the queue is an `asyncio.Lock` per thread. With several workers, a shared lock backend (Redis)
+is taken as well, held for as long as the work runs and renewed while it does. The `redis` package is only
+needed for that backend and is not in `requirements.txt`; install it alongside when running several workers.
+
+Classes:
+- ThreadBusyError: The thread stayed busy longer than the queue waits.
+- MemoryLockBackend: A shared lock backend within one process, for tests and single-worker deployments.
+- RedisLockBackend: A shared lock backend in Redis, for several workers.
+- ThreadQueue: Runs blocking work on a thread once the thread is free, optionally merging duplicates.
+
+Usage:
+- Create one queue per worker, with a `RedisLockBackend.from_url(...)` when running several workers.
+- Wrap every call that adds messages or runs to an existing thread in `await queue.run(thread_id, func, merge_key)`.
+- Answer `ThreadBusyError` with 409 so the client retries later instead of stacking more requests.
+- Call `queue.keep_held(thread_id, future)` from work that goes on in the background after it returns, so the next
+  request on the thread waits for it too.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import secrets
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, TypeVar
+
+from metrics import REGISTRY
+
+T = TypeVar("T")
+
+QUEUE_WAIT = REGISTRY.histogram(
+    "thread_queue_wait_seconds", "Time a request waited for its thread to be free.",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+QUEUE_WAITING = REGISTRY.gauge("thread_queue_waiting", "Requests waiting for their thread to be free.")
+QUEUE_MERGED = REGISTRY.counter("thread_queue_merged_total", "Requests merged into an identical request on the same thread.")
+QUEUE_TIMEOUTS = REGISTRY.counter("thread_queue_timeouts_total", "Requests rejected because their thread stayed busy.")
+
+# Deletes or extends the lock only if it is still held with our token, so an expired lock taken over by
+# another worker is never released or renewed by the previous owner
+RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+EXTEND_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+
+
+class ThreadBusyError(Exception):
+    """The thread stayed busy longer than the queue waits."""
+
+
+class MemoryLockBackend:
+    """Shared locks held in this process, with the same expiry semantics as the Redis backend."""
+    def __init__(self):
+        self._locks = {}  # key -> (token, expires at)
+
+    def _owner(self, key: str) -> str | None:
+        token, expires_at = self._locks.get(key, (None, 0.0))
+        return token if time.monotonic() < expires_at else None
+
+    async def acquire(self, key: str, token: str, ttl: float) -> bool:
+        if self._owner(key) is not None:
+            return False
+        self._locks[key] = (token, time.monotonic() + ttl)
+        return True
+
+    async def extend(self, key: str, token: str, ttl: float) -> bool:
+        if self._owner(key) != token:
+            return False
+        self._locks[key] = (token, time.monotonic() + ttl)
+        return True
+
+    async def release(self, key: str, token: str):
+        if self._owner(key) == token:
+            del self._locks[key]
+
+
+class RedisLockBackend:
+    """
+    Shared locks in Redis: `SET NX PX` to take a lock, and compare-and-delete scripts to release or renew it.
+
+    Attributes:
+        client (redis.asyncio.Redis): The Redis client
+        prefix (str): Prepended to every lock key
+    """
+    def __init__(self, client, prefix: str = "thread-lock:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "thread-lock:") -> "RedisLockBackend":
+        """
+        Connects to Redis; the `redis` package is only needed when this backend is used.
+
+        Args:
+            url (str): The Redis URL, e.g. `redis://localhost:6379/0`
+            prefix (str): Prepended to every lock key
+
+        Returns:
+            RedisLockBackend: The backend
+
+        Raises:
+            ImportError: The `redis` package is not installed
+        """
+        try:
+            import redis.asyncio
+        except ImportError as e:
+            raise ImportError("The shared thread lock needs the `redis` package (pip install redis).") from e
+
+        return cls(redis.asyncio.from_url(url), prefix)
+
+    async def acquire(self, key: str, token: str, ttl: float) -> bool:
+        return bool(await self.client.set(self.prefix + key, token, nx=True, px=int(ttl * 1000)))
+
+    async def extend(self, key: str, token: str, ttl: float) -> bool:
+        return bool(await self.client.eval(EXTEND_SCRIPT, 1, self.prefix + key, token, int(ttl * 1000)))
+
+    async def release(self, key: str, token: str):
+        await self.client.eval(RELEASE_SCRIPT, 1, self.prefix + key, token)
+
+
+class ThreadQueue:
+    """
+    Runs blocking work on a thread once no other work of this worker, or of any worker sharing the backend,
+    is running on it.
+
+    Attributes:
+        backend (MemoryLockBackend | RedisLockBackend | None): The lock shared between workers, or None for one worker
+        merge (bool): Whether a request repeating a queued or running request on the same thread shares its result
+        max_wait (float): Most seconds a request waits for its thread before `ThreadBusyError`
+        lock_ttl (float): Seconds the shared lock outlives a worker that died holding it; renewed while work runs
+        poll_interval (float): Seconds between attempts to take a shared lock held by another worker
+    """
+    def __init__(self, backend=None, merge: bool = False, max_wait: float = 120.0, lock_ttl: float = 30.0,
+                 poll_interval: float = 0.05):
+        self.backend = backend
+        self.merge = merge
+        self.max_wait = max_wait
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self._locks = {}  # thread_id -> [asyncio.Lock, number of requests holding or waiting for it]
+        self._inflight = {}  # (thread_id, merge key) -> future of the result
+        self._kept = {}  # thread_id -> concurrent future of work that goes on after `run` returns
+        self._releases = set()
+
+    def waiting(self, thread_id: str) -> int:
+        """Returns how many requests of this worker hold or wait for a thread."""
+        entry = self._locks.get(thread_id)
+        return entry[1] if entry else 0
+
+    async def _renew(self, thread_id: str, token: str):
+        while True:
+            await asyncio.sleep(self.lock_ttl / 3)
+            if not await self.backend.extend(thread_id, token, self.lock_ttl):
+                logging.warning(f"Lost the shared lock of thread {thread_id}")
+                return
+
+    async def _acquire_shared(self, thread_id: str, token: str, deadline: float):
+        while not await self.backend.acquire(thread_id, token, self.lock_ttl):
+            if time.monotonic() >= deadline:
+                raise ThreadBusyError(f"Thread {thread_id} is busy in another worker.")
+            await asyncio.sleep(self.poll_interval)
+
+    @asynccontextmanager
+    async def hold(self, thread_id: str):
+        """
+        Waits until the thread is free and holds it for the duration of the block.
+
+        Args:
+            thread_id (str): The thread
+
+        Raises:
+            ThreadBusyError: The thread stayed busy for `max_wait` seconds
+        """
+        entry = self._locks.setdefault(thread_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        start = time.monotonic()
+        deadline = start + self.max_wait
+        QUEUE_WAITING.inc()
+        waiting = True
+        try:
+            try:
+                await asyncio.wait_for(entry[0].acquire(), self.max_wait)
+            except asyncio.TimeoutError:
+                raise ThreadBusyError(f"Thread {thread_id} is busy.")
+            try:
+                token, renewal = None, None
+                if self.backend is not None:
+                    token = secrets.token_hex(8)
+                    await self._acquire_shared(thread_id, token, deadline)
+                    renewal = asyncio.create_task(self._renew(thread_id, token))
+                QUEUE_WAITING.dec()
+                waiting = False
+                QUEUE_WAIT.observe(time.monotonic() - start)
+                try:
+                    yield
+                finally:
+                    if renewal is not None:
+                        renewal.cancel()
+                        await self.backend.release(thread_id, token)
+            finally:
+                entry[0].release()
+        except ThreadBusyError as e:
+            QUEUE_TIMEOUTS.inc()
+            logging.warning(f"{e} Waited {time.monotonic() - start:.1f}s behind {entry[1] - 1} request(s).")
+            raise
+        finally:
+            if waiting:
+                QUEUE_WAITING.dec()
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(thread_id, None)
+
+    async def run(self, thread_id: str, func: Callable[[], T], merge_key: str | None = None) -> T:
+        """
+        Runs `func` in a worker thread once the thread is free.
+
+        Args:
+            thread_id (str): The thread the work adds messages or runs to
+            func (Callable): The blocking work
+            merge_key (str | None): Identifies repeated requests (e.g. the question); a request whose key matches
+                one queued or running on the same thread returns that request's result instead of running
+
+        Returns:
+            The result of `func`, or of the request it was merged into
+
+        Raises:
+            ThreadBusyError: The thread stayed busy for `max_wait` seconds
+            Exception: Whatever `func` (or the request it was merged into) raised
+        """
+        key = (thread_id, merge_key) if self.merge and merge_key is not None else None
+        if key is not None and key in self._inflight:
+            QUEUE_MERGED.inc()
+            logging.info(f"Merged a repeated request on thread {thread_id}")
+            return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.get_running_loop().create_future() if key is not None else None
+        if key is not None:
+            self._inflight[key] = future
+        try:
+            hold = self.hold(thread_id)
+            await hold.__aenter__()
+            try:
+                result = await asyncio.to_thread(func)
+            except BaseException as e:
+                self._kept.pop(thread_id, None)
+                await hold.__aexit__(type(e), e, e.__traceback__)
+                raise
+            await self._release_when_done(thread_id, hold, self._kept.pop(thread_id, None))
+        except BaseException as e:
+            if future is not None:
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+                    # Mark the exception as retrieved, whether or not a merged request awaits it
+                    future.exception()
+            raise
+        finally:
+            if key is not None:
+                self._inflight.pop(key, None)
+        if future is not None:
+            future.set_result(result)
+        return result
+
+    def keep_held(self, thread_id: str, done: concurrent.futures.Future):
+        """
+        Keeps a thread held after the work running on it returns, until `done` completes or `max_wait` passes.
+
+        Called from the work passed to `run` (e.g. when an answer is added to the thread once a cancelled run
+        ends). For a thread the work created outside the queue, call `hold_kept` once the work returns.
+
+        Args:
+            thread_id (str): The thread
+            done (concurrent.futures.Future): Completes when the thread may be used again
+        """
+        self._kept[thread_id] = done
+
+    async def hold_kept(self, thread_id: str):
+        """Holds a thread that `keep_held` was called for outside of `run`, until its work is done."""
+        done = self._kept.pop(thread_id, None)
+        if done is not None:
+            hold = self.hold(thread_id)
+            await hold.__aenter__()
+            await self._release_when_done(thread_id, hold, done)
+
+    async def _release_when_done(self, thread_id: str, hold, done: concurrent.futures.Future | None):
+        if done is None:
+            await hold.__aexit__(None, None, None)
+            return
+        task = asyncio.create_task(self._release_after(thread_id, hold, done))
+        self._releases.add(task)
+        task.add_done_callback(self._releases.discard)
+
+    async def _release_after(self, thread_id: str, hold, done: concurrent.futures.Future):
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(done)), self.max_wait)
+        except asyncio.TimeoutError:
+            logging.warning(f"Released thread {thread_id} before the work kept on it was done")
+        except Exception:
+            # The work reports its own failures
+            pass
+        finally:
+            await hold.__aexit__(None, None, None)
@@ -0,0 +1,356 @@
+"""
+This module provides lightweight request tracing: nested spans that follow a request from the FastAPI
+handler through `AssistantAPI` and into the individual OpenAI and Box calls.
+
+Spans are only recorded when an exporter is configured, so tracing costs a single context-variable lookup
+per span when it is switched off. Finished spans are handed to a background thread in batches, so exporting
+never blocks the request path; if the export queue is full, spans are dropped rather than slowing requests down.
+
+Classes:
+- Span: One timed operation within a trace.
+- FileSpanExporter: Appends finished spans as JSON lines to a local file.
+- HttpSpanExporter: POSTs batches of finished spans to an OpenTelemetry collector as OTLP/HTTP JSON.
+
+Functions:
+- configure_tracing(target: str | None) -> None: Enables tracing for a `file:` path or an `http(s)://` collector URL.
+- span(name: str, **attributes): Context manager that records a span as a child of the current span.
+- traced(name: str): Decorator that records a span around every call of the decorated function.
+- current_trace_id() -> str | None: Returns the trace id of the active span.
+
+Usage:
+- Set `TRACE_EXPORT=file:traces.jsonl` or `TRACE_EXPORT=http://collector:4318/v1/traces` (the OTLP/HTTP traces
+  endpoint; `OTEL_SERVICE_NAME` names the service) and call `configure_tracing`. Calling it again replaces the
+  exporter, after exporting the spans still queued for the previous one.
+- Use `span` or `traced` around any operation that should show up in a request's trace.
+"""
+
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_processor = None
+
+
+class Span:
+    """
+    One timed operation within a trace.
+
+    Attributes:
+        name (str): The name of the operation (e.g. `openai.messages_create`)
+        trace_id (str): The 32 hex character id shared by every span of a trace
+        span_id (str): The 16 hex character id of this span
+        parent_id (str | None): The id of the enclosing span, if any
+        attributes (dict): Extra key/value data attached to the span
+        start_time (float): The wall clock start time (seconds since the epoch)
+        duration (float | None): The duration in seconds, set once the span ends
+        error (str | None): The exception type and message if the operation failed
+    """
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start_time", "duration", "error", "_start")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None = None, attributes: dict | None = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.start_time = time.time()
+        self.duration = None
+        self.error = None
+        self._start = time.perf_counter()
+
+    def set_attribute(self, key: str, value):
+        """Attaches a key/value pair to the span."""
+        self.attributes[key] = value
+
+    def end(self):
+        """Marks the span as finished."""
+        self.duration = time.perf_counter() - self._start
+
+    def to_dict(self) -> dict:
+        """Returns the span as a JSON-serializable dictionary."""
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class FileSpanExporter:
+    """
+    Appends finished spans as JSON lines to a local file.
+
+    Attributes:
+        path (str): The path of the JSON lines file
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: list[dict]):
+        """Writes a batch of spans to the file."""
+        with open(self.path, "a") as f:
+            for span_dict in spans:
+                f.write(json.dumps(span_dict, default=str) + "\n")
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(span_dict: dict) -> dict:
+    start = int(span_dict["start_time"] * 1e9)
+    otlp = {
+        "traceId": span_dict["trace_id"],
+        "spanId": span_dict["span_id"],
+        "name": span_dict["name"],
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(start),
+        "endTimeUnixNano": str(start + int((span_dict["duration_ms"] or 0) * 1e6)),
+        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span_dict["attributes"].items()],
+        # STATUS_CODE_ERROR, or STATUS_CODE_UNSET for spans that did not fail
+        "status": {"code": 2, "message": span_dict["error"]} if span_dict["error"] else {"code": 0},
+    }
+    if span_dict["parent_id"]:
+        otlp["parentSpanId"] = span_dict["parent_id"]
+    return otlp
+
+
+class HttpSpanExporter:
+    """
+    POSTs batches of finished spans to an OpenTelemetry collector as OTLP/HTTP JSON.
+
+    Attributes:
+        url (str): The collector's traces endpoint, e.g. `http://collector:4318/v1/traces`
+        service_name (str): The `service.name` resource attribute of the spans
+    """
+    def __init__(self, url: str, timeout: float = 5.0, service_name: str | None = None):
+        self.url = url
+        self.service_name = service_name or os.getenv("OTEL_SERVICE_NAME", "assistant-backend")
+        self.client = httpx.Client(timeout=timeout)
+
+    def payload(self, spans: list[dict]) -> dict:
+        """Returns the OTLP `ExportTraceServiceRequest` of a batch of spans."""
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [_otlp_span(span_dict) for span_dict in spans]}],
+        }]}
+
+    def export(self, spans: list[dict]):
+        """Sends a batch of spans to the collector."""
+        response = self.client.post(self.url, content=json.dumps(self.payload(spans), default=str),
+                                    headers={"Content-Type": "application/json"})
+        response.raise_for_status()
+
+    def close(self):
+        self.client.close()
+
+
+class _BatchProcessor:
+    """Collects finished spans on a bounded queue and exports them in batches from a daemon thread."""
+
+    def __init__(self, exporter, max_queue_size: int = 10000, batch_size: int = 256, flush_interval: float = 1.0):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._worker, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, finished: Span):
+        try:
+            self._queue.put_nowait(finished.to_dict())
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self, first: dict | None) -> list[dict]:
+        batch = [first] if first is not None else []
+        while len(batch) < self.batch_size:
+            try:
+                queued = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if queued is not None:
+                batch.append(queued)
+        return batch
+
+    def _worker(self):
+        while not self._stopped.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if first is not None:
+                self._export(self._drain(first))
+
+    def _export(self, batch: list[dict]):
+        try:
+            self.exporter.export(batch)
+        except Exception as e:
+            logging.warning(f"Failed to export {len(batch)} spans: {e}")
+
+    def flush(self):
+        """Exports every queued span synchronously."""
+        while not self._queue.empty():
+            batch = self._drain(None)
+            if batch:
+                self._export(batch)
+
+    def shutdown(self):
+        """Stops the export thread once its current batch is exported, then exports what is still queued."""
+        self._stopped.set()
+        try:
+            # Wakes the thread if it is waiting for spans
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._thread.join(self.flush_interval + 5)
+        self.flush()
+        close = getattr(self.exporter, "close", None)
+        if close is not None:
+            close()
+
+
+def _flush_at_exit():
+    processor = _processor
+    if processor is not None:
+        processor.flush()
+
+
+atexit.register(_flush_at_exit)
+
+
+def configure_tracing(target: str | None = None):
+    """
+    Enables span recording and export.
+
+    Args:
+        target (str | None): `file:<path>` for a local JSON lines file, an `http(s)://` OTLP/HTTP traces endpoint,
+            or None to read the `TRACE_EXPORT` environment variable. An empty target disables tracing.
+
+    The exporter configured before, if any, is shut down first.
+    """
+    global _processor
+    target = target if target is not None else os.getenv("TRACE_EXPORT", "")
+    previous, _processor = _processor, None
+    if previous is not None:
+        previous.shutdown()
+    if not target:
+        return
+
+    if target.startswith("file:"):
+        exporter = FileSpanExporter(target[len("file:"):])
+    elif target.startswith(("http://", "https://")):
+        exporter = HttpSpanExporter(target)
+    else:
+        raise ValueError(f"Unsupported trace export target: {target}")
+
+    _processor = _BatchProcessor(exporter)
+    logging.info(f"Tracing enabled, exporting spans to {target}")
+
+
+def tracing_enabled() -> bool:
+    """Returns whether spans are currently being recorded."""
+    return _processor is not None
+
+
+def current_trace_id() -> str | None:
+    """Returns the trace id of the active span, or None outside of a trace."""
+    active = _current_span.get()
+    return active.trace_id if active else None
+
+
+def parse_traceparent(header: str | None) -> tuple[str, str] | None:
+    """
+    Parses a W3C `traceparent` header so that traces can be continued from an upstream proxy or client.
+
+    Args:
+        header (str | None): The header value, e.g. `00-<trace id>-<parent id>-01`
+
+    Returns:
+        tuple[str, str] | None: The trace id and parent span id, or None if the header is missing or malformed
+    """
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+@contextmanager
+def span(name: str, parent: tuple[str, str] | None = None, **attributes):
+    """
+    Records a span around the `with` block as a child of the current span.
+
+    Args:
+        name (str): The name of the operation
+        parent (tuple[str, str] | None): An explicit (trace id, parent span id), used for incoming requests
+        **attributes: Extra data attached to the span
+
+    Yields:
+        Span | None: The active span, or None when tracing is disabled
+    """
+    if _processor is None:
+        yield None
+        return
+
+    enclosing = _current_span.get()
+    if parent is not None:
+        trace_id, parent_id = parent
+    elif enclosing is not None:
+        trace_id, parent_id = enclosing.trace_id, enclosing.span_id
+    else:
+        trace_id, parent_id = secrets.token_hex(16), None
+
+    active = Span(name, trace_id, parent_id, attributes)
+    token = _current_span.set(active)
+    try:
+        yield active
+    except BaseException as e:
+        active.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        active.end()
+        processor = _processor
+        if processor is not None:
+            processor.submit(active)
+
+
+def traced(name: str):
+    """
+    Decorator that records a span around every call of the decorated function.
+
+    Args:
+        name (str): The name of the span
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,198 @@
+"""
+This module records the token usage and latency of every assistant run, and reports them per user, model or thread.
+
+Each finished run (answers, escalations and compaction summaries alike) is appended as one JSON line to a local
+file: who asked, on which thread and turn, with which assistant and model, how the run ended, how long it took
+and how many prompt, completion and total tokens it used. The file is append-only, so it can be tailed, rotated
+with `logrotate` (`copytruncate`) or shipped elsewhere, and a crash loses at most a partly written last line.
+The report groups the records and gives count, error count, token totals and percentiles, plus the threads that
+used the most tokens, so runaway threads and the effect of routing and truncation settings can be found.
+
+Classes:
+- UsageLedger: Appends one JSON line per finished run.
+
+Functions:
+- read_usage(path: str, since: float | None) -> Iterator[dict]: Reads the records of a ledger file, skipping damaged lines.
+- summarize(records: Iterable[dict], by: str, top_threads: int) -> dict: Aggregates records into percentiles per group.
+
+Usage:
+- Set `current_user` for the request (it follows the request into worker threads), and pass the ledger to the
+  `ThreadContextManager`, which records every run it is told about.
+- Report with the `/usage-report` endpoint, or offline with `python usage_ledger.py usage.jsonl --by model --since-hours 24`.
+"""
+
+import argparse
+import contextvars
+import json
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Iterable, Iterator
+
+# The user whose request started the current run; set per request, and copied into `asyncio.to_thread` workers
+current_user = contextvars.ContextVar("usage_user", default=None)
+
+GROUP_KEYS = {"user": "user", "model": "model", "assistant": "assistant_id", "thread": "thread_id"}
+PERCENTILES = (50, 90, 99)
+
+
+class UsageLedger:
+    """
+    Appends the usage of each finished run to a JSON lines file.
+
+    Attributes:
+        path (str): The ledger file
+    """
+    def __init__(self, path: str):
+        """
+        Opens the ledger file for appending, creating it if needed.
+
+        Args:
+            path (str): The ledger file
+        """
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def record(self, thread_id: str, run, duration: float, turn: int | None = None):
+        """
+        Appends one finished run.
+
+        Args:
+            thread_id (str): The thread the run answered on
+            run (Run): The finished run (its `usage` may be None for failed runs)
+            duration (float): Seconds from run creation to completion
+            turn (int | None): The turn of the thread the run answered
+        """
+        usage = getattr(run, "usage", None)
+        entry = {
+            "ts": round(time.time(), 3),
+            "user": current_user.get(),
+            "thread_id": thread_id,
+            "turn": turn,
+            "run_id": getattr(run, "id", None),
+            "assistant_id": getattr(run, "assistant_id", None),
+            "model": getattr(run, "model", None),
+            "status": getattr(run, "status", None),
+            "seconds": round(duration, 4),
+            "prompt_tokens": usage.prompt_tokens if usage else None,
+            "completion_tokens": usage.completion_tokens if usage else None,
+            "total_tokens": usage.total_tokens if usage else None,
+        }
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        try:
+            with self._lock:
+                self._file.write(line)
+                self._file.flush()
+        except Exception as e:
+            # Accounting must never fail the user's request
+            logging.error(f"Failed to write usage of run {entry['run_id']}: {e}")
+
+    def close(self):
+        """Closes the ledger file."""
+        with self._lock:
+            self._file.close()
+
+
+def read_usage(path: str, since: float | None = None) -> Iterator[dict]:
+    """
+    Reads the records of a ledger file, oldest first.
+
+    Args:
+        path (str): The ledger file
+        since (float | None): Only records at or after this Unix time
+
+    Returns:
+        Iterator[dict]: The records; lines that are not valid JSON (e.g. cut off by a crash) are skipped
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if since is None or record.get("ts", 0) >= since:
+                yield record
+
+
+def _percentile(values: list[float], q: float) -> float | None:
+    """Returns the nearest-rank percentile of sorted values."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def _distribution(values: list[float]) -> dict:
+    values = sorted(values)
+    return {f"p{q}": _percentile(values, q) for q in PERCENTILES} | {"max": values[-1] if values else None}
+
+
+def summarize(records: Iterable[dict], by: str = "user", top_threads: int = 10) -> dict:
+    """
+    Aggregates run records per group.
+
+    Args:
+        records (Iterable[dict]): The records, e.g. from `read_usage`
+        by (str): The grouping: "user", "model", "assistant" or "thread"
+        top_threads (int): How many of the threads that used the most tokens to list
+
+    Returns:
+        dict: Per group, the number of runs, failed runs, token totals and the percentiles of seconds,
+        prompt tokens and total tokens; and the heaviest threads with their turns and largest prompt
+
+    Raises:
+        ValueError: The grouping is unknown
+    """
+    if by not in GROUP_KEYS:
+        raise ValueError(f"Unknown grouping '{by}', expected one of {', '.join(GROUP_KEYS)}.")
+    key = GROUP_KEYS[by]
+    groups = defaultdict(lambda: {"runs": 0, "failed": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                                  "total_tokens": 0, "_seconds": [], "_prompt": [], "_total": []})
+    threads = defaultdict(lambda: {"runs": 0, "total_tokens": 0, "max_prompt_tokens": 0, "max_turn": 0, "user": None})
+    runs = 0
+    for record in records:
+        runs += 1
+        group = groups[record.get(key) or "unknown"]
+        group["runs"] += 1
+        if record.get("status") != "completed":
+            group["failed"] += 1
+        group["_seconds"].append(record.get("seconds") or 0.0)
+        for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            group[field] += record.get(field) or 0
+        if record.get("prompt_tokens") is not None:
+            group["_prompt"].append(record["prompt_tokens"])
+        if record.get("total_tokens") is not None:
+            group["_total"].append(record["total_tokens"])
+
+        thread = threads[record.get("thread_id") or "unknown"]
+        thread["runs"] += 1
+        thread["total_tokens"] += record.get("total_tokens") or 0
+        thread["max_prompt_tokens"] = max(thread["max_prompt_tokens"], record.get("prompt_tokens") or 0)
+        thread["max_turn"] = max(thread["max_turn"], record.get("turn") or 0)
+        thread["user"] = record.get("user") or thread["user"]
+
+    report = {}
+    for name, group in sorted(groups.items(), key=lambda item: -item[1]["total_tokens"]):
+        report[name] = {
+            **{field: value for field, value in group.items() if not field.startswith("_")},
+            "seconds": _distribution(group["_seconds"]),
+            "prompt_tokens_per_run": _distribution(group["_prompt"]),
+            "total_tokens_per_run": _distribution(group["_total"]),
+        }
+    heaviest = sorted(threads.items(), key=lambda item: -item[1]["total_tokens"])[:top_threads]
+    return {"by": by, "runs": runs, "groups": report,
+            "top_threads": [{"thread_id": thread_id, **thread} for thread_id, thread in heaviest]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report assistant run usage and latency from a usage ledger.")
+    parser.add_argument("path", help="The usage ledger (JSON lines)")
+    parser.add_argument("--by", choices=sorted(GROUP_KEYS), default="user")
+    parser.add_argument("--since-hours", type=float, default=None, help="Only runs from the last N hours")
+    parser.add_argument("--top-threads", type=int, default=10)
+    args = parser.parse_args()
+
+    since = time.time() - args.since_hours * 3600 if args.since_hours else None
+    print(json.dumps(summarize(read_usage(args.path, since), args.by, args.top_threads), indent=2))
@@ -1,14 +1,30 @@
+import json
 import logging
 import os
 from dotenv import load_dotenv
 from openai import OpenAI
 import io
+from tracing import traced
+from chunking import ChunkingPolicy, load_policy
+
+
+def _stream_size(file_stream):
+    """Returns the size in bytes of a seekable stream without moving it, or None."""
+    try:
+        position = file_stream.tell()
+        size = file_stream.seek(0, io.SEEK_END)
+        file_stream.seek(position)
+        return size - position
+    except (AttributeError, OSError):
+        return None
 
 class OpenAIVectorStoreAPI:
-    def __init__(self, api_key, vector_store_id):
+    def __init__(self, api_key, vector_store_id, client=None, chunking_policy: ChunkingPolicy | None = None):
         self.api_key = api_key
         self.vector_store_id = vector_store_id
-        self.client = OpenAI(api_key=api_key)
+        self.client = client if client is not None else OpenAI(api_key=api_key)
+        # Chunk size and overlap per document; `CHUNKING_POLICY` names a JSON file of rules replacing the default ones
+        self.chunking_policy = chunking_policy if chunking_policy is not None else load_policy(os.getenv("CHUNKING_POLICY"))
 
         # Configure logging
         logging.basicConfig(
@@ -23,14 +39,17 @@ class OpenAIVectorStoreAPI:
         logging.info("OpenAI client initialized.")
         logging.info(f"Loaded VECTOR_STORE_ID: {self.vector_store_id}")
 
+    @traced("vector_store.upload_file")
     def upload_file(self, file_name, file_stream):
-        """Upload a file to the vector store."""
+        """Upload a file to the vector store, chunked as the chunking policy says for its type, size and name."""
         try:
             logging.info(f"Uploading file: {file_name}")
-            response = self.client.beta.vector_stores.files.create(
+            strategy = self.chunking_policy.strategy_for(file_name, _stream_size(file_stream))
+            # `files.create` only accepts an existing file id; `upload` creates the file object and attaches it
+            response = self.client.beta.vector_stores.files.upload(
                 vector_store_id=self.vector_store_id,
-                file=file_stream,
-                file_name=file_name
+                file=(file_name, file_stream),
+                **({"chunking_strategy": strategy} if strategy else {}),
             )
             logging.info(f"File uploaded successfully: {response}")
             return response
@@ -38,6 +57,7 @@ class OpenAIVectorStoreAPI:
             logging.error(f"Failed to upload file: {e}")
             raise
 
+    @traced("vector_store.delete_file")
     def delete_file(self, file_id):
         """Delete a file from the vector store."""
         try:
@@ -52,41 +72,67 @@ class OpenAIVectorStoreAPI:
             logging.error(f"Failed to delete file: {e}")
             raise
 
+    @traced("vector_store.sync_file")
+    def sync_file(self, item, records):
+        """
+        Uploads the current content of a Box file and removes the vector store file previously uploaded for it.
+
+        The new file is uploaded before the old one is deleted, so the assistant never misses the file.
+
+        Args:
+            item: The Box file item (anything with `id`, `name`, `content()` and `created_at`); it is uploaded
+                under its name, which citations show.
+            records (dict): Box file ID -> (vector store file ID, created_at) of the files in the vector store.
+        """
+        # Records written before they were keyed by Box file ID are keyed by file name
+        key = item.id if item.id in records else item.name if item.name in records else None
+        old_file_id, _ = records.get(key, (None, None))
+        uploaded_file = self.upload_file(item.name, io.BytesIO(item.content()))
+        records.pop(key, None)
+        records[item.id] = (uploaded_file.id, item.created_at)
+        if old_file_id:
+            self.delete_file(old_file_id)
+
+    @traced("vector_store.remove_file")
+    def remove_file(self, box_file_id, records):
+        """
+        Removes the vector store file uploaded for a Box file and forgets its record.
+
+        Args:
+            box_file_id (str): The Box file ID used as the record key.
+            records (dict): Box file ID -> (vector store file ID, created_at) of the files in the vector store.
+        """
+        old_file_id, _ = records.pop(box_file_id, (None, None))
+        if old_file_id:
+            self.delete_file(old_file_id)
+
+    @traced("vector_store.update_vector_store")
     def update_vector_store(self, changes, box_folder_id, box_client, records):
         """
         Updates the vector store with new or modified files detected in the Box folder.
 
         Args:
-            changes (list): List of changes detected by the BoxClient.
-            box_folder_id (str): Box folder ID to pull new/modified files.
+            changes (list): List of changes detected by the BoxClient, naming files by their path in the folder.
+            box_folder_id (str): Box folder ID to pull new/modified files (subfolders included).
             box_client (BoxClient): Instance of the BoxClient to interact with Box.
-            records (dict): JSON records containing file IDs and timestamps in the vector store.
+            records (dict): Box file ID -> (vector store file ID, created_at) of the files in the vector store.
         """
         if not changes:
             logging.info("No changes detected. Exiting update process.")
             return
 
+        # `detect_changes` keeps the items it flagged; only walk the folder tree for changes it did not produce
+        box_items = dict(getattr(box_client, "changed_items", None) or {})
+        if any(change.split(": ", 1)[1] not in box_items for change in changes):
+            box_items = dict(box_client.walk_tree(box_folder_id)) | box_items
+
         for change in changes:
-            file_name = change.split(": ")[1]  # Extract file name from change message
-            box_items = box_client.get_folder(box_folder_id).get_items()
-
-            for item in box_items:
-                if item.name == file_name and item.type == "file":
-                    file_stream = io.BytesIO(item.content())  # Convert file content to byte stream
-
-                    # Check if the file is modified
-                    if "Modified" in change:
-                        old_file_id, _ = records.get(file_name, (None, None))
-                        if old_file_id:
-                            self.delete_file(old_file_id)
-
-                        uploaded_file = self.upload_file(file_name, file_stream)
-                        records[file_name] = (uploaded_file.id, item.created_at)
-
-                    # Check if the file is new
-                    elif "New" in change:
-                        uploaded_file = self.upload_file(file_name, file_stream)
-                        records[file_name] = (uploaded_file.id, item.created_at)
+            path = change.split(": ", 1)[1]  # Extract the file path from change message
+            item = box_items.get(path)
+
+            # New and modified files are both (re-)uploaded
+            if item is not None and ("Modified" in change or "New" in change):
+                self.sync_file(item, records)
 
         # Save the updated records
         with open("file_records.json", "w") as f:
@@ -0,0 +1,420 @@
+import asyncio
+import functools
+import json
+import os
+import sys
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from openai import OpenAI
+
+# Add the `src` and `benchmarks` directories to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+os.environ.setdefault("API_KEY", "test-key")
+os.environ.setdefault("ASSISTANT_ID_4O", "asst_4o")
+os.environ.setdefault("ASSISTANT_ID_4O_MINI", "asst_4o_mini")
+
+import main
+from assistant_api import RunFailedError
+from load_test import percentile, run_level
+from stub_openai_server import StubConfig, create_app
+
+
+@pytest.fixture
+def stub():
+    """Points both assistants at a fresh in-memory stub of the OpenAI API."""
+    stub_app = create_app(StubConfig())
+    client = OpenAI(api_key="test-key", base_url="http://stub/v1", http_client=TestClient(stub_app), max_retries=0)
+    originals = (main.assistant_api_4o.client, main.assistant_api_4o_mini.client)
+    main.assistant_api_4o.client = client
+    main.assistant_api_4o_mini.client = client
+    main.app.state.user_assistants.clear()
+    # Every stub numbers its threads from 1, so redirects left by a compaction test would hit the next test
+    main.thread_context._redirects.clear()
+    main.thread_context._usage.clear()
+    main.app.state.auto_routes.clear()
+    main.app.state.thread_owners.clear()
+    main.citation_names.clear()
+    main.app.state.indexing._records.clear()
+    main.app.state.history._threads.clear()
+    yield stub_app
+    main.assistant_api_4o.client, main.assistant_api_4o_mini.client = originals
+
+
+@pytest.fixture
+def api():
+    return TestClient(main.app)
+
+
+def test_create_thread_and_ask_question(stub, api):
+    thread_id = api.post("/create-thread", json={"user_id": "a@example.edu"}).json()["thread_id"]
+
+    response = api.post("/ask-question", json={"thread_id": thread_id, "question": "What is WG3?", "user_id": "a@example.edu"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["response"] == StubConfig.answer
+    assert body["citations"] == ["01 - Working Group 3 Evidence Expectations"]
+
+
+def test_upload_and_attach_file(stub, api):
+    thread_id = api.post("/create-thread", json={"user_id": "a@example.edu"}).json()["thread_id"]
+
+    response = api.post("/upload", files={"file": ("notes.txt", b"hello", "text/plain")}, data={"user_id": "a@example.edu"})
+    assert response.status_code == 200
+    file_id = response.json()["file_id"]
+    assert stub.state.stub["files"][file_id]["bytes"] == 5
+
+    response = api.post("/attach-file", json={"thread_id": thread_id, "file_id": file_id, "user_id": "a@example.edu"})
+    assert response.json()["status"] == "file attached to thread"
+    record = api.get("/indexing-status", params={"tracking_id": response.json()["tracking_id"]}).json()
+    assert (record["thread_id"], record["file_id"], record["status"]) == (thread_id, file_id, "in_progress")
+
+
+def test_upload_runs_off_the_event_loop(stub, api, monkeypatch):
+    upload, loops = main.assistant_api_4o.upload_file, []
+
+    def upload_file(file):
+        try:
+            loops.append(asyncio.get_running_loop())
+        except RuntimeError:
+            loops.append(None)
+        return upload(file)
+
+    monkeypatch.setattr(main.assistant_api_4o, "upload_file", upload_file)
+    response = api.post("/upload", files={"file": ("notes.txt", b"hello", "text/plain")}, data={"user_id": "a@example.edu"})
+    assert response.status_code == 200 and loops == [None]
+
+
+def test_set_model_switches_assistant(stub, api):
+    response = api.post("/set-model", json={"model_type": "4o-mini", "user_id": "a@example.edu"})
+    assert response.json()["active_model"] == "4o-mini"
+    assert api.get("/get-active-model", params={"user_id": "a@example.edu"}).json() == {"active_model": "4o-mini"}
+    assert api.post("/set-model", json={"model_type": "gpt-5", "user_id": "a@example.edu"}).status_code == 400
+
+
+def test_ask_question_on_unknown_thread_fails(stub, api):
+    response = api.post("/ask-question", json={"thread_id": "thread_missing", "question": "Hi", "user_id": "a@example.edu"})
+    assert response.status_code == 500
+
+
+def test_load_generator_reports_percentiles(stub):
+    transport = httpx.ASGITransport(app=main.app)
+    level = asyncio.run(run_level("http://backend", concurrency=2, requests=4, question="Hi", upload_size=32,
+                                  transport=transport))
+
+    assert level["concurrency"] == 2
+    for endpoint in ("/create-thread", "/ask-question", "/upload", "/attach-file"):
+        stats = level["endpoints"][endpoint]
+        assert stats["requests"] == 4 and stats["errors"] == 0
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+
+
+def test_percentile_interpolates():
+    assert percentile([], 50) == 0.0
+    assert percentile([1, 2, 3, 4], 50) == 2.5
+    assert percentile([5], 99) == 5
+
+
+def test_create_thread_is_served_from_warm_pool(stub):
+    with TestClient(main.app) as api:
+        pool = main.app.state.thread_pool
+        deadline = time.monotonic() + 2
+        while len(pool) < pool.low_water_mark and time.monotonic() < deadline:
+            time.sleep(0.01)
+        pooled = {thread_id for thread_id, _ in pool._threads}
+
+        thread_id = api.post("/create-thread", json={"user_id": "a@example.edu"}).json()["thread_id"]
+        assert thread_id in pooled
+        assert pool.hits >= 1
+    # Unused pooled threads are deleted on shutdown
+    assert not set(stub.state.stub["threads"]) & (pooled - {thread_id})
+
+
+def test_long_thread_is_compacted_into_summary_thread(stub, api, monkeypatch):
+    monkeypatch.setattr(main.thread_context, "compaction_threshold", 1)
+    thread_id = api.post("/create-thread", json={"user_id": "a@example.edu"}).json()["thread_id"]
+
+    first = api.post("/ask-question", json={"thread_id": thread_id, "question": "Q1", "user_id": "a@example.edu"}).json()
+    assert first["thread_id"] == thread_id
+
+    # The compaction ran after the first response; the old ID now continues in the summary thread
+    assert thread_id not in stub.state.stub["threads"]
+    monkeypatch.setattr(main.thread_context, "compaction_threshold", None)
+    second = api.post("/ask-question", json={"thread_id": thread_id, "question": "Q2", "user_id": "a@example.edu"}).json()
+    assert second["thread_id"] != thread_id
+    summary = stub.state.stub["messages"][second["thread_id"]][0]
+    assert summary["role"] == "assistant"
+    assert summary["content"][0]["text"]["value"].startswith("Summary of our conversation so far")
+    # The summary thread belongs to the user of the thread it continues
+    assert main.app.state.thread_owners[second["thread_id"]] == "a@example.edu"
+
+
+def test_attachments_stay_searchable_after_compaction(stub, monkeypatch):
+    monkeypatch.setattr(main.thread_context, "compaction_threshold", 1)
+    monkeypatch.setattr(main.app.state.indexing, "poll_interval", 0.05)
+    with TestClient(main.app) as api:
+        thread_id = api.post("/create-thread", json={"user_id": "a@example.edu"}).json()["thread_id"]
+        file_id = api.post("/upload", files={"file": ("notes.txt", b"hello", "text/plain")},
+                           data={"user_id": "a@example.edu"}).json()["file_id"]
+        tracking_id = api.post("/attach-file", json={"thread_id": thread_id, "file_id": file_id,
+                                                     "user_id": "a@example.edu"}).json()["tracking_id"]
+        threads = stub.state.stub["threads"]
+        vector_store_ids = threads[thread_id]["tool_resources"]["file_search"]["vector_store_ids"]
+        api.post("/ask-question", json={"thread_id": thread_id, "question": "Q1", "user_id": "a@example.edu"})
+        compact_thread_id = main.thread_context.resolve(thread_id)
+        assert compact_thread_id != thread_id
+
+        # The summary thread searches the vector store holding the attachment, and the attachment is tracked on it
+        assert threads[compact_thread_id]["tool_resources"]["file_search"]["vector_store_ids"] == vector_store_ids
+        assert (vector_store_ids[0], file_id) in stub.state.stub["vector_store_files"]
+        attachments = api.get("/indexing-status", params={"thread_id": thread_id}).json()["attachments"]
+        assert [(a["tracking_id"], a["thread_id"]) for a in attachments] == [(tracking_id, compact_thread_id)]
+
+
+def test_question_during_compaction_waits_and_continues_in_summary_thread(stub, api, monkeypatch):
+    import threading
+
+    thread_id = api.post("/create-thread", json={"user_id": "a@example.edu"}).json()["thread_id"]
+    api.post("/ask-question", json={"thread_id": thread_id, "question": "Q1", "user_id": "a@example.edu"})
+    started, compact = threading.Event(), main.assistant_api_4o.compact_thread
+
+    def slow_compact(compacted_thread_id):
+        started.set()
+        time.sleep(0.3)
+        return compact(compacted_thread_id)
+
+    monkeypatch.setattr(main.assistant_api_4o, "compact_thread", slow_compact)
+
+    async def scenario():
+        compaction = asyncio.create_task(main.compact_thread(main.assistant_api_4o, thread_id))
+        await asyncio.to_thread(started.wait)
+        body, _ = await main.answer_question("a@example.edu", thread_id, "Q2")
+        await compaction
+        return body
+
+    body = asyncio.run(scenario())
+    # The question waited for the summary instead of running next to it, and was asked on the summary thread
+    assert body["thread_id"] == main.thread_context.resolve(thread_id) != thread_id
+    questions = [m["content"][0]["text"]["value"] for m in stub.state.stub["messages"][body["thread_id"]] if m["role"] == "user"]
+    assert questions == ["Q2"] and thread_id not in stub.state.stub["threads"]
+
+
+def test_answer_again_replaces_the_previous_answer(stub, api):
+    thread_id = api.post("/create-thread", json={"user_id": "a@example.edu"}).json()["thread_id"]
+    api.post("/ask-question", json={"thread_id": thread_id, "question": "What is WG3?", "user_id": "a@example.edu"})
+
+    response, _, _ = main.assistant_api_4o.answer_again(thread_id)
+    assert response == StubConfig.answer
+    roles = [m["role"] for m in stub.state.stub["messages"][thread_id]]
+    assert roles == ["user", "assistant"]
+
+
+def test_failed_answer_again_keeps_the_previous_answer(stub, api):
+    thread_id = api.post("/create-thread", json={"user_id": "a@example.edu"}).json()["thread_id"]
+    api.post("/ask-question", json={"thread_id": thread_id, "question": "What is WG3?", "user_id": "a@example.edu"})
+
+    stub.state.config.rate_limited_runs = 1
+    with pytest.raises(RunFailedError):
+        main.assistant_api_4o.answer_again(thread_id)
+    # The escalation failed, so the answer the user is given is still the one on the thread
+    roles = [m["role"] for m in stub.state.stub["messages"][thread_id]]
+    assert roles == ["user", "assistant"]
+
+
+def test_question_takes_a_single_run_request(stub, api):
+    thread_id = api.post("/create-thread", json={"user_id": "a@example.edu"}).json()["thread_id"]
+    stub.state.request_counts.clear()
+
+    api.post("/ask-question", json={"thread_id": thread_id, "question": "What is WG3?", "user_id": "a@example.edu"})
+
+    assert stub.state.request_counts == {
+        f"POST /v1/threads/{thread_id}/runs": 1,
+        "GET /v1/files/file-stub-citation": 1,
+    }
+    roles = [m["role"] for m in stub.state.stub["messages"][thread_id]]
+    assert roles == ["user", "assistant"]
+
+
+def test_question_without_thread_creates_one_with_the_run(stub, api):
+    response = api.post("/ask-question", json={"question": "What is WG3?", "user_id": "a@example.edu"}).json()
+    assert response["thread_id"] in stub.state.stub["threads"]
+    assert response["response"] == StubConfig.answer
+    assert main.app.state.thread_owners[response["thread_id"]] == "a@example.edu"
+    assert stub.state.request_counts.get("POST /v1/threads") is None
+    assert stub.state.request_counts["POST /v1/threads/runs"] == 1
+
+
+def test_auto_model_reports_route(stub, api):
+    assert api.post("/set-model", json={"model_type": "auto", "user_id": "a@example.edu"}).json()["active_model"] == "auto"
+    assert api.get("/get-active-model", params={"user_id": "a@example.edu"}).json() == {"active_model": "auto", "route": None}
+
+    response = api.post("/ask-question", json={"question": "What is WG3?", "user_id": "a@example.edu"})
+    assert response.json()["response"] == StubConfig.answer
+    assert api.get("/get-active-model", params={"user_id": "a@example.edu"}).json() == {"active_model": "auto", "route": "4o-mini"}
+
+
+def test_batch_streams_one_line_per_question(stub, api):
+    questions = ["What is WG3?", "Who chairs WG3?", ""]
+    response = api.post("/ask-batch", json={"questions": questions, "user_id": "a@example.edu", "concurrency": 2})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    results = {line["index"]: line for line in lines[:-1]}
+    assert results[0]["response"] == StubConfig.answer and results[1]["citations"]
+    assert "error" in results[2]
+    assert lines[-1]["done"] and (lines[-1]["answered"], lines[-1]["failed"]) == (2, 1)
+    # Per-question threads are deleted once answered
+    assert results[0]["thread_id"] not in stub.state.stub["threads"]
+
+
+@pytest.mark.parametrize("keep_threads", [True, False])
+def test_rate_limited_batch_run_is_answered_again_on_its_thread(stub, api, monkeypatch, keep_threads):
+    monkeypatch.setattr(main, "run_batch", functools.partial(main.run_batch, backoff=0.01))
+    stub.state.config.rate_limited_runs = 1
+    response = api.post("/ask-batch", json={"questions": ["What is WG3?"], "user_id": "a@example.edu",
+                                            "keep_threads": keep_threads})
+    result = json.loads(response.text.splitlines()[0])
+    assert result["attempts"] == 2 and result["response"] == StubConfig.answer
+    # The failed run created the only thread; the retry answered its question instead of asking it again
+    assert stub.state.request_counts["POST /v1/threads/runs"] == 1
+    if keep_threads:
+        assert [m["role"] for m in stub.state.stub["messages"][result["thread_id"]]] == ["user", "assistant"]
+    else:
+        assert stub.state.stub["threads"] == {}
+
+
+def test_rate_limited_run_on_shared_thread_does_not_repeat_the_question(stub, api, monkeypatch):
+    monkeypatch.setattr(main, "run_batch", functools.partial(main.run_batch, backoff=0.01))
+    thread_id = api.post("/create-thread", json={"user_id": "a@example.edu"}).json()["thread_id"]
+    stub.state.config.rate_limited_runs = 1
+    response = api.post("/ask-batch", json={"questions": ["What is WG3?"], "user_id": "a@example.edu",
+                                            "thread_id": thread_id, "shared_thread": True})
+    assert json.loads(response.text.splitlines()[0])["attempts"] == 2
+    assert [m["role"] for m in stub.state.stub["messages"][thread_id]] == ["user", "assistant"]
+
+
+def test_ready_after_warm_up_with_preloaded_citation_names(stub):
+    with TestClient(main.app) as api:
+        deadline = time.monotonic() + 2
+        while api.get("/ready").status_code != 200 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        body = api.get("/ready").json()
+        assert body["warmup_errors"] == {}
+        assert body["citation_names"] > 0 and body["ready_seconds"] >= body["warmup_seconds"]
+        assert main.citation_names["file-FMXyHoo5DgLwAEtpdh5ewd"] == "01 - Working Group 3 Evidence Expectations.pdf"
+        assert stub.state.request_counts[f"GET /v1/assistants/{main.ASSISTANT_ID_4O}"] == 1
+
+
+def test_cited_file_names_are_cached(stub, api):
+    for _ in range(2):
+        body = api.post("/ask-question", json={"question": "What is WG3?", "user_id": "a@example.edu"}).json()
+        assert body["citations"] == ["01 - Working Group 3 Evidence Expectations"]
+    assert stub.state.request_counts["GET /v1/files/file-stub-citation"] == 1
+
+
+def test_question_waits_for_attachments_to_be_indexed(stub, monkeypatch):
+    stub.state.config.index_ms = 300
+    monkeypatch.setattr(main.app.state.indexing, "poll_interval", 0.05)
+    with TestClient(main.app) as api:
+        thread_id = api.post("/create-thread", json={"user_id": "a@example.edu"}).json()["thread_id"]
+        file_id = api.post("/upload", files={"file": ("notes.txt", b"hello", "text/plain")},
+                           data={"user_id": "a@example.edu"}).json()["file_id"]
+        tracking_id = api.post("/attach-file", json={"thread_id": thread_id, "file_id": file_id,
+                                                     "user_id": "a@example.edu"}).json()["tracking_id"]
+
+        start = time.monotonic()
+        body = api.post("/ask-question", json={"thread_id": thread_id, "question": "Summarize my notes",
+                                               "user_id": "a@example.edu"}).json()
+        assert time.monotonic() - start >= 0.25
+        assert body["indexing_pending"] == []
+        assert api.get("/indexing-status", params={"tracking_id": tracking_id}).json()["status"] == "completed"
+
+        events = api.get("/indexing-events", params={"thread_id": thread_id}).text
+        assert '"status": "completed"' in events and events.endswith("event: done\ndata: {}\n\n")
+
+
+def test_thread_history_is_served_from_cache_with_etag(stub, api):
+    thread_id = api.post("/create-thread", json={"user_id": "a@example.edu"}).json()["thread_id"]
+    for question in ("Q1", "Q2", "Q3"):
+        api.post("/ask-question", json={"thread_id": thread_id, "question": question, "user_id": "a@example.edu"})
+    stub.state.request_counts.clear()
+
+    response = api.get("/thread-history", params={"thread_id": thread_id, "limit": 4})
+    page = response.json()
+    assert [m["content"] for m in page["messages"]] == ["Q2", StubConfig.answer, "Q3", StubConfig.answer]
+    assert page["messages"][1]["citations"] == ["01 - Working Group 3 Evidence Expectations"]
+    assert page["total"] == 6 and page["next_cursor"] == "2"
+    older = api.get("/thread-history", params={"thread_id": thread_id, "limit": 4, "before": page["next_cursor"]}).json()
+    assert [m["content"] for m in older["messages"]] == ["Q1", StubConfig.answer] and older["next_cursor"] is None
+
+    etag = response.headers["etag"]
+    again = api.get("/thread-history", params={"thread_id": thread_id, "limit": 4}, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert stub.state.request_counts == {}
+
+    api.post("/ask-question", json={"thread_id": thread_id, "question": "Q4", "user_id": "a@example.edu"})
+    changed = api.get("/thread-history", params={"thread_id": thread_id, "limit": 4}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.json()["messages"][-2]["content"] == "Q4"
+
+
+def test_thread_history_reads_unknown_thread_once(stub, api):
+    thread_id = api.post("/ask-question", json={"question": "Q1", "user_id": "a@example.edu"}).json()["thread_id"]
+    main.app.state.history._threads.clear()
+    stub.state.request_counts.clear()
+
+    first = api.get("/thread-history", params={"thread_id": thread_id}).json()
+    second = api.get("/thread-history", params={"thread_id": thread_id}).json()
+    assert first == second
+    assert [(m["role"], m["content"]) for m in first["messages"]] == [("user", "Q1"), ("assistant", StubConfig.answer)]
+    assert first["messages"][1]["citations"] == ["01 - Working Group 3 Evidence Expectations"]
+    assert stub.state.request_counts[f"GET /v1/threads/{thread_id}/messages"] == 1
+    assert api.get("/thread-history", params={"thread_id": thread_id, "before": "x"}).status_code == 400
+
+
+def test_thread_history_survives_compaction(stub, api, monkeypatch):
+    monkeypatch.setattr(main.thread_context, "compaction_threshold", 1)
+    thread_id = api.post("/create-thread", json={"user_id": "a@example.edu"}).json()["thread_id"]
+    api.post("/ask-question", json={"thread_id": thread_id, "question": "Q1", "user_id": "a@example.edu"})
+
+    # Before and after the next question, the history still starts with the first question
+    assert api.get("/thread-history", params={"thread_id": thread_id}).json()["total"] == 2
+    new_thread_id = api.post("/ask-question", json={"thread_id": thread_id, "question": "Q2", "user_id": "a@example.edu"}).json()["thread_id"]
+    page = api.get("/thread-history", params={"thread_id": new_thread_id}).json()
+    assert [m["content"] for m in page["messages"] if m["role"] == "user"] == ["Q1", "Q2"]
+
+
+def test_opening_questions_are_answered_from_semantic_cache(stub, api, monkeypatch):
+    from semantic_cache import OpenAIEmbedder, SemanticAnswerCache
+
+    monkeypatch.setattr(main.app.state, "faq_cache", SemanticAnswerCache(
+        OpenAIEmbedder(lambda: main.assistant_api_4o.client), threshold=0.9
+    ))
+    first = api.post("/ask-question", json={"question": "What are the evidence expectations for WG3?", "user_id": "a@example.edu"}).json()
+    assert first["cached"] is False
+
+    stub.state.request_counts.clear()
+    again = api.post("/ask-question", json={"question": "WG3: what are the evidence expectations?", "user_id": "a@example.edu"}).json()
+    assert again["cached"] is True
+    assert (again["response"], again["citations"]) == (first["response"], first["citations"])
+    assert "POST /v1/threads/runs" not in stub.state.request_counts
+    # The conversation goes on from the cached answer
+    messages = stub.state.stub["messages"][again["thread_id"]]
+    assert [(m["role"], m["content"][0]["text"]["value"]) for m in messages] == [
+        ("user", "WG3: what are the evidence expectations?"), ("assistant", first["response"]),
+    ]
+    page = api.get("/thread-history", params={"thread_id": again["thread_id"]}).json()
+    assert page["total"] == 2
+
+    # Follow-ups depend on the conversation and are always asked
+    follow_up = api.post("/ask-question", json={"thread_id": again["thread_id"], "question": "What are the evidence expectations for WG3?",
+                                                "user_id": "a@example.edu"}).json()
+    assert follow_up["cached"] is False
+
+    thread_id = api.post("/create-thread", json={"user_id": "a@example.edu"}).json()["thread_id"]
+    opening = api.post("/ask-question", json={"thread_id": thread_id, "question": "For WG3, what are the evidence expectations?",
+                                              "user_id": "a@example.edu"}).json()
+    assert opening["cached"] is True and opening["thread_id"] == thread_id
+    assert len(stub.state.stub["messages"][thread_id]) == 2
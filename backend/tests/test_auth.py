@@ -0,0 +1,194 @@
+import os
+import sys
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi.testclient import TestClient
+
+# Add the `src` directory to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+os.environ.setdefault("API_KEY", "test-key")
+
+from auth import OktaVerifier, user_id_from_claims
+
+ISSUER = "https://example.okta.com/oauth2/default"
+CLIENT_ID = "0oa-test-client"
+
+
+class FakeOkta:
+    """A locally generated key set standing in for an Okta authorization server."""
+    def __init__(self):
+        self.keys = {}
+        self.fetches = 0
+        self.rotate()
+
+    def rotate(self) -> str:
+        kid = f"key-{len(self.keys) + 1}"
+        self.keys[kid] = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.kid = kid
+        return kid
+
+    def fetch_json(self, url: str) -> dict:
+        self.fetches += 1
+        if url.endswith("/.well-known/openid-configuration"):
+            return {"issuer": ISSUER, "jwks_uri": f"{ISSUER}/v1/keys"}
+        keys = []
+        for kid, private_key in self.keys.items():
+            jwk = jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+            keys.append({**jwk, "kid": kid, "use": "sig", "alg": "RS256"})
+        return {"keys": keys}
+
+    def token(self, kid: str | None = None, **claims) -> str:
+        now = int(time.time())
+        claims = {"iss": ISSUER, "aud": CLIENT_ID, "sub": "00u1", "email": "a@example.edu", "iat": now,
+                  "exp": now + 3600, **claims}
+        kid = kid or self.kid
+        return jwt.encode(claims, self.keys[kid], algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def okta():
+    return FakeOkta()
+
+
+@pytest.fixture
+def verifier(okta):
+    return OktaVerifier(ISSUER, [CLIENT_ID, "api://default"], min_refresh_interval=0, fetch_json=okta.fetch_json)
+
+
+def test_verifies_token_and_derives_user(okta, verifier):
+    claims = verifier.verify(okta.token())
+    assert user_id_from_claims(claims) == "a@example.edu"
+    assert user_id_from_claims({"sub": "b@example.edu"}) == "b@example.edu"
+    # Discovery document and JWKS
+    assert okta.fetches == 2
+
+
+@pytest.mark.parametrize("claims", [
+    {"aud": "someone-else"},
+    {"iss": "https://evil.example.com"},
+    {"exp": int(time.time()) - 3600},
+])
+def test_rejects_invalid_claims(okta, verifier, claims):
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify(okta.token(**claims))
+
+
+def test_rejects_forged_and_unsigned_tokens(okta, verifier):
+    verifier.refresh()
+    forged = jwt.encode({"iss": ISSUER, "aud": CLIENT_ID, "sub": "x", "iat": int(time.time()), "exp": int(time.time()) + 60},
+                        rsa.generate_private_key(public_exponent=65537, key_size=2048), algorithm="RS256",
+                        headers={"kid": okta.kid})
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify(forged)
+    unsigned = jwt.encode({"iss": ISSUER, "aud": CLIENT_ID, "sub": "x"}, None, algorithm="none", headers={"kid": okta.kid})
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify(unsigned)
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify("not-a-token")
+
+
+def test_verified_tokens_are_cached(okta, verifier):
+    token = okta.token()
+    verifier.verify(token)
+    assert verifier.cached(token)["email"] == "a@example.edu"
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        verifier.verify(token)
+    # Steady state is a hash and a dictionary lookup, far below a millisecond per request
+    assert (time.perf_counter() - start) / 1000 < 0.0005
+
+    verifier.token_ttl = 0
+    fresh = okta.token(sub="00u2")
+    verifier.verify(fresh)
+    assert verifier.cached(fresh) is None
+
+
+def test_rotated_key_is_fetched_once(okta, verifier):
+    verifier.verify(okta.token())
+    fetches = okta.fetches
+    new_kid = okta.rotate()
+    assert verifier.verify(okta.token(kid=new_kid, email="c@example.edu"))["email"] == "c@example.edu"
+    assert okta.fetches == fetches + 1
+    verifier.verify(okta.token(kid=new_kid, email="d@example.edu"))
+    assert okta.fetches == fetches + 1
+
+
+def test_endpoints_take_user_from_token(okta, verifier, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main.app.state, "auth", verifier)
+    main.app.state.user_assistants.clear()
+    api = TestClient(main.app)
+
+    assert api.post("/set-model", json={"model_type": "4o-mini", "user_id": "a@example.edu"}).status_code == 401
+    bad = {"Authorization": f"Bearer {okta.token(aud='other')}"}
+    assert api.post("/set-model", json={"model_type": "4o-mini"}, headers=bad).status_code == 401
+
+    headers = {"Authorization": f"Bearer {okta.token(email='b@example.edu')}"}
+    # The user named in the body is ignored in favour of the token's
+    assert api.post("/set-model", json={"model_type": "4o-mini", "user_id": "a@example.edu"}, headers=headers).status_code == 200
+    assert "a@example.edu" not in main.app.state.user_assistants
+    assert api.get("/get-active-model", headers=headers).json() == {"active_model": "4o-mini"}
+    assert api.get("/indexing-status", params={"thread_id": "thread_x"}).status_code == 401
+
+
+def test_threads_of_other_users_are_not_found(okta, verifier, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main.app.state, "auth", verifier)
+    monkeypatch.setitem(main.app.state.thread_owners, "thread_a", "a@example.edu")
+    tracking_id = main.app.state.indexing.track("thread_a", "file_a")
+    api = TestClient(main.app)
+    owner = {"Authorization": f"Bearer {okta.token(email='a@example.edu')}"}
+    other = {"Authorization": f"Bearer {okta.token(email='b@example.edu')}"}
+
+    try:
+        for path, params in [("/thread-history", {"thread_id": "thread_a"}), ("/indexing-status", {"thread_id": "thread_a"}),
+                             ("/indexing-status", {"tracking_id": tracking_id}), ("/indexing-events", {"thread_id": "thread_a"}),
+                             ("/indexing-events", {"tracking_id": tracking_id})]:
+            response = api.get(path, params=params, headers=other)
+            assert (response.status_code, response.json()) == (404, {"detail": "Thread not found."})
+        # Asking, attaching or deleting is refused as well, before anything reaches OpenAI
+        for method, path, body in [("POST", "/ask-question", {"thread_id": "thread_a", "question": "Q"}),
+                                   ("POST", "/ask-batch", {"thread_id": "thread_a", "questions": ["Q"], "shared_thread": True}),
+                                   ("POST", "/attach-file", {"thread_id": "thread_a", "file_id": "file_b"}),
+                                   ("DELETE", "/delete-thread", {"thread_id": "thread_a"})]:
+            response = api.request(method, path, json=body, headers=other)
+            assert (response.status_code, response.json()) == (404, {"detail": "Thread not found."})
+        assert main.app.state.thread_owners["thread_a"] == "a@example.edu"
+        with api.websocket_connect("/ws/chat") as ws:
+            ws.send_json({"token": okta.token(email="b@example.edu")})
+            ws.receive_json()
+            ws.send_json({"id": "q", "type": "ask", "thread_id": "thread_a", "question": "Q"})
+            assert ws.receive_json() == {"id": "q", "type": "error", "status": 404, "detail": "Thread not found."}
+
+        assert api.get("/indexing-status", params={"tracking_id": tracking_id}, headers=owner).json()["file_id"] == "file_a"
+        assert api.get("/indexing-status", params={"thread_id": "thread_a"}, headers=owner).json()["attachments"][0]["tracking_id"] == tracking_id
+    finally:
+        main.app.state.indexing._records.pop(tracking_id)
+
+
+def test_chat_socket_authenticates_once_per_connection(okta, verifier, monkeypatch):
+    import main
+    from fastapi import WebSocketDisconnect
+
+    monkeypatch.setattr(main.app.state, "auth", verifier)
+    main.app.state.user_assistants.clear()
+    api = TestClient(main.app)
+
+    with api.websocket_connect("/ws/chat") as ws:
+        ws.send_json({"token": okta.token(aud="other"), "user_id": "a@example.edu"})
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+        assert closed.value.code == 4401
+
+    with api.websocket_connect("/ws/chat") as ws:
+        ws.send_json({"token": okta.token(email="b@example.edu"), "user_id": "a@example.edu"})
+        assert ws.receive_json() == {"type": "ready", "user_id": "b@example.edu"}
+        # Later messages carry no token; the connection's user asks them
+        ws.send_json({"id": "q", "type": "ask", "user_id": "a@example.edu"})
+        assert ws.receive_json()["status"] == 422
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+# Add the `src` directory to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from assistant_api import AssistantAPI
+from batch import run_batch
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+class EventStream(list):
+    """Streamed run events, closed like the SDK's stream."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+def test_concurrency_is_bounded_and_results_stream_in_completion_order():
+    in_flight, peak = 0, 0
+
+    async def ask(thread_id, question):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05 if question == "slow" else 0.01)
+        in_flight -= 1
+        return f"answer to {question}", ["Handbook"], f"thread_{question}"
+
+    results = asyncio.run(collect(run_batch(ask, ["slow", "a", "b", "c"], concurrency=2)))
+    assert peak == 2
+    assert results[-1]["question"] == "slow"
+    assert {result["index"] for result in results} == {0, 1, 2, 3}
+    assert all(result["citations"] == ["Handbook"] and result["latency_ms"] >= 0 for result in results)
+
+
+def test_rate_limit_is_retried_and_failures_are_reported():
+    calls = []
+
+    async def ask(thread_id, question):
+        calls.append(question)
+        if question == "limited" and calls.count("limited") == 1:
+            raise RateLimited("slow down")
+        if question == "broken":
+            raise RuntimeError("run failed")
+        return "ok", [], "thread_1"
+
+    results = {r["question"]: r for r in asyncio.run(collect(run_batch(ask, ["limited", "broken"], backoff=0.01)))}
+    assert results["limited"]["attempts"] == 2 and results["limited"]["response"] == "ok"
+    assert results["broken"]["error"] == "run failed"
+
+
+def test_streamed_run_failed_by_rate_limit_is_retried():
+    assistant = AssistantAPI("test-key", "asst_test")
+    error = SimpleNamespace(event="error", data=SimpleNamespace(
+        message="Rate limit reached for gpt-4o.", code="rate_limit_exceeded"))
+    calls = []
+
+    async def ask(thread_id, question):
+        calls.append(question)
+        if len(calls) == 1:
+            # The error a streamed run reports once OpenAI has accepted the run
+            assistant._consume_run_stream(EventStream([error]), thread_id, time.perf_counter())
+        return "ok", [], "thread_1"
+
+    [result] = asyncio.run(collect(run_batch(ask, ["limited"], backoff=0.01)))
+    assert result["attempts"] == 2 and result["response"] == "ok"
+
+
+def test_shared_thread_runs_serially_in_one_thread():
+    seen = []
+    discarded = []
+
+    async def ask(thread_id, question):
+        seen.append(thread_id)
+        return "ok", [], thread_id or "thread_new"
+
+    async def discard(thread_id):
+        discarded.append(thread_id)
+
+    results = asyncio.run(collect(run_batch(ask, ["q1", "q2", "q3"], shared_thread=True, discard_thread=discard)))
+    assert [r["index"] for r in results] == [0, 1, 2]
+    assert seen == [None, "thread_new", "thread_new"]
+    assert discarded == []
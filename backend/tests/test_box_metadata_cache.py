@@ -0,0 +1,69 @@
+import os
+import sys
+
+# Add the `src` and `benchmarks` directories to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+
+from box_client_api import BoxClient, BoxMetadataCache
+from fake_box import generate_corpus
+
+
+def test_lookups_are_served_locally_within_max_age():
+    box = generate_corpus(20, median_kb=1, sigma=0)
+    cache = BoxMetadataCache(box, max_age=60)
+    folder_id = box.watched_folder.id
+
+    for i in range(20):
+        assert cache.find(folder_id, f"Document {i:05d}.pdf", "file").name == f"Document {i:05d}.pdf"
+    assert cache.find(folder_id, "Missing.pdf") is None
+    assert box.calls["folder.get_items"] == 1
+    assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 20
+
+
+def test_stale_entries_are_revalidated_with_etag():
+    box = generate_corpus(5, median_kb=1, sigma=0)
+    cache = BoxMetadataCache(box, max_age=0)
+    folder_id = box.watched_folder.id
+
+    cache.items(folder_id)
+    cache.items(folder_id)
+    assert box.calls["folder.get_items"] == 1
+    assert cache.stats()["revalidations"] == 1
+
+    box.add_files(1, folder_id=folder_id)
+    assert len(cache.items(folder_id)) == 6
+    assert box.calls["folder.get_items"] == 2
+    assert cache.stats()["hit_rate"] == 1 / 3
+
+
+def test_least_recently_used_folder_is_evicted():
+    box = generate_corpus(6, median_kb=1, sigma=0, subfolders=2)
+    first, second = [box.watched_folder.children[f"Working Group {i}"].id for i in (1, 2)]
+    cache = BoxMetadataCache(box, max_folders=2, max_age=60)
+
+    cache.items(first)
+    cache.items(box.watched_folder.id)
+    cache.items(first)
+    cache.items(second)
+    assert cache.stats()["folders"] == 2
+    box.reset_counters()
+    cache.items(first)
+    assert box.calls["folder.get_items"] == 0
+    cache.items(box.watched_folder.id)
+    assert box.calls["folder.get_items"] == 1
+
+
+def test_delete_file_uses_cache_and_writes_through(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    box = generate_corpus(10, median_kb=1, sigma=0)
+    client = BoxClient(config_path=None, client=box)
+    folder_id = box.watched_folder.id
+
+    client.get_folder(folder_id)
+    client.delete_file("Document 00003.pdf", folder_id)
+    client.delete_file("Document 00004.pdf", folder_id)
+    assert box.calls["folder.get_items"] == 1
+    assert box.calls["file.delete"] == 2
+    assert "Document 00003.pdf" not in client.cache.items(folder_id)
+    assert "Document 00003.pdf" not in box.watched_folder.children
@@ -0,0 +1,195 @@
+import os
+import sys
+
+import pytest
+
+# Add the `src` and `benchmarks` directories to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+
+from box_client_api import BoxClient
+from box_sync import BoxSyncDaemon
+from fake_box import generate_corpus
+from fake_vector_store import FakeOpenAIClient
+from vector_store_api import OpenAIVectorStoreAPI
+
+
+class FlakyVectorStore(OpenAIVectorStoreAPI):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail = False
+
+    def upload_file(self, file_name, file_stream):
+        if self.fail:
+            raise RuntimeError("vector store unavailable")
+        return super().upload_file(file_name, file_stream)
+
+
+@pytest.fixture
+def setup(tmp_path):
+    box = generate_corpus(30, median_kb=1, sigma=0, subfolders=2)
+    openai = FakeOpenAIClient()
+    store = openai.beta.vector_stores.create(name="test")
+    vector_store = FlakyVectorStore("test", store.id, client=openai)
+
+    def make_daemon():
+        return BoxSyncDaemon(BoxClient(config_path=None, client=box), vector_store, box.watched_folder.id,
+                             state_path=str(tmp_path / "state.json"), retry_delay=0)
+
+    return box, openai, store, vector_store, make_daemon
+
+
+def test_first_run_syncs_whole_tree(setup):
+    box, openai, store, _, make_daemon = setup
+    daemon = make_daemon()
+    daemon.run_once()
+    assert len(daemon.files) == 30
+    assert len(store.files) == 30
+    assert daemon.stream_position == 0
+
+
+def test_incremental_sync_only_touches_changed_files(setup):
+    box, openai, store, _, make_daemon = setup
+    daemon = make_daemon()
+    daemon.run_once()
+    box.reset_counters()
+    openai.reset_counters()
+
+    touched = box.touch_files(0.1)
+    daemon.run_once()
+    assert openai.calls["files.create"] == len(touched)
+    assert box.calls["file.content"] == len(touched)
+    # The folder is never listed again
+    assert box.calls["folder.get_items"] == 0
+    assert len(store.files) == 30
+
+
+def test_events_outside_tree_are_ignored(setup):
+    box, openai, store, _, make_daemon = setup
+    daemon = make_daemon()
+    daemon.run_once()
+    openai.reset_counters()
+
+    other = box.add_folder(box.root, "Elsewhere")
+    box.add_file(other, "Unrelated.pdf", 100)
+    assert daemon.run_once() == 1
+    assert openai.calls["files.create"] == 0
+    assert daemon.stream_position == 1
+
+
+def test_trash_rename_and_move_out(setup):
+    box, openai, store, _, make_daemon = setup
+    daemon = make_daemon()
+    daemon.run_once()
+
+    trashed, renamed, moved = [box.files[file_id] for file_id in sorted(daemon.files)[:3]]
+    trashed.delete()
+    renamed.rename("Renamed.pdf")
+    moved.move(box.root)
+    daemon.run_once()
+
+    assert trashed.id not in daemon.files and trashed.id not in daemon.records
+    assert daemon.files[renamed.id] == "Renamed.pdf"
+    assert renamed.id in daemon.records
+    assert moved.id not in daemon.files
+    assert len(store.files) == 28
+
+
+def test_changes_to_one_file_are_coalesced_and_duplicates_dropped(setup):
+    box, openai, store, _, make_daemon = setup
+    daemon = make_daemon()
+    daemon.run_once()
+    openai.reset_counters()
+
+    item = next(iter(box.watched_folder.children.values()))
+    while item.type != "file":
+        item = next(iter(item.children.values()))
+    for _ in range(5):
+        item.version += 1
+        box.emit("ITEM_UPLOAD", item)
+    # Box may deliver an event more than once
+    box.event_log.append(dict(box.event_log[-1]))
+    daemon.run_once()
+    assert openai.calls["files.create"] == 1
+
+
+def test_cursor_survives_restart(setup):
+    box, openai, store, _, make_daemon = setup
+    make_daemon().run_once()
+    box.touch_files(0.1)
+    make_daemon().run_once()
+    openai.reset_counters()
+
+    restarted = make_daemon()
+    assert restarted.stream_position == len(box.event_log)
+    restarted.run_once()
+    assert openai.calls["files.create"] == 0
+    assert len(restarted.files) == 30
+
+
+def test_failed_batch_keeps_cursor_and_is_retried(setup):
+    box, openai, store, vector_store, make_daemon = setup
+    daemon = make_daemon()
+    daemon.run_once()
+
+    touched = box.touch_files(0.1)
+    vector_store.fail = True
+    daemon.run_once()
+    assert daemon.stream_position == 0
+    assert make_daemon().stream_position == 0
+
+    vector_store.fail = False
+    openai.reset_counters()
+    daemon.run_once()
+    assert daemon.stream_position == len(box.event_log)
+    assert openai.calls["files.create"] == len(touched)
+
+
+def test_long_poll_waits_for_new_events(setup):
+    box, openai, store, _, make_daemon = setup
+    daemon = make_daemon()
+    daemon.run_once()
+    assert daemon.run_once(wait=0.05) == 0
+    assert box.calls["events.long_poll"] == 1
+
+
+def test_resave_without_content_change_is_not_uploaded(setup):
+    box, openai, store, _, make_daemon = setup
+    daemon = make_daemon()
+    daemon.run_once()
+    openai.reset_counters()
+
+    box.touch_files(0.2, content_changed=False)
+    moved = box.files[sorted(daemon.files)[0]]
+    moved.move(box.watched_folder)
+    daemon.run_once()
+    assert openai.calls["files.create"] == 0
+    assert daemon.stream_position == len(box.event_log)
+
+
+def test_files_with_the_same_name_are_kept_apart(setup):
+    box, openai, store, _, make_daemon = setup
+    daemon = make_daemon()
+    daemon.run_once()
+    first = box.add_file(box.add_folder(box.watched_folder, "2023"), "Minutes.pdf", 100)
+    second = box.add_file(box.add_folder(box.watched_folder, "2024"), "Minutes.pdf", 200)
+    daemon.run_once()
+    assert len(store.files) == 32 and daemon.records[first.id] != daemon.records[second.id]
+
+    # Changing one of them replaces only its own vector store file
+    openai.reset_counters()
+    box.add_file(second.parent, "Minutes.pdf", 300)
+    daemon.run_once()
+    assert openai.calls["files.create"] == 1
+    assert daemon.records[first.id][0] in store.files and len(store.files) == 32
+
+
+def test_records_keyed_by_name_are_rekeyed(setup):
+    box, openai, store, _, make_daemon = setup
+    daemon = make_daemon()
+    daemon.run_once()
+    records = {box_id: list(record) for box_id, record in daemon.records.items()}
+    daemon.records = {daemon.files[box_id]: record for box_id, record in records.items()}
+    daemon.save_state()
+
+    assert make_daemon().records == records
@@ -0,0 +1,96 @@
+import json
+import os
+import sys
+
+# Add the `src` and `benchmarks` directories to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+
+from box_client_api import BoxClient
+from fake_box import generate_corpus
+from fake_vector_store import FakeOpenAIClient
+from vector_store_api import OpenAIVectorStoreAPI
+
+
+def tree_path(box, item) -> str:
+    """Returns the path of a fake Box file relative to the watched folder."""
+    folders = item.parent.ancestors() + [item.parent]
+    names = [folder.name for folder in folders[folders.index(box.watched_folder) + 1:]]
+    return "/".join(names + [item.name])
+
+
+def test_detect_changes_skips_resaves_and_walks_subfolders(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    box = generate_corpus(40, median_kb=1, sigma=0, subfolders=3)
+    client = BoxClient(config_path=None, client=box, max_workers=4)
+    assert len(client.detect_changes(box.watched_folder.id)) == 40
+
+    edited = box.touch_files(0.1, content_changed=True, seed=1)
+    box.touch_files(0.1, content_changed=False, seed=2)
+    box.reset_counters()
+    changes = client.detect_changes(box.watched_folder.id)
+    assert sorted(changes) == sorted(f"Modified file: {tree_path(box, item)}" for item in edited)
+    assert set(client.changed_items) == {tree_path(box, item) for item in edited}
+    # One listing per folder and no per-file lookups
+    assert box.calls["folder.get_items"] == 4
+    assert box.calls["file.get"] == 0
+
+
+def test_detect_changes_upgrades_timestamp_records(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    box = generate_corpus(10, median_kb=1, sigma=0)
+    client = BoxClient(config_path=None, client=box)
+    client.records = {item.name: item.created_at for item in box.files.values()}
+    stale = next(iter(box.files.values()))
+    client.records[stale.name] = "2020-01-01T00:00:00+00:00"
+
+    assert client.detect_changes(box.watched_folder.id) == [f"Modified file: {stale.name}"]
+    # The records written by file name are now keyed by Box file ID
+    assert set(client.records) == set(box.files)
+    assert all(record["sha1"] == box.files[box_id].sha1 for box_id, record in client.records.items())
+    assert client.detect_changes(box.watched_folder.id) == []
+
+
+def test_detect_and_sync_records_survive_a_restart(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    box = generate_corpus(20, median_kb=1, sigma=0)
+    openai = FakeOpenAIClient()
+    vector_store = OpenAIVectorStoreAPI("test", openai.beta.vector_stores.create(name="test").id, client=openai)
+    client = BoxClient(config_path=None, client=box)
+    vector_store.update_vector_store(client.detect_changes(box.watched_folder.id), box.watched_folder.id, client, {})
+
+    # A restart reloads both records files; syncing rewrote the vector store's without touching the detector's
+    client = BoxClient(config_path=None, client=box)
+    assert client.detect_changes(box.watched_folder.id) == []
+
+
+def test_detect_changes_reads_legacy_vector_store_records(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    box = generate_corpus(10, median_kb=1, sigma=0)
+    stale = next(iter(box.files.values()))
+    records = {item.name: [f"file-{item.id}", item.created_at] for item in box.files.values()}
+    records[stale.name][1] = "2020-01-01T00:00:00+00:00"
+    (tmp_path / BoxClient.LEGACY_RECORDS_FILE).write_text(json.dumps(records))
+
+    client = BoxClient(config_path=None, client=box)
+    assert client.detect_changes(box.watched_folder.id) == [f"Modified file: {stale.name}"]
+    assert client.detect_changes(box.watched_folder.id) == []
+
+
+def test_files_with_the_same_name_in_different_subfolders(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    box = generate_corpus(4, median_kb=1, sigma=0)
+    first = box.add_file(box.add_folder(box.watched_folder, "2023"), "Minutes.pdf", 100)
+    second = box.add_file(box.add_folder(box.watched_folder, "2024"), "Minutes.pdf", 200)
+    openai = FakeOpenAIClient()
+    store = openai.beta.vector_stores.create(name="test")
+    vector_store = OpenAIVectorStoreAPI("test", store.id, client=openai)
+    client, records = BoxClient(config_path=None, client=box), {}
+
+    changes = client.detect_changes(box.watched_folder.id)
+    assert {"New file: 2023/Minutes.pdf", "New file: 2024/Minutes.pdf"} <= set(changes)
+    vector_store.update_vector_store(changes, box.watched_folder.id, client, records)
+    assert len(store.files) == 6 and {first.id, second.id} <= set(records)
+
+    # Neither file is mistaken for a modification of the other
+    assert client.detect_changes(box.watched_folder.id) == []
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+import pytest
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+from openai import OpenAI
+
+# Add the `src` and `benchmarks` directories to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+os.environ.setdefault("API_KEY", "test-key")
+
+import main
+from chat_socket import CLOSE_SLOW_CLIENT, ChatConnection
+from stub_openai_server import StubConfig, create_app, serve_in_background
+
+
+def use_client(monkeypatch, client):
+    """Points both assistants at a stub of the OpenAI API and forgets the state left by other stubs."""
+    for assistant in (main.assistant_api_4o, main.assistant_api_4o_mini):
+        monkeypatch.setattr(assistant, "_client", client)
+    main.app.state.user_assistants.clear()
+    main.thread_context._redirects.clear()
+    main.app.state.indexing._records.clear()
+    main.app.state.history._threads.clear()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    stub_app = create_app(StubConfig(stream_chunks=4))
+    use_client(monkeypatch, OpenAI(api_key="test-key", base_url="http://stub/v1", http_client=TestClient(stub_app), max_retries=0))
+    return stub_app
+
+
+@contextmanager
+def connect(api: TestClient):
+    with api.websocket_connect("/ws/chat") as ws:
+        ws.send_json({"user_id": "a@example.edu"})
+        assert ws.receive_json() == {"type": "ready", "user_id": "a@example.edu"}
+        yield ws
+
+
+def receive_until(ws, *request_ids) -> dict[str, list[dict]]:
+    """Collects messages by request ID until each of the requests has its result, error or cancellation."""
+    messages, pending = {}, set(request_ids)
+    while pending:
+        message = ws.receive_json()
+        messages.setdefault(message["id"], []).append(message)
+        if message["type"] in ("result", "error", "cancelled"):
+            pending.discard(message["id"])
+    return messages
+
+
+def test_questions_are_multiplexed_and_streamed(stub):
+    with connect(TestClient(main.app)) as ws:
+        ws.send_json({"id": "t", "type": "create_thread"})
+        thread_id = receive_until(ws, "t")["t"][-1]["data"]["thread_id"]
+
+        ws.send_json({"id": "q1", "type": "ask", "thread_id": thread_id, "question": "What is WG3?"})
+        ws.send_json({"id": "q2", "type": "ask", "question": "What is WG4?"})
+        messages = receive_until(ws, "q1", "q2")
+
+    q1 = messages["q1"]
+    assert q1[0]["type"] == "status" and q1[0]["thread_id"] == thread_id
+    assert "".join(m["text"] for m in q1 if m["type"] == "delta") == StubConfig.answer
+    assert q1[-1]["type"] == "result" and q1[-1]["data"]["response"] == StubConfig.answer
+    assert q1[-1]["data"]["thread_id"] == thread_id and q1[-1]["data"]["citations"]
+    # The second question started its own conversation, as `/ask-question` does without a thread
+    assert messages["q2"][-1]["data"]["thread_id"] not in (thread_id, None)
+
+
+def test_invalid_messages_get_errors(stub):
+    with connect(TestClient(main.app)) as ws:
+        ws.send_text("not json")
+        assert ws.receive_json() == {"id": None, "type": "error", "status": 400, "detail": "Messages must be JSON objects."}
+        ws.send_json({"type": "ask", "question": "Q"})
+        assert ws.receive_json()["detail"] == "Every message needs a string id."
+        ws.send_json({"id": "x", "type": "upload"})
+        assert ws.receive_json() == {"id": "x", "type": "error", "status": 400, "detail": "Unknown message type: upload."}
+        ws.send_json({"id": "q", "type": "ask"})
+        error = ws.receive_json()
+        assert (error["id"], error["status"], error["detail"][0]["loc"]) == ("q", 422, ["question"])
+        ws.send_json({"id": "c", "type": "cancel", "target": "nothing"})
+        assert ws.receive_json() == {"id": "c", "type": "result", "data": {"cancelled": False}}
+
+    with TestClient(main.app).websocket_connect("/ws/chat") as ws:
+        ws.send_json({"token": "no user without auth"})
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+        assert closed.value.code == 4400
+
+
+def test_cancel_stops_the_run(monkeypatch):
+    # The stub is served on a socket; `TestClient` would return the streamed run only once it ended
+    stub_app = create_app(StubConfig(run_ms=5000, stream_chunks=50))
+    with serve_in_background(stub_app) as base_url:
+        use_client(monkeypatch, OpenAI(api_key="test-key", base_url=base_url, max_retries=0))
+        with connect(TestClient(main.app)) as ws:
+            ws.send_json({"id": "q", "type": "ask", "question": "What is WG3?"})
+            status = ws.receive_json()
+            assert status["type"] == "status" and status["status"] == "running"
+
+            start = time.monotonic()
+            ws.send_json({"id": "c", "type": "cancel", "target": "q"})
+            messages = receive_until(ws, "q", "c")
+            assert messages["q"][-1] == {"id": "q", "type": "cancelled"}
+            assert messages["c"] == [{"id": "c", "type": "result", "data": {"cancelled": True}}]
+            run = stub_app.state.stub["runs"][status["run_id"]]
+            while run["status"] != "cancelled" and time.monotonic() - start < 2:
+                time.sleep(0.01)
+            assert run["status"] == "cancelled"
+
+            # Nothing more arrives for the cancelled question, and the connection keeps serving
+            ws.send_json({"id": "t", "type": "create_thread"})
+            messages = receive_until(ws, "t")
+            assert list(messages) == ["t"] and messages["t"][0]["data"]["thread_id"]
+
+
+def test_attach_pushes_indexing_progress(stub, monkeypatch):
+    stub.state.config.index_ms = 200
+    monkeypatch.setattr(main.app.state.indexing, "poll_interval", 0.05)
+    with TestClient(main.app) as api:
+        thread_id = api.post("/create-thread", json={"user_id": "a@example.edu"}).json()["thread_id"]
+        file_id = api.post("/upload", files={"file": ("notes.txt", b"hello", "text/plain")},
+                           data={"user_id": "a@example.edu"}).json()["file_id"]
+        with connect(api) as ws:
+            ws.send_json({"id": "a", "type": "attach", "thread_id": thread_id, "file_id": file_id})
+            messages = [ws.receive_json()]
+            while messages[-1]["type"] != "indexing_done":
+                messages.append(ws.receive_json())
+
+    assert messages[0]["type"] == "result" and messages[0]["data"]["tracking_id"]
+    indexing = [m["data"]["status"] for m in messages if m["type"] == "indexing"]
+    assert indexing[0] == "in_progress" and indexing[-1] == "completed"
+
+
+class FakeSocket:
+    """A WebSocket whose client reads only once `reading` is set."""
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.reading = asyncio.Event()
+        self.sent = []
+        self.close_code = None
+
+    async def receive_text(self) -> str:
+        text = await self.incoming.get()
+        if text is None:
+            raise WebSocketDisconnect(1000)
+        return text
+
+    async def send_text(self, text: str):
+        await self.reading.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int, reason: str = ""):
+        self.close_code = code
+
+
+def test_slow_client_gets_coalesced_deltas_and_in_flight_limit():
+    async def scenario():
+        socket = FakeSocket()
+        release = asyncio.Event()
+
+        async def stream(request):
+            for i in range(100):
+                request.on_delta(f"{i} ")
+            await release.wait()
+            yield "result", {"data": "done"}
+
+        connection = ChatConnection(socket, {"stream": stream}, cancel_run=None, max_in_flight=2, max_queued=4)
+        serving = asyncio.create_task(connection.serve())
+        for request_id in ("a", "b", "c"):
+            socket.incoming.put_nowait(json.dumps({"id": request_id, "type": "stream"}))
+        await asyncio.sleep(0.05)
+        socket.reading.set()
+        release.set()
+        await asyncio.sleep(0.05)
+        socket.incoming.put_nowait(None)
+        await serving
+        return socket.sent
+
+    sent = asyncio.run(scenario())
+    assert {"id": "c", "type": "error", "status": 429, "detail": "Too many requests in flight on this connection."} in sent
+    for request_id in ("a", "b"):
+        deltas = [m["text"] for m in sent if m["id"] == request_id and m["type"] == "delta"]
+        # The client was not reading, so the 100 pieces went out in a single message
+        assert len(deltas) == 1 and deltas[0] == "".join(f"{i} " for i in range(100))
+        assert sent.index({"id": request_id, "type": "result", "data": "done"}) > sent.index(
+            {"id": request_id, "type": "delta", "text": deltas[0]})
+
+
+def test_client_that_stops_reading_is_disconnected():
+    async def scenario():
+        socket = FakeSocket()
+
+        async def echo(request):
+            yield "result", {"data": request.message["text"]}
+
+        connection = ChatConnection(socket, {"echo": echo}, cancel_run=None, send_timeout=0.05)
+        socket.incoming.put_nowait(json.dumps({"id": "e", "type": "echo", "text": "hi"}))
+        await asyncio.wait_for(connection.serve(), 1)
+        return socket
+
+    socket = asyncio.run(scenario())
+    assert socket.close_code == CLOSE_SLOW_CLIENT and socket.sent == []
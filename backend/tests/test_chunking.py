@@ -0,0 +1,91 @@
+import io
+import json
+import os
+import sys
+
+import pytest
+
+# Add the `src`, `benchmarks` and `setup` directories to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../setup')))
+os.environ.setdefault("API_KEY", "test-key")
+
+from chunking import ChunkingPolicy, ChunkingRule, load_policy
+from chunking_benchmark import builtin_policies, generate_corpus, run_benchmark
+from fake_vector_store import FakeOpenAIClient
+from vector_store_api import OpenAIVectorStoreAPI
+
+MB = 1024 * 1024
+
+
+def test_first_matching_rule_gives_the_strategy():
+    policy = load_policy()
+    assert policy.rule_for("Enrollment.CSV", 10 * MB).name == "tables"
+    assert policy.rule_for("Memo.pdf", 20 * 1024).name == "short"
+    assert policy.strategy_for("Self-Study.pdf", 5 * MB) == \
+        {"type": "static", "static": {"max_chunk_size_tokens": 1200, "chunk_overlap_tokens": 300}}
+    # Medium files, and files of unknown size, keep the default
+    assert policy.strategy_for("Report.pdf", MB) is None
+    assert policy.strategy_for("Self-Study.pdf") is None
+
+    named = ChunkingPolicy([{"name": "minutes", "name_pattern": "minutes*", "max_chunk_size_tokens": 300,
+                             "chunk_overlap_tokens": 0}])
+    assert named.rule_for("Minutes 2024-03.docx").name == "minutes"
+    assert named.rule_for("Agenda.docx") is None
+
+
+def test_invalid_rules_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ChunkingRule("tiny", max_chunk_size_tokens=50, chunk_overlap_tokens=0)
+    with pytest.raises(ValueError):
+        ChunkingRule("overlapping", max_chunk_size_tokens=400, chunk_overlap_tokens=300)
+
+    path = tmp_path / "policy.json"
+    path.write_text(json.dumps(load_policy().to_dict()))
+    assert [rule.name for rule in load_policy(str(path)).rules] == ["tables", "short", "handbooks"]
+
+
+def test_group_splits_files_by_strategy():
+    groups = load_policy().group([("a.pdf", 5 * MB, "a"), ("b.csv", 10, "b"), ("c.pdf", 3 * MB, "c"),
+                                  ("d.pdf", MB, "d")])
+    assert [(strategy and strategy["static"]["max_chunk_size_tokens"], values) for strategy, values in groups] == \
+        [(1200, ["a", "c"]), (400, ["b"]), (None, ["d"])]
+
+
+def test_upload_passes_the_chunking_strategy():
+    openai = FakeOpenAIClient()
+    store = openai.beta.vector_stores.create(name="test")
+    api = OpenAIVectorStoreAPI("test", store.id, client=openai)
+
+    api.upload_file("Memo.pdf", io.BytesIO(b"x" * 1000))
+    api.upload_file("Report.pdf", io.BytesIO(b"x" * MB))
+    strategies = [entry.chunking_strategy for entry in openai.vector_stores[store.id].files.values()]
+    assert strategies[0]["static"]["max_chunk_size_tokens"] == 400
+    assert strategies[1] is None
+
+
+def test_setup_uploads_one_batch_per_strategy():
+    import create_store_and_assistant as setup_script
+
+    openai = FakeOpenAIClient()
+    setup_script.client = openai
+    streams = [(f"Memo {i}.pdf", io.BytesIO(b"x" * 100)) for i in range(3)] + \
+              [("Self-Study.pdf", io.BytesIO(b"x" * 3 * MB)), ("Data.csv", io.BytesIO(b"1,2"))]
+    store = setup_script.upload_files_in_batches(streams, batch_size=2)
+    assert openai.calls["vector_stores.file_batches.create"] == 4
+    sizes = sorted(entry.chunking_strategy["static"]["max_chunk_size_tokens"]
+                   for entry in openai.vector_stores[store.id].files.values())
+    assert sizes == [400, 400, 400, 400, 1200]
+
+
+def test_benchmark_reports_every_policy():
+    documents, questions = generate_corpus(num_handbooks=1, num_memos=5, num_tables=2, seed=1)
+    assert documents[0]["size"] > 2 * MB and len(questions) == 12 + 5 + 2 * 4
+    results = run_benchmark(builtin_policies(), documents, questions, top_k=5)
+    assert results["default-rules"]["rules"] == {"handbooks": 1, "short": 5, "tables": 2}
+    assert results["auto"]["rules"] == {"auto": 8}
+    # Smaller chunks mean more of them and less context per answer
+    assert results["uniform-400"]["chunks"] > results["uniform-1600"]["chunks"]
+    assert results["uniform-400"]["context_tokens_p50"] < results["uniform-1600"]["context_tokens_p50"]
+    assert all(0 <= result["mrr"] <= result["hit_rate"] <= 1 for result in results.values())
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from openai import OpenAI
+
+# Add the `src` and `benchmarks` directories to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+os.environ.setdefault("API_KEY", "test-key")
+
+from hedging import HedgeBudget, Hedger, LatencyWindow
+from thread_queue import ThreadQueue
+from usage_ledger import current_user
+from stub_openai_server import StubConfig, create_app, serve_in_background
+
+
+class FakeAssistant:
+    """Answers after `seconds`, unless its run is cancelled first."""
+    def __init__(self, assistant_id, seconds, answer, fail=False):
+        self.assistant_id = assistant_id
+        self.seconds = seconds
+        self.answer = answer
+        self.fail = fail
+        self.cancelled = []
+        self.recorded = []
+        self.deleted = []
+        self.scratch_messages = None
+        self.cancel_delay = 0
+        self.users = []
+        self._cancel_events = {}
+        self._runs = 0
+
+    def _run(self, thread_id, on_run):
+        self._runs += 1
+        self.users.append(current_user.get())
+        run_id = f"run_{self.assistant_id}_{self._runs}"
+        cancel = self._cancel_events[run_id] = threading.Event()
+        if on_run:
+            on_run(thread_id, run_id)
+        if cancel.wait(self.seconds):
+            # The run takes a while to reach its cancelled state
+            time.sleep(self.cancel_delay)
+            raise RuntimeError(f"Run {run_id} ended with status 'cancelled'")
+        if self.fail:
+            raise RuntimeError("run failed")
+        return self.answer, ["Handbook"], thread_id
+
+    def ask_question(self, thread_id, question, on_run=None):
+        return self._run(thread_id or "thread_new", on_run)
+
+    def answer_on_scratch_thread(self, messages, on_run=None):
+        self.scratch_messages = messages
+        return self._run("thread_scratch", on_run)
+
+    def cancel_run(self, thread_id, run_id):
+        self.cancelled.append((thread_id, run_id))
+        self._cancel_events[run_id].set()
+
+    def record_answer(self, thread_id, question, response, answer_only=False):
+        self.recorded.append((thread_id, question, response, answer_only))
+        return thread_id or "thread_written"
+
+    def delete_thread(self, thread_id):
+        self.deleted.append(thread_id)
+
+
+def test_latency_window_and_budget():
+    window = LatencyWindow(size=100)
+    for seconds in range(1, 101):
+        window.record(float(seconds))
+    assert (window.percentile(50), window.percentile(95), window.percentile(100)) == (50.0, 95.0, 100.0)
+    assert window.mean_beyond(97) == 99.0 and window.mean_beyond(100) is None
+
+    budget = HedgeBudget(ratio=0.25, burst=1)
+    assert budget.spend() and not budget.spend()
+    for _ in range(4):
+        budget.earn()
+    assert budget.spend()
+
+
+def test_stalled_primary_is_hedged_and_the_answer_written_back():
+    hedger = Hedger(initial_delay=0.05, cancel_wait=1)
+    primary, secondary = FakeAssistant("asst_4o", 5, "slow"), FakeAssistant("asst_mini", 0.01, "fast")
+    context = [{"role": "user", "content": "What is WG3?", "created_at": 1}, {"role": "assistant", "content": "A group."}]
+
+    start = time.perf_counter()
+    response, citations, thread_id, winner = hedger.ask_question(primary, secondary, "thread_1", "Who chairs it?", context)
+    assert time.perf_counter() - start < 1
+    assert (response, thread_id, winner) == ("fast", "thread_1", "hedge")
+    # The hedge saw the conversation, the user's run was cancelled and the answer added after the question it held
+    assert secondary.scratch_messages == [{"role": "user", "content": "What is WG3?"},
+                                          {"role": "assistant", "content": "A group."},
+                                          {"role": "user", "content": "Who chairs it?"}]
+    assert primary.cancelled == [("thread_1", "run_asst_4o_1")]
+    assert primary.recorded == [("thread_1", "Who chairs it?", "fast", True)]
+    time.sleep(0.05)
+    assert secondary.deleted == ["thread_scratch"]
+
+
+def test_runs_see_the_callers_context():
+    hedger = Hedger(initial_delay=0.05, cancel_wait=1)
+    primary, secondary = FakeAssistant("asst_4o", 5, "slow"), FakeAssistant("asst_mini", 0.01, "fast")
+    token = current_user.set("a@example.edu")
+    try:
+        assert hedger.ask_question(primary, secondary, "thread_1", "Q", [])[3] == "hedge"
+    finally:
+        current_user.reset(token)
+    # The usage ledger attributes both runs to the user
+    assert primary.users == secondary.users == ["a@example.edu"]
+
+
+def test_thread_stays_held_until_a_late_write_back():
+    hedger = Hedger(initial_delay=0.05, cancel_wait=0.05)
+    primary, secondary = FakeAssistant("asst_4o", 5, "slow"), FakeAssistant("asst_mini", 0.01, "fast")
+    primary.cancel_delay = 0.3
+
+    async def scenario():
+        queue = ThreadQueue()
+        first = await queue.run("thread_1", lambda: hedger.ask_question(
+            primary, secondary, "thread_1", "Q1", [], on_deferred=queue.keep_held))
+        # The answer came back before the cancelled run ended; the next request waits for its write-back
+        assert first[3] == "hedge" and primary.recorded == []
+        return await queue.run("thread_1", lambda: list(primary.recorded))
+
+    assert asyncio.run(scenario()) == [("thread_1", "Q1", "fast", True)]
+
+
+def test_fast_primary_is_not_hedged_and_the_deadline_adapts():
+    hedger = Hedger(initial_delay=1, min_delay=0.01, min_samples=5)
+    primary, secondary = FakeAssistant("asst_4o", 0.01, "primary"), FakeAssistant("asst_mini", 0.01, "hedge")
+    assert hedger.deadline(primary) == 1
+    for _ in range(5):
+        assert hedger.ask_question(primary, secondary, None, "Q", [])[3] == "primary"
+    assert secondary.scratch_messages is None
+    assert 0.01 <= hedger.deadline(primary) < 0.5
+
+    # A hedge that loses is cancelled and its scratch thread deleted
+    primary.seconds = 0.2
+    secondary.seconds = 5
+    assert hedger.ask_question(primary, secondary, "thread_1", "Q", [])[3] == "primary"
+    assert secondary.cancelled == [("thread_scratch", "run_asst_mini_1")]
+    time.sleep(0.05)
+    assert secondary.deleted == ["thread_scratch"] and primary.recorded == []
+
+
+def test_hedges_are_capped_by_budget_and_need_context():
+    primary, secondary = FakeAssistant("asst_4o", 0.1, "primary"), FakeAssistant("asst_mini", 0.01, "hedge")
+    hedger = Hedger(initial_delay=0.02, budget=0.0, burst=1, cancel_wait=1)
+    assert hedger.ask_question(primary, secondary, None, "Q1", [])[3] == "hedge"
+    assert hedger.ask_question(primary, secondary, None, "Q2", [])[3] == "primary"
+
+    hedger = Hedger(initial_delay=0.02)
+    assert hedger.ask_question(primary, secondary, "thread_1", "Q3", None)[3] == "primary"
+
+    # A failing hedge leaves the primary's answer
+    secondary.fail = True
+    assert hedger.ask_question(primary, secondary, "thread_1", "Q4", [])[:4:3] == ("primary", "primary")
+
+
+@pytest.fixture
+def served_stub():
+    stub_app = create_app(StubConfig(run_ms=50, assistant_run_ms={"asst_slow": 5000}, stream_chunks=20))
+    with serve_in_background(stub_app) as base_url:
+        yield stub_app, OpenAI(api_key="test-key", base_url=base_url, max_retries=0)
+
+
+def test_hedged_question_through_the_endpoint(monkeypatch, served_stub):
+    import main
+
+    stub_app, client = served_stub
+    for assistant, assistant_id in ((main.assistant_api_4o, "asst_slow"), (main.assistant_api_4o_mini, "asst_fast")):
+        monkeypatch.setattr(assistant, "_client", client)
+        monkeypatch.setattr(assistant, "assistant_id", assistant_id)
+    monkeypatch.setattr(main.app.state, "hedger", Hedger(initial_delay=0.2, cancel_wait=2))
+    main.app.state.user_assistants.clear()
+
+    start = time.perf_counter()
+    body = TestClient(main.app).post("/ask-question", json={"question": "What is WG3?", "user_id": "a@example.edu"}).json()
+    assert time.perf_counter() - start < 3
+    assert body["response"] == StubConfig().answer
+    # The user's thread holds the question and the hedged answer; the slow run was cancelled and the scratch thread deleted
+    messages = stub_app.state.stub["messages"][body["thread_id"]]
+    assert [(m["role"], m["content"][0]["text"]["value"]) for m in messages] == \
+        [("user", "What is WG3?"), ("assistant", StubConfig().answer)]
+    runs = {run["assistant_id"]: run for run in stub_app.state.stub["runs"].values()}
+    assert runs["asst_slow"]["status"] == "cancelled" and runs["asst_slow"]["thread_id"] == body["thread_id"]
+    time.sleep(0.2)
+    assert runs["asst_fast"]["thread_id"] not in stub_app.state.stub["threads"]
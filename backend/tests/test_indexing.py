@@ -0,0 +1,60 @@
+import asyncio
+import os
+import sys
+
+# Add the `src` directory to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from indexing import IndexingTracker
+
+
+def test_poller_records_final_status_and_vector_store():
+    checks = []
+
+    def check_status(thread_id, file_id, vector_store_id):
+        checks.append(vector_store_id)
+        if len(checks) < 3:
+            return "in_progress", None, "vs_1"
+        return "failed", "Unsupported file type", "vs_1"
+
+    async def scenario():
+        tracker = IndexingTracker(check_status, poll_interval=0.01, max_poll_interval=0.02)
+        tracker.start()
+        tracking_id = tracker.track("thread_1", "file_1", "notes.bin")
+        pending = await tracker.wait_for_thread("thread_1", timeout=2)
+        await tracker.stop()
+        return tracker.get(tracking_id), pending
+
+    record, pending = asyncio.run(scenario())
+    assert pending == []
+    assert (record["status"], record["error"], record["vector_store_id"]) == ("failed", "Unsupported file type", "vs_1")
+    # The vector store found by the first check is reused instead of retrieving the thread again
+    assert checks[0] is None and checks[1:] == ["vs_1", "vs_1"]
+
+
+def test_wait_times_out_and_other_threads_do_not_wait():
+    async def scenario():
+        tracker = IndexingTracker(lambda *args: ("in_progress", None, None), poll_interval=0.01)
+        tracker.start()
+        tracker.track("thread_1", "file_1")
+        still_pending = await tracker.wait_for_thread("thread_1", timeout=0.05)
+        other = await tracker.wait_for_thread("thread_2", timeout=5)
+        await tracker.stop()
+        return still_pending, other
+
+    still_pending, other = asyncio.run(scenario())
+    assert [record["file_id"] for record in still_pending] == ["file_1"]
+    assert other == []
+
+
+def test_stuck_indexing_is_marked_failed():
+    async def scenario():
+        tracker = IndexingTracker(lambda *args: ("in_progress", None, None), poll_interval=0.01,
+                                  max_indexing_seconds=0.03)
+        tracker.start()
+        tracking_id = tracker.track("thread_1", "file_1")
+        events = [record["status"] async for record in tracker.events(tracking_id=tracking_id)]
+        await tracker.stop()
+        return events
+
+    assert asyncio.run(scenario()) == ["in_progress", "failed"]
@@ -0,0 +1,37 @@
+import os
+import sys
+
+# Add the `src` and `benchmarks` directories to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+
+from fake_box import generate_corpus
+from ingestion_benchmark import run_scenario
+
+
+def test_generated_corpus_counts_downloads():
+    box = generate_corpus(50, median_kb=4, sigma=0, seed=3)
+    items = list(box.folder(box.watched_folder.id).get_items())
+    assert len(items) == 50
+    assert len(items[0].content()) == 4096
+    assert box.bytes_downloaded == 4096
+    assert box.calls["folder.get_items"] == 1 and box.calls["file.content"] == 1
+
+
+def test_full_sync_uploads_every_file():
+    result = run_scenario("full", 40, median_kb=2, sigma=0)
+    assert result["changes"] == 40
+    assert result["calls"]["openai.files.create"] == 40
+    assert result["bytes_moved"]["box_download"] == result["bytes_moved"]["openai_upload"] == 40 * 2048
+
+
+def test_incremental_sync_only_moves_changed_files():
+    result = run_scenario("incremental", 200, median_kb=2, sigma=0, change_fraction=0.05)
+    assert 0 < result["changes"] < 200
+    assert result["calls"]["openai.files.create"] == result["changes"]
+    assert result["calls"]["box.folder.get_items"] <= 2
+
+
+def test_setup_scenario_runs_batched_upload():
+    result = run_scenario("setup", 25, median_kb=1, sigma=0)
+    assert result["calls"]["openai.vector_stores.file_batches.create"] == 3
@@ -0,0 +1,84 @@
+import os
+import sys
+from types import SimpleNamespace
+
+# Add the `src` directory to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from metrics import MetricsRegistry, track_stage, STAGE_LATENCY, STAGE_ERRORS
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Test latency.", ("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="a")
+    histogram.observe(0.5, stage="a")
+    histogram.observe(5, stage="a")
+
+    body = registry.render()
+    assert '# TYPE latency_seconds histogram' in body
+    assert 'latency_seconds_bucket{stage="a",le="0.1"} 1' in body
+    assert 'latency_seconds_bucket{stage="a",le="1"} 2' in body
+    assert 'latency_seconds_bucket{stage="a",le="+Inf"} 3' in body
+    assert 'latency_seconds_count{stage="a"} 3' in body
+
+
+def test_counter_and_gauge():
+    registry = MetricsRegistry()
+    errors = registry.counter("errors_total", "Test errors.", ("error_type",))
+    in_flight = registry.gauge("in_flight", "Test gauge.")
+    errors.inc(error_type='Bad"Request')
+    errors.inc(error_type='Bad"Request')
+    with in_flight.track_inprogress():
+        assert in_flight.value() == 1
+    assert in_flight.value() == 0
+
+    body = registry.render()
+    assert 'errors_total{error_type="Bad\\"Request"} 2' in body
+    assert 'in_flight 0' in body
+
+
+def test_track_stage_records_latency_and_errors():
+    STAGE_LATENCY.clear()
+    STAGE_ERRORS.clear()
+    with track_stage("messages_create"):
+        pass
+    try:
+        with track_stage("messages_create"):
+            raise TimeoutError("slow")
+    except TimeoutError:
+        pass
+
+    assert STAGE_LATENCY.snapshot(stage="messages_create")["count"] == 2
+    assert STAGE_ERRORS.value(stage="messages_create", error_type="TimeoutError") == 1
+
+
+def test_run_and_poll_counts_polls(monkeypatch):
+    from assistant_api import AssistantAPI
+    from thread_context import ThreadContextManager
+    import assistant_api
+
+    statuses = iter(["in_progress", "in_progress", "completed"])
+
+    class FakeRuns:
+        def create(self, thread_id, assistant_id, **options):
+            return SimpleNamespace(id="run_1", status="queued")
+
+        @property
+        def with_raw_response(self):
+            return self
+
+        def retrieve(self, thread_id, run_id):
+            run = SimpleNamespace(id=run_id, status=next(statuses), usage=None)
+            return SimpleNamespace(parse=lambda: run, headers={"openai-poll-after-ms": "1"})
+
+    api = AssistantAPI.__new__(AssistantAPI)
+    api.assistant_id = "asst_1"
+    api.context = ThreadContextManager()
+    api.client = SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(runs=FakeRuns())))
+    monkeypatch.setattr(assistant_api.time, "sleep", lambda _: None)
+
+    assistant_api.RUN_POLLS.clear()
+    run = api.run_and_poll("thread_1")
+    assert run.status == "completed"
+    assert assistant_api.RUN_POLLS.snapshot() == {"count": 1, "sum": 3.0}
@@ -0,0 +1,97 @@
+import os
+import sys
+
+# Add the `src` directory to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import pytest
+
+from model_router import ModelRouter, complexity_score
+from thread_context import ThreadContextManager
+
+
+class FakeAssistant:
+    def __init__(self, answer="Answer.", citations=("Handbook",), fail=False):
+        self.context = ThreadContextManager()
+        self.answer = answer
+        self.citations = list(citations)
+        self.fail = fail
+        self.asked = []
+        self.answered_again = []
+
+    def ask_question(self, thread_id, question):
+        if self.fail:
+            raise RuntimeError("run failed")
+        self.asked.append(question)
+        return self.answer, self.citations, thread_id or "thread_new"
+
+    def answer_again(self, thread_id):
+        if self.fail:
+            raise RuntimeError("run failed")
+        self.answered_again.append(thread_id)
+        return "Strong answer.", ["Handbook"], thread_id
+
+
+def test_complexity_score_separates_lookups_from_synthesis():
+    assert complexity_score("When is the deadline?") < 2
+    assert complexity_score("Compare the evidence expectations of WG2 and WG3 and recommend a plan for our team.") >= 2
+    assert complexity_score("What is WG3?", turns=30) > complexity_score("What is WG3?")
+
+
+def test_routes_by_complexity():
+    fast, strong = FakeAssistant(), FakeAssistant()
+    router = ModelRouter(fast, strong)
+
+    assert router.ask_question("thread_1", "What is WG3?")[3] == "4o-mini"
+    assert router.ask_question("thread_1", "Compare and contrast the evidence for WG2 and WG3, and why they differ.")[3] == "4o"
+    assert fast.asked == ["What is WG3?"] and len(strong.asked) == 1
+
+
+def test_poor_fast_answer_is_escalated_and_thread_stays_strong():
+    fast, strong = FakeAssistant(answer="I couldn't find that in the files.", citations=()), FakeAssistant()
+    router = ModelRouter(fast, strong)
+
+    response, citations, thread_id, route = router.ask_question("thread_1", "What is WG3?")
+    assert (response, route) == ("Strong answer.", "4o")
+    assert strong.answered_again == ["thread_1"]
+    assert router.route("thread_1", "Who chairs it?").reason == "escalated"
+
+
+def test_failed_escalation_keeps_the_fast_answer():
+    fast, strong = FakeAssistant(answer="I couldn't find that in the files.", citations=()), FakeAssistant(fail=True)
+    router = ModelRouter(fast, strong)
+
+    response, citations, thread_id, route = router.ask_question("thread_1", "What is WG3?")
+    assert (response, citations, thread_id, route) == ("I couldn't find that in the files.", [], "thread_1", "4o-mini")
+
+
+def test_failing_route_falls_back():
+    fast, strong = FakeAssistant(fail=True), FakeAssistant()
+    router = ModelRouter(fast, strong, max_error_rate=0.3)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            router.ask_question("thread_1", "What is WG3?")
+    decision = router.route("thread_1", "What is WG3?")
+    assert (decision.route, decision.reason) == ("4o", "fallback")
+
+
+def test_slow_fast_route_is_skipped():
+    router = ModelRouter(FakeAssistant(), FakeAssistant())
+    router.stats["4o-mini"].record(3.0, ok=True)
+    router.stats["4o"].record(1.0, ok=True)
+    assert router.route(None, "What is WG3?").reason == "latency"
+
+
+def test_avoided_route_is_probed_and_traffic_returns_once_it_recovers():
+    fast, strong = FakeAssistant(fail=True), FakeAssistant()
+    router = ModelRouter(fast, strong, max_error_rate=0.3, probe_every=3)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            router.ask_question("thread_1", "What is WG3?")
+
+    fast.fail = False
+    routes = [router.ask_question("thread_1", "What is WG3?")[3] for _ in range(4)]
+    # Two questions fell back, the third probed the recovered route and the fourth went there again
+    assert routes == ["4o", "4o", "4o-mini", "4o-mini"]
+    assert router.route("thread_1", "What is WG3?").reason == "simple"
@@ -0,0 +1,108 @@
+import os
+import re
+import sys
+
+import numpy as np
+import pytest
+
+# Add the `src` directory to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from semantic_cache import SemanticAnswerCache
+
+# Words mapped to the concept they stand for, a stand-in for what a real embedding model learns
+CONCEPTS = {
+    "wg3": "wg3", "evidence": "evidence", "expectations": "requirement", "need": "requirement",
+    "needs": "requirement", "required": "requirement", "wg4": "wg4", "deadline": "deadline", "due": "deadline",
+    "budget": "budget",
+}
+DIMENSIONS = {concept: i for i, concept in enumerate(sorted(set(CONCEPTS.values())))}
+
+
+class ToyEmbedder:
+    """Embeds texts offline as counts of the concepts they mention."""
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, texts):
+        self.calls += 1
+        vectors = np.zeros((len(texts), len(DIMENSIONS)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            text = re.sub(r"working group (\d)", r"wg\1", text.lower())
+            for word in re.findall(r"\w+", text):
+                if word in CONCEPTS:
+                    vectors[row, DIMENSIONS[CONCEPTS[word]]] += 1
+        return vectors
+
+
+@pytest.fixture
+def cache():
+    return SemanticAnswerCache(ToyEmbedder(), threshold=0.9, max_entries=3)
+
+
+def test_paraphrase_is_served_from_cache(cache):
+    cache.store("Evidence expectations for working group 3", "v1", "Self-study design.", ["WG3 Evidence"])
+    hit = cache.lookup("What does WG3 need as evidence?", "v1")
+    assert hit.response == "Self-study design." and hit.citations == ["WG3 Evidence"]
+    assert hit.similarity == pytest.approx(1.0)
+    # A different question stays below the threshold
+    assert cache.lookup("What evidence does WG4 need?", "v1") is None
+
+
+def test_answers_of_another_version_are_not_served(cache):
+    cache.store("Evidence expectations for WG3", "asst_1:vs_1", "Old answer.", [])
+    assert cache.lookup("Evidence expectations for WG3", "asst_1:vs_2") is None
+    cache.store("Evidence expectations for WG3", "asst_1:vs_2", "New answer.", [])
+    assert cache.lookup("What does WG3 need as evidence?", "asst_1:vs_2").response == "New answer."
+
+    cache.invalidate(keep_version="asst_1:vs_2")
+    assert len(cache) == 1
+    assert cache.lookup("Evidence expectations for WG3", "asst_1:vs_1") is None
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    cache.store("WG3 evidence", "v1", "A", [])
+    cache.store("WG4 evidence", "v1", "B", [])
+    cache.store("WG3 deadline", "v1", "C", [])
+    assert cache.lookup("evidence for WG3", "v1").response == "A"
+    cache.store("Budget", "v1", "D", [])
+    assert len(cache) == 3
+    assert cache.lookup("WG4 evidence", "v1") is None
+    assert cache.lookup("WG3 evidence", "v1").response == "A"
+
+
+def test_question_is_embedded_once_per_lookup(cache):
+    embedder = cache.embed
+    assert cache.lookup("WG3 evidence", "v1") is None
+    # Nothing cached yet: no embedding needed
+    assert embedder.calls == 0
+    vector = cache.embed_question("WG3 evidence")
+    cache.lookup("WG3 evidence", "v1", vector)
+    cache.store("WG3 evidence", "v1", "A", [], vector)
+    assert embedder.calls == 1
+
+
+def test_cache_survives_restart(tmp_path):
+    path = str(tmp_path / "faq.npz")
+    cache = SemanticAnswerCache(ToyEmbedder(), threshold=0.9, path=path, save_every=2)
+    cache.store("WG3 evidence", "v1", "A", ["WG3 Evidence"])
+    assert not os.path.exists(path)
+    cache.store("WG4 deadline", "v1", "B", [])
+    assert os.path.exists(path)
+
+    restarted = SemanticAnswerCache(ToyEmbedder(), threshold=0.9, path=path)
+    assert len(restarted) == 2
+    assert restarted.lookup("evidence needed for working group 3", "v1").citations == ["WG3 Evidence"]
+
+    # A cache too small for the saved entries keeps the most recently used ones
+    restarted.save()
+    small = SemanticAnswerCache(ToyEmbedder(), threshold=0.9, max_entries=1, path=path)
+    assert small.lookup("WG3 evidence", "v1").response == "A"
+    assert small.lookup("WG4 deadline", "v1") is None
+
+
+def test_corrupt_file_starts_empty(tmp_path):
+    path = tmp_path / "faq.npz"
+    path.write_bytes(b"not a cache")
+    cache = SemanticAnswerCache(ToyEmbedder(), path=str(path))
+    assert len(cache) == 0
@@ -0,0 +1,137 @@
+import os
+import sys
+
+import pytest
+
+# Add the `src` and `benchmarks` directories to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+
+from box_client_api import BoxClient
+from box_sync import BoxSyncDaemon
+from fake_box import generate_corpus
+from fake_vector_store import FakeOpenAIClient
+from store_rebuild import RebuildError, StoreRebuilder
+from vector_store_api import OpenAIVectorStoreAPI
+
+
+@pytest.fixture
+def setup(tmp_path):
+    box = generate_corpus(20, median_kb=1, sigma=0, subfolders=2)
+    openai = FakeOpenAIClient()
+    store = openai.beta.vector_stores.create(name="live")
+    assistants = [openai.beta.assistants.create(model=model, tool_resources={"file_search": {"vector_store_ids": [store.id]}}).id
+                  for model in ("gpt-4o", "gpt-4o-mini")]
+    vector_store = OpenAIVectorStoreAPI("test", store.id, client=openai)
+
+    def make_daemon():
+        rebuilder = StoreRebuilder(vector_store, assistants, state_path=str(tmp_path / "rebuild.json"), rollback_window=3600)
+        return BoxSyncDaemon(BoxClient(config_path=None, client=box), vector_store, box.watched_folder.id,
+                             state_path=str(tmp_path / "state.json"), retry_delay=0, rebuilder=rebuilder)
+
+    daemon = make_daemon()
+    daemon.run_once()
+    return box, openai, store, assistants, daemon, make_daemon
+
+
+def searched_stores(openai, assistants):
+    return {tuple(openai.assistants[a].tool_resources.file_search.vector_store_ids) for a in assistants}
+
+
+def test_rebuild_reuses_unchanged_files_and_switches_assistants(setup):
+    box, openai, store, assistants, daemon, make_daemon = setup
+    touched = box.touch_files(0.2)
+    openai.reset_counters()
+
+    daemon.rebuild()
+    new_id = daemon.vector_store.vector_store_id
+    assert new_id != store.id
+    assert searched_stores(openai, assistants) == {(new_id,)}
+    # Only the changed files were uploaded; the live store was left as it was
+    assert openai.calls["files.create"] == len(touched)
+    assert len(openai.vector_stores[new_id].files) == 20
+    assert len(store.files) == 20 and openai.calls["vector_stores.files.delete"] == 0
+    assert set(daemon.records[name][0] for name in daemon.records) == set(openai.vector_stores[new_id].files)
+
+    # A restarted daemon follows the rebuilt store, not `VECTOR_STORE_ID`, and has nothing left to sync
+    restarted = make_daemon()
+    assert restarted.vector_store.vector_store_id == new_id
+    openai.reset_counters()
+    restarted.run_once()
+    assert openai.calls["files.create"] == 0
+
+
+def test_failed_rebuild_leaves_the_live_store(setup, monkeypatch):
+    box, openai, store, assistants, daemon, _ = setup
+    box.touch_files(0.2)
+    records = dict(daemon.records)
+    stores = set(openai.vector_stores)
+    uploaded = set(openai.uploaded)
+
+    create_and_poll = openai.beta.vector_stores.file_batches.create_and_poll
+
+    def partly_failing(*args, **kwargs):
+        batch = create_and_poll(*args, **kwargs)
+        batch.file_counts.failed = 1
+        return batch
+
+    monkeypatch.setattr(openai.beta.vector_stores.file_batches, "create_and_poll", partly_failing)
+    with pytest.raises(RebuildError):
+        daemon.rebuild()
+    assert searched_stores(openai, assistants) == {(store.id,)}
+    assert daemon.vector_store.vector_store_id == store.id and daemon.records == records
+    # The half-built store and the files uploaded for it are deleted
+    assert set(openai.vector_stores) == stores and set(openai.uploaded) == uploaded
+
+
+def test_failed_switch_restores_switched_assistants(setup, monkeypatch):
+    box, openai, store, assistants, daemon, _ = setup
+    update = openai.beta.assistants.update
+
+    def failing_update(assistant_id, **kwargs):
+        if assistant_id == assistants[1]:
+            raise RuntimeError("rate limited")
+        return update(assistant_id, **kwargs)
+
+    monkeypatch.setattr(openai.beta.assistants, "update", failing_update)
+    with pytest.raises(RebuildError):
+        daemon.rebuild()
+    assert searched_stores(openai, assistants) == {(store.id,)}
+
+
+def test_rollback_and_garbage_collection(setup):
+    box, openai, store, assistants, daemon, _ = setup
+    box.touch_files(0.2)
+    daemon.rebuild()
+    new_id = daemon.vector_store.vector_store_id
+    rebuilder = daemon.rebuilder
+    assert rebuilder.collect_garbage() == []
+
+    daemon.rollback()
+    assert searched_stores(openai, assistants) == {(store.id,)}
+    assert daemon.vector_store.vector_store_id == store.id
+    # The restored state describes the old store; reconciling re-uploads the files changed since
+    assert set(record[0] for record in daemon.records.values()) == set(store.files)
+    daemon.run_once()
+    assert searched_stores(openai, assistants) == {(store.id,)}
+
+    # Once the window has passed, the rebuilt store goes, with the files only it used
+    only_new = set(openai.vector_stores[new_id].files) - set(store.files)
+    assert only_new and only_new <= set(openai.uploaded)
+    deleted = rebuilder.collect_garbage(now=rebuilder.retired[-1]["retired_at"] + 3600)
+    assert deleted == [new_id] and new_id not in openai.vector_stores
+    assert not only_new & set(openai.uploaded)
+    assert set(store.files) <= set(openai.uploaded)
+    assert rebuilder.retired == []
+
+
+def test_cache_version_follows_a_switch_over(setup):
+    from assistant_api import AssistantAPI
+
+    box, openai, store, assistants, daemon, _ = setup
+    assistant = AssistantAPI("test", assistants[0], client=openai)
+    assert assistant.cache_version() == f"{assistants[0]}:{store.id}"
+    daemon.rebuild()
+    assert assistant.cache_version() == f"{assistants[0]}:{store.id}"
+    assistant.vector_store_refresh = 0
+    assert assistant.cache_version() == f"{assistants[0]}:{daemon.vector_store.vector_store_id}"
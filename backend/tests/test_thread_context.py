@@ -0,0 +1,60 @@
+import os
+import sys
+from types import SimpleNamespace
+
+# Add the `src` directory to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from thread_context import ThreadContextManager, turn_bucket
+
+
+def _run(prompt_tokens):
+    return SimpleNamespace(usage=SimpleNamespace(prompt_tokens=prompt_tokens))
+
+
+def test_run_options_apply_truncation_settings():
+    assert ThreadContextManager().run_options() == {"truncation_strategy": {"type": "auto"}}
+    options = ThreadContextManager(last_messages=10, max_prompt_tokens=8000).run_options()
+    assert options == {
+        "truncation_strategy": {"type": "last_messages", "last_messages": 10},
+        "max_prompt_tokens": 8000,
+    }
+
+
+def test_usage_is_tracked_per_turn_and_triggers_compaction():
+    context = ThreadContextManager(compaction_threshold=1000)
+    context.record_run("thread_1", _run(400), 1.0)
+    assert not context.needs_compaction("thread_1")
+    context.record_run("thread_1", _run(1200), 2.0)
+    assert context.usage("thread_1") == {"turns": 2, "prompt_tokens": [400, 1200]}
+    assert context.needs_compaction("thread_1")
+
+    assert context.begin_compaction("thread_1")
+    assert not context.begin_compaction("thread_1")
+    assert not context.needs_compaction("thread_1")
+    context.finish_compaction("thread_1", "thread_2")
+    assert context.resolve("thread_1") == "thread_2"
+    assert context.usage("thread_1") is None
+
+
+def test_failed_compaction_keeps_thread():
+    context = ThreadContextManager(compaction_threshold=10)
+    context.begin_compaction("thread_1")
+    context.finish_compaction("thread_1", None)
+    assert context.resolve("thread_1") == "thread_1"
+
+
+def test_tracked_threads_are_bounded():
+    context = ThreadContextManager(max_tracked_threads=2)
+    for thread_id in ("a", "b", "c"):
+        context.record_run(thread_id, _run(10), 0.1)
+    assert context.usage("a") is None and context.usage("c") is not None
+
+    for thread_id in ("a", "b", "c"):
+        context.begin_compaction(thread_id)
+        context.finish_compaction(thread_id, f"{thread_id}_summary")
+    assert context.resolve("a") == "a" and context.resolve("c") == "c_summary"
+
+
+def test_turn_buckets():
+    assert [turn_bucket(t) for t in (1, 3, 10, 11, 60)] == ["1", "2-5", "6-10", "11-20", "51+"]
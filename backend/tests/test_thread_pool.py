@@ -0,0 +1,69 @@
+import asyncio
+import itertools
+import os
+import sys
+import time
+
+# Add the `src` directory to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from thread_pool import ThreadPool
+
+
+class FakeThreads:
+    def __init__(self):
+        self.ids = itertools.count(1)
+        self.created = []
+        self.deleted = []
+
+    def create(self):
+        thread_id = f"thread_{next(self.ids)}"
+        self.created.append(thread_id)
+        return thread_id
+
+    def delete(self, thread_id):
+        self.deleted.append(thread_id)
+
+
+async def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        await asyncio.sleep(0.005)
+
+
+def test_pool_refills_after_acquire():
+    threads = FakeThreads()
+
+    async def scenario():
+        pool = ThreadPool(threads.create, threads.delete, low_water_mark=3)
+        assert pool.acquire() is None  # cold pool is a miss
+        pool.start()
+        await _wait_for(lambda: len(pool) == 3)
+
+        thread_id = pool.acquire()
+        assert thread_id in threads.created
+        await _wait_for(lambda: len(pool) == 3)
+        await pool.stop()
+        return pool
+
+    pool = asyncio.run(scenario())
+    assert pool.stats()["hits"] == 1 and pool.stats()["misses"] == 1
+    assert pool.hit_rate == 0.5
+    # The three threads left in the pool are deleted on shutdown
+    assert len(threads.deleted) == 3
+
+
+def test_unused_threads_expire_and_are_deleted():
+    threads = FakeThreads()
+
+    async def scenario():
+        pool = ThreadPool(threads.create, threads.delete, low_water_mark=2, max_age=0.05)
+        pool.start()
+        await _wait_for(lambda: len(threads.deleted) >= 2)
+        await pool.stop(delete_pooled=False)
+        return pool
+
+    pool = asyncio.run(scenario())
+    assert threads.deleted[:2] == threads.created[:2]
+    assert len(pool) <= 2
@@ -0,0 +1,179 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import httpx
+import pytest
+from openai import OpenAI
+from fastapi.testclient import TestClient
+
+# Add the `src` and `benchmarks` directories to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+os.environ.setdefault("API_KEY", "test-key")
+
+from thread_queue import (EXTEND_SCRIPT, RELEASE_SCRIPT, MemoryLockBackend, RedisLockBackend, ThreadBusyError,
+                          ThreadQueue)
+from stub_openai_server import StubConfig, create_app
+
+
+class Recorder:
+    """Blocking work that records how many calls overlap."""
+    def __init__(self, seconds: float = 0.05):
+        self.seconds = seconds
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, result=None):
+        with self._lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.seconds)
+        with self._lock:
+            self.running -= 1
+        return result
+
+
+def test_same_thread_is_serialized_and_other_threads_run_in_parallel():
+    async def scenario():
+        queue = ThreadQueue()
+        same, other = Recorder(), Recorder()
+        await asyncio.gather(*(queue.run("thread_1", same) for _ in range(3)))
+        assert (same.calls, same.max_running) == (3, 1)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(queue.run(f"thread_{i}", other) for i in range(4)))
+        assert other.max_running > 1
+        assert time.perf_counter() - start < 4 * other.seconds
+        assert queue.waiting("thread_1") == 0
+
+    asyncio.run(scenario())
+
+
+def test_repeated_requests_share_one_result():
+    async def scenario():
+        queue = ThreadQueue(merge=True)
+        work = Recorder()
+        results = await asyncio.gather(
+            queue.run("thread_1", lambda: work("answer"), merge_key="Q1"),
+            queue.run("thread_1", lambda: work("answer again"), merge_key="Q1"),
+            queue.run("thread_1", lambda: work("other"), merge_key="Q2"),
+        )
+        assert results == ["answer", "answer", "other"]
+        assert work.calls == 2
+
+        def fail():
+            raise RuntimeError("run failed")
+
+        outcomes = await asyncio.gather(queue.run("thread_1", fail, merge_key="Q3"),
+                                        queue.run("thread_1", fail, merge_key="Q3"), return_exceptions=True)
+        assert [type(outcome) for outcome in outcomes] == [RuntimeError, RuntimeError]
+
+        # Without merging, the default, every request runs
+        unmerged = ThreadQueue()
+        work = Recorder(0.01)
+        await asyncio.gather(*(unmerged.run("thread_1", work, merge_key="Q1") for _ in range(2)))
+        assert work.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_busy_thread_times_out():
+    async def scenario():
+        queue = ThreadQueue(max_wait=0.05)
+        outcomes = await asyncio.gather(queue.run("thread_1", Recorder(0.3)), queue.run("thread_1", Recorder(0)),
+                                        return_exceptions=True)
+        assert outcomes[0] is None and isinstance(outcomes[1], ThreadBusyError)
+        assert queue.waiting("thread_1") == 0
+
+    asyncio.run(scenario())
+
+
+def test_shared_backend_serializes_workers():
+    async def scenario():
+        backend = MemoryLockBackend()
+        workers = [ThreadQueue(backend, poll_interval=0.005), ThreadQueue(backend, poll_interval=0.005)]
+        work = Recorder(0.03)
+        await asyncio.gather(*(worker.run("thread_1", work) for worker in workers for _ in range(2)))
+        assert (work.calls, work.max_running) == (4, 1)
+        assert backend._locks == {}
+
+        # A lock left by a worker that died expires after its TTL
+        await backend.acquire("thread_2", "dead-worker", ttl=0.05)
+        survivor = ThreadQueue(backend, poll_interval=0.005, max_wait=1)
+        assert await survivor.run("thread_2", lambda: "done") == "done"
+
+    asyncio.run(scenario())
+
+
+class FakeRedis:
+    """The subset of `redis.asyncio.Redis` the lock backend uses."""
+    def __init__(self):
+        self.values = {}
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, token, *args):
+        if self.values.get(key) != token:
+            return 0
+        if script == RELEASE_SCRIPT:
+            del self.values[key]
+        assert script in (RELEASE_SCRIPT, EXTEND_SCRIPT)
+        return 1
+
+
+def test_redis_backend_only_releases_its_own_lock():
+    async def scenario():
+        backend = RedisLockBackend(FakeRedis())
+        assert await backend.acquire("thread_1", "a", 30)
+        assert not await backend.acquire("thread_1", "b", 30)
+        assert not await backend.extend("thread_1", "b", 30)
+        await backend.release("thread_1", "b")
+        assert backend.client.values == {"thread-lock:thread_1": "a"}
+        assert await backend.extend("thread_1", "a", 30)
+        await backend.release("thread_1", "a")
+        assert backend.client.values == {}
+
+    asyncio.run(scenario())
+
+
+def test_redis_backend_needs_the_redis_package(monkeypatch):
+    monkeypatch.setitem(sys.modules, "redis", None)
+    monkeypatch.setitem(sys.modules, "redis.asyncio", None)
+    with pytest.raises(ImportError, match="pip install redis"):
+        RedisLockBackend.from_url("redis://localhost:6379/0")
+
+
+def test_double_submitted_questions_do_not_collide(monkeypatch):
+    import main
+
+    stub_app = create_app(StubConfig(run_ms=100, stream_chunks=4))
+    client = OpenAI(api_key="test-key", base_url="http://stub/v1", http_client=TestClient(stub_app), max_retries=0)
+    monkeypatch.setattr(main.assistant_api_4o, "_client", client)
+    monkeypatch.setattr(main.app.state.thread_queue, "merge", True)
+    main.app.state.user_assistants.clear()
+    main.app.state.history._threads.clear()
+    thread_id = TestClient(main.app).post("/create-thread", json={"user_id": "a@example.edu"}).json()["thread_id"]
+
+    async def submit():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as api:
+            def ask(question):
+                return api.post("/ask-question", json={"thread_id": thread_id, "question": question, "user_id": "a@example.edu"})
+            return await asyncio.gather(ask("Q1"), ask("Q1"), ask("Q2"))
+
+    responses = asyncio.run(submit())
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    # The double-submit shared one run; the other question waited for it
+    runs = [run for run in stub_app.state.stub["runs"].values() if run["thread_id"] == thread_id]
+    assert len(runs) == 2
+    questions = [m["content"][0]["text"]["value"] for m in stub_app.state.stub["messages"][thread_id] if m["role"] == "user"]
+    assert sorted(questions) == ["Q1", "Q2"]
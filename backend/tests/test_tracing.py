@@ -0,0 +1,108 @@
+import json
+import os
+import sys
+import threading
+import time
+
+# Add the `src` directory to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import profiler
+import tracing
+
+
+def test_spans_nest_and_export_to_file(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracing.configure_tracing(f"file:{path}")
+    try:
+        with tracing.span("POST /ask-question") as root:
+            with tracing.span("openai.messages_create", thread_id="thread_1"):
+                pass
+            try:
+                with tracing.span("openai.run"):
+                    raise RuntimeError("run failed")
+            except RuntimeError:
+                pass
+        tracing._processor.flush()
+        time.sleep(0.05)
+    finally:
+        tracing.configure_tracing("")
+
+    spans = {s["name"]: s for s in map(json.loads, path.read_text().splitlines())}
+    assert spans["openai.messages_create"]["parent_id"] == root.span_id
+    assert spans["openai.messages_create"]["trace_id"] == root.trace_id
+    assert spans["openai.messages_create"]["attributes"] == {"thread_id": "thread_1"}
+    assert spans["openai.run"]["error"] == "RuntimeError: run failed"
+    assert spans["POST /ask-question"]["parent_id"] is None
+
+
+def test_span_is_noop_when_disabled():
+    tracing.configure_tracing("")
+    with tracing.span("anything") as active:
+        assert active is None
+    assert tracing.current_trace_id() is None
+
+
+def test_traceparent_continues_upstream_trace():
+    trace_id, parent_id = "a" * 32, "b" * 16
+    assert tracing.parse_traceparent(f"00-{trace_id}-{parent_id}-01") == (trace_id, parent_id)
+    assert tracing.parse_traceparent("garbage") is None
+
+
+def test_profiler_emits_folded_stacks():
+    stop = threading.Event()
+
+    def busy_worker():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=busy_worker, name="busy")
+    worker.start()
+    try:
+        folded = profiler.profile(0.1, interval=0.005)
+    finally:
+        stop.set()
+        worker.join()
+
+    lines = folded.strip().splitlines()
+    assert lines
+    assert any(line.startswith("busy;") and "busy_worker" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_reconfiguring_replaces_the_exporter(tmp_path):
+    first, second = tmp_path / "first.jsonl", tmp_path / "second.jsonl"
+    tracing.configure_tracing(f"file:{first}")
+    try:
+        processor = tracing._processor
+        with tracing.span("before"):
+            pass
+        tracing.configure_tracing(f"file:{second}")
+        with tracing.span("after"):
+            pass
+        tracing._processor.flush()
+    finally:
+        tracing.configure_tracing("")
+
+    # The first exporter's thread stopped once its spans were written
+    assert not processor._thread.is_alive()
+    assert [json.loads(line)["name"] for line in first.read_text().splitlines()] == ["before"]
+    assert [json.loads(line)["name"] for line in second.read_text().splitlines()] == ["after"]
+
+
+def test_http_exporter_sends_otlp_json():
+    root = {"name": "POST /ask-question", "trace_id": "a" * 32, "span_id": "b" * 16, "parent_id": None,
+            "start_time": 1700000000.5, "duration_ms": 250.0, "attributes": {"http.status_code": 200}, "error": None}
+    child = dict(root, name="openai.run", span_id="c" * 16, parent_id="b" * 16, attributes={"thread_id": "thread_1"},
+                 error="RuntimeError: run failed")
+    payload = tracing.HttpSpanExporter("http://collector:4318/v1/traces", service_name="backend").payload([root, child])
+
+    resource_spans = payload["resourceSpans"][0]
+    assert resource_spans["resource"]["attributes"] == [{"key": "service.name", "value": {"stringValue": "backend"}}]
+    spans = resource_spans["scopeSpans"][0]["spans"]
+    assert spans[0]["startTimeUnixNano"] == "1700000000500000000"
+    assert spans[0]["endTimeUnixNano"] == "1700000000750000000"
+    assert spans[0]["attributes"] == [{"key": "http.status_code", "value": {"intValue": "200"}}]
+    assert "parentSpanId" not in spans[0] and spans[0]["status"] == {"code": 0}
+    assert spans[1]["parentSpanId"] == "b" * 16
+    assert spans[1]["status"] == {"code": 2, "message": "RuntimeError: run failed"}
@@ -0,0 +1,90 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from openai import OpenAI
+
+# Add the `src` and `benchmarks` directories to the Python path for imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+os.environ.setdefault("API_KEY", "test-key")
+
+from usage_ledger import UsageLedger, current_user, read_usage, summarize
+from stub_openai_server import StubConfig, create_app
+
+
+def make_run(run_id, prompt_tokens, status="completed", model="gpt-4o"):
+    usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=10,
+                            total_tokens=prompt_tokens + 10) if status == "completed" else None
+    return SimpleNamespace(id=run_id, assistant_id="asst_1", model=model, status=status, usage=usage)
+
+
+def test_records_runs_with_their_user(tmp_path):
+    path = str(tmp_path / "usage.jsonl")
+    ledger = UsageLedger(path)
+    current_user.set("a@example.edu")
+    ledger.record("thread_1", make_run("run_1", 100), 1.5, turn=1)
+    current_user.set(None)
+    ledger.record("thread_1", make_run("run_2", 0, status="failed"), 0.2, turn=2)
+    ledger.close()
+    # A line cut off by a crash is skipped
+    with open(path, "a") as f:
+        f.write('{"ts": 1, "user"')
+
+    first, second = read_usage(path)
+    assert (first["user"], first["run_id"], first["prompt_tokens"], first["total_tokens"], first["turn"]) == \
+        ("a@example.edu", "run_1", 100, 110, 1)
+    assert (second["user"], second["status"], second["total_tokens"]) == (None, "failed", None)
+    assert list(read_usage(path, since=first["ts"] + 3600)) == []
+
+
+def test_summarize_percentiles_and_heaviest_threads():
+    records = [
+        {"user": "a", "model": "gpt-4o", "thread_id": "t1", "turn": turn, "status": "completed",
+         "seconds": float(turn), "prompt_tokens": 1000 * turn, "completion_tokens": 10, "total_tokens": 1000 * turn + 10}
+        for turn in range(1, 11)
+    ] + [
+        {"user": "b", "model": "gpt-4o-mini", "thread_id": "t2", "turn": 1, "status": "failed", "seconds": 0.5,
+         "prompt_tokens": None, "completion_tokens": None, "total_tokens": None},
+    ]
+    report = summarize(records, by="user", top_threads=1)
+    assert report["runs"] == 11
+    a = report["groups"]["a"]
+    assert (a["runs"], a["failed"], a["prompt_tokens"]) == (10, 0, 55000)
+    assert a["seconds"] == {"p50": 5.0, "p90": 9.0, "p99": 10.0, "max": 10.0}
+    assert a["prompt_tokens_per_run"]["p90"] == 9000
+    b = report["groups"]["b"]
+    assert (b["failed"], b["total_tokens"], b["total_tokens_per_run"]["p50"]) == (1, 0, None)
+    assert report["top_threads"] == [{"thread_id": "t1", "runs": 10, "total_tokens": 55100,
+                                      "max_prompt_tokens": 10000, "max_turn": 10, "user": "a"}]
+
+    assert list(summarize(records, by="model")["groups"]) == ["gpt-4o", "gpt-4o-mini"]
+    with pytest.raises(ValueError):
+        summarize(records, by="weekday")
+
+
+def test_usage_report_endpoint(tmp_path, monkeypatch):
+    import main
+
+    client = OpenAI(api_key="test-key", base_url="http://stub/v1", http_client=TestClient(create_app(StubConfig())),
+                    max_retries=0)
+    monkeypatch.setattr(main.assistant_api_4o, "_client", client)
+    monkeypatch.setattr(main.thread_context, "ledger", UsageLedger(str(tmp_path / "usage.jsonl")))
+    monkeypatch.setattr(main, "USAGE_REPORT_TOKEN", "secret")
+    main.app.state.user_assistants.clear()
+    main.thread_context._usage.clear()
+    api = TestClient(main.app)
+
+    thread_id = api.post("/ask-question", json={"question": "Q1", "user_id": "a@example.edu"}).json()["thread_id"]
+    api.post("/ask-question", json={"thread_id": thread_id, "question": "Q2", "user_id": "a@example.edu"})
+    api.post("/ask-question", json={"question": "Q3", "user_id": "b@example.edu"})
+
+    assert api.get("/usage-report").status_code == 403
+    report = api.get("/usage-report", headers={"X-Usage-Token": "secret"}).json()
+    assert {user: group["runs"] for user, group in report["groups"].items()} == {"a@example.edu": 2, "b@example.edu": 1}
+    assert report["top_threads"][0]["thread_id"] == thread_id and report["top_threads"][0]["max_turn"] == 2
+    by_model = api.get("/usage-report", params={"by": "model"}, headers={"X-Usage-Token": "secret"}).json()
+    assert by_model["groups"]["gpt-4o"]["runs"] == 3
+    assert api.get("/usage-report", params={"by": "weekday"}, headers={"X-Usage-Token": "secret"}).status_code == 400
@@ -159,6 +159,11 @@ function Chat() {
         user_id: userEmail, // Pass email as user_id
       });
 
+      // Long threads are compacted into a new thread by the backend; keep using the live one
+      if (response.data.thread_id && response.data.thread_id !== threadId) {
+        setThreadId(response.data.thread_id);
+      }
+
       let assistantContent = response.data.response;
 
       if (typeof assistantContent === "object" && assistantContent.value) {
@@ -372,6 +377,7 @@ function Chat() {
           >
             <option value="4o">4o Model</option>
             <option value="4o-mini">4o-mini Model</option>
+            <option value="auto">Auto (picks per question)</option>
           </select>
         </div>
 